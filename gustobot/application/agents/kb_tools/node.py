@@ -10,7 +10,7 @@ except ImportError:  # pragma: no cover - minimal fallback
 
 from gustobot.config import settings
 from gustobot.infrastructure.core.logger import get_logger
-from gustobot.infrastructure.knowledge import KnowledgeService
+from gustobot.infrastructure.knowledge import KnowledgeService, get_knowledge_service
 from gustobot.application.services.llm_client import LLMClient
 from .prompts import build_knowledge_system_prompt
 from gustobot.infrastructure.tools.search import SearchTool
@@ -76,7 +76,7 @@ def create_knowledge_query_node(
     Build a LangGraph node that queries the recipe knowledge base and crafts an answer.
     """
 
-    knowledge_service = knowledge_service or KnowledgeService()
+    knowledge_service = knowledge_service or get_knowledge_service()
 
     # Lazily construct a client only if API key is present.
     llm_client = llm_client or (
@@ -103,12 +103,14 @@ def create_knowledge_query_node(
         similarity_threshold = context.get("similarity_threshold")
         filter_expr = context.get("filter_expr")
 
+        search_report: Dict[str, int] = {}
         try:
             documents = await knowledge_service.search(
                 query=question,
                 top_k=top_k,
                 similarity_threshold=similarity_threshold,
                 filter_expr=filter_expr,
+                report=search_report,
             )
             logger.info("Knowledge search retrieved {} documents.", len(documents))
         except Exception as exc:  # pragma: no cover - defensive
@@ -185,6 +187,8 @@ def create_knowledge_query_node(
             "similarity_threshold": similarity_threshold,
             "filter_expr": filter_expr,
             "web_results": web_results,
+            "candidates": search_report.get("candidates", len(documents)),
+            "duplicates_pruned": search_report.get("pruned", 0),
         }
 
         if llm_client is None:
@@ -11,7 +11,7 @@ from pydantic import BaseModel, Field
 
 try:
     from lightrag import LightRAG, QueryParam
-    from lightrag.llm.openai import openai_complete_if_cache, openai_embed
+    from lightrag.llm.openai import openai_complete_if_cache
     from lightrag.utils import EmbeddingFunc
     from lightrag.kg.shared_storage import initialize_pipeline_status
     LIGHTRAG_AVAILABLE = True
@@ -28,12 +28,10 @@ except ImportError:  # pragma: no cover - optional dependency
     def openai_complete_if_cache(*args: Any, **kwargs: Any) -> Any:  # type: ignore[assignment]
         return _missing_lighttrag(*args, **kwargs)
 
-    def openai_embed(*args: Any, **kwargs: Any) -> Any:  # type: ignore[assignment]
-        return _missing_lighttrag(*args, **kwargs)
-
 # 导入配置
 from gustobot.config import settings
 from gustobot.infrastructure.core.logger import get_logger
+from gustobot.infrastructure.knowledge.embedding_service import get_embedding_service
 
 logger = get_logger(service="lightrag-node")
 
@@ -156,12 +154,8 @@ class LightRAGAPI:
         np.ndarray
             嵌入向量数组，形状为 (len(texts), embedding_dim)
         """
-        return await openai_embed(
-            texts=texts,
-            model=settings.EMBEDDING_MODEL,
-            api_key=settings.OPENAI_API_KEY,
-            base_url=settings.OPENAI_API_BASE,
-        )
+        vectors = await get_embedding_service().embed(texts)
+        return np.asarray(vectors, dtype=np.float32)
 
     async def initialize(self):
         """初始化 LightRAG 实例"""
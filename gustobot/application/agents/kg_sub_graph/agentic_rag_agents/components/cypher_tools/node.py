@@ -68,17 +68,7 @@ def create_cypher_query_node(
             openai_kwargs["openai_api_base"] = openai_api_base
         model = ChatOpenAI(**openai_kwargs)
 
-        # 获取 Neo4j 图数据库连接
-        try:
-            neo4j_graph = get_neo4j_graph()
-            logger.info("success to get Neo4j graph database connection")
-        except Exception as e:
-            logger.error(f"failed to get Neo4j graph database connection: {e}")
-
-        # 创建自定义检索器实例，根据 Graph Schema 创建 Cypher 示例，用来引导大模型生成正确的 Cypher 查询语句
-        cypher_retriever = RecipeCypherRetriever()
-
-        # 根据自定义的 Cypher，引导大模型生成当前输入问题的 Cypher 查询语句
+        # 获取共享的 Neo4j 图数据库连接（schema 已缓存，不会重复内省）
         try:
             neo4j_graph = get_neo4j_graph()
             logger.info("success to get Neo4j graph database connection")
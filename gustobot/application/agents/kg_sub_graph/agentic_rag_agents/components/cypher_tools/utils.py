@@ -16,7 +16,6 @@ from operator import add
 from pydantic import BaseModel, Field
 from langchain_core.language_models import BaseChatModel
 from langchain_core.runnables.base import Runnable
-from langchain_neo4j.chains.graph_qa.cypher_utils import CypherQueryCorrector, Schema
 from neo4j.exceptions import CypherSyntaxError
 from gustobot.application.agents.kg_sub_graph.agentic_rag_agents.components.utils.utils import (
     retrieve_and_parse_schema_from_graph_for_prompts,
@@ -132,15 +131,13 @@ def correct_cypher_query_relationship_direction(
     str
         The Cypher statement with corrected Relationship directions.
     """
-    # 从数据库中提取关系的结构性信息
-    corrector_schema = [
-        Schema(el["start"], el["type"], el["end"])
-        for el in graph.structured_schema.get("relationships", list())
-    ]
+    from gustobot.application.agents.kg_sub_graph.agentic_rag_agents.components.text2cypher.validation.validators import (
+        get_cypher_query_corrector,
+    )
 
-    # 使用langchain_neo4j 的CypherQueryCorrector 来校验Cypher语句的语法
+    # 从数据库中提取关系的结构性信息，构建 langchain_neo4j 的CypherQueryCorrector 来校验Cypher语句的语法（共享连接按 schema 版本缓存）
     # 比如 ：MATCH (a:Person)-[r:FRIENDS_WITH]->(b:Person) ，如果r:FRIENDS_WITH 是反向的，则会被纠正为：MATCH (a:Person)-[r:FRIENDS_WITH]->(b:Person)
-    cypher_query_corrector = CypherQueryCorrector(corrector_schema)
+    cypher_query_corrector = get_cypher_query_corrector(graph)
 
     corrected_cypher: str = cypher_query_corrector(cypher_statement)
 
@@ -254,6 +251,7 @@ def validate_cypher_query_with_schema(
 )
     from gustobot.application.agents.kg_sub_graph.agentic_rag_agents.components.text2cypher.validation.validators import (
     extract_entities_for_validation,
+    get_structured_schema,
     update_task_list_with_property_type,
     _validate_node_property_names_with_enum,
     _validate_node_property_values_with_enum,
@@ -263,9 +261,7 @@ def validate_cypher_query_with_schema(
     _validate_relationship_property_values_with_range,
     )
 
-    schema: Neo4jStructuredSchema = Neo4jStructuredSchema.model_validate(
-        graph.get_structured_schema
-    )
+    schema: Neo4jStructuredSchema = get_structured_schema(graph)
     nodes_and_rels = extract_entities_for_validation(cypher_statement=cypher_statement)
 
     node_tasks = update_task_list_with_property_type(
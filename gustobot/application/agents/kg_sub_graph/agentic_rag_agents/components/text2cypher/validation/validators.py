@@ -9,6 +9,7 @@ from langchain_neo4j import Neo4jGraph
 from langchain_neo4j.chains.graph_qa.cypher_utils import CypherQueryCorrector, Schema
 from neo4j.exceptions import CypherSyntaxError
 
+from gustobot.application.agents.kg_sub_graph.kg_neo4j_conn import get_neo4j_schema_cache
 from ....components.text2cypher.validation.models import ValidateCypherOutput
 from ....constants import WRITE_CLAUSES
 from ...utils.utils import retrieve_and_parse_schema_from_graph_for_prompts
@@ -25,6 +26,39 @@ from .utils.cypher_extractors import (
 from .utils.utils import update_task_list_with_property_type
 
 
+def get_structured_schema(graph: Neo4jGraph) -> Neo4jStructuredSchema:
+    """
+    Parse the graph's structured schema for validation.
+    For the shared graph the parsed schema is cached per schema version.
+    """
+    cache = get_neo4j_schema_cache()
+    if cache.owns(graph):
+        return cache.derived(
+            "validation_schema",
+            lambda: Neo4jStructuredSchema.model_validate(graph.get_structured_schema),
+        )
+    return Neo4jStructuredSchema.model_validate(graph.get_structured_schema)
+
+
+def get_cypher_query_corrector(graph: Neo4jGraph) -> CypherQueryCorrector:
+    """
+    Build LangChain's `CypherQueryCorrector` from the graph's relationships.
+    For the shared graph the corrector is cached per schema version.
+    """
+
+    def build() -> CypherQueryCorrector:
+        corrector_schema = [
+            Schema(el["start"], el["type"], el["end"])
+            for el in graph.structured_schema.get("relationships", list())
+        ]
+        return CypherQueryCorrector(corrector_schema)
+
+    cache = get_neo4j_schema_cache()
+    if cache.owns(graph):
+        return cache.derived("cypher_query_corrector", build)
+    return build()
+
+
 def validate_cypher_query_syntax(graph: Neo4jGraph, cypher_statement: str) -> List[str]:
     """
     Validate the Cypher statement syntax by running an EXPLAIN query.
@@ -68,11 +102,7 @@ def correct_cypher_query_relationship_direction(
         The Cypher statement with corrected Relationship directions.
     """
     # Cypher query corrector is experimental
-    corrector_schema = [
-        Schema(el["start"], el["type"], el["end"])
-        for el in graph.structured_schema.get("relationships", list())
-    ]
-    cypher_query_corrector = CypherQueryCorrector(corrector_schema)
+    cypher_query_corrector = get_cypher_query_corrector(graph)
 
     corrected_cypher: str = cypher_query_corrector(cypher_statement)
 
@@ -163,9 +193,7 @@ def validate_cypher_query_with_schema(
         A list of any found errors.
     """
 
-    schema: Neo4jStructuredSchema = Neo4jStructuredSchema.model_validate(
-        graph.get_structured_schema
-    )
+    schema: Neo4jStructuredSchema = get_structured_schema(graph)
     nodes_and_rels = extract_entities_for_validation(cypher_statement=cypher_statement)
 
     node_tasks = update_task_list_with_property_type(
@@ -15,6 +15,7 @@ from langgraph.constants import END, START
 from langgraph.graph.state import CompiledStateGraph, StateGraph
 from pydantic import BaseModel, Field
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableConfig
 
 # 导入输入输出状态定义
 from gustobot.application.agents.kg_sub_graph.agentic_rag_agents.components.state import (
@@ -40,7 +41,8 @@ from gustobot.application.agents.kg_sub_graph.agentic_rag_agents.components.text
 
 from gustobot.config import settings
 from gustobot.infrastructure.core.logger import get_logger
-from gustobot.infrastructure.knowledge import KnowledgeService
+from gustobot.infrastructure.knowledge import KnowledgeService, get_knowledge_service
+from gustobot.infrastructure.knowledge.dedup import prune_candidates
 
 
 from ...components.errors import create_error_tool_selection_node
@@ -52,6 +54,7 @@ from ...components.summarize import create_summarization_node
 
 
 
+from .retrieval_executor import RetrievalExecutor, RetrievalSource
 from .edges import (
     guardrails_conditional_edge,
     map_reduce_planner_to_tool_selection,
@@ -214,6 +217,8 @@ class KBWorkflowState(TypedDict):
     postgres_results: List[Dict[str, Any]]
     local_results: List[Dict[str, Any]]
     external_results: List[Dict[str, Any]]
+    external_searched: bool
+    dedup_pruned: Dict[str, int]
     answer: str
     steps: Annotated[List[str], add]
     sources: Annotated[List[str], add]
@@ -235,6 +240,7 @@ def create_kb_multi_tool_workflow(
     allow_external: Optional[bool] = None,
     external_search_url: Optional[str] = None,
     external_search_timeout: Optional[float] = None,
+    local_search_deadline: Optional[float] = None,
     scope_description: Optional[str] = None,
 ) -> CompiledStateGraph:
     """
@@ -245,7 +251,7 @@ def create_kb_multi_tool_workflow(
     and then synthesises a response with safety-aware instructions.
     """
 
-    knowledge_service = knowledge_service or KnowledgeService()
+    knowledge_service = knowledge_service or get_knowledge_service()
     effective_top_k = top_k or settings.KB_TOP_K
     effective_threshold = (
         similarity_threshold
@@ -288,6 +294,11 @@ def create_kb_multi_tool_workflow(
         if external_search_timeout is not None
         else settings.KB_EXTERNAL_SEARCH_TIMEOUT
     )
+    search_deadline = (
+        local_search_deadline
+        if local_search_deadline is not None
+        else settings.KB_LOCAL_SEARCH_DEADLINE
+    )
 
     scope_text = scope_description or (
         "菜谱文化知识库仅处理菜谱的历史渊源、命名来历、地域流派、典故故事，以及历史名人与菜谱之间的关联信息。"
@@ -551,14 +562,159 @@ def create_kb_multi_tool_workflow(
             "steps": ["router"],
         }
 
+    async def _search_postgres(question: str, dedup_report: Dict[str, int]) -> List[Dict[str, Any]]:
+        kb_logger.info("🔍 [优先] 查询 PostgreSQL pgvector 结构化数据库...")
+        postgres_results: List[Dict[str, Any]] = []
+        payload: Dict[str, Any] = {
+            "query": question,
+            "top_k": effective_top_k,
+        }
+        if settings.KB_POSTGRES_SIMILARITY_THRESHOLD is not None:
+            payload["threshold"] = settings.KB_POSTGRES_SIMILARITY_THRESHOLD
+        try:
+            timeout_cfg = aiohttp.ClientTimeout(total=request_timeout)
+            async with aiohttp.ClientSession(timeout=timeout_cfg) as session:
+                async with session.post(postgres_search_url, json=payload) as response:
+                    if response.status == 200:
+                        body = await response.json()
+                        data_results = body.get("results") or []
+                        if isinstance(data_results, list):
+                            for idx, item in enumerate(data_results):
+                                item_copy = dict(item)
+                                metadata_copy = dict(item_copy.get("metadata") or {})
+                                item_copy["metadata"] = metadata_copy
+                                item_copy["tool"] = "postgres"
+                                similarity = (
+                                    item_copy.get("similarity")
+                                    if item_copy.get("similarity") is not None
+                                    else item_copy.get("score")
+                                )
+                                if similarity is not None:
+                                    try:
+                                        item_copy["similarity"] = float(similarity)
+                                    except (TypeError, ValueError):
+                                        item_copy["similarity"] = 0.0
+                                item_copy["id"] = str(
+                                    item_copy.get("id")
+                                    or item_copy.get("document_id")
+                                    or item_copy.get("source_id")
+                                    or f"postgres_{idx}"
+                                )
+                                postgres_results.append(item_copy)
+                            # 近重复分块只保留排名最靠前的一条，再送 rerank 与上下文
+                            postgres_results, dedup_report["postgres"] = prune_candidates(postgres_results)
+                            if postgres_results and knowledge_service.reranker.enabled:
+                                postgres_results = await knowledge_service.reranker.rerank(
+                                    question, postgres_results, effective_top_k
+                                )
+                            filtered_postgres: List[Dict[str, Any]] = []
+                            for doc in postgres_results:
+                                similarity = float(doc.get("similarity") or doc.get("score") or 0.0)
+                                # reranker 熔断或超时降级时没有 rerank_score，仅按相似度过滤
+                                if doc.get("rerank_score") is not None:
+                                    rerank_score = float(doc["rerank_score"])
+                                    if (
+                                        similarity >= settings.KB_POSTGRES_SIMILARITY_THRESHOLD
+                                        and rerank_score >= settings.KB_POSTGRES_RERANK_THRESHOLD
+                                    ):
+                                        filtered_postgres.append(doc)
+                                else:
+                                    if similarity >= settings.KB_POSTGRES_SIMILARITY_THRESHOLD:
+                                        filtered_postgres.append(doc)
+                            postgres_results = filtered_postgres[:effective_top_k]
+                            kb_logger.info(
+                                "✅ PostgreSQL 返回 {} 条结果，近重复裁剪 {} 条，过滤后保留 {} 条",
+                                len(data_results),
+                                dedup_report["postgres"],
+                                len(postgres_results),
+                            )
+                        else:
+                            kb_logger.warning(
+                                "Unexpected PostgreSQL search payload structure: {}",
+                                body,
+                            )
+                    else:
+                        error_text = await response.text()
+                        kb_logger.warning(
+                            "PostgreSQL KB search failed ({}): {}",
+                            response.status,
+                            error_text,
+                        )
+        except Exception as exc:  # pragma: no cover - defensive logging
+            kb_logger.error("PostgreSQL knowledge search error: {}", exc)
+        return postgres_results
+
+    async def _search_milvus(question: str, dedup_report: Dict[str, int]) -> List[Dict[str, Any]]:
+        milvus_results: List[Dict[str, Any]] = []
+        try:
+            search_report: Dict[str, int] = {}
+            docs = await knowledge_service.search(
+                query=question,
+                top_k=effective_top_k,
+                similarity_threshold=settings.KB_SIMILARITY_THRESHOLD,
+                filter_expr=filter_expr,
+                filter_by_similarity=not knowledge_service.reranker.enabled,
+                report=search_report,
+            )
+            dedup_report["milvus"] = search_report.get("pruned", 0)
+            for doc in docs:
+                doc_copy = dict(doc)
+                metadata_copy = dict(doc.get("metadata") or {})
+                doc_copy["metadata"] = metadata_copy
+                doc_copy["tool"] = "milvus"
+                milvus_results.append(doc_copy)
+            kb_logger.info("✅ Milvus 返回 {} 条结果", len(milvus_results))
+        except Exception as exc:  # pragma: no cover - defensive logging
+            kb_logger.error("Milvus knowledge search failed: {}", exc)
+        return milvus_results
+
+    async def _search_external(question: str) -> List[Dict[str, Any]]:
+        payload: Dict[str, Any] = {
+            "query": question,
+            "top_k": effective_top_k,
+        }
+        if effective_threshold is not None:
+            payload["threshold"] = effective_threshold
+
+        results: List[Dict[str, Any]] = []
+        try:
+            timeout_cfg = aiohttp.ClientTimeout(total=request_timeout)
+            async with aiohttp.ClientSession(timeout=timeout_cfg) as session:
+                async with session.post(external_url, json=payload) as response:
+                    if response.status == 200:
+                        body = await response.json()
+                        data_results = body.get("results") or []
+                        if isinstance(data_results, list):
+                            results = data_results
+                        else:
+                            kb_logger.warning(
+                                "Unexpected external search payload structure: {}",
+                                body,
+                            )
+                    else:
+                        error_text = await response.text()
+                        kb_logger.warning(
+                            "External KB search failed ({}): {}",
+                            response.status,
+                            error_text,
+                        )
+        except Exception as exc:  # pragma: no cover - defensive logging
+            kb_logger.error("External KB search error: {}", exc)
+        return results
+
+    def _external_search_skipped(state: KBWorkflowState) -> bool:
+        """外部检索与已执行的 PostgreSQL 工具同源时无需重复查询。"""
+        return external_is_postgres and "postgres" in (state.get("kb_tools") or [])
+
     async def local_search(state: KBWorkflowState) -> Dict[str, Any]:
         """
-        优先使用 PostgreSQL pgvector 结构化查询，如果无结果再用 Milvus 兜底。
+        并发查询 PostgreSQL pgvector、Milvus（以及可用时的外部检索），整体受截止时间约束。
 
-        执行策略：
-        1. 优先查询 PostgreSQL（如果在工具列表中）
-        2. 如果 PostgreSQL 有结果（>= 1条），直接使用，跳过 Milvus
-        3. 如果 PostgreSQL 无结果或未被选择，查询 Milvus 作为兜底
+        合并策略与串行兜底保持一致：
+        1. PostgreSQL（如果在工具列表中）有结果（>= 1条）时直接使用，Milvus 被取消
+        2. PostgreSQL 无结果、失败或未被选择时，使用 Milvus 的结果
+        3. 本地均无结果时使用外部检索结果；hybrid 路由下外部检索结果始终保留
+        每个源的状态与耗时写入 `steps`。
         """
         question = state.get("question", "")
         if not question.strip():
@@ -570,137 +726,65 @@ def create_kb_multi_tool_workflow(
             }
 
         selected_tools = state.get("kb_tools") or ["postgres", "milvus"]
+        route = state.get("route", "local")
 
-        milvus_results: List[Dict[str, Any]] = []
-        postgres_results: List[Dict[str, Any]] = []
-
-        # Step 1: 优先查询 PostgreSQL（如果在工具列表中）
         should_try_postgres = "postgres" in selected_tools
         should_try_milvus = "milvus" in selected_tools
+        if should_try_postgres and not postgres_search_url:
+            kb_logger.warning(
+                "PostgreSQL 工具被选中，但 INGEST_SERVICE_URL 未配置，跳过 PostgreSQL 直接使用 Milvus。"
+            )
+            should_try_postgres = False
+            should_try_milvus = True
 
-        # 确保优先级：如果同时选择了两个工具，先尝试 PostgreSQL
+        # 列表顺序即优先级：排在前面的源返回非空结果后，后面的兜底源会被取消
+        dedup_pruned: Dict[str, int] = {}
+        sources: List[RetrievalSource] = []
         if should_try_postgres:
-            if not postgres_search_url:
-                kb_logger.warning(
-                    "PostgreSQL 工具被选中，但 INGEST_SERVICE_URL 未配置，跳过 PostgreSQL 直接使用 Milvus。"
+            sources.append(RetrievalSource("postgres", lambda: _search_postgres(question, dedup_pruned)))
+        if should_try_milvus:
+            sources.append(RetrievalSource("milvus", lambda: _search_milvus(question, dedup_pruned)))
+        if not sources:
+            kb_logger.warning("⚠️ 未选择任何可用的知识库工具")
+
+        fetch_external = (
+            route in {"local", "hybrid"}
+            and allow_external_search
+            and bool(external_url)
+            and not _external_search_skipped(state)
+        )
+        if fetch_external:
+            sources.append(
+                RetrievalSource(
+                    "external",
+                    lambda: _search_external(question),
+                    always=route == "hybrid",
                 )
-                # 如果 PostgreSQL 不可用，直接使用 Milvus
-                should_try_milvus = True
-            else:
-                kb_logger.info("🔍 [优先] 查询 PostgreSQL pgvector 结构化数据库...")
-                payload: Dict[str, Any] = {
-                    "query": question,
-                    "top_k": effective_top_k,
-                }
-                if settings.KB_POSTGRES_SIMILARITY_THRESHOLD is not None:
-                    payload["threshold"] = settings.KB_POSTGRES_SIMILARITY_THRESHOLD
-                try:
-                    timeout_cfg = aiohttp.ClientTimeout(total=request_timeout)
-                    async with aiohttp.ClientSession(timeout=timeout_cfg) as session:
-                        async with session.post(postgres_search_url, json=payload) as response:
-                            if response.status == 200:
-                                body = await response.json()
-                                data_results = body.get("results") or []
-                                if isinstance(data_results, list):
-                                    for idx, item in enumerate(data_results):
-                                        item_copy = dict(item)
-                                        metadata_copy = dict(item_copy.get("metadata") or {})
-                                        item_copy["metadata"] = metadata_copy
-                                        item_copy["tool"] = "postgres"
-                                        similarity = (
-                                            item_copy.get("similarity")
-                                            if item_copy.get("similarity") is not None
-                                            else item_copy.get("score")
-                                        )
-                                        if similarity is not None:
-                                            try:
-                                                item_copy["similarity"] = float(similarity)
-                                            except (TypeError, ValueError):
-                                                item_copy["similarity"] = 0.0
-                                        item_copy["id"] = str(
-                                            item_copy.get("id")
-                                            or item_copy.get("document_id")
-                                            or item_copy.get("source_id")
-                                            or f"postgres_{idx}"
-                                        )
-                                        postgres_results.append(item_copy)
-                                    if postgres_results and knowledge_service.reranker.enabled:
-                                        postgres_results = await knowledge_service.reranker.rerank(
-                                            question, postgres_results, effective_top_k
-                                        )
-                                    filtered_postgres: List[Dict[str, Any]] = []
-                                    for doc in postgres_results:
-                                        similarity = float(doc.get("similarity") or doc.get("score") or 0.0)
-                                        rerank_score = float(doc.get("rerank_score") or 0.0)
-                                        if knowledge_service.reranker.enabled:
-                                            if (
-                                                similarity >= settings.KB_POSTGRES_SIMILARITY_THRESHOLD
-                                                and rerank_score >= settings.KB_POSTGRES_RERANK_THRESHOLD
-                                            ):
-                                                filtered_postgres.append(doc)
-                                        else:
-                                            if similarity >= settings.KB_POSTGRES_SIMILARITY_THRESHOLD:
-                                                filtered_postgres.append(doc)
-                                    postgres_results = filtered_postgres[:effective_top_k]
-                                    kb_logger.info(
-                                        "✅ PostgreSQL 返回 {} 条结果，过滤后保留 {} 条",
-                                        len(data_results),
-                                        len(postgres_results),
-                                    )
-                                else:
-                                    kb_logger.warning(
-                                        "Unexpected PostgreSQL search payload structure: {}",
-                                        body,
-                                    )
-                            else:
-                                error_text = await response.text()
-                                kb_logger.warning(
-                                    "PostgreSQL KB search failed ({}): {}",
-                                    response.status,
-                                    error_text,
-                                )
-                except Exception as exc:  # pragma: no cover - defensive logging
-                    kb_logger.error("PostgreSQL knowledge search error: {}", exc)
+            )
+
+        outcomes = await RetrievalExecutor(search_deadline).run(sources)
+
+        def _results(name: str) -> List[Dict[str, Any]]:
+            outcome = outcomes.get(name)
+            return outcome.results if outcome else []
 
-        # Step 2: 根据 PostgreSQL 结果决定是否需要 Milvus 兜底
-        if postgres_results and len(postgres_results) > 0:
-            # PostgreSQL 有结果，直接使用，跳过 Milvus
+        postgres_results = _results("postgres")
+        milvus_results: List[Dict[str, Any]] = []
+        if postgres_results:
             kb_logger.info(
                 "✅ PostgreSQL 有结果（{}条），直接使用结构化数据，跳过 Milvus 向量查询",
                 len(postgres_results)
             )
             combined_results = postgres_results
         else:
-            # PostgreSQL 无结果或不可用，使用 Milvus 兜底
+            milvus_results = _results("milvus")
             if should_try_milvus:
-                if not postgres_results:
-                    kb_logger.info("⚠️ PostgreSQL 无结果，使用 Milvus 向量库兜底...")
-                else:
-                    kb_logger.info("⚠️ PostgreSQL 不可用，使用 Milvus 向量库...")
-
-                try:
-                    docs = await knowledge_service.search(
-                        query=question,
-                        top_k=effective_top_k,
-                        similarity_threshold=settings.KB_SIMILARITY_THRESHOLD,
-                        filter_expr=filter_expr,
-                        filter_by_similarity=not knowledge_service.reranker.enabled,
-                    )
-                    for doc in docs:
-                        doc_copy = dict(doc)
-                        metadata_copy = dict(doc.get("metadata") or {})
-                        doc_copy["metadata"] = metadata_copy
-                        doc_copy["tool"] = "milvus"
-                        milvus_results.append(doc_copy)
-                    kb_logger.info("✅ Milvus 兜底返回 {} 条结果", len(milvus_results))
-                except Exception as exc:  # pragma: no cover - defensive logging
-                    kb_logger.error("Milvus knowledge search failed: {}", exc)
-                combined_results = milvus_results
-            else:
-                kb_logger.warning("⚠️ 未选择任何可用的知识库工具")
-                combined_results = []
+                kb_logger.info("⚠️ PostgreSQL 无结果，使用 Milvus 向量库兜底（{}条）", len(milvus_results))
+            combined_results = milvus_results
 
-        route = state.get("route", "local")
+        external_results: List[Dict[str, Any]] = []
+        if fetch_external and (route == "hybrid" or not combined_results):
+            external_results = _results("external")
         if (
             not combined_results
             and route in {"local", "hybrid"}
@@ -710,19 +794,26 @@ def create_kb_multi_tool_workflow(
             kb_logger.info("Local searches empty, falling back to external search.")
             route = "external"
 
-        return {
+        update: Dict[str, Any] = {
             "milvus_results": milvus_results,
             "postgres_results": postgres_results,
             "local_results": combined_results,
             "route": route,
-            "steps": ["local_search"],
+            "dedup_pruned": dedup_pruned,
+            "steps": ["local_search"]
+            + [outcome.as_step() for outcome in outcomes.values()]
+            + [f"local_search:dedup:{name}=pruned({count})" for name, count in dedup_pruned.items()],
         }
+        if fetch_external:
+            update["external_results"] = external_results
+            update["external_searched"] = True
+        return update
 
     async def external_search(state: KBWorkflowState) -> Dict[str, Any]:
         if not (allow_external_search and external_url):
             return {"external_results": [], "steps": ["external_search"]}
 
-        if external_is_postgres and "postgres" in (state.get("kb_tools") or []):
+        if _external_search_skipped(state):
             kb_logger.debug(
                 "Skip external search: router already执行了 PostgreSQL 工具，且外部检索与其同源。"
             )
@@ -732,44 +823,13 @@ def create_kb_multi_tool_workflow(
         if not question.strip():
             return {"external_results": [], "steps": ["external_search"]}
 
-        payload: Dict[str, Any] = {
-            "query": question,
-            "top_k": effective_top_k,
-        }
-        if effective_threshold is not None:
-            payload["threshold"] = effective_threshold
-
-        results: List[Dict[str, Any]] = []
-        try:
-            timeout_cfg = aiohttp.ClientTimeout(total=request_timeout)
-            async with aiohttp.ClientSession(timeout=timeout_cfg) as session:
-                async with session.post(external_url, json=payload) as response:
-                    if response.status == 200:
-                        body = await response.json()
-                        data_results = body.get("results") or []
-                        if isinstance(data_results, list):
-                            results = data_results
-                        else:
-                            kb_logger.warning(
-                                "Unexpected external search payload structure: {}",
-                                body,
-                            )
-                    else:
-                        error_text = await response.text()
-                        kb_logger.warning(
-                            "External KB search failed ({}): {}",
-                            response.status,
-                            error_text,
-                        )
-        except Exception as exc:  # pragma: no cover - defensive logging
-            kb_logger.error("External KB search error: {}", exc)
-
+        results = await _search_external(question)
         return {
             "external_results": results,
             "steps": ["external_search"],
         }
 
-    async def finalize(state: KBWorkflowState) -> KBOutputState:
+    async def finalize(state: KBWorkflowState, config: RunnableConfig) -> KBOutputState:
         if state.get("guardrails_decision") == "end":
             summary = state.get("summary") or "抱歉，该问题暂时无法回答。"
             return {"answer": summary, "sources": [], "steps": ["finalize"]}
@@ -797,7 +857,8 @@ def create_kb_multi_tool_workflow(
             external_context=external_context,
         )
         try:
-            response = await llm.ainvoke(messages)
+            # 显式传递 config，使回调（astream_events 的逐 token 事件）在 Python 3.10 下也能传播
+            response = await llm.ainvoke(messages, config=config)
             content = getattr(response, "content", None)
             if isinstance(content, str):
                 answer = content.strip()
@@ -828,6 +889,9 @@ def create_kb_multi_tool_workflow(
         return "external_search" if state.get("route") == "external" else "local_search"
 
     def local_edge(state: KBWorkflowState) -> str:
+        if state.get("external_searched"):
+            # 外部检索已在 local_search 中与本地检索并发完成
+            return "finalize"
         route = state.get("route", "local")
         if route in {"hybrid", "external"} and allow_external_search and external_url:
             return "external_search"
@@ -0,0 +1,135 @@
+"""
+知识库检索并发执行器。
+
+按优先级声明的多个检索源（PostgreSQL → Milvus → 外部检索）同时发起，整体受一个
+截止时间约束。合并语义与原先的串行兜底一致：排在前面的源只要返回非空结果就胜出，
+其后的兜底源会被立即取消；`always=True` 的源（例如 hybrid 路由下的外部检索）
+不参与优先级，始终等待到完成或截止。
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+from gustobot.infrastructure.core.logger import get_logger
+
+logger = get_logger(service="kb-retrieval")
+
+SearchResults = List[Dict[str, Any]]
+
+
+@dataclass
+class RetrievalSource:
+    """一个检索源；`search` 每次调用返回一个新的协程。"""
+
+    name: str
+    search: Callable[[], Awaitable[SearchResults]]
+    always: bool = False
+
+
+@dataclass
+class SourceOutcome:
+    name: str
+    status: str  # "ok" | "empty" | "error" | "cancelled" | "timeout"
+    elapsed_ms: float
+    results: SearchResults = field(default_factory=list)
+
+    def describe(self) -> str:
+        count = f"({len(self.results)})" if self.status == "ok" else ""
+        return f"{self.name}={self.status}{count} {self.elapsed_ms:.0f}ms"
+
+    def as_step(self, prefix: str = "local_search") -> str:
+        """写入工作流 `steps` 的计时记录，例如 `local_search:postgres=ok(3) 812ms`。"""
+        return f"{prefix}:{self.describe()}"
+
+
+class RetrievalExecutor:
+    """并发执行检索源，返回每个源的结果与耗时。"""
+
+    def __init__(self, deadline: Optional[float]) -> None:
+        self.deadline = deadline
+
+    async def run(self, sources: Sequence[RetrievalSource]) -> Dict[str, SourceOutcome]:
+        if not sources:
+            return {}
+
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        finished_at: Dict[asyncio.Task, float] = {}
+        tasks: Dict[asyncio.Task, RetrievalSource] = {}
+        for source in sources:
+            task = asyncio.ensure_future(source.search())
+            task.add_done_callback(lambda t: finished_at.setdefault(t, time.perf_counter()))
+            tasks[task] = source
+        ranked = [task for task, source in tasks.items() if not source.always]
+
+        outcomes: Dict[str, SourceOutcome] = {}
+        end = loop.time() + self.deadline if self.deadline else None
+        pending = set(tasks)
+        try:
+            while pending:
+                winner = self._winner(ranked)
+                if winner is not None:
+                    late = [task for task in ranked[ranked.index(winner) + 1:] if task in pending]
+                    for task in late:
+                        task.cancel()
+                        pending.discard(task)
+                        outcomes[tasks[task].name] = self._outcome(tasks[task], "cancelled", started)
+                    if not pending:
+                        break
+
+                timeout = None if end is None else end - loop.time()
+                if timeout is not None and timeout <= 0:
+                    break
+                done, pending = await asyncio.wait(
+                    pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+                outcomes[tasks[task].name] = self._outcome(tasks[task], "timeout", started)
+            cancelled = [task for task in tasks if task.cancelled() or not task.done()]
+            if cancelled:
+                await asyncio.gather(*cancelled, return_exceptions=True)
+
+        for task, source in tasks.items():
+            if source.name in outcomes:
+                continue
+            elapsed = (finished_at.get(task, time.perf_counter()) - started) * 1000
+            if task.cancelled():
+                # 检索源自身以取消结束（例如其内部的操作被取消）
+                outcomes[source.name] = SourceOutcome(source.name, "cancelled", elapsed)
+                continue
+            exc = task.exception()
+            if exc is not None:
+                logger.error("Retrieval source {} failed: {}", source.name, exc)
+                outcomes[source.name] = SourceOutcome(source.name, "error", elapsed)
+                continue
+            results = list(task.result() or [])
+            status = "ok" if results else "empty"
+            outcomes[source.name] = SourceOutcome(source.name, status, elapsed, results)
+
+        logger.info(
+            "Retrieval fan-out finished in {:.0f}ms: {}",
+            (time.perf_counter() - started) * 1000,
+            ", ".join(outcome.describe() for outcome in outcomes.values()),
+        )
+        return outcomes
+
+    @staticmethod
+    def _winner(ranked: List[asyncio.Task]) -> Optional[asyncio.Task]:
+        """优先级最高且已返回非空结果的源；更高优先级的源尚未结束时返回 None。"""
+        for task in ranked:
+            if not task.done():
+                return None
+            if not task.cancelled() and task.exception() is None and task.result():
+                return task
+        return None
+
+    @staticmethod
+    def _outcome(source: RetrievalSource, status: str, started: float) -> SourceOutcome:
+        return SourceOutcome(source.name, status, (time.perf_counter() - started) * 1000)
@@ -1,7 +1,11 @@
 from langchain_neo4j import Neo4jGraph
 from gustobot.config import settings
 from gustobot.infrastructure.core.logger import get_logger
+from gustobot.infrastructure.knowledge.recipe_kg.graph_importer_service import add_import_listener
+from typing import Any, Callable, Dict, Optional
 import logging
+import threading
+import time
 
 # 获取日志记录器
 logger = get_logger(service="kg_builder")
@@ -14,27 +18,147 @@ logging.getLogger("langchain_neo4j").setLevel(logging.ERROR)
 logging.getLogger("neo4j.io").setLevel(logging.ERROR)
 logging.getLogger("neo4j.bolt").setLevel(logging.ERROR)
 
+
+class Neo4jSchemaCache:
+    """
+    共享 Neo4jGraph 的版本化 schema 缓存。
+
+    每次 schema 重新加载都会递增 `version`，依赖 schema 的派生对象
+    （例如校验器使用的 `Neo4jStructuredSchema`）按版本缓存在 `derived()` 中。
+    """
+
+    def __init__(self, ttl: float) -> None:
+        self.ttl = ttl
+        self.graph: Optional[Neo4jGraph] = None
+        self.version = 0
+        self.loaded_at = 0.0
+        self._derived: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def is_stale(self) -> bool:
+        return bool(self.ttl) and time.monotonic() - self.loaded_at >= self.ttl
+
+    def mark_loaded(self) -> None:
+        self.version += 1
+        self.loaded_at = time.monotonic()
+        self._derived = {}
+
+    def owns(self, graph: Any) -> bool:
+        return graph is not None and graph is self.graph
+
+    def derived(self, name: str, build: Callable[[], Any]) -> Any:
+        """返回当前 schema 版本下名为 `name` 的派生对象，不存在时构建。"""
+        derived = self._derived
+        if name not in derived:
+            derived[name] = build()
+        return derived[name]
+
+
+_schema_cache = Neo4jSchemaCache(settings.NEO4J_SCHEMA_TTL)
+
+
+def create_neo4j_graph() -> Neo4jGraph:
+    """创建一个新的（非共享）Neo4jGraph实例，构造时会建立驱动并读取 schema。"""
+    kwargs = {
+        "url": settings.NEO4J_URI,
+        "database": settings.NEO4J_DATABASE,
+    }
+    if settings.NEO4J_USER and settings.NEO4J_PASSWORD not in (None, ""):
+        kwargs.update({
+            "username": settings.NEO4J_USER,
+            "password": settings.NEO4J_PASSWORD,
+        })
+    return Neo4jGraph(**kwargs)
+
+
 def get_neo4j_graph() -> Neo4jGraph:
     """
-    创建并返回一个Neo4jGraph实例，使用配置文件中的设置。
-    
+    返回进程内共享的Neo4jGraph实例（共享一个驱动），使用配置文件中的设置。
+
+    首次调用时建立连接并读取 schema；schema 超过 NEO4J_SCHEMA_TTL 后由
+    一个调用方交给后台线程刷新并立即返回，刷新完成前所有调用方继续使用旧 schema。
+
     Returns:
         Neo4jGraph: 配置好的Neo4j图数据库连接实例
     """
-    logger.info(f"initialize Neo4j connection: {settings.NEO4J_URI}")
+    cache = _schema_cache
+    graph = cache.graph
+    if graph is None:
+        with cache._lock:
+            if cache.graph is None:
+                logger.info(f"initialize Neo4j connection: {settings.NEO4J_URI}")
+                cache.graph = create_neo4j_graph()
+                cache.mark_loaded()
+            return cache.graph
 
+    if cache.is_stale() and cache._lock.acquire(blocking=False):
+        try:
+            if cache.is_stale():
+                # 锁交由后台线程在刷新结束后释放
+                threading.Thread(
+                    target=_refresh_in_background,
+                    args=(cache,),
+                    name="neo4j-schema-refresh",
+                    daemon=True,
+                ).start()
+            else:
+                cache._lock.release()
+        except BaseException:
+            cache._lock.release()
+            raise
+    return graph
+
+
+def _refresh_in_background(cache: Neo4jSchemaCache) -> None:
+    try:
+        _refresh_locked(cache)
+    finally:
+        cache._lock.release()
+
+
+def _refresh_locked(cache: Neo4jSchemaCache) -> None:
     try:
-        kwargs = {
-            "url": settings.NEO4J_URI,
-            "database": settings.NEO4J_DATABASE,
-        }
-        if settings.NEO4J_USER and settings.NEO4J_PASSWORD not in (None, ""):
-            kwargs.update({
-                "username": settings.NEO4J_USER,
-                "password": settings.NEO4J_PASSWORD,
-            })
-        
-        neo4j_graph = Neo4jGraph(**kwargs)
-        return neo4j_graph
+        cache.graph.refresh_schema()
+        cache.mark_loaded()
+        logger.info(f"Neo4j schema refreshed (version {cache.version})")
     except Exception as e:
-        raise
+        # 保留旧 schema，等下一个 TTL 周期再试
+        cache.loaded_at = time.monotonic()
+        logger.warning(f"failed to refresh Neo4j schema: {e}")
+
+
+def refresh_neo4j_schema() -> int:
+    """
+    立即重新读取共享连接的 schema（例如菜谱图谱导入之后），返回新的 schema 版本。
+    尚未建立连接时无需刷新，下一次 `get_neo4j_graph()` 会读取最新 schema。
+    """
+    cache = _schema_cache
+    with cache._lock:
+        if cache.graph is not None:
+            _refresh_locked(cache)
+        return cache.version
+
+
+def get_neo4j_schema_version() -> int:
+    """当前共享 schema 的版本号，schema 每次重新加载后递增。"""
+    return _schema_cache.version
+
+
+def get_neo4j_schema_cache() -> Neo4jSchemaCache:
+    return _schema_cache
+
+
+def close_neo4j_graph() -> None:
+    """关闭共享连接的驱动。"""
+    cache = _schema_cache
+    with cache._lock:
+        graph, cache.graph = cache.graph, None
+    if graph is not None:
+        try:
+            graph._driver.close()
+        except Exception as e:  # pragma: no cover - defensive cleanup
+            logger.warning(f"failed to close Neo4j graph driver: {e}")
+
+
+# 菜谱图谱导入完成后刷新 schema
+add_import_listener(refresh_neo4j_schema)
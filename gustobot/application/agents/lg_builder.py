@@ -18,14 +18,8 @@ from langchain_core.messages import BaseMessage
 from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import END, START, StateGraph
 from gustobot.application.agents.lg_states import AgentState, InputState, Router, GradeHallucinations
-from gustobot.application.agents.kg_sub_graph.agentic_rag_agents.retrievers.cypher_examples.recipe_retriever import \
-    RecipeCypherRetriever
 from gustobot.application.agents.kg_sub_graph.agentic_rag_agents.components.planner.node import create_planner_node
-from gustobot.application.agents.kg_sub_graph.agentic_rag_agents.workflows.multi_agent.multi_tool import (
-    create_multi_tool_workflow,
-    create_kb_multi_tool_workflow,
-)
-from gustobot.application.agents.kg_sub_graph.kg_neo4j_conn import get_neo4j_graph
+from gustobot.application.agents.workflow_factory import get_workflow_factory
 from pydantic import BaseModel, Field
 from langchain_core.messages import AIMessage
 from langchain_core.runnables.base import Runnable
@@ -44,7 +38,7 @@ import io
 
 from langchain_openai import ChatOpenAI
 from gustobot.application.agents.kb_tools import create_knowledge_query_node, KnowledgeQueryInputState
-from gustobot.infrastructure.knowledge import KnowledgeService
+from gustobot.infrastructure.knowledge import KnowledgeService, get_knowledge_service
 class AdditionalGuardrailsOutput(BaseModel):
     """
     格式化输出，用于判断用户的问题是否与图谱内容相关
@@ -261,7 +255,7 @@ async def respond_to_general_query(
     )
 
     messages = [{"role": "system", "content": system_prompt}] + state.messages
-    response = await model.ainvoke(messages)
+    response = await model.ainvoke(messages, config=config)
     return {"messages": [response]}
 
 #大模型生成输出多了一些额外消息
@@ -287,13 +281,8 @@ async def get_additional_info(
                        tags=["additional_info"])
     # 如果用户的问题是菜谱相关，但与自己的业务无关，则需要返回"无关问题"
 
-    # 首先连接 Neo4j 图数据库
-    try:
-        neo4j_graph = get_neo4j_graph()
-        logger.info("success to get Neo4j graph database connection")
-    except Exception as e:
-        logger.error(f"failed to get Neo4j graph database connection: {e}")
-        neo4j_graph = None
+    # 首先获取共享的 Neo4j 图数据库连接（不可用时为 None）
+    neo4j_graph = get_workflow_factory().dependencies.neo4j_graph()
 
     # 定义菜谱助手服务范围（用户友好的业务描述）
     scope_description = """
@@ -375,16 +364,19 @@ async def get_additional_info(
             logic=router.logic
         )
         messages = [{"role": "system", "content": system_prompt}] + state.messages
-        response = await model.ainvoke(messages)
+        response = await model.ainvoke(messages, config=config)
         return {"messages": [response]}
 
 
-async def _generate_image(user_query: str, state: AgentState) -> Dict[str, List[BaseMessage]]:
+async def _generate_image(
+        user_query: str, state: AgentState, config: RunnableConfig
+) -> Dict[str, List[BaseMessage]]:
     """使用CogView-4 API生成图片
 
     Args:
         user_query: 用户的图片生成请求
         state: 当前代理状态
+        config: 调用方的 RunnableConfig，透传给提示词增强的 LLM 调用以传播流式回调
 
     Returns:
         包含生成图片信息的消息字典
@@ -402,7 +394,7 @@ async def _generate_image(user_query: str, state: AgentState) -> Dict[str, List[
         enhance_messages = [{"role": "user", "content": enhance_prompt}]
 
         logger.info(f"Enhancing user prompt: {user_query}")
-        enhanced_response = await model.ainvoke(enhance_messages)
+        enhanced_response = await model.ainvoke(enhance_messages, config=config)
         enhanced_prompt = enhanced_response.content.strip()
         logger.info(f"Enhanced prompt: {enhanced_prompt}")
 
@@ -498,7 +490,7 @@ async def create_image_query(
     # 情况1: 用户要求生成图片（没有上传图片，或明确要求生成）
     if is_generation and not image_path:
         logger.info(f"Image Generation Request: {user_query}")
-        return await _generate_image(user_query, state)
+        return await _generate_image(user_query, state, config)
 
     # 情况2: 用户上传了图片，进行识别
     if not image_path:
@@ -629,7 +621,7 @@ async def create_file_query(
     file_path = config_opts.get("file_path")
     ingest_service_url = settings.INGEST_SERVICE_URL
 
-    service = KnowledgeService()
+    service = get_knowledge_service()
 
     if not file_path:
         logger.warning("User Upload File Path is None")
@@ -732,23 +724,13 @@ async def create_kb_query(
         if not settings.OPENAI_API_KEY:
             raise RuntimeError("OPENAI_API_KEY is not configured for KB multi-tool workflow.")
 
-        llm = ChatOpenAI(
-            openai_api_key=settings.OPENAI_API_KEY,
-            model_name=settings.OPENAI_MODEL,
-            openai_api_base=settings.OPENAI_API_BASE,
-            temperature=0.3,
-            tags=["kb_multi_tool"],
-        )
-
-        knowledge_service = KnowledgeService()
+        knowledge_service = get_knowledge_service()
 
         external_url = settings.KB_EXTERNAL_SEARCH_URL
         if not external_url and settings.INGEST_SERVICE_URL:
             external_url = f"{settings.INGEST_SERVICE_URL.rstrip('/')}/api/search"
 
-        workflow = create_kb_multi_tool_workflow(
-            llm=llm,
-            knowledge_service=knowledge_service,
+        workflow = get_workflow_factory().kb_workflow(
             top_k=kb_top_k,
             similarity_threshold=kb_similarity_threshold,
             filter_expr=kb_filter_expr,
@@ -769,7 +751,8 @@ async def create_kb_query(
             {
                 "question": last_message,
                 "history": history_payload,
-            }
+            },
+            config=config,
         )
         answer_text = response.get("answer") or "检索完成，但暂时没有可以分享的结果。"
         sources = response.get("sources", [])
@@ -785,7 +768,7 @@ async def create_kb_query(
 
     # Fallback: direct KB query
     if knowledge_service is None:
-        knowledge_service = KnowledgeService()
+        knowledge_service = get_knowledge_service()
     knowledge_node = create_knowledge_query_node(knowledge_service=knowledge_service)
     input_state: KnowledgeQueryInputState = {
         "task": last_message,
@@ -819,81 +802,8 @@ async def create_research_plan(
     if not settings.OPENAI_API_KEY:
         raise RuntimeError("OPENAI_API_KEY is not configured for research plan generation.")
 
-    model = ChatOpenAI(
-        openai_api_key=settings.OPENAI_API_KEY,
-        openai_api_base=settings.OPENAI_API_BASE,
-        model_name=settings.OPENAI_MODEL,
-        temperature=0.7,
-        tags=["research_plan"],
-    )
-
-    # 初始化必要参数
-    #  Neo4j图数据库连接 - 使用配置中的连接信息
-    neo4j_graph=None
-    try:
-        neo4j_graph = get_neo4j_graph()
-        logger.info("success to get Neo4j graph database connection")
-    except Exception as e:
-        logger.error(f"failed to get Neo4j graph database connection: {e}")
-
-    #  创建菜谱场景的检索器实例，根据 Graph Schema创建 Cypher ， 优先生成对应问题的cypher模版 用来引导大模型生成正确的Cypher查询语句
-    cypher_retriever = RecipeCypherRetriever()
-
-    #  定义工具模式列表
-    from gustobot.application.agents.kg_sub_graph.kg_tools_list import (
-        cypher_query,
-        predefined_cypher,
-        microsoft_graphrag_query,
-        text2sql_query,
-    )
-    tool_schemas: List[type[BaseModel]] = [
-        cypher_query,
-        predefined_cypher,
-        microsoft_graphrag_query,
-        text2sql_query,
-    ]
-
-    #  预定义的Cypher查询 为菜谱场景定义有用的查询
-    from gustobot.application.agents.kg_sub_graph.agentic_rag_agents.components.predefined_cypher.cypher_dict import \
-        predefined_cypher_dict
-
-    # 定义菜谱助手服务范围
-    scope_description = """
-    菜谱智能助手服务范围：为您提供全方位的烹饪指导和美食知识，包括但不限于：
-
-    🍳 菜谱查询与制作指导
-    - 各类中华料理的详细做法和烹饪技巧
-    - 食材用量、烹饪时长、火候掌握
-    - 分步骤的烹饪指导和小贴士
-
-    🥬 食材知识与营养价值
-    - 食材的营养成分和健康功效
-    - 食材的选购、储存和处理方法
-    - 食材之间的搭配和替代建议
-
-    🌶️ 口味与烹饪技法
-    - 各种口味特点（麻辣、酱香、清淡等）
-    - 不同烹饪方法（炒、蒸、煮、炖、烤等）
-    - 菜品分类（热菜、凉菜、汤品、主食等）
-
-    💊 食疗养生建议
-    - 食材的中医食疗功效
-    - 季节性饮食调理建议
-    - 特定人群的饮食注意事项
-
-    暂不支持：政治、娱乐八卦、新闻时事、天气预报、网购推荐、医疗诊断等非烹饪美食相关内容。
-    """
-
-    # 创建多工具工作流
-    multi_tool_workflow = create_multi_tool_workflow(
-        llm=model,
-        graph=neo4j_graph,
-        tool_schemas=tool_schemas,
-        predefined_cypher_dict=predefined_cypher_dict,
-        cypher_example_retriever=cypher_retriever,
-        scope_description=scope_description,
-        llm_cypher_validation=True,
-    )
+    # 多工具工作流（ChatOpenAI、Neo4j 连接、Cypher 示例检索器）按配置只编译一次，跨请求复用
+    multi_tool_workflow = get_workflow_factory().research_workflow()
 
     # return multi_tool_workflow
     # 准备输入状态
@@ -906,7 +816,7 @@ async def create_research_plan(
     }
 
     # 执行工作流
-    response = await multi_tool_workflow.ainvoke(input_state)
+    response = await multi_tool_workflow.ainvoke(input_state, config=config)
     return {"messages": [AIMessage(content=response["answer"])]}
 
 
@@ -0,0 +1,390 @@
+"""
+Compiled sub-workflow factory for the main agent graph.
+
+`create_research_plan` and `create_kb_query` used to rebuild their LangGraph
+sub-workflows on every request: a new `ChatOpenAI` client, a new Neo4j
+connection (which introspects the schema), a new `RecipeCypherRetriever`
+(which loads the recipe_kg dictionaries) and a fresh `StateGraph.compile()`.
+
+`AgentDependencies` now owns those long-lived objects and `WorkflowFactory`
+compiles each sub-workflow once per configuration. Compiled graphs are
+stateless between invocations, so one instance can serve concurrent requests.
+The Neo4j workflows are keyed by the shared graph's schema version, so a TTL
+or import-triggered schema refresh recompiles them; `invalidate_neo4j_schema()`
+forces a refresh.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from langchain_openai import ChatOpenAI
+from loguru import logger
+
+from gustobot.config import settings
+
+RECIPE_SCOPE_DESCRIPTION = """
+    菜谱智能助手服务范围：为您提供全方位的烹饪指导和美食知识，包括但不限于：
+
+    🍳 菜谱查询与制作指导
+    - 各类中华料理的详细做法和烹饪技巧
+    - 食材用量、烹饪时长、火候掌握
+    - 分步骤的烹饪指导和小贴士
+
+    🥬 食材知识与营养价值
+    - 食材的营养成分和健康功效
+    - 食材的选购、储存和处理方法
+    - 食材之间的搭配和替代建议
+
+    🌶️ 口味与烹饪技法
+    - 各种口味特点（麻辣、酱香、清淡等）
+    - 不同烹饪方法（炒、蒸、煮、炖、烤等）
+    - 菜品分类（热菜、凉菜、汤品、主食等）
+
+    💊 食疗养生建议
+    - 食材的中医食疗功效
+    - 季节性饮食调理建议
+    - 特定人群的饮食注意事项
+
+    暂不支持：政治、娱乐八卦、新闻时事、天气预报、网购推荐、医疗诊断等非烹饪美食相关内容。
+    """
+
+
+def _default_llm_factory(temperature: float, tag: str) -> ChatOpenAI:
+    if not settings.OPENAI_API_KEY:
+        raise RuntimeError("OPENAI_API_KEY is not configured for agent workflows.")
+    return ChatOpenAI(
+        openai_api_key=settings.OPENAI_API_KEY,
+        openai_api_base=settings.OPENAI_API_BASE,
+        model_name=settings.OPENAI_MODEL,
+        temperature=temperature,
+        tags=[tag],
+    )
+
+
+def _default_graph_factory() -> Any:
+    from gustobot.application.agents.kg_sub_graph.kg_neo4j_conn import get_neo4j_graph
+
+    return get_neo4j_graph()
+
+
+def _default_schema_version() -> int:
+    from gustobot.application.agents.kg_sub_graph.kg_neo4j_conn import get_neo4j_schema_version
+
+    return get_neo4j_schema_version()
+
+
+def _default_schema_refresher() -> Any:
+    from gustobot.application.agents.kg_sub_graph.kg_neo4j_conn import refresh_neo4j_schema
+
+    return refresh_neo4j_schema()
+
+
+def _default_retriever_factory() -> Any:
+    from gustobot.application.agents.kg_sub_graph.agentic_rag_agents.retrievers.cypher_examples.recipe_retriever import (
+        RecipeCypherRetriever,
+    )
+
+    return RecipeCypherRetriever()
+
+
+def _default_knowledge_service_factory() -> Any:
+    from gustobot.infrastructure.knowledge import get_knowledge_service
+
+    return get_knowledge_service()
+
+
+class AgentDependencies:
+    """Container for the long-lived clients the agent sub-workflows depend on."""
+
+    def __init__(
+        self,
+        *,
+        llm_factory: Callable[[float, str], Any] = _default_llm_factory,
+        graph_factory: Callable[[], Any] = _default_graph_factory,
+        schema_version: Callable[[], int] = _default_schema_version,
+        schema_refresher: Callable[[], Any] = _default_schema_refresher,
+        retriever_factory: Callable[[], Any] = _default_retriever_factory,
+        knowledge_service_factory: Callable[[], Any] = _default_knowledge_service_factory,
+        graph_retry_backoff: Optional[float] = None,
+    ) -> None:
+        self._llm_factory = llm_factory
+        self._graph_factory = graph_factory
+        self._schema_version = schema_version
+        self._schema_refresher = schema_refresher
+        self._retriever_factory = retriever_factory
+        self._knowledge_service_factory = knowledge_service_factory
+        self.graph_retry_backoff = (
+            graph_retry_backoff if graph_retry_backoff is not None else settings.KB_RECONNECT_BACKOFF
+        )
+        self._llms: Dict[Tuple[float, str], Any] = {}
+        self._graph_failed_at: float = 0.0
+        self._retriever: Any = None
+        self._lock = threading.RLock()
+
+    def llm(self, temperature: float, tag: str) -> Any:
+        """Shared chat model for a (temperature, tag) pair."""
+        key = (temperature, tag)
+        with self._lock:
+            model = self._llms.get(key)
+            if model is None:
+                model = self._llm_factory(temperature, tag)
+                self._llms[key] = model
+            return model
+
+    def neo4j_graph(self) -> Any:
+        """Shared Neo4j graph, or None while Neo4j is unreachable (retried after a backoff)."""
+        if self._graph_failed_at and time.monotonic() - self._graph_failed_at < self.graph_retry_backoff:
+            return None
+        try:
+            # The shared graph keeps its own TTL'd schema cache (see kg_neo4j_conn).
+            graph = self._graph_factory()
+        except Exception as exc:
+            self._graph_failed_at = time.monotonic()
+            logger.error("failed to get Neo4j graph database connection: {}", exc)
+            return None
+        self._graph_failed_at = 0.0
+        return graph
+
+    def neo4j_schema_version(self) -> int:
+        return self._schema_version()
+
+    def cypher_retriever(self) -> Any:
+        """Shared recipe Cypher example retriever."""
+        with self._lock:
+            if self._retriever is None:
+                self._retriever = self._retriever_factory()
+            return self._retriever
+
+    def knowledge_service(self) -> Any:
+        return self._knowledge_service_factory()
+
+    def refresh_neo4j_schema(self) -> None:
+        """Re-read the schema of the shared Neo4j graph and retry a failed connection right away."""
+        self._graph_failed_at = 0.0
+        self._schema_refresher()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._llms.clear()
+            self._graph_failed_at = 0.0
+            self._retriever = None
+
+
+class WorkflowFactory:
+    """Compile each agent sub-workflow once per configuration and reuse it."""
+
+    def __init__(
+        self,
+        dependencies: Optional[AgentDependencies] = None,
+        *,
+        research_builder: Optional[Callable[..., Any]] = None,
+        kb_builder: Optional[Callable[..., Any]] = None,
+    ) -> None:
+        self.dependencies = dependencies or AgentDependencies()
+        self._research_builder = research_builder
+        self._kb_builder = kb_builder
+        self._workflows: Dict[Tuple[str, Hashable], Any] = {}
+        self._lock = threading.RLock()
+        self.stats: Dict[str, float] = {"hits": 0, "builds": 0, "build_ms": 0.0}
+
+    # ------------------------------------------------------------------ public
+    def research_workflow(self) -> Any:
+        """Neo4j multi-tool workflow used by `create_research_plan`."""
+        graph = self.dependencies.neo4j_graph()
+        # Prompts embed the graph schema, so each schema version gets its own compile.
+        version = self.dependencies.neo4j_schema_version() if graph is not None else None
+        key = ("research", version)
+        if key not in self._workflows:
+            self.invalidate("research")
+        return self._get(key, lambda: self._build_research(graph))
+
+    def kb_workflow(
+        self,
+        *,
+        top_k: int,
+        similarity_threshold: float,
+        filter_expr: Optional[str] = None,
+        allow_external: Optional[bool] = None,
+        external_search_url: Optional[str] = None,
+    ) -> Any:
+        """Milvus/Postgres multi-tool workflow used by `create_kb_query`."""
+        knowledge_service = self.dependencies.knowledge_service()
+        # The service identity is part of the key so a Milvus reconnect recompiles.
+        key = (
+            "kb",
+            (
+                id(knowledge_service),
+                top_k,
+                similarity_threshold,
+                filter_expr,
+                allow_external,
+                external_search_url,
+            ),
+        )
+        return self._get(
+            key,
+            lambda: (
+                self._kb_builder_fn()(
+                    llm=self.dependencies.llm(0.3, "kb_multi_tool"),
+                    knowledge_service=knowledge_service,
+                    top_k=top_k,
+                    similarity_threshold=similarity_threshold,
+                    filter_expr=filter_expr,
+                    allow_external=allow_external,
+                    external_search_url=external_search_url,
+                ),
+                True,
+            ),
+        )
+
+    def invalidate(self, kind: Optional[str] = None) -> int:
+        """Drop compiled workflows (all, or only "research"/"kb"); returns how many were dropped."""
+        with self._lock:
+            keys = [key for key in self._workflows if kind is None or key[0] == kind]
+            for key in keys:
+                del self._workflows[key]
+        return len(keys)
+
+    def invalidate_neo4j_schema(self) -> int:
+        """Hook for Neo4j schema changes: refresh the schema and recompile the graph workflows."""
+        self.dependencies.refresh_neo4j_schema()
+        dropped = self.invalidate("research")
+        logger.info("Neo4j schema invalidated; dropped {} compiled workflow(s)", dropped)
+        return dropped
+
+    def warm_up(self) -> Dict[str, float]:
+        """Build the research workflow ahead of the first request and report the cost."""
+        started = time.perf_counter()
+        self.research_workflow()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        logger.info("Research workflow compiled in {:.0f} ms", elapsed_ms)
+        return {"research_build_ms": elapsed_ms}
+
+    def benchmark(
+        self,
+        iterations: int = 5,
+        *,
+        cold_graph_factory: Optional[Callable[[], Any]] = None,
+    ) -> Dict[str, float]:
+        """Compare per-request construction cost: cold (old behaviour) vs cached factory."""
+        if cold_graph_factory is None:
+            from gustobot.application.agents.kg_sub_graph.kg_neo4j_conn import create_neo4j_graph
+
+            # The old path opened a new connection (and introspected the schema) per request.
+            cold_graph_factory = create_neo4j_graph
+
+        cold: List[float] = []
+        for _ in range(iterations):
+            dependencies = AgentDependencies(
+                llm_factory=self.dependencies._llm_factory,
+                graph_factory=cold_graph_factory,
+                schema_version=self.dependencies._schema_version,
+                schema_refresher=self.dependencies._schema_refresher,
+                retriever_factory=self.dependencies._retriever_factory,
+                knowledge_service_factory=self.dependencies._knowledge_service_factory,
+            )
+            factory = WorkflowFactory(
+                dependencies,
+                research_builder=self._research_builder,
+                kb_builder=self._kb_builder,
+            )
+            started = time.perf_counter()
+            factory.research_workflow()
+            cold.append((time.perf_counter() - started) * 1000)
+
+        self.research_workflow()
+        warm: List[float] = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            self.research_workflow()
+            warm.append((time.perf_counter() - started) * 1000)
+
+        result = {
+            "iterations": iterations,
+            "per_request_build_ms": sum(cold) / len(cold),
+            "cached_lookup_ms": sum(warm) / len(warm),
+        }
+        logger.info(
+            "Workflow construction per request: {:.1f} ms rebuilt vs {:.3f} ms cached",
+            result["per_request_build_ms"],
+            result["cached_lookup_ms"],
+        )
+        return result
+
+    # ---------------------------------------------------------------- internals
+    def _get(self, key: Tuple[str, Hashable], build: Callable[[], Tuple[Any, bool]]) -> Any:
+        workflow = self._workflows.get(key)
+        if workflow is not None:
+            self.stats["hits"] += 1
+            return workflow
+        with self._lock:
+            workflow = self._workflows.get(key)
+            if workflow is not None:
+                self.stats["hits"] += 1
+                return workflow
+            started = time.perf_counter()
+            workflow, cacheable = build()
+            self.stats["builds"] += 1
+            self.stats["build_ms"] += (time.perf_counter() - started) * 1000
+            if cacheable:
+                self._workflows[key] = workflow
+            return workflow
+
+    def _build_research(self, graph: Any) -> Tuple[Any, bool]:
+        from gustobot.application.agents.kg_sub_graph.kg_tools_list import (
+            cypher_query,
+            predefined_cypher,
+            microsoft_graphrag_query,
+            text2sql_query,
+        )
+        from gustobot.application.agents.kg_sub_graph.agentic_rag_agents.components.predefined_cypher.cypher_dict import (
+            predefined_cypher_dict,
+        )
+
+        workflow = self._research_builder_fn()(
+            llm=self.dependencies.llm(0.7, "research_plan"),
+            graph=graph,
+            tool_schemas=[cypher_query, predefined_cypher, microsoft_graphrag_query, text2sql_query],
+            predefined_cypher_dict=predefined_cypher_dict,
+            cypher_example_retriever=self.dependencies.cypher_retriever(),
+            scope_description=RECIPE_SCOPE_DESCRIPTION,
+            llm_cypher_validation=True,
+        )
+        # Without Neo4j the workflow still answers (degraded); rebuild once it is back.
+        return workflow, graph is not None
+
+    def _research_builder_fn(self) -> Callable[..., Any]:
+        if self._research_builder is None:
+            from gustobot.application.agents.kg_sub_graph.agentic_rag_agents.workflows.multi_agent.multi_tool import (
+                create_multi_tool_workflow,
+            )
+
+            self._research_builder = create_multi_tool_workflow
+        return self._research_builder
+
+    def _kb_builder_fn(self) -> Callable[..., Any]:
+        if self._kb_builder is None:
+            from gustobot.application.agents.kg_sub_graph.agentic_rag_agents.workflows.multi_agent.multi_tool import (
+                create_kb_multi_tool_workflow,
+            )
+
+            self._kb_builder = create_kb_multi_tool_workflow
+        return self._kb_builder
+
+
+_workflow_factory: Optional[WorkflowFactory] = None
+
+
+def get_workflow_factory() -> WorkflowFactory:
+    """Return the process-wide workflow factory."""
+    global _workflow_factory
+    if _workflow_factory is None:
+        _workflow_factory = WorkflowFactory()
+    return _workflow_factory
+
+
+def invalidate_neo4j_schema() -> int:
+    """Refresh the shared Neo4j schema and recompile dependent workflows."""
+    return get_workflow_factory().invalidate_neo4j_schema()
@@ -6,6 +6,8 @@ __all__ = [
     "lightrag_service",
     "llm_client",
     "redis_cache",
+    "response_cache",
+    "semantic_cache",
     "search_service",
 ]
 
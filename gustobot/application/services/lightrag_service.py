@@ -16,13 +16,14 @@ from pathlib import Path
 
 from pydantic import BaseModel, Field
 from lightrag import LightRAG, QueryParam
-from lightrag.llm.openai import openai_complete_if_cache, openai_embed
+from lightrag.llm.openai import openai_complete_if_cache
 from lightrag.utils import EmbeddingFunc
 from lightrag.kg.shared_storage import initialize_pipeline_status
 import numpy as np
 
 from gustobot.config import settings
 from gustobot.infrastructure.core.logger import get_logger
+from gustobot.infrastructure.knowledge.embedding_service import get_embedding_service
 
 logger = get_logger(service="lightrag-service")
 
@@ -147,12 +148,8 @@ class LightRAGService:
         np.ndarray
             嵌入向量数组
         """
-        return await openai_embed(
-            texts=texts,
-            model=settings.EMBEDDING_MODEL,
-            api_key=settings.OPENAI_API_KEY,
-            base_url=settings.OPENAI_API_BASE,
-        )
+        vectors = await get_embedding_service().embed(texts)
+        return np.asarray(vectors, dtype=np.float32)
 
     async def initialize(self) -> None:
         """
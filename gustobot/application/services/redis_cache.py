@@ -1,12 +1,13 @@
 import hashlib
 import json
 import math
+from array import array
 from datetime import datetime
-from typing import Any, Dict, List, Optional, Sequence
-import httpx
+from typing import Any, Dict, List, Optional, Sequence, Set
 from loguru import logger
 from redis.asyncio import Redis
 from gustobot.config import settings
+from gustobot.infrastructure.knowledge.embedding_service import get_embedding_service
 
 
 def _now_timestamp() -> float:
@@ -43,8 +44,73 @@ def _cosine_similarity(a: Sequence[float], b: Sequence[float]) -> float:
     return numerator / denom
 
 
+async def fetch_embedding(text: str, *, model_name: Optional[str] = None) -> List[float]:
+    """Embed a single text through the shared, cached embedding service."""
+    return await get_embedding_service(model_name).embed_query(text)
+
+
+# Writes one entry, scores it and trims the namespace atomically.
+# KEYS: entry hash, access zset. ARGV: vec, resp, now, entry ttl, zset ttl,
+# policy, member, max size, entry key prefix. Returns the number of hashes evicted.
+# Re-stores keep created_at/access_count and (under LFU) the access score; the
+# member just written is never a victim, and victims whose hash already expired
+# only drop their stale score.
+_STORE_SCRIPT = """
+local entry, access = KEYS[1], KEYS[2]
+local now, member = ARGV[3], ARGV[7]
+redis.call('HSET', entry, 'vec', ARGV[1], 'resp', ARGV[2], 'last_access', now)
+redis.call('HSETNX', entry, 'created_at', now)
+redis.call('HSETNX', entry, 'access_count', 1)
+redis.call('EXPIRE', entry, ARGV[4])
+if ARGV[6] == 'lru' then
+    redis.call('ZADD', access, now, member)
+else
+    redis.call('ZADD', access, 'NX', 1, member)
+end
+redis.call('EXPIRE', access, ARGV[5])
+
+local overflow = redis.call('ZCARD', access) - tonumber(ARGV[8])
+local evicted = 0
+if overflow > 0 then
+    for _, victim in ipairs(redis.call('ZRANGE', access, 0, overflow)) do
+        if overflow == 0 then
+            break
+        end
+        if victim ~= member then
+            redis.call('ZREM', access, victim)
+            evicted = evicted + redis.call('DEL', ARGV[9] .. victim)
+            overflow = overflow - 1
+        end
+    end
+end
+return evicted
+"""
+
+
+def _pack_vector(vector: Sequence[float]) -> bytes:
+    """Serialise an embedding as packed float32 bytes."""
+    return array("f", vector).tobytes()
+
+
+def _unpack_vector(payload: bytes) -> List[float]:
+    """Inverse of `_pack_vector`."""
+    values = array("f")
+    values.frombytes(payload)
+    return values.tolist()
+
+
 class RedisSemanticCache:
-    """Semantic cache backed by Redis storing embeddings alongside responses."""
+    """
+    Semantic cache backed by Redis storing embeddings alongside responses.
+
+    Each entry is a single hash ``{ns}:entry:{hash}`` (vector, response and
+    access metadata). A per-namespace sorted set ``{ns}:access`` scores every
+    entry by last access time (LRU) or access count (LFU), so trimming the cache
+    removes the lowest scores instead of scanning all metadata. Writes run as one
+    Lua script; scores left behind by expired hashes are dropped on lookup misses.
+    """
+
+    EVICTION_POLICIES = ("lru", "lfu")
 
     def __init__(
         self,
@@ -56,6 +122,7 @@ class RedisSemanticCache:
         prefix: str = "semantic",
         max_cache_size: Optional[int] = None,
         ttl: Optional[int] = None,
+        eviction_policy: Optional[str] = None,
     ) -> None:
         self._redis = redis_client or Redis.from_url(
             redis_url or settings.REDIS_URL,
@@ -66,6 +133,10 @@ class RedisSemanticCache:
         self.prefix = prefix
         self.max_cache_size = max_cache_size or settings.REDIS_CACHE_MAX_SIZE
         self.ttl = ttl or settings.REDIS_CACHE_EXPIRE
+        self.eviction_policy = (eviction_policy or settings.SEMANTIC_CACHE_EVICTION).lower()
+        if self.eviction_policy not in self.EVICTION_POLICIES:
+            raise ValueError(f"Unknown semantic cache eviction policy: {self.eviction_policy}")
+        self._store_script = self._redis.register_script(_STORE_SCRIPT)
 
     async def lookup(
         self,
@@ -91,18 +162,20 @@ class RedisSemanticCache:
             return None
 
         namespace = self._namespace(scope)
-        pattern = f"{namespace}:vec:*"
+        pattern = self._entry_key(namespace, "*")
         best_similarity = 0.0
         best_hash: Optional[str] = None
+        live: Set[str] = set()
 
-        async for raw_key in self._redis.scan_iter(pattern):
-            cached_vector_raw = await self._redis.get(raw_key)
+        async for raw_key in self._redis.scan_iter(match=pattern):
+            live.add(_decode(raw_key).split(":")[-1])
+            cached_vector_raw = await self._redis.hget(raw_key, "vec")
             if not cached_vector_raw:
                 continue
 
             try:
-                cached_vector = json.loads(_decode(cached_vector_raw))
-            except json.JSONDecodeError:
+                cached_vector = _unpack_vector(cached_vector_raw)
+            except ValueError:
                 logger.warning("Failed to decode cached vector for key {}", _decode(raw_key))
                 continue
 
@@ -112,14 +185,14 @@ class RedisSemanticCache:
                 best_hash = _decode(raw_key).split(":")[-1]
 
         if best_similarity < self.score_threshold or not best_hash:
+            await self._prune_stale_scores(namespace, live)
             return None
 
-        response_key = f"{namespace}:resp:{best_hash}"
-        cached_response = await self._redis.get(response_key)
+        cached_response = await self._update_metadata(namespace, best_hash)
         if not cached_response:
+            await self._remove_entry(namespace, best_hash)
             return None
 
-        await self._update_metadata(namespace, best_hash)
         logger.info(
             "Semantic cache hit | namespace={} similarity={:.4f}",
             namespace,
@@ -138,6 +211,10 @@ class RedisSemanticCache:
         """
         Store a conversation turn inside the semantic cache.
 
+        The entry hash, its access score and the trim down to `max_cache_size`
+        run in one Lua script (`_STORE_SCRIPT`), so a write is a single atomic
+        round trip costing O(log N) rather than a scan, and it never evicts itself.
+
         Args:
             messages: Conversation context ending with the triggering user message.
             response: Assistant response to cache.
@@ -155,133 +232,110 @@ class RedisSemanticCache:
 
         namespace = self._namespace(scope)
         message_hash = self._message_hash(user_message)
-        vector_key = f"{namespace}:vec:{message_hash}"
-        response_key = f"{namespace}:resp:{message_hash}"
-        metadata_key = f"{namespace}:meta:{message_hash}"
+        entry_key = self._entry_key(namespace, message_hash)
+        access_key = self._access_key(namespace)
         ttl = expire or self.ttl
-
-        await self._redis.set(vector_key, json.dumps(vector), ex=ttl)
-        await self._redis.set(response_key, response, ex=ttl)
-        metadata = {
-            "created_at": _now_timestamp(),
-            "last_access": _now_timestamp(),
-            "access_count": 1,
-        }
-        await self._redis.set(metadata_key, json.dumps(metadata), ex=ttl)
-        await self._ensure_capacity(namespace)
+        now = _now_timestamp()
+
+        evicted = await self._store_script(
+            keys=[entry_key, access_key],
+            args=[
+                _pack_vector(vector),
+                response,
+                now,
+                ttl,
+                max(ttl, self.ttl),
+                self.eviction_policy,
+                message_hash,
+                self.max_cache_size,
+                self._entry_key(namespace, ""),
+            ],
+        )
 
         logger.debug(
-            "Semantic cache updated | namespace={} hash={}",
+            "Semantic cache updated | namespace={} hash={} evicted={}",
             namespace,
             message_hash,
+            evicted,
         )
 
     async def clear_namespace(self, scope: Optional[str] = None) -> None:
         """Remove every cached entry for a namespace."""
         namespace = self._namespace(scope)
-        pattern = f"{namespace}:*"
         keys: List[bytes] = []
-        async for raw_key in self._redis.scan_iter(pattern):
+        async for raw_key in self._redis.scan_iter(match=self._entry_key(namespace, "*")):
             keys.append(raw_key)
 
+        await self._redis.delete(self._access_key(namespace), *keys)
         if keys:
-            await self._redis.delete(*keys)
             logger.info(
                 "Cleared semantic cache namespace | namespace={} count={}",
                 namespace,
                 len(keys),
             )
 
-    async def _ensure_capacity(self, namespace: str) -> None:
-        """Trim cache when exceeding the configured capacity."""
-        pattern = f"{namespace}:meta:*"
-        metadata_entries: List[Dict[str, Any]] = []
-
-        async for raw_key in self._redis.scan_iter(pattern):
-            payload = await self._redis.get(raw_key)
-            if not payload:
-                continue
-            try:
-                data = json.loads(_decode(payload))
-                metadata_entries.append(
-                    {
-                        "key": _decode(raw_key),
-                        "last_access": data.get("last_access", 0),
-                    }
-                )
-            except json.JSONDecodeError:
-                logger.warning("Failed to decode metadata for key {}", _decode(raw_key))
-
-        if len(metadata_entries) <= self.max_cache_size:
-            return
+    async def _prune_stale_scores(self, namespace: str, live: Set[str]) -> int:
+        """
+        Drop access scores whose entry hash has expired.
 
-        metadata_entries.sort(key=lambda item: item["last_access"])
-        remove_count = len(metadata_entries) - self.max_cache_size
-        for entry in metadata_entries[:remove_count]:
-            hash_id = entry["key"].split(":")[-1]
-            await self._remove_entry(namespace, hash_id)
+        Expired hashes leave their members behind in the access set, inflating
+        its size (early evictions) and, under LFU, pinning high counts forever.
+        `live` holds the hashes seen by the lookup scan; the rest are checked
+        with EXISTS before removal so entries written meanwhile are kept.
+        """
+        access_key = self._access_key(namespace)
+        members = [_decode(member) for member in await self._redis.zrange(access_key, 0, -1)]
+        candidates = [member for member in members if member not in live]
+        if not candidates:
+            return 0
+
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for member in candidates:
+                pipe.exists(self._entry_key(namespace, member))
+            alive = await pipe.execute()
+        stale = [member for member, exists in zip(candidates, alive) if not exists]
+        if stale:
+            await self._redis.zrem(access_key, *stale)
+        return len(stale)
 
     async def _remove_entry(self, namespace: str, hash_id: str) -> None:
-        """Delete vector/response/metadata triple."""
-        vector_key = f"{namespace}:vec:{hash_id}"
-        response_key = f"{namespace}:resp:{hash_id}"
-        metadata_key = f"{namespace}:meta:{hash_id}"
-        await self._redis.delete(
-            vector_key,
-            response_key,
-            metadata_key,
-        )
-
-    async def _update_metadata(self, namespace: str, hash_id: str) -> None:
-        """Update access metadata for a given entry."""
-        metadata_key = f"{namespace}:meta:{hash_id}"
-        raw = await self._redis.get(metadata_key)
-
-        metadata = {"access_count": 0}
-        if raw:
-            try:
-                metadata.update(json.loads(_decode(raw)))
-            except json.JSONDecodeError:
-                logger.warning("Failed to decode existing metadata; resetting counters.")
-
-        metadata["last_access"] = _now_timestamp()
-        metadata["access_count"] = metadata.get("access_count", 0) + 1
-        await self._redis.set(
-            metadata_key,
-            json.dumps(metadata),
-            ex=self.ttl,
-        )
+        """Delete an entry hash together with its access score."""
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.delete(self._entry_key(namespace, hash_id))
+            pipe.zrem(self._access_key(namespace), hash_id)
+            await pipe.execute()
+
+    async def _update_metadata(self, namespace: str, hash_id: str) -> Optional[bytes]:
+        """Record an access and return the cached response in one round trip."""
+        entry_key = self._entry_key(namespace, hash_id)
+        access_key = self._access_key(namespace)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.hget(entry_key, "resp")
+            pipe.hset(entry_key, "last_access", _now_timestamp())
+            pipe.hincrby(entry_key, "access_count", 1)
+            if self.eviction_policy == "lru":
+                pipe.zadd(access_key, {hash_id: _now_timestamp()})
+            else:
+                pipe.zincrby(access_key, 1, hash_id)
+            results = await pipe.execute()
+        return results[0]
 
     async def _get_embedding(self, text: str) -> List[float]:
         """Fetch embedding vector from an OpenAI-compatible endpoint."""
-        base_url = settings.OPENAI_API_BASE or "https://api.openai.com/v1"
-        url = f"{base_url.rstrip('/')}/embeddings"
-        payload = {"model": self.model_name, "input": text}
-        headers = {"Content-Type": "application/json"}
-
-        api_key = settings.OPENAI_API_KEY
-        if api_key:
-            headers["Authorization"] = f"Bearer {api_key}"
-
-        async with httpx.AsyncClient(timeout=30) as client:
-            response = await client.post(url, json=payload, headers=headers)
-            response.raise_for_status()
-            data = response.json()
-
-        items = data.get("data")
-        if not items:
-            raise ValueError("Embedding endpoint returned no data.")
-
-        first_item = items[0]
-        vector = first_item.get("embedding") if isinstance(first_item, dict) else first_item
-        if not isinstance(vector, list):
-            raise ValueError("Unexpected embedding payload format.")
-        return vector
+        return await fetch_embedding(text, model_name=self.model_name)
 
     def _namespace(self, scope: Optional[str]) -> str:
         """Create namespace prefix for a scope."""
         return f"{self.prefix}:{scope}" if scope else self.prefix
 
+    @staticmethod
+    def _entry_key(namespace: str, hash_id: str) -> str:
+        return f"{namespace}:entry:{hash_id}"
+
+    @staticmethod
+    def _access_key(namespace: str) -> str:
+        return f"{namespace}:access"
+
     @staticmethod
     def _message_hash(message: str) -> str:
         """Generate deterministic hash for message text."""
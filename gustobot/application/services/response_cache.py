@@ -0,0 +1,322 @@
+"""
+Two-tier response cache for the chat pipeline.
+
+`process_agent_query` consults this cache before running the LangGraph agent:
+
+1. an exact-match, in-process LRU keyed on the normalised question, the route
+   forced by attachments (image/file) and the cache scope;
+2. the semantic Redis cache (`get_semantic_cache`), shared across workers;
+3. on a miss the graph runs and its answer is written back to both tiers with
+   the TTL configured for the resolved route.
+
+Routes listed in ``CHAT_CACHE_SESSION_ROUTES`` and every request carrying an
+attachment are cached per session only and never reach the shared semantic
+tier. Routes whose TTL is 0 (e.g. ``file-query``, which ingests data) are never
+cached.
+
+A follow-up question ("那它要煮多久？") only makes sense together with the
+earlier turns of its conversation. Once a session has prior turns, lookups and
+writes are keyed on `history_digest` of those turns as well and skip the
+semantic tier, which only sees the last message.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from loguru import logger
+
+from gustobot.config import settings
+from .semantic_cache import SemanticCache, get_semantic_cache
+
+SEMANTIC_SCOPE = "chat"
+_CACHED_FIELDS = ("message", "route", "route_logic", "sources")
+_TRAILING_PUNCTUATION = "?？!！。.,，~～ "
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_question(text: str) -> str:
+    """Canonicalise a question for exact-match lookups (width, case, spacing, end punctuation)."""
+    normalized = unicodedata.normalize("NFKC", text or "").lower()
+    normalized = _WHITESPACE.sub(" ", normalized).strip()
+    return normalized.rstrip(_TRAILING_PUNCTUATION)
+
+
+def history_digest(messages: Optional[Sequence[Any]]) -> Optional[str]:
+    """Stable digest of a conversation's prior turns (None when there are none)."""
+    turns = []
+    for message in messages or ():
+        if isinstance(message, dict):
+            role = message.get("type") or message.get("role")
+            content = message.get("content")
+        else:
+            role = getattr(message, "type", None)
+            content = getattr(message, "content", None)
+        if not isinstance(content, str):
+            content = json.dumps(content, ensure_ascii=False, default=str)
+        turns.append([role, content])
+    if not turns:
+        return None
+    encoded = json.dumps(turns, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()[:32]
+
+
+@dataclass
+class CacheLookup:
+    """Outcome of a response cache lookup."""
+
+    status: str  # "hit" | "miss" | "bypass"
+    tier: Optional[str] = None  # "lru" | "semantic"
+    payload: Optional[Dict[str, Any]] = None
+    history_key: Optional[str] = None  # `history_digest` of the turns before this question
+
+    @property
+    def hit(self) -> bool:
+        return self.status == "hit" and self.payload is not None
+
+    def as_metadata(self) -> Dict[str, Any]:
+        return {"status": self.status, "tier": self.tier}
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        """HTTP headers describing the cache outcome."""
+        headers = {"X-Cache": self.status.upper()}
+        if self.tier:
+            headers["X-Cache-Tier"] = self.tier
+        if self.payload and self.payload.get("route"):
+            headers["X-Cache-Route"] = str(self.payload["route"])
+        return headers
+
+
+class TTLLRUCache:
+    """Bounded in-process LRU whose entries carry their own expiry."""
+
+    def __init__(self, max_size: int, *, clock: Callable[[], float] = time.monotonic) -> None:
+        self.max_size = max(1, max_size)
+        self._clock = clock
+        self._items: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, key: str) -> Optional[Any]:
+        item = self._items.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at <= self._clock():
+            del self._items[key]
+            return None
+        self._items.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        self._items[key] = (self._clock() + ttl, value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        self._items.clear()
+
+
+class ResponseCache:
+    """In-process LRU in front of the semantic Redis cache for chat answers."""
+
+    def __init__(
+        self,
+        *,
+        enabled: Optional[bool] = None,
+        lru_size: Optional[int] = None,
+        semantic_enabled: Optional[bool] = None,
+        semantic_cache: Optional[SemanticCache] = None,
+        route_ttls: Optional[Dict[str, int]] = None,
+        session_routes: Optional[Iterable[str]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.enabled = settings.CHAT_CACHE_ENABLED if enabled is None else enabled
+        self.semantic_enabled = (
+            settings.CHAT_CACHE_SEMANTIC_ENABLED if semantic_enabled is None else semantic_enabled
+        )
+        self.route_ttls = dict(route_ttls if route_ttls is not None else settings.chat_cache_route_ttls)
+        self.session_routes: Set[str] = set(
+            session_routes if session_routes is not None else settings.chat_cache_session_routes
+        )
+        self._lru = TTLLRUCache(lru_size or settings.CHAT_CACHE_LRU_SIZE, clock=clock)
+        self._semantic = semantic_cache
+        self._pending: Set[asyncio.Task] = set()
+
+    def route_ttl(self, route: Optional[str]) -> int:
+        """TTL in seconds for answers of `route` (0 means not cacheable)."""
+        return self.route_ttls.get(route or "", 0)
+
+    async def lookup(
+        self,
+        message: str,
+        *,
+        session_id: str,
+        image_path: Optional[str] = None,
+        file_path: Optional[str] = None,
+        history_key: Optional[str] = None,
+    ) -> CacheLookup:
+        """
+        Return the cached answer for `message`, trying the LRU and then the semantic tier.
+
+        `history_key` is the `history_digest` of the session's earlier turns; follow-ups
+        only match answers given after the same conversation.
+        """
+        normalized = normalize_question(message)
+        if not self.enabled or not normalized:
+            return CacheLookup(status="bypass", history_key=history_key)
+
+        hint = self._route_hint(image_path, file_path)
+        if hint != "auto" and self.route_ttl(hint) <= 0:
+            return CacheLookup(status="bypass", history_key=history_key)
+
+        attachment = image_path or file_path
+        for key in self._candidate_keys(normalized, hint, session_id, attachment, history_key):
+            payload = self._lru.get(key)
+            if payload is not None:
+                return CacheLookup(status="hit", tier="lru", payload=payload, history_key=history_key)
+
+        if hint == "auto" and history_key is None:
+            payload = await self._semantic_lookup(normalized)
+            if payload is not None:
+                ttl = self.route_ttl(payload.get("route"))
+                self._lru.set(self._key("global", hint, normalized), payload, ttl)
+                return CacheLookup(status="hit", tier="semantic", payload=payload)
+
+        return CacheLookup(status="miss", history_key=history_key)
+
+    async def store(
+        self,
+        message: str,
+        result: Dict[str, Any],
+        *,
+        session_id: str,
+        image_path: Optional[str] = None,
+        file_path: Optional[str] = None,
+        history_key: Optional[str] = None,
+    ) -> bool:
+        """Cache a graph answer under the TTL/scope rules of its resolved route (see `lookup`)."""
+        normalized = normalize_question(message)
+        route = result.get("route")
+        ttl = self.route_ttl(route)
+        if not self.enabled or not normalized or ttl <= 0 or not result.get("message"):
+            return False
+
+        hint = self._route_hint(image_path, file_path)
+        payload = {name: result.get(name) for name in _CACHED_FIELDS}
+        session_scoped = hint != "auto" or route in self.session_routes
+        scope = self._session_scope(session_id, image_path or file_path) if session_scoped else "global"
+        self._lru.set(self._key(scope, hint, normalized, history_key), payload, ttl)
+
+        if not session_scoped and history_key is None and self.semantic_enabled:
+            # Embedding + Redis write happen off the request path.
+            task = asyncio.create_task(self._semantic_store(normalized, payload, ttl))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "lru_size": len(self._lru),
+            "semantic_enabled": self.semantic_enabled,
+        }
+
+    def clear(self) -> None:
+        """Drop the in-process tier (the semantic tier expires on its own)."""
+        self._lru.clear()
+
+    async def _semantic_lookup(self, normalized: str) -> Optional[Dict[str, Any]]:
+        cache = self._semantic_cache()
+        if cache is None:
+            return None
+        try:
+            raw = await cache.lookup([{"role": "user", "content": normalized}], scope=SEMANTIC_SCOPE)
+        except Exception as exc:
+            logger.warning("Chat semantic cache lookup failed: {}", exc)
+            return None
+        if not raw:
+            return None
+        try:
+            payload = json.loads(raw)
+        except json.JSONDecodeError:
+            return None
+        route = payload.get("route")
+        if self.route_ttl(route) <= 0 or route in self.session_routes:
+            return None
+        return payload
+
+    async def _semantic_store(self, normalized: str, payload: Dict[str, Any], ttl: int) -> None:
+        cache = self._semantic_cache()
+        if cache is None:
+            return
+        try:
+            await cache.update(
+                [{"role": "user", "content": normalized}],
+                json.dumps(payload, ensure_ascii=False, default=str),
+                scope=SEMANTIC_SCOPE,
+                expire=ttl,
+            )
+        except Exception as exc:
+            logger.warning("Chat semantic cache update failed: {}", exc)
+
+    def _semantic_cache(self) -> Optional[SemanticCache]:
+        if not self.semantic_enabled:
+            return None
+        if self._semantic is None:
+            self._semantic = get_semantic_cache()
+        return self._semantic
+
+    def _candidate_keys(
+        self,
+        normalized: str,
+        hint: str,
+        session_id: str,
+        attachment: Optional[str],
+        history_key: Optional[str] = None,
+    ) -> List[str]:
+        keys = [self._key(self._session_scope(session_id, attachment), hint, normalized, history_key)]
+        if hint == "auto":
+            keys.append(self._key("global", hint, normalized, history_key))
+        return keys
+
+    @staticmethod
+    def _route_hint(image_path: Optional[str], file_path: Optional[str]) -> str:
+        """Route forced by attachments before the router runs (mirrors `route_query`)."""
+        if image_path:
+            return "image-query"
+        if file_path:
+            return "file-query"
+        return "auto"
+
+    @staticmethod
+    def _session_scope(session_id: str, attachment: Optional[str]) -> str:
+        scope = f"session:{session_id}"
+        return f"{scope}:{attachment}" if attachment else scope
+
+    @staticmethod
+    def _key(scope: str, hint: str, normalized: str, history_key: Optional[str] = None) -> str:
+        if history_key:
+            return f"{scope}|{hint}|{history_key}|{normalized}"
+        return f"{scope}|{hint}|{normalized}"
+
+
+_response_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> ResponseCache:
+    """Return the process-wide chat response cache."""
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = ResponseCache()
+    return _response_cache
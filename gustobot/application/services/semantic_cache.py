@@ -0,0 +1,675 @@
+"""
+Vector-indexed semantic cache.
+
+`RedisSemanticCache` finds neighbours by SCAN-ing every ``{ns}:entry:*`` hash and
+scoring it in Python, so a lookup costs one round trip per cached entry. The
+cache in this module keeps the vectors of each namespace in an in-process ANN
+index (HNSW via ``hnswlib`` when installed, otherwise an exact NumPy matrix)
+and mirrors every entry to Redis as a single hash so that other workers and
+restarts can rebuild the index. A lookup is an index probe plus one pipelined
+round trip that fetches the response and bumps its access metadata.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from loguru import logger
+from redis.asyncio import Redis
+
+from gustobot.config import settings
+from .redis_cache import RedisSemanticCache, _decode, _now_timestamp, fetch_embedding
+
+try:  # pragma: no cover - optional dependency
+    import hnswlib
+except ImportError:  # pragma: no cover - fall back to exact NumPy search
+    hnswlib = None
+
+EmbeddingFn = Callable[[str], Awaitable[List[float]]]
+
+# Read the response and record the access only if the entry still exists, so an
+# entry that expired between the index search and the fetch is never recreated.
+_FETCH_SCRIPT = """
+local resp = redis.call('HGET', KEYS[1], 'resp')
+if resp then
+    redis.call('HSET', KEYS[1], 'last_access', ARGV[1])
+    redis.call('HINCRBY', KEYS[1], 'access_count', 1)
+end
+return resp
+"""
+
+
+def _normalise(vector: Sequence[float]) -> np.ndarray:
+    """Return an L2-normalised float32 copy of `vector`."""
+    array = np.asarray(vector, dtype=np.float32).reshape(-1)
+    norm = float(np.linalg.norm(array))
+    if norm > 0:
+        array = array / norm
+    return array
+
+
+class NumpyVectorIndex:
+    """Exact cosine index stored as a contiguous float32 matrix."""
+
+    def __init__(self, dimension: int, *, initial_capacity: int = 1024) -> None:
+        self.dimension = dimension
+        self._matrix = np.zeros((max(initial_capacity, 1), dimension), dtype=np.float32)
+        self._keys: List[str] = []
+        self._rows: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._rows
+
+    def add(self, key: str, vector: Sequence[float]) -> None:
+        row = _normalise(vector)
+        existing = self._rows.get(key)
+        if existing is not None:
+            self._matrix[existing] = row
+            return
+
+        size = len(self._keys)
+        if size == self._matrix.shape[0]:
+            grown = np.zeros((size * 2, self.dimension), dtype=np.float32)
+            grown[:size] = self._matrix
+            self._matrix = grown
+
+        self._matrix[size] = row
+        self._rows[key] = size
+        self._keys.append(key)
+
+    def add_many(self, keys: Sequence[str], vectors: Sequence[Sequence[float]]) -> None:
+        for key, vector in zip(keys, vectors):
+            self.add(key, vector)
+
+    def remove(self, key: str) -> None:
+        row = self._rows.pop(key, None)
+        if row is None:
+            return
+        last = len(self._keys) - 1
+        if row != last:
+            moved = self._keys[last]
+            self._matrix[row] = self._matrix[last]
+            self._keys[row] = moved
+            self._rows[moved] = row
+        self._keys.pop()
+
+    def search(self, vector: Sequence[float], k: int = 1) -> List[Tuple[str, float]]:
+        size = len(self._keys)
+        if not size:
+            return []
+
+        scores = self._matrix[:size] @ _normalise(vector)
+        k = min(k, size)
+        if k == 1:
+            best = int(np.argmax(scores))
+            return [(self._keys[best], float(scores[best]))]
+
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self._keys[idx], float(scores[idx])) for idx in top]
+
+
+class HnswVectorIndex:
+    """Approximate cosine index backed by ``hnswlib``."""
+
+    def __init__(
+        self,
+        dimension: int,
+        *,
+        initial_capacity: int = 1024,
+        m: int = 16,
+        ef_construction: int = 200,
+        ef_search: int = 64,
+    ) -> None:
+        if hnswlib is None:
+            raise RuntimeError("hnswlib is not installed")
+
+        self.dimension = dimension
+        self._ef_search = ef_search
+        self._index = hnswlib.Index(space="ip", dim=dimension)
+        self._index.init_index(
+            max_elements=max(initial_capacity, 1),
+            M=m,
+            ef_construction=ef_construction,
+            allow_replace_deleted=True,
+        )
+        self._index.set_ef(ef_search)
+        self._labels: Dict[str, int] = {}
+        self._keys: Dict[int, str] = {}
+        self._next_label = 0
+
+    def __len__(self) -> int:
+        return len(self._labels)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._labels
+
+    def add(self, key: str, vector: Sequence[float]) -> None:
+        row = _normalise(vector)
+        label = self._labels.get(key)
+        if label is not None:
+            self._index.add_items(row, [label])
+            return
+
+        if len(self._labels) >= self._index.get_max_elements():
+            self._index.resize_index(self._index.get_max_elements() * 2)
+
+        label = self._next_label
+        self._next_label += 1
+        self._index.add_items(row, [label], replace_deleted=True)
+        self._labels[key] = label
+        self._keys[label] = key
+
+    def add_many(self, keys: Sequence[str], vectors: Sequence[Sequence[float]]) -> None:
+        """Insert new keys with one multi-threaded ``add_items`` call."""
+        pending: Dict[str, Sequence[float]] = {}
+        for key, vector in zip(keys, vectors):
+            if key in self._labels:
+                self.add(key, vector)
+            else:
+                pending[key] = vector
+        fresh = list(pending.items())
+        if not fresh:
+            return
+
+        required = len(self._labels) + len(fresh)
+        if required > self._index.get_max_elements():
+            self._index.resize_index(max(required, self._index.get_max_elements() * 2))
+
+        labels = list(range(self._next_label, self._next_label + len(fresh)))
+        self._next_label += len(fresh)
+        rows = np.stack([_normalise(vector) for _, vector in fresh])
+        self._index.add_items(rows, labels, replace_deleted=True)
+        for (key, _), label in zip(fresh, labels):
+            self._labels[key] = label
+            self._keys[label] = key
+
+    def remove(self, key: str) -> None:
+        label = self._labels.pop(key, None)
+        if label is None:
+            return
+        self._keys.pop(label, None)
+        self._index.mark_deleted(label)
+
+    def search(self, vector: Sequence[float], k: int = 1) -> List[Tuple[str, float]]:
+        if not self._labels:
+            return []
+
+        k = min(k, len(self._labels))
+        self._index.set_ef(max(self._ef_search, k))
+        labels, distances = self._index.knn_query(_normalise(vector), k=k)
+        matches: List[Tuple[str, float]] = []
+        for label, distance in zip(labels[0], distances[0]):
+            key = self._keys.get(int(label))
+            if key is not None:
+                # hnswlib reports inner-product distance as 1 - <a, b>.
+                matches.append((key, 1.0 - float(distance)))
+        return matches
+
+
+VectorIndex = Union[NumpyVectorIndex, HnswVectorIndex]
+
+
+def create_vector_index(dimension: int, backend: str = "auto") -> VectorIndex:
+    """
+    Build an empty vector index.
+
+    Args:
+        dimension: Embedding dimension.
+        backend: ``hnsw``, ``numpy`` or ``auto`` (HNSW when hnswlib is importable).
+    """
+    backend = (backend or "auto").lower()
+    if backend == "hnsw" or (backend == "auto" and hnswlib is not None):
+        return HnswVectorIndex(dimension)
+    if backend not in {"auto", "numpy"}:
+        raise ValueError(f"Unknown vector index backend: {backend}")
+    return NumpyVectorIndex(dimension)
+
+
+@dataclass
+class CacheMetrics:
+    """Hit/miss counters and a rolling lookup latency window."""
+
+    hits: int = 0
+    misses: int = 0
+    errors: int = 0
+    writes: int = 0
+    evictions: int = 0
+    latency_window: int = 2048
+    _latencies_ms: Deque[float] = field(default_factory=deque, repr=False)
+
+    def __post_init__(self) -> None:
+        self._latencies_ms = deque(maxlen=self.latency_window)
+
+    def record_lookup(self, *, hit: bool, latency_ms: float) -> None:
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        self._latencies_ms.append(latency_ms)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return a JSON-serialisable view of the counters."""
+        lookups = self.hits + self.misses
+        latencies = sorted(self._latencies_ms)
+
+        def _percentile(pct: float) -> float:
+            if not latencies:
+                return 0.0
+            return round(latencies[min(len(latencies) - 1, int(pct * len(latencies)))], 3)
+
+        return {
+            "lookups": lookups,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "errors": self.errors,
+            "writes": self.writes,
+            "evictions": self.evictions,
+            "latency_ms": {
+                "avg": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+                "p50": _percentile(0.50),
+                "p95": _percentile(0.95),
+                "p99": _percentile(0.99),
+                "max": round(latencies[-1], 3) if latencies else 0.0,
+            },
+        }
+
+
+class _NamespaceIndex:
+    """Vector index and LRU order for a single cache namespace."""
+
+    def __init__(self, backend: str) -> None:
+        self.backend = backend
+        self.index: Optional[VectorIndex] = None
+        self.recency: "OrderedDict[str, None]" = OrderedDict()
+        self.synced_at = 0.0
+        # Local writes made while a replacement index is loaded from Redis.
+        self.journal: Optional[List[Tuple[str, str, Optional[Sequence[float]]]]] = None
+
+    def __len__(self) -> int:
+        return len(self.recency)
+
+    def add(self, key: str, vector: Sequence[float]) -> None:
+        if self.journal is not None:
+            self.journal.append(("add", key, vector))
+        if self.index is None or self.index.dimension != len(vector):
+            if self.index is not None:
+                logger.warning(
+                    "Semantic cache embedding dimension changed ({} -> {}); resetting index",
+                    self.index.dimension,
+                    len(vector),
+                )
+                self.recency.clear()
+            self.index = create_vector_index(len(vector), self.backend)
+        self.index.add(key, vector)
+        self.touch(key)
+
+    def add_many(self, keys: Sequence[str], vectors: Sequence[Sequence[float]]) -> None:
+        if not keys:
+            return
+        if self.index is None:
+            self.index = create_vector_index(len(vectors[0]), self.backend)
+        dimension = self.index.dimension
+        matching = [(key, vector) for key, vector in zip(keys, vectors) if len(vector) == dimension]
+        self.index.add_many([key for key, _ in matching], [vector for _, vector in matching])
+        for key, _ in matching:
+            self.touch(key)
+
+    def touch(self, key: str) -> None:
+        self.recency[key] = None
+        self.recency.move_to_end(key)
+
+    def discard(self, key: str) -> None:
+        if self.journal is not None:
+            self.journal.append(("discard", key, None))
+        self.recency.pop(key, None)
+        if self.index is not None:
+            self.index.remove(key)
+
+    def best_match(self, vector: Sequence[float]) -> Optional[Tuple[str, float]]:
+        if self.index is None or self.index.dimension != len(vector):
+            return None
+        matches = self.index.search(vector, k=1)
+        return matches[0] if matches else None
+
+    def evict_overflow(self, max_size: int) -> List[str]:
+        """Drop least recently used keys beyond `max_size` and return them."""
+        evicted: List[str] = []
+        while len(self.recency) > max_size:
+            key, _ = self.recency.popitem(last=False)
+            if self.journal is not None:
+                self.journal.append(("discard", key, None))
+            if self.index is not None:
+                self.index.remove(key)
+            evicted.append(key)
+        return evicted
+
+    def replay(self, journal: Sequence[Tuple[str, str, Optional[Sequence[float]]]]) -> None:
+        """Apply writes journaled on the index this one replaces."""
+        for op, key, vector in journal:
+            if op == "add":
+                self.add(key, vector)
+            else:
+                self.discard(key)
+
+
+class IndexedSemanticCache:
+    """
+    Semantic cache that searches an in-process vector index mirrored to Redis.
+
+    Each entry is stored as one Redis hash ``{ns}:entry:{hash}`` holding the
+    float32 vector, the response and access metadata. Indexes are built from
+    Redis lazily per namespace. Every `sync_interval` seconds a background task
+    reloads them and swaps the new index in, so entries written by other
+    workers become visible without a lookup waiting on the reload.
+    """
+
+    def __init__(
+        self,
+        *,
+        redis_client: Optional[Redis] = None,
+        redis_url: Optional[str] = None,
+        model_name: Optional[str] = None,
+        score_threshold: Optional[float] = None,
+        prefix: str = "semantic",
+        max_cache_size: Optional[int] = None,
+        ttl: Optional[int] = None,
+        index_backend: Optional[str] = None,
+        sync_interval: Optional[float] = None,
+        embedding_fn: Optional[EmbeddingFn] = None,
+    ) -> None:
+        self._redis = redis_client or Redis.from_url(
+            redis_url or settings.REDIS_URL,
+            decode_responses=False,
+        )
+        self.model_name = model_name or settings.EMBEDDING_MODEL
+        self.score_threshold = score_threshold or settings.REDIS_CACHE_THRESHOLD
+        self.prefix = prefix
+        self.max_cache_size = max_cache_size or settings.REDIS_CACHE_MAX_SIZE
+        self.ttl = ttl or settings.REDIS_CACHE_EXPIRE
+        self.index_backend = index_backend or settings.SEMANTIC_CACHE_INDEX
+        self.sync_interval = (
+            sync_interval if sync_interval is not None else settings.SEMANTIC_CACHE_SYNC_INTERVAL
+        )
+        self._embedding_fn = embedding_fn
+        self.metrics = CacheMetrics()
+        self._namespaces: Dict[str, _NamespaceIndex] = {}
+        self._sync_locks: Dict[str, asyncio.Lock] = {}
+        self._resyncs: Dict[str, asyncio.Task] = {}
+        self._fetch_script = self._redis.register_script(_FETCH_SCRIPT)
+
+    async def lookup(
+        self,
+        messages: Sequence[Dict[str, Any]],
+        *,
+        scope: Optional[str] = None,
+    ) -> Optional[str]:
+        """
+        Try to find a cached response for the latest user message in `messages`.
+
+        Args:
+            messages: Chat messages containing at least `role` and `content`.
+            scope: Optional namespace (e.g. session/user ID) to isolate caches.
+        """
+        user_message = RedisSemanticCache._last_user_message(messages)
+        if not user_message:
+            return None
+
+        started = time.perf_counter()
+        try:
+            vector = await self._get_embedding(user_message)
+        except Exception:
+            # Embedding service failure should not break chat flow.
+            self.metrics.errors += 1
+            return None
+
+        namespace = self._namespace(scope)
+        cached_response: Optional[str] = None
+        try:
+            state = await self._namespace_state(namespace)
+            match = state.best_match(vector)
+            if match and match[1] >= self.score_threshold:
+                hash_id, similarity = match
+                cached_response = await self._fetch_response(namespace, state, hash_id)
+                if cached_response is not None:
+                    logger.info(
+                        "Semantic cache hit | namespace={} similarity={:.4f}",
+                        namespace,
+                        similarity,
+                    )
+        except Exception as exc:
+            self.metrics.errors += 1
+            logger.warning("Semantic cache lookup failed | namespace={} error={}", namespace, exc)
+            cached_response = None
+
+        self.metrics.record_lookup(
+            hit=cached_response is not None,
+            latency_ms=(time.perf_counter() - started) * 1000,
+        )
+        return cached_response
+
+    async def update(
+        self,
+        messages: Sequence[Dict[str, Any]],
+        response: str,
+        *,
+        scope: Optional[str] = None,
+        expire: Optional[int] = None,
+    ) -> None:
+        """
+        Store a conversation turn inside the semantic cache.
+
+        Args:
+            messages: Conversation context ending with the triggering user message.
+            response: Assistant response to cache.
+            scope: Optional namespace to isolate caches (e.g. per user/session).
+            expire: Custom expiry in seconds (defaults to the cache TTL).
+        """
+        user_message = RedisSemanticCache._last_user_message(messages)
+        if not user_message:
+            return
+
+        try:
+            vector = await self._get_embedding(user_message)
+        except Exception:
+            self.metrics.errors += 1
+            return
+
+        namespace = self._namespace(scope)
+        message_hash = RedisSemanticCache._message_hash(user_message)
+        now = _now_timestamp()
+
+        try:
+            state = await self._namespace_state(namespace)
+            state.add(message_hash, vector)
+            evicted = state.evict_overflow(self.max_cache_size)
+
+            entry_key = self._entry_key(namespace, message_hash)
+            async with self._redis.pipeline(transaction=False) as pipe:
+                pipe.hset(
+                    entry_key,
+                    mapping={
+                        "vec": np.asarray(vector, dtype=np.float32).tobytes(),
+                        "resp": response,
+                        "last_access": now,
+                    },
+                )
+                # Re-storing an entry keeps its creation time and access count.
+                pipe.hsetnx(entry_key, "created_at", now)
+                pipe.hsetnx(entry_key, "access_count", 1)
+                pipe.expire(entry_key, expire or self.ttl)
+                if evicted:
+                    pipe.delete(*(self._entry_key(namespace, key) for key in evicted))
+                await pipe.execute()
+        except Exception as exc:
+            self.metrics.errors += 1
+            logger.warning("Semantic cache update failed | namespace={} error={}", namespace, exc)
+            return
+
+        self.metrics.writes += 1
+        self.metrics.evictions += len(evicted)
+        logger.debug(
+            "Semantic cache updated | namespace={} hash={} evicted={}",
+            namespace,
+            message_hash,
+            len(evicted),
+        )
+
+    async def clear_namespace(self, scope: Optional[str] = None) -> None:
+        """Remove every cached entry for a namespace."""
+        namespace = self._namespace(scope)
+        keys: List[bytes] = []
+        async for raw_key in self._redis.scan_iter(match=f"{namespace}:entry:*"):
+            keys.append(raw_key)
+
+        if keys:
+            await self._redis.delete(*keys)
+        self._namespaces.pop(namespace, None)
+        logger.info(
+            "Cleared semantic cache namespace | namespace={} count={}",
+            namespace,
+            len(keys),
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """Return lookup metrics together with per-namespace index sizes."""
+        snapshot = self.metrics.snapshot()
+        snapshot["namespaces"] = {name: len(state) for name, state in self._namespaces.items()}
+        return snapshot
+
+    async def _fetch_response(
+        self,
+        namespace: str,
+        state: _NamespaceIndex,
+        hash_id: str,
+    ) -> Optional[str]:
+        """Fetch a response and record the access in a single round trip."""
+        raw_response = await self._fetch_script(
+            keys=[self._entry_key(namespace, hash_id)],
+            args=[_now_timestamp()],
+        )
+
+        if raw_response is None:
+            # Expired in Redis; drop it from the local index as well.
+            state.discard(hash_id)
+            return None
+
+        state.touch(hash_id)
+        return _decode(raw_response)
+
+    async def _namespace_state(self, namespace: str) -> _NamespaceIndex:
+        """Return the index for `namespace`, building it on first use and re-syncing it in the background."""
+        state = self._namespaces.get(namespace)
+        if state is None:
+            lock = self._sync_locks.setdefault(namespace, asyncio.Lock())
+            async with lock:
+                state = self._namespaces.get(namespace)
+                if state is None:
+                    state = await self._load_namespace(namespace)
+                    self._namespaces[namespace] = state
+            return state
+
+        if self._needs_sync(state) and namespace not in self._resyncs:
+            state.journal = []
+            task = asyncio.create_task(self._resync_namespace(namespace, state))
+            self._resyncs[namespace] = task
+            task.add_done_callback(lambda done: self._resyncs.pop(namespace, None))
+        return state
+
+    async def _resync_namespace(self, namespace: str, stale: _NamespaceIndex) -> None:
+        """Reload `namespace` from Redis and swap it in, replaying writes made meanwhile."""
+        try:
+            fresh = await self._load_namespace(namespace)
+        except Exception as exc:
+            # Keep serving the current index; retry after the next interval.
+            stale.journal = None
+            stale.synced_at = time.monotonic()
+            self.metrics.errors += 1
+            logger.warning("Semantic cache re-sync failed | namespace={} error={}", namespace, exc)
+            return
+
+        if self._namespaces.get(namespace) is not stale:
+            return  # cleared while loading
+        fresh.replay(stale.journal or ())
+        fresh.evict_overflow(self.max_cache_size)
+        self._namespaces[namespace] = fresh
+
+    def _needs_sync(self, state: _NamespaceIndex) -> bool:
+        if not self.sync_interval:
+            return False
+        return time.monotonic() - state.synced_at >= self.sync_interval
+
+    async def _load_namespace(self, namespace: str, batch_size: int = 500) -> _NamespaceIndex:
+        """Rebuild a namespace index from the hashes mirrored in Redis."""
+        state = _NamespaceIndex(self.index_backend)
+        keys: List[bytes] = []
+        async for raw_key in self._redis.scan_iter(match=f"{namespace}:entry:*", count=batch_size):
+            keys.append(raw_key)
+
+        entries: List[Tuple[float, str, np.ndarray]] = []
+        for start in range(0, len(keys), batch_size):
+            batch = keys[start:start + batch_size]
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for key in batch:
+                    pipe.hmget(key, "vec", "last_access")
+                rows = await pipe.execute()
+            for key, (raw_vector, raw_last_access) in zip(batch, rows):
+                if not raw_vector:
+                    continue
+                try:
+                    last_access = float(_decode(raw_last_access) or 0)
+                except (TypeError, ValueError):
+                    last_access = 0.0
+                vector = np.frombuffer(raw_vector, dtype=np.float32)
+                entries.append((last_access, _decode(key).split(":")[-1], vector))
+
+        # Insert oldest first so the LRU order matches Redis metadata.
+        entries.sort(key=lambda item: item[0])
+        state.add_many([hash_id for _, hash_id, _ in entries], [vector for _, _, vector in entries])
+
+        state.synced_at = time.monotonic()
+        logger.debug("Semantic cache index loaded | namespace={} size={}", namespace, len(state))
+        return state
+
+    async def _get_embedding(self, text: str) -> List[float]:
+        if self._embedding_fn is not None:
+            return await self._embedding_fn(text)
+        return await fetch_embedding(text, model_name=self.model_name)
+
+    def _namespace(self, scope: Optional[str]) -> str:
+        """Create namespace prefix for a scope."""
+        return f"{self.prefix}:{scope}" if scope else self.prefix
+
+    @staticmethod
+    def _entry_key(namespace: str, hash_id: str) -> str:
+        return f"{namespace}:entry:{hash_id}"
+
+
+SemanticCache = Union[IndexedSemanticCache, RedisSemanticCache]
+
+_semantic_cache: Optional[SemanticCache] = None
+
+
+def get_semantic_cache() -> SemanticCache:
+    """
+    Return the process-wide semantic cache configured by `SEMANTIC_CACHE_BACKEND`.
+
+    ``indexed`` (default) uses :class:`IndexedSemanticCache`; ``scan`` keeps the
+    legacy :class:`RedisSemanticCache`.
+    """
+    global _semantic_cache
+    if _semantic_cache is None:
+        backend = (settings.SEMANTIC_CACHE_BACKEND or "indexed").lower()
+        if backend == "scan":
+            _semantic_cache = RedisSemanticCache()
+        else:
+            _semantic_cache = IndexedSemanticCache()
+    return _semantic_cache
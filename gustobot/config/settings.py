@@ -3,11 +3,13 @@ Centralised application settings for GustoBot.
 """
 from __future__ import annotations
 
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple, Union
 
 from pydantic import Field
 from pydantic_settings import BaseSettings
 
+ParamValue = Union[int, float, str]
+
 
 class Settings(BaseSettings):
     """Application wide configuration loaded from environment variables."""
@@ -71,6 +73,31 @@ class Settings(BaseSettings):
     MILVUS_COLLECTION: str = "recipes"
     MILVUS_INDEX_TYPE: str = "IVF_FLAT"
     MILVUS_METRIC_TYPE: str = "IP"
+    MILVUS_INDEX_PROFILES: str = Field(
+        default="",
+        description="Per-collection index profile overrides, e.g. 'recipes:HNSW,faq:IVF_SQ8' (default MILVUS_INDEX_TYPE)",
+    )
+    MILVUS_INDEX_PARAMS: str = Field(
+        default="",
+        description="Per-collection index build params, e.g. 'recipes:M=32,recipes:efConstruction=256'",
+    )
+    MILVUS_SEARCH_PARAMS: str = Field(
+        default="",
+        description="Per-collection search params, e.g. 'recipes:ef=96' (see scripts/tune_milvus_index.py)",
+    )
+
+    def milvus_index_config(self, collection: str) -> Tuple[str, Dict[str, ParamValue], Dict[str, ParamValue]]:
+        """Resolve (index profile, build params, search params) for a Milvus collection"""
+        profiles: Dict[str, str] = {}
+        for item in self.MILVUS_INDEX_PROFILES.split(","):
+            name, _, profile = item.partition(":")
+            if name.strip() and profile.strip():
+                profiles[name.strip()] = profile.strip().upper()
+        return (
+            profiles.get(collection, self.MILVUS_INDEX_TYPE),
+            _collection_params(self.MILVUS_INDEX_PARAMS, collection),
+            _collection_params(self.MILVUS_SEARCH_PARAMS, collection),
+        )
 
     # Embeddings
     EMBEDDING_PROVIDER: str = Field(default="openai", description="Embedding provider")
@@ -78,18 +105,51 @@ class Settings(BaseSettings):
     EMBEDDING_API_KEY: Optional[str] = None
     EMBEDDING_BASE_URL: Optional[str] = Field(default=None, description="Embedding API base URL")
     EMBEDDING_DIMENSION: int = 1536
+    EMBEDDING_MAX_CONNECTIONS: int = Field(
+        default=20,
+        description="Connection pool size of the shared embedding client",
+    )
+    EMBEDDING_CACHE_SIZE: int = Field(
+        default=10000,
+        description="Number of embeddings kept in the in-memory LRU (0 disables)",
+    )
+    EMBEDDING_CACHE_BACKEND: str = Field(
+        default="redis",
+        description="Persistent embedding cache tier: redis or none",
+    )
+    EMBEDDING_CACHE_TTL: int = Field(
+        default=60 * 60 * 24 * 7,
+        description="Expiry in seconds of embeddings in the persistent cache tier",
+    )
 
     # Reranker configuration
     RERANK_ENABLED: bool = Field(default=True, description="Enable reranking")
     RERANK_PROVIDER: str = Field(default="custom", description="Rerank provider: cohere, jina, voyage, custom")
     RERANK_BASE_URL: Optional[str] = Field(default=None, description="Rerank API base URL")
     RERANK_ENDPOINT: str = Field(default="/rerank", description="Rerank endpoint path")
+    COHERE_RERANK_URL: str = Field(
+        default="https://api.cohere.com/v2/rerank",
+        description="Cohere rerank endpoint (RERANK_BASE_URL only applies to the custom provider)",
+    )
     RERANK_MODEL: str = Field(default="bge-reranker-large", description="Rerank model name")
     RERANK_API_KEY: Optional[str] = None
     RERANK_MAX_CANDIDATES: int = Field(default=20, description="Max candidates for reranking")
     RERANK_TOP_N: int = Field(default=6, description="Top N results after reranking")
     RERANK_TIMEOUT: int = Field(default=30, description="Rerank API timeout in seconds")
     RERANK_SCORE_FUSION_ALPHA: Optional[float] = Field(default=None, description="Score fusion alpha parameter")
+    RERANK_LATENCY_BUDGET_MS: int = Field(
+        default=1500,
+        description="Deadline for one rerank call; past it candidates keep their retrieval order (<=0 uses RERANK_TIMEOUT)",
+    )
+    RERANK_MAX_CONNECTIONS: int = Field(default=20, description="Pooled HTTP connections to the rerank API")
+    RERANK_CACHE_SIZE: int = Field(default=10000, description="Max (query, document, model) scores kept in memory")
+    RERANK_CACHE_TTL: int = Field(default=3600, description="Expiry in seconds of cached rerank scores")
+    RERANK_BREAKER_FAILURES: int = Field(
+        default=3, description="Consecutive rerank failures/timeouts that open the circuit breaker"
+    )
+    RERANK_BREAKER_COOLDOWN: float = Field(
+        default=30.0, description="Seconds the reranker is skipped once the breaker opens, before a trial call"
+    )
 
     # Legacy reranker compatibility
     @property
@@ -150,6 +210,47 @@ class Settings(BaseSettings):
         default=1000,
         description="Maximum number of cached items per namespace",
     )
+    SEMANTIC_CACHE_BACKEND: str = Field(
+        default="indexed",
+        description="Semantic cache backend: indexed (in-process ANN mirrored to Redis) or scan (legacy)",
+    )
+    SEMANTIC_CACHE_INDEX: str = Field(
+        default="auto",
+        description="Vector index used by the indexed semantic cache: auto, hnsw, numpy",
+    )
+    SEMANTIC_CACHE_SYNC_INTERVAL: float = Field(
+        default=300.0,
+        description="Seconds between background re-syncs of the in-process cache index from Redis (0 disables)",
+    )
+    SEMANTIC_CACHE_EVICTION: str = Field(
+        default="lru",
+        description="Eviction policy of the scan semantic cache sorted set: lru or lfu",
+    )
+
+    # Chat response cache (in-process LRU -> semantic Redis -> graph)
+    CHAT_CACHE_ENABLED: bool = Field(
+        default=False,
+        description="Serve repeated /chat questions from the two-tier response cache",
+    )
+    CHAT_CACHE_LRU_SIZE: int = Field(
+        default=2048,
+        description="Maximum number of exact-match responses kept in the in-process LRU",
+    )
+    CHAT_CACHE_SEMANTIC_ENABLED: bool = Field(
+        default=True,
+        description="Consult the semantic Redis cache when the in-process LRU misses",
+    )
+    CHAT_CACHE_ROUTE_TTLS: str = Field(
+        default=(
+            "general-query:3600,kb-query:43200,graphrag-query:43200,"
+            "text2sql-query:600,image-query:1800,additional-query:0,file-query:0"
+        ),
+        description="Comma-separated route:ttl_seconds pairs; routes with 0 or missing are never cached",
+    )
+    CHAT_CACHE_SESSION_ROUTES: str = Field(
+        default="image-query,file-query",
+        description="Comma-separated routes whose cached answers are only reused within the same session",
+    )
 
     # Relational database
     DATABASE_URL: str = "sqlite:///./data/gustobot.db"
@@ -200,6 +301,14 @@ class Settings(BaseSettings):
     NEO4J_BOOTSTRAP_FORCE: bool = False
     NEO4J_RECIPE_JSON_PATH: str = "data/recipe.json"
     NEO4J_INGREDIENT_JSON_PATH: Optional[str] = "data/excipients.json"
+    RECIPE_KG_CLASSIFIER_CACHE_PATH: str = Field(
+        default="data/cache/recipe_kg_classifier.pkl",
+        description="Pickle of the prebuilt recipe_kg classifier, rebuilt when the dict files change (empty disables).",
+    )
+    NEO4J_SCHEMA_TTL: float = Field(
+        default=600.0,
+        description="Seconds before the shared Neo4j graph re-reads its schema (0 disables the TTL).",
+    )
 
     # Agent behaviour
     MAX_ITERATIONS: int = 10
@@ -286,6 +395,91 @@ class Settings(BaseSettings):
         default=20.0,
         description="Timeout in seconds for external KB search requests.",
     )
+    KB_LOCAL_SEARCH_DEADLINE: float = Field(
+        default=20.0,
+        description="Overall deadline in seconds for the concurrent PostgreSQL/Milvus/external KB retrieval (0 disables).",
+    )
+    KB_WARMUP_ON_STARTUP: bool = Field(
+        default=True,
+        description="Connect to Milvus and warm the KB collection during API startup.",
+    )
+    KB_HEALTH_CHECK_INTERVAL: float = Field(
+        default=30.0,
+        description="Seconds between background Milvus health checks (0 disables).",
+    )
+    KB_RECONNECT_BACKOFF: float = Field(
+        default=10.0,
+        description="Minimum seconds between Milvus reconnect attempts after a failure.",
+    )
+    KB_HYBRID_ENABLED: bool = Field(
+        default=True,
+        description="Fuse a local BM25 (character-bigram) index with Milvus ANN results via RRF.",
+    )
+    KB_HYBRID_CANDIDATES: int = Field(
+        default=10,
+        description="Candidates taken from each retriever when hybrid search is active (replaces RERANK_MAX_CANDIDATES).",
+    )
+    KB_HYBRID_RRF_K: int = Field(default=60, description="Reciprocal rank fusion constant k.")
+    KB_HYBRID_SKIP_RERANK: bool = Field(
+        default=True,
+        description="Skip the reranker when lexical and vector retrieval agree on the top hit or the query names the top dish.",
+    )
+    KB_LEXICAL_MATCH_THRESHOLD: float = Field(
+        default=0.5,
+        description="Minimum idf-weighted share of the query's indexed terms a lexical-only hit must contain when it is not reranked.",
+    )
+    KB_HYBRID_REFRESH_INTERVAL: float = Field(
+        default=600.0,
+        description="Seconds after which the lexical index is rebuilt from Milvus in the background (0 disables).",
+    )
+    KB_SEARCH_BATCH_WINDOW_MS: float = Field(
+        default=0.0,
+        description="Window in ms for merging concurrent KB searches into one embedding + Milvus call (0 disables).",
+    )
+    KB_SEARCH_BATCH_MAX: int = Field(
+        default=32,
+        description="Maximum queries merged into one micro-batched KB search.",
+    )
+    KB_DEDUP_ENABLED: bool = Field(
+        default=True,
+        description="Prune near-duplicate KB candidates before reranking and context building.",
+    )
+    KB_DEDUP_JACCARD: float = Field(
+        default=0.8,
+        description="MinHash-estimated shingle Jaccard similarity at or above which two chunks are near-duplicates (0 disables).",
+    )
+    KB_DEDUP_EMBEDDING_SIMILARITY: float = Field(
+        default=0.97,
+        description="Cosine similarity between chunk embeddings at or above which Milvus hits collapse (0 disables vector fetch).",
+    )
+    KB_INGEST_EMBED_BATCH_SIZE: int = Field(
+        default=64,
+        description="Chunks embedded per request when batch-ingesting recipes into Milvus.",
+    )
+    KB_INGEST_EMBED_CONCURRENCY: int = Field(
+        default=4,
+        description="Concurrent embedding requests during batch recipe ingestion.",
+    )
+    KB_INGEST_INSERT_BATCH_SIZE: int = Field(
+        default=1000,
+        description="Rows per Milvus insert call during batch recipe ingestion.",
+    )
+    KB_INGEST_FLUSH_ROWS: int = Field(
+        default=50000,
+        description="Flush Milvus once this many rows are unflushed during batch ingestion (0 = only at the end).",
+    )
+    KB_INGEST_FLUSH_INTERVAL: float = Field(
+        default=60.0,
+        description="Flush Milvus once unflushed rows are older than this many seconds during batch ingestion (0 = only at the end).",
+    )
+    AGENT_WORKFLOW_WARMUP_ON_STARTUP: bool = Field(
+        default=True,
+        description="Compile the Neo4j multi-tool workflow during API startup.",
+    )
+    AGENT_WORKFLOW_BENCHMARK_ON_STARTUP: bool = Field(
+        default=False,
+        description="Log per-request workflow construction cost (rebuilt vs cached) at startup.",
+    )
 
     # Conversation history retention
     CONVERSATION_HISTORY_TTL: int = Field(
@@ -320,6 +514,21 @@ class Settings(BaseSettings):
             return [origin.strip() for origin in self.CORS_ORIGINS.split(",")]
         return list(self.CORS_ORIGINS)
 
+    @property
+    def chat_cache_route_ttls(self) -> Dict[str, int]:
+        """Parse CHAT_CACHE_ROUTE_TTLS into a route -> ttl mapping"""
+        ttls: Dict[str, int] = {}
+        for item in self.CHAT_CACHE_ROUTE_TTLS.split(","):
+            route, _, ttl = item.partition(":")
+            if route.strip() and ttl.strip():
+                ttls[route.strip()] = int(ttl)
+        return ttls
+
+    @property
+    def chat_cache_session_routes(self) -> List[str]:
+        """Parse CHAT_CACHE_SESSION_ROUTES string to list"""
+        return [route.strip() for route in self.CHAT_CACHE_SESSION_ROUTES.split(",") if route.strip()]
+
     model_config = {
         "env_file": ".env",
         "case_sensitive": True,
@@ -331,4 +540,25 @@ class Settings(BaseSettings):
         return self.NEO4J_USER
 
 
+def _collection_params(raw: str, collection: str) -> Dict[str, ParamValue]:
+    """Parse 'collection:key=value,...' entries for one collection"""
+    params: Dict[str, ParamValue] = {}
+    for item in raw.split(","):
+        name, _, assignment = item.partition(":")
+        key, _, value = assignment.partition("=")
+        if name.strip() == collection and key.strip() and value.strip():
+            params[key.strip()] = _param_value(value.strip())
+    return params
+
+
+def _param_value(value: str) -> ParamValue:
+    """Keep int, float and string index params as their own types (e.g. nlist=1024, radius=0.8)"""
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    return value
+
+
 settings = Settings()
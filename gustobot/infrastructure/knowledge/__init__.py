@@ -5,11 +5,15 @@ Knowledge Base Module
 from .vector_store import VectorStore
 from .knowledge_service import KnowledgeService
 from .reranker import Reranker
+from .registry import KnowledgeServiceRegistry, get_knowledge_registry, get_knowledge_service
 from gustobot.infrastructure.knowledge.recipe_kg import Neo4jQAService
 
 __all__ = [
     "VectorStore",
     "KnowledgeService",
     "Reranker",
+    "KnowledgeServiceRegistry",
+    "get_knowledge_registry",
+    "get_knowledge_service",
     "Neo4jQAService",
 ]
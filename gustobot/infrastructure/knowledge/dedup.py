@@ -0,0 +1,141 @@
+"""
+Near-duplicate pruning for retrieval candidates.
+
+Two things make many candidates near-identical: overlapping splitter windows,
+and the same recipe uploaded more than once. Sending all of them to the
+reranker and into the LLM context wastes payload and prompt tokens, and it
+crowds out other documents. `prune_near_duplicates` walks the candidates in
+rank order and drops each one that is a near-duplicate of a hit already kept:
+
+- text: MinHash signatures over character shingles estimate the Jaccard
+  similarity of the two chunk texts;
+- embedding: when hits carry their vectors, a cosine similarity above the
+  threshold collapses rewordings that share few shingles.
+
+A kept hit lists the ids it absorbed under `near_duplicates`.
+"""
+from __future__ import annotations
+
+import re
+import zlib
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from gustobot.config import settings
+from .lexical_index import normalize_text
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+class MinHasher:
+    """MinHash signatures over character n-grams; `num_perm` fixed, seeded permutations."""
+
+    def __init__(self, num_perm: int = 64, shingle_size: int = 3, seed: int = 1) -> None:
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        # a*x+b 中 a、b、x 均小于 2^32，uint64 运算不会溢出
+        self._a = rng.integers(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+    def shingles(self, text: str) -> set:
+        compact = _NON_WORD.sub("", normalize_text(text))
+        if len(compact) <= self.shingle_size:
+            return {compact} if compact else set()
+        size = self.shingle_size
+        return {compact[index:index + size] for index in range(len(compact) - size + 1)}
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        shingles = self.shingles(text)
+        if not shingles:
+            return None
+        hashes = np.fromiter(
+            (zlib.crc32(shingle.encode("utf-8")) for shingle in shingles),
+            dtype=np.uint64,
+            count=len(shingles),
+        )
+        permuted = (hashes[:, None] * self._a + self._b) % _MERSENNE_PRIME
+        return permuted.min(axis=0)
+
+    @staticmethod
+    def similarity(left: np.ndarray, right: np.ndarray) -> float:
+        """Estimated Jaccard similarity of the two shingle sets."""
+        return float(np.mean(left == right))
+
+
+_default_hasher = MinHasher()
+
+
+def prune_near_duplicates(
+    hits: Sequence[Dict[str, Any]],
+    *,
+    jaccard_threshold: Optional[float] = 0.8,
+    embedding_threshold: Optional[float] = 0.97,
+    vector_key: str = "embedding",
+    hasher: Optional[MinHasher] = None,
+) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Keep the best-ranked hit of each near-duplicate group, preserving order.
+
+    A threshold of None (or outside (0, 1]) disables that test. Returned hits are
+    copies without `vector_key`. Returns `(kept, pruned_count)`.
+    """
+    text_on = jaccard_threshold is not None and 0 < jaccard_threshold <= 1
+    vector_on = embedding_threshold is not None and 0 < embedding_threshold <= 1
+    hasher = hasher or _default_hasher
+
+    kept: List[Dict[str, Any]] = []
+    signatures: List[Optional[np.ndarray]] = []
+    vectors: List[Optional[np.ndarray]] = []
+    pruned = 0
+    for hit in hits:
+        signature = hasher.signature(hit.get("content") or hit.get("document") or "") if text_on else None
+        vector = _unit_vector(hit.get(vector_key)) if vector_on else None
+
+        duplicate_of = None
+        for position, kept_hit in enumerate(kept):
+            if signature is not None and signatures[position] is not None:
+                if hasher.similarity(signature, signatures[position]) >= jaccard_threshold:
+                    duplicate_of = kept_hit
+                    break
+            if vector is not None and vectors[position] is not None:
+                if float(vector @ vectors[position]) >= embedding_threshold:
+                    duplicate_of = kept_hit
+                    break
+
+        if duplicate_of is not None:
+            pruned += 1
+            if hit.get("id") is not None:
+                duplicate_of.setdefault("near_duplicates", []).append(hit["id"])
+            continue
+
+        kept.append({key: value for key, value in hit.items() if key != vector_key})
+        signatures.append(signature)
+        vectors.append(vector)
+    return kept, pruned
+
+
+def prune_candidates(
+    hits: Sequence[Dict[str, Any]],
+    *,
+    vector_key: str = "embedding",
+) -> Tuple[List[Dict[str, Any]], int]:
+    """`prune_near_duplicates` configured from the KB_DEDUP_* settings (pass-through when disabled)."""
+    if not settings.KB_DEDUP_ENABLED or len(hits) < 2:
+        return [{key: value for key, value in hit.items() if key != vector_key} for hit in hits], 0
+    return prune_near_duplicates(
+        hits,
+        jaccard_threshold=settings.KB_DEDUP_JACCARD,
+        embedding_threshold=settings.KB_DEDUP_EMBEDDING_SIMILARITY,
+        vector_key=vector_key,
+    )
+
+
+def _unit_vector(values: Any) -> Optional[np.ndarray]:
+    if values is None:
+        return None
+    vector = np.asarray(values, dtype=np.float32)
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if vector.ndim == 1 and norm > 0 else None
@@ -0,0 +1,369 @@
+"""
+Shared embedding service.
+
+Every embedding consumer in the API process (semantic cache, Milvus knowledge
+base, LightRAG) goes through one `EmbeddingService` per model/endpoint:
+
+- pooled HTTP connections via a single `AsyncOpenAI` (and a blocking `OpenAI`
+  client for the few synchronous callers);
+- in-flight coalescing: concurrent requests for the same text await one call;
+- a content-hash keyed cache with an in-memory LRU tier and a persistent Redis
+  tier, so a user question is embedded once per request (and once per TTL)
+  instead of once per retriever.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+import httpx
+from loguru import logger
+from openai import AsyncOpenAI, OpenAI
+from redis.asyncio import Redis
+
+from gustobot.config import settings
+
+
+def embedding_cache_key(model: str, text: str) -> str:
+    """Content hash identifying the embedding of `text` under `model`."""
+    return hashlib.sha256(f"{model}\x00{text}".encode("utf-8")).hexdigest()
+
+
+def _pack(vector: Sequence[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def _unpack(payload: bytes) -> List[float]:
+    values = array("f")
+    values.frombytes(payload)
+    return values.tolist()
+
+
+class EmbeddingLRU:
+    """Thread-safe in-memory LRU of packed float32 vectors."""
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self._items: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            payload = self._items.get(key)
+            if payload is not None:
+                self._items.move_to_end(key)
+            return payload
+
+    def set(self, key: str, payload: bytes) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._items[key] = payload
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+
+class EmbeddingService:
+    """Async, pooled, coalescing and cached client for an OpenAI-compatible `/embeddings` API."""
+
+    def __init__(
+        self,
+        *,
+        model: Optional[str] = None,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        dimension: Optional[int] = None,
+        max_batch_size: int = 64,
+        request_timeout: float = 60.0,
+        max_connections: Optional[int] = None,
+        cache_size: Optional[int] = None,
+        redis_client: Optional[Redis] = None,
+        persistent_cache: Optional[bool] = None,
+        persistent_ttl: Optional[int] = None,
+        async_client: Optional[Any] = None,
+        sync_client: Optional[Any] = None,
+    ) -> None:
+        self.model = model or settings.EMBEDDING_MODEL
+        self.dimension = dimension
+        self.max_batch_size = max_batch_size
+        self.request_timeout = request_timeout
+        self.base_url = base_url or settings.EMBEDDING_BASE_URL or settings.OPENAI_API_BASE
+        self._api_key = api_key or settings.EMBEDDING_API_KEY or settings.OPENAI_API_KEY
+        self._max_connections = max_connections or settings.EMBEDDING_MAX_CONNECTIONS
+        self._async_client = async_client
+        self._sync_client = sync_client
+        self._lru = EmbeddingLRU(cache_size if cache_size is not None else settings.EMBEDDING_CACHE_SIZE)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._fetches: Set[asyncio.Task] = set()
+
+        use_redis = (
+            persistent_cache
+            if persistent_cache is not None
+            else settings.EMBEDDING_CACHE_BACKEND.lower() == "redis"
+        )
+        self._redis: Optional[Redis] = None
+        if use_redis:
+            self._redis = redis_client or Redis.from_url(settings.REDIS_URL, decode_responses=False)
+        self.persistent_ttl = persistent_ttl or settings.EMBEDDING_CACHE_TTL
+
+        self.stats: Dict[str, int] = {
+            "requests": 0,
+            "texts": 0,
+            "lru_hits": 0,
+            "persistent_hits": 0,
+            "coalesced": 0,
+            "api_calls": 0,
+            "api_texts": 0,
+        }
+
+    # ------------------------------------------------------------------ public
+    async def embed(self, texts: Sequence[str]) -> List[List[float]]:
+        """Embed `texts`, serving repeats from cache and sharing in-flight calls."""
+        if not texts:
+            return []
+        inputs = [self._clean(text) for text in texts]
+        keys = [embedding_cache_key(self.model, text) for text in inputs]
+        self.stats["requests"] += 1
+        self.stats["texts"] += len(inputs)
+
+        resolved: Dict[str, bytes] = {}
+        waiting: Dict[str, asyncio.Future] = {}
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, inputs):
+            if key in resolved or key in waiting or key in missing:
+                continue
+            payload = self._lru.get(key)
+            if payload is not None:
+                self.stats["lru_hits"] += 1
+                resolved[key] = payload
+            elif key in self._inflight:
+                self.stats["coalesced"] += 1
+                waiting[key] = self._inflight[key]
+            else:
+                missing[key] = text
+
+        if missing:
+            loop = asyncio.get_running_loop()
+            owned = {key: loop.create_future() for key in missing}
+            self._inflight.update(owned)
+            # The fetch runs detached from this caller: cancelling the owner must
+            # not cancel (or fail) the requests coalesced onto its futures.
+            fetch = loop.create_task(self._resolve_missing(missing))
+            self._fetches.add(fetch)
+            fetch.add_done_callback(lambda done: self._settle(owned, done))
+            resolved.update(await asyncio.shield(fetch))
+
+        for key, future in waiting.items():
+            resolved[key] = await asyncio.shield(future)
+
+        return [_unpack(resolved[key]) for key in keys]
+
+    async def embed_query(self, text: str) -> List[float]:
+        vectors = await self.embed([text])
+        return vectors[0] if vectors else []
+
+    def embed_sync(self, texts: Sequence[str]) -> List[List[float]]:
+        """Blocking variant for synchronous callers; shares the in-memory tier only."""
+        if not texts:
+            return []
+        inputs = [self._clean(text) for text in texts]
+        keys = [embedding_cache_key(self.model, text) for text in inputs]
+        resolved: Dict[str, bytes] = {}
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, inputs):
+            payload = self._lru.get(key)
+            if payload is not None:
+                self.stats["lru_hits"] += 1
+                resolved[key] = payload
+            else:
+                missing[key] = text
+
+        pending = list(missing.items())
+        for start in range(0, len(pending), self.max_batch_size):
+            batch = pending[start:start + self.max_batch_size]
+            response = self._get_sync_client().embeddings.create(
+                model=self.model,
+                input=[text for _, text in batch],
+                timeout=self.request_timeout,
+            )
+            for (key, _), vector in zip(batch, self._vectors(response, len(batch))):
+                payload = _pack(vector)
+                self._lru.set(key, payload)
+                resolved[key] = payload
+        return [_unpack(resolved[key]) for key in keys]
+
+    async def aclose(self) -> None:
+        if self._async_client is not None and hasattr(self._async_client, "close"):
+            await self._async_client.close()
+        if self._redis is not None:
+            await self._redis.close()
+
+    # ---------------------------------------------------------------- internals
+    def _settle(self, owned: Dict[str, asyncio.Future], fetch: asyncio.Task) -> None:
+        """Resolve the coalesced futures of a finished fetch and release its keys."""
+        self._fetches.discard(fetch)
+        for key in owned:
+            self._inflight.pop(key, None)
+        if fetch.cancelled():
+            # Only happens when the loop shuts down; nobody is left to retry.
+            for future in owned.values():
+                future.cancel()
+            return
+        exc = fetch.exception()
+        for key, future in owned.items():
+            if exc is not None:
+                future.set_exception(exc)
+                future.exception()  # mark retrieved; the owner re-raises
+            else:
+                future.set_result(fetch.result()[key])
+
+    async def _resolve_missing(self, missing: Dict[str, str]) -> Dict[str, bytes]:
+        fetched = await self._persistent_get(list(missing))
+        for key, payload in fetched.items():
+            self.stats["persistent_hits"] += 1
+            self._lru.set(key, payload)
+
+        pending = [(key, text) for key, text in missing.items() if key not in fetched]
+        computed: Dict[str, bytes] = {}
+        for start in range(0, len(pending), self.max_batch_size):
+            batch = pending[start:start + self.max_batch_size]
+            vectors = await self._request([text for _, text in batch])
+            for (key, _), vector in zip(batch, vectors):
+                payload = _pack(vector)
+                self._lru.set(key, payload)
+                computed[key] = payload
+
+        await self._persistent_set(computed)
+        fetched.update(computed)
+        return fetched
+
+    async def _request(self, batch: List[str]) -> List[List[float]]:
+        self.stats["api_calls"] += 1
+        self.stats["api_texts"] += len(batch)
+        response = await self._get_async_client().embeddings.create(
+            model=self.model,
+            input=batch,
+            timeout=self.request_timeout,
+        )
+        return self._vectors(response, len(batch))
+
+    def _vectors(self, response: Any, expected: int) -> List[List[float]]:
+        data = sorted(response.data, key=lambda item: getattr(item, "index", 0))
+        if len(data) != expected:
+            raise RuntimeError(
+                f"Embedding API returned {len(data)} vectors for {expected} inputs"
+            )
+        vectors = [list(item.embedding) for item in data]
+        if self.dimension and vectors and len(vectors[0]) != self.dimension:
+            logger.warning(
+                "Embedding dimension mismatch: expected={} actual={}",
+                self.dimension,
+                len(vectors[0]),
+            )
+        return vectors
+
+    async def _persistent_get(self, keys: List[str]) -> Dict[str, bytes]:
+        if self._redis is None or not keys:
+            return {}
+        try:
+            payloads = await self._redis.mget([self._redis_key(key) for key in keys])
+        except Exception as exc:
+            logger.warning("Embedding cache read failed: {}", exc)
+            return {}
+        return {key: payload for key, payload in zip(keys, payloads) if payload}
+
+    async def _persistent_set(self, items: Dict[str, bytes]) -> None:
+        if self._redis is None or not items:
+            return
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for key, payload in items.items():
+                    pipe.set(self._redis_key(key), payload, ex=self.persistent_ttl)
+                await pipe.execute()
+        except Exception as exc:
+            logger.warning("Embedding cache write failed: {}", exc)
+
+    def _get_async_client(self) -> Any:
+        if self._async_client is None:
+            self._async_client = AsyncOpenAI(
+                api_key=self._api_key,
+                base_url=self.base_url,
+                http_client=httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=self._max_connections,
+                        max_keepalive_connections=self._max_connections,
+                    ),
+                    timeout=self.request_timeout,
+                ),
+            )
+        return self._async_client
+
+    def _get_sync_client(self) -> Any:
+        if self._sync_client is None:
+            self._sync_client = OpenAI(api_key=self._api_key, base_url=self.base_url)
+        return self._sync_client
+
+    @staticmethod
+    def _clean(text: str) -> str:
+        # DashScope 对空字符串会报错，使用单空格保持顺序
+        return (text or "").strip() or " "
+
+    @staticmethod
+    def _redis_key(key: str) -> str:
+        return f"embedding:{key}"
+
+
+_ServiceKey = Tuple[str, Optional[str], Optional[str], Optional[int], float, int]
+_services: Dict[_ServiceKey, EmbeddingService] = {}
+_services_lock = threading.Lock()
+
+
+def get_embedding_service(
+    model: Optional[str] = None,
+    *,
+    base_url: Optional[str] = None,
+    api_key: Optional[str] = None,
+    dimension: Optional[int] = None,
+    request_timeout: float = 60.0,
+    max_batch_size: int = 64,
+    **kwargs: Any,
+) -> EmbeddingService:
+    """
+    Return the process-wide service for this endpoint configuration (defaults from settings).
+
+    Services are shared per (model, base_url, api_key, dimension, request_timeout,
+    max_batch_size); callers that differ in any of these get their own service.
+    Credentials fall back from EMBEDDING_* to OPENAI_API_BASE / OPENAI_API_KEY.
+    """
+    model = model or settings.EMBEDDING_MODEL
+    base_url = base_url or settings.EMBEDDING_BASE_URL or settings.OPENAI_API_BASE
+    api_key = api_key or settings.EMBEDDING_API_KEY or settings.OPENAI_API_KEY
+    key = (model, base_url, api_key, dimension, float(request_timeout), max_batch_size)
+    with _services_lock:
+        service = _services.get(key)
+        if service is None:
+            service = EmbeddingService(
+                model=model,
+                base_url=base_url,
+                api_key=api_key,
+                dimension=dimension,
+                request_timeout=request_timeout,
+                max_batch_size=max_batch_size,
+                **kwargs,
+            )
+            _services[key] = service
+            logger.info(
+                "Initialised shared embedding service (model={}, base_url={}, dimension={})",
+                model,
+                base_url or "https://api.openai.com/v1",
+                dimension,
+            )
+        return service
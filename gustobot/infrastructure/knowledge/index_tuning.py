@@ -0,0 +1,139 @@
+"""
+Offline recall/latency tuning for Milvus index profiles.
+
+Ground truth is an exact (brute-force) top-k computed with numpy over the
+collection's stored vectors. Each candidate value of the profile's sweep
+parameter (`nprobe` for IVF, `ef` for HNSW, `search_list` for DiskANN) is
+then measured for recall@k and per-query latency on the same query set, and
+the cheapest value that reaches the target recall is recommended.
+"""
+from __future__ import annotations
+
+import statistics
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .vector_store import VectorStore
+
+
+@dataclass
+class SweepPoint:
+    params: Dict[str, Any]
+    recall: float
+    p50_ms: float
+    p95_ms: float
+
+    def as_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["recall"] = round(self.recall, 4)
+        data["p50_ms"] = round(self.p50_ms, 2)
+        data["p95_ms"] = round(self.p95_ms, 2)
+        return data
+
+
+def load_vectors(vector_store: VectorStore, batch_size: int = 1000) -> Tuple[List[str], np.ndarray]:
+    """Read every (id, embedding) pair of the collection."""
+    ids: List[str] = []
+    rows: List[List[float]] = []
+    iterator = vector_store.collection.query_iterator(
+        batch_size=batch_size,
+        expr='id != ""',
+        output_fields=["id", "embedding"],
+    )
+    try:
+        while True:
+            batch = iterator.next()
+            if not batch:
+                break
+            for entity in batch:
+                ids.append(entity["id"])
+                rows.append(entity["embedding"])
+    finally:
+        iterator.close()
+    matrix = np.asarray(rows, dtype=np.float32).reshape(len(rows), vector_store.dimension)
+    return ids, matrix
+
+
+def exact_top_k(corpus: np.ndarray, queries: np.ndarray, k: int, metric_type: str = "IP") -> np.ndarray:
+    """Brute-force top-k row indices of `corpus` for each query, best first."""
+    metric = metric_type.upper()
+    corpus = np.asarray(corpus, dtype=np.float32)
+    queries = np.asarray(queries, dtype=np.float32)
+    if metric == "COSINE":
+        corpus = corpus / np.maximum(np.linalg.norm(corpus, axis=1, keepdims=True), 1e-12)
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+    if metric == "L2":
+        scores = -(
+            np.sum(queries ** 2, axis=1, keepdims=True)
+            - 2 * queries @ corpus.T
+            + np.sum(corpus ** 2, axis=1)
+        )
+    else:
+        scores = queries @ corpus.T
+    k = min(k, corpus.shape[0])
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(scores, top, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(top, order, axis=1)
+
+
+def recall_at_k(found: Sequence[Sequence[str]], truth: Sequence[Sequence[str]]) -> float:
+    """Mean fraction of the exact top-k ids returned by the ANN search."""
+    if not truth:
+        return 0.0
+    hits = [len(set(ann) & set(exact)) / len(exact) for ann, exact in zip(found, truth) if exact]
+    return sum(hits) / len(hits) if hits else 0.0
+
+
+def sweep(
+    vector_store: VectorStore,
+    queries: np.ndarray,
+    truth: Sequence[Sequence[str]],
+    top_k: int,
+    values: Optional[Sequence[int]] = None,
+) -> List[SweepPoint]:
+    """Search every query once per candidate value of the profile's sweep parameter."""
+    profile = vector_store.profile
+    if profile.sweep_param is None:
+        candidates: List[Dict[str, Any]] = [{}]
+    else:
+        candidates = [{profile.sweep_param: value} for value in (values or profile.sweep_values)]
+
+    points: List[SweepPoint] = []
+    for overrides in candidates:
+        params = profile.search_params_for(top_k, overrides)
+        found: List[List[str]] = []
+        latencies: List[float] = []
+        for query in queries:
+            started = time.perf_counter()
+            results = vector_store.collection.search(
+                data=[query.tolist()],
+                anns_field="embedding",
+                param={"metric_type": vector_store.metric_type, "params": params},
+                limit=top_k,
+                output_fields=["id"],
+            )
+            latencies.append((time.perf_counter() - started) * 1000)
+            found.append([hit.id for hits in results for hit in hits])
+        ordered = sorted(latencies)
+        points.append(
+            SweepPoint(
+                params=params,
+                recall=recall_at_k(found, truth),
+                p50_ms=statistics.median(latencies) if latencies else 0.0,
+                p95_ms=ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))] if ordered else 0.0,
+            )
+        )
+    return points
+
+
+def recommend(points: Sequence[SweepPoint], target_recall: float, sweep_param: Optional[str]) -> Optional[SweepPoint]:
+    """Cheapest point (smallest sweep value) meeting `target_recall`; None if none does."""
+    eligible = [point for point in points if point.recall >= target_recall]
+    if not eligible:
+        return None
+    if sweep_param is None:
+        return min(eligible, key=lambda point: point.p50_ms)
+    return min(eligible, key=lambda point: (point.params.get(sweep_param, 0), point.p50_ms))
@@ -2,7 +2,10 @@
 from __future__ import annotations
 
 import asyncio
-from typing import Any, Dict, List, Optional
+import threading
+import time
+from itertools import islice
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
 from uuid import uuid4
 
 from langchain.schema import Document
@@ -10,9 +13,12 @@ from langchain.text_splitter import RecursiveCharacterTextSplitter
 from loguru import logger
 
 from gustobot.config import settings
+from .dedup import prune_candidates
 from .embeddings import OpenAICompatibleEmbeddings
+from .lexical_index import LexicalIndex, normalize_text, reciprocal_rank_fusion
 from .vector_store import VectorStore
 from .reranker import Reranker
+from .search_batcher import MicroBatcher
 
 
 class KnowledgeService:
@@ -43,17 +49,34 @@ class KnowledgeService:
             dimension=settings.EMBEDDING_DIMENSION,
         )
 
-        self.vector_store = vector_store or VectorStore(
-            collection_name=settings.MILVUS_COLLECTION,
-            host=settings.MILVUS_HOST,
-            port=settings.MILVUS_PORT,
-            dimension=settings.EMBEDDING_DIMENSION,
-            index_type=settings.MILVUS_INDEX_TYPE,
-            metric_type=settings.MILVUS_METRIC_TYPE,
-        )
+        if vector_store is None:
+            index_type, index_params, search_params = settings.milvus_index_config(settings.MILVUS_COLLECTION)
+            vector_store = VectorStore(
+                collection_name=settings.MILVUS_COLLECTION,
+                host=settings.MILVUS_HOST,
+                port=settings.MILVUS_PORT,
+                dimension=settings.EMBEDDING_DIMENSION,
+                index_type=index_type,
+                metric_type=settings.MILVUS_METRIC_TYPE,
+                index_params=index_params,
+                search_params=search_params,
+            )
+        self.vector_store = vector_store
 
         self.reranker = Reranker()
 
+        # 本地 BM25 索引，与 Milvus 向量结果做 RRF 融合；首次检索或启动预热时从 Milvus 构建
+        self.lexical_index = LexicalIndex()
+        self._lexical_lock = threading.Lock()
+        self._lexical_failed_at = 0.0
+
+        window = settings.KB_SEARCH_BATCH_WINDOW_MS / 1000.0
+        self._search_batcher: Optional[MicroBatcher] = (
+            MicroBatcher(self._ann_many, window=window, max_batch=settings.KB_SEARCH_BATCH_MAX)
+            if window > 0
+            else None
+        )
+
         logger.info(
             "KnowledgeService initialised (chunk_size=%s, chunk_overlap=%s)",
             self.chunk_size,
@@ -73,9 +96,8 @@ class KnowledgeService:
         if not documents:
             return {"add_count": 0, "ids": []}
 
-        embeddings = await asyncio.to_thread(
-            self.embedder.embed_documents,
-            [doc.page_content for doc in documents],
+        embeddings = await self.embedder.aembed_documents(
+            [doc.page_content for doc in documents]
         )
 
         result = await asyncio.to_thread(self._store_documents, documents, embeddings)
@@ -99,25 +121,95 @@ class KnowledgeService:
 
     async def add_recipe(self, recipe_id: str, recipe_data: Dict[str, Any]) -> bool:
         document = self._format_recipe_document(recipe_data)
-        metadata = {
-            "recipe_id": recipe_id,
-            "name": recipe_data.get("name", ""),
-            "category": recipe_data.get("category", ""),
-            "difficulty": recipe_data.get("difficulty", ""),
-        }
-        result = await self.ingest_text(document, metadata=metadata)
+        result = await self.ingest_text(document, metadata=self._recipe_metadata(recipe_id, recipe_data))
         return result.get("add_count", 0) > 0
 
-    async def add_recipes_batch(self, recipes: List[Dict[str, Any]]) -> Dict[str, int]:
-        success_count = 0
-        error_count = 0
-        for recipe in recipes:
-            recipe_id = recipe.get("id") or recipe.get("recipe_id") or str(uuid4())
-            if await self.add_recipe(recipe_id, recipe):
-                success_count += 1
-            else:
-                error_count += 1
-        return {"success": success_count, "error": error_count, "total": len(recipes)}
+    async def add_recipes_batch(self, recipes: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Bulk-load recipes into Milvus.
+
+        All recipes are chunked up front, embedded in request-sized groups with bounded
+        concurrency, inserted in large segments and flushed once at the end (or earlier
+        when the KB_INGEST_FLUSH_* thresholds trip) instead of once per recipe.
+        Besides the success/error/total counts, `items` reports per-recipe outcomes.
+        """
+        if not recipes:
+            return {"success": 0, "error": 0, "total": 0, "items": []}
+
+        prepared = await asyncio.to_thread(self._prepare_recipe_batch, recipes)
+        items: List[Dict[str, Any]] = [
+            {"recipe_id": recipe_id, "success": False, "chunks": len(documents)}
+            for recipe_id, documents in prepared
+        ]
+        for item in items:
+            if not item["chunks"]:
+                item["error"] = "empty recipe document"
+
+        groups = _pack_groups(
+            [len(documents) for _, documents in prepared],
+            max(1, settings.KB_INGEST_EMBED_BATCH_SIZE),
+        )
+        concurrency = max(1, settings.KB_INGEST_EMBED_CONCURRENCY)
+
+        async def embed_group(group: List[int]) -> Tuple[List[int], Optional[List[List[float]]]]:
+            texts = [doc.page_content for index in group for doc in prepared[index][1]]
+            try:
+                return group, await self.embedder.aembed_documents(texts)
+            except Exception as exc:
+                logger.error("Embedding {} recipe chunks failed: {}", len(texts), exc)
+                for index in group:
+                    items[index]["error"] = f"embedding failed: {exc}"
+                return group, None
+
+        insert_batch_size = max(1, settings.KB_INGEST_INSERT_BATCH_SIZE)
+        segment: List[Tuple[int, List[Document], List[List[float]]]] = []
+        segment_rows = 0
+        pending_groups = iter(groups)
+        in_flight: Set[asyncio.Future] = set()
+        try:
+            # 同时在途的嵌入请求不超过并发上限，完成一个再补一个，大批量导入时内存不随菜谱数增长；
+            # 嵌入结果按完成顺序进入写入缓冲，攒满一个 segment 再插入 Milvus
+            for group in islice(pending_groups, concurrency):
+                in_flight.add(asyncio.ensure_future(embed_group(group)))
+            while in_flight:
+                done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for group in islice(pending_groups, len(done)):
+                    in_flight.add(asyncio.ensure_future(embed_group(group)))
+                for finished in done:
+                    group, vectors = finished.result()
+                    if vectors is None:
+                        continue
+                    offset = 0
+                    for index in group:
+                        documents = prepared[index][1]
+                        segment.append((index, documents, vectors[offset:offset + len(documents)]))
+                        offset += len(documents)
+                        segment_rows += len(documents)
+                if segment_rows >= insert_batch_size:
+                    await asyncio.to_thread(self._insert_segment, segment, items)
+                    segment, segment_rows = [], 0
+            if segment:
+                await asyncio.to_thread(self._insert_segment, segment, items)
+        finally:
+            for task in in_flight:
+                task.cancel()
+
+        flushed = await asyncio.to_thread(self.vector_store.flush)
+        success_count = sum(1 for item in items if item["success"])
+        logger.info(
+            "Batch ingested {}/{} recipes ({} chunks, flushed={})",
+            success_count,
+            len(items),
+            sum(item["chunks"] for item in items if item["success"]),
+            flushed,
+        )
+        return {
+            "success": success_count,
+            "error": len(items) - success_count,
+            "total": len(items),
+            "flushed": flushed,
+            "items": items,
+        }
 
     async def search(
         self,
@@ -127,49 +219,246 @@ class KnowledgeService:
         similarity_threshold: Optional[float] = None,
         filter_expr: Optional[str] = None,
         filter_by_similarity: bool = True,
+        report: Optional[Dict[str, int]] = None,
     ) -> List[Dict[str, Any]]:
+        """
+        Vector (plus lexical) search with near-duplicate pruning and optional rerank.
+
+        If `report` is given it receives `candidates` (before pruning) and `pruned`.
+        """
         if not query or not query.strip():
             return []
 
         top_k = top_k or settings.KB_TOP_K
-        similarity_threshold = (
-            similarity_threshold if similarity_threshold is not None else settings.KB_SIMILARITY_THRESHOLD
+        lookup = (query, self._recall_k(top_k, filter_expr), filter_expr)
+        if self._search_batcher is not None:
+            # 并发请求在批处理窗口内合并为一次嵌入 + 一次 Milvus 检索
+            results = await self._search_batcher.submit(lookup)
+        else:
+            results = (await self._ann_many([lookup]))[0]
+        return await self._finalize(
+            query, results, top_k, similarity_threshold, filter_by_similarity, filter_expr, report
         )
 
-        # 如果启用 reranker，先召回更多候选文档
-        recall_k = top_k
-        if self.reranker.enabled:
-            recall_k = settings.RERANK_MAX_CANDIDATES  # 召回更多文档用于重排
+    async def search_many(
+        self,
+        queries: Sequence[str],
+        *,
+        top_k: Optional[int] = None,
+        similarity_threshold: Optional[float] = None,
+        filter_expr: Optional[str] = None,
+        filter_by_similarity: bool = True,
+        reports: Optional[List[Dict[str, int]]] = None,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Search several queries at once: one embedding request and one batched ANN call,
+        then per-query threshold/rerank. Returns one result list per query, in order.
+        If `reports` is given it is extended with one pruning report per query.
+        """
+        top_k = top_k or settings.KB_TOP_K
+        recall_k = self._recall_k(top_k, filter_expr)
+        live = [index for index, query in enumerate(queries) if query and query.strip()]
+        outputs: List[List[Dict[str, Any]]] = [[] for _ in queries]
+        query_reports: List[Dict[str, int]] = [{"candidates": 0, "pruned": 0} for _ in queries]
+        if reports is not None:
+            reports.extend(query_reports)
+        if not live:
+            return outputs
+
+        results = await self._ann_many([(queries[index], recall_k, filter_expr) for index in live])
+        finalized = await asyncio.gather(
+            *(
+                self._finalize(
+                    queries[index],
+                    result,
+                    top_k,
+                    similarity_threshold,
+                    filter_by_similarity,
+                    filter_expr,
+                    query_reports[index],
+                )
+                for index, result in zip(live, results)
+            )
+        )
+        for index, result in zip(live, finalized):
+            outputs[index] = result
+        return outputs
+
+    def _recall_k(self, top_k: int, filter_expr: Optional[str] = None) -> int:
+        # 如果启用 reranker，先召回更多候选文档用于重排；混合检索下词法召回补足精确匹配，候选池可以更小
+        if not self.reranker.enabled:
+            return top_k
+        if self._hybrid_active(filter_expr) and self.lexical_index.ready:
+            return max(top_k, settings.KB_HYBRID_CANDIDATES)
+        return settings.RERANK_MAX_CANDIDATES
+
+    @staticmethod
+    def _dedup_by_vector() -> bool:
+        return settings.KB_DEDUP_ENABLED and 0 < settings.KB_DEDUP_EMBEDDING_SIMILARITY <= 1
+
+    @staticmethod
+    def _hybrid_active(filter_expr: Optional[str]) -> bool:
+        # Milvus 过滤表达式无法在本地索引上求值，带过滤条件的检索只走向量
+        return settings.KB_HYBRID_ENABLED and not filter_expr
+
+    def refresh_lexical_index(self, *, blocking: bool = True) -> bool:
+        """Rebuild the BM25 index from the Milvus collection; False if skipped or failed."""
+        iter_documents = getattr(self.vector_store, "iter_documents", None)
+        if iter_documents is None or not self._lexical_lock.acquire(blocking=blocking):
+            return False
+        try:
+            started = time.perf_counter()
+            self.lexical_index.rebuild(
+                (doc["id"], doc["content"], doc["metadata"]) for doc in iter_documents()
+            )
+            logger.info(
+                "Lexical index rebuilt: {} chunks in {:.0f} ms",
+                len(self.lexical_index),
+                (time.perf_counter() - started) * 1000,
+            )
+            return True
+        except Exception as exc:
+            self._lexical_failed_at = time.monotonic()
+            logger.warning("Lexical index rebuild failed: {}", exc)
+            return False
+        finally:
+            self._lexical_lock.release()
+
+    async def _lexical_hits(self, query: str, limit: int, filter_expr: Optional[str]) -> List[Dict[str, Any]]:
+        if not self._hybrid_active(filter_expr) or not hasattr(self.vector_store, "iter_documents"):
+            return []
+        index = self.lexical_index
+        if not index.ready:
+            if time.monotonic() - self._lexical_failed_at < settings.KB_RECONNECT_BACKOFF:
+                return []
+            # 其他请求在构建期间直接跳过词法召回
+            await asyncio.to_thread(self.refresh_lexical_index, blocking=False)
+            if not index.ready:
+                return []
+        elif (
+            settings.KB_HYBRID_REFRESH_INTERVAL > 0
+            and time.monotonic() - index.built_at > settings.KB_HYBRID_REFRESH_INTERVAL
+            and not self._lexical_lock.locked()
+        ):
+            threading.Thread(
+                target=self.refresh_lexical_index,
+                kwargs={"blocking": False},
+                name="kb-lexical-refresh",
+                daemon=True,
+            ).start()
+        return index.search(query, limit)
+
+    @staticmethod
+    def _confident_hit(query: str, lexical: List[Dict[str, Any]], vector_top: Optional[str]) -> Optional[str]:
+        """Id of the top lexical hit if both retrievers agree on it or the query names its dish."""
+        top = lexical[0]
+        if vector_top is not None and top.get("id") == vector_top:
+            return vector_top
+        name = normalize_text(str((top.get("metadata") or {}).get("name") or "")).strip()
+        return top.get("id") if len(name) >= 2 and name in normalize_text(query) else None
+
+    async def _ann_many(
+        self,
+        lookups: List[Tuple[str, int, Optional[str]]],
+    ) -> List[List[Dict[str, Any]]]:
+        """Embed all queries in one request and run one ANN call per distinct filter."""
+        embeddings = await self.embedder.aembed_documents([query for query, _, _ in lookups])
+        groups: Dict[Optional[str], List[int]] = {}
+        for index, (_, _, filter_expr) in enumerate(lookups):
+            groups.setdefault(filter_expr, []).append(index)
+
+        # 近重复裁剪需要分块向量时一并取回
+        extra: Dict[str, Any] = {"output_vectors": True} if self._dedup_by_vector() else {}
+        results: List[List[Dict[str, Any]]] = [[] for _ in lookups]
+        for filter_expr, indices in groups.items():
+            # 同一批次取最大召回数，再按各请求的召回数截断
+            limit = max(lookups[index][1] for index in indices)
+            batch = await asyncio.to_thread(
+                self.vector_store.search_batch,
+                [embeddings[index] for index in indices],
+                limit,
+                filter_expr,
+                **extra,
+            )
+            for index, hits in zip(indices, batch):
+                results[index] = hits[: lookups[index][1]]
+        return results
 
-        embedding = await asyncio.to_thread(self.embedder.embed_query, query)
-        results = await asyncio.to_thread(
-            self.vector_store.search,
-            embedding,
-            recall_k,  # 使用更大的召回数量
-            filter_expr,
+    async def _finalize(
+        self,
+        query: str,
+        results: List[Dict[str, Any]],
+        top_k: int,
+        similarity_threshold: Optional[float],
+        filter_by_similarity: bool,
+        filter_expr: Optional[str] = None,
+        report: Optional[Dict[str, int]] = None,
+    ) -> List[Dict[str, Any]]:
+        similarity_threshold = (
+            similarity_threshold if similarity_threshold is not None else settings.KB_SIMILARITY_THRESHOLD
         )
 
         candidates = results
         if filter_by_similarity and similarity_threshold is not None:
             candidates = [r for r in candidates if r.get("score", 0.0) >= similarity_threshold]
 
+        rerank = self.reranker.enabled
+        lexical = await self._lexical_hits(
+            query,
+            max(top_k, settings.KB_HYBRID_CANDIDATES) if rerank else top_k,
+            filter_expr,
+        )
+        if lexical:
+            # 词法与向量结果按 RRF 融合；仅由词法召回的分块没有向量相似度 score
+            vector_top = candidates[0].get("id") if candidates else None
+            candidates = reciprocal_rank_fusion(
+                {"vector": candidates, "lexical": lexical},
+                k=settings.KB_HYBRID_RRF_K,
+            )
+            confident = self._confident_hit(query, lexical, vector_top) if settings.KB_HYBRID_SKIP_RERANK else None
+            if confident is not None:
+                # 精确命中时不再调用 reranker，命中分块置顶，其余保持 RRF 顺序
+                candidates.sort(key=lambda r: r.get("id") != confident)
+                rerank = False
+
+        # 重叠分块与重复上传的近重复候选只保留排名最靠前的一条，减少 rerank 请求与 LLM 上下文
+        total = len(candidates)
+        candidates, pruned = prune_candidates(candidates)
+        if report is not None:
+            report.update({"candidates": total, "pruned": pruned})
+        if pruned:
+            logger.debug("Pruned {} near-duplicate candidates of {} for query: {}", pruned, total, query[:50])
+
         # 使用 reranker 精排
-        if candidates and self.reranker.enabled:
+        if candidates and rerank:
             candidates = await self.reranker.rerank(query, candidates, top_k)
+            # reranker 熔断或超出延迟预算时按原顺序返回（无 rerank_score），改按向量相似度过滤
+            rerank = any("rerank_score" in r for r in candidates)
 
-        if self.reranker.enabled:
+        if rerank:
             candidates = [
                 r
                 for r in candidates
                 if r.get("rerank_score", 0.0) >= settings.KB_RERANK_SCORE_THRESHOLD
             ]
-        elif not filter_by_similarity and similarity_threshold is not None:
-            candidates = [r for r in candidates if r.get("score", 0.0) >= similarity_threshold]
+        else:
+            # 未经 rerank 时向量命中按相似度过滤，仅由词法召回的分块按查询词覆盖率过滤
+            candidates = [r for r in candidates if self._passes_without_rerank(r, similarity_threshold)]
 
         return candidates[:top_k]
 
+    @staticmethod
+    def _passes_without_rerank(hit: Dict[str, Any], similarity_threshold: Optional[float]) -> bool:
+        if hit.get("retrievers") == ["lexical"]:
+            return hit.get("lexical_match", 0.0) >= settings.KB_LEXICAL_MATCH_THRESHOLD
+        return similarity_threshold is None or hit.get("score", 0.0) >= similarity_threshold
+
     async def delete_recipe(self, recipe_id: str) -> bool:
-        return await asyncio.to_thread(self.vector_store.delete_documents, [recipe_id])
+        # 分块 id 为 "{recipe_id}_{序号}"，按 recipe_id 删除该菜谱的全部分块
+        deleted = await asyncio.to_thread(self.vector_store.delete_by_recipe, [recipe_id])
+        if deleted:
+            self.lexical_index.remove_where(lambda metadata: metadata.get("recipe_id") == recipe_id)
+        return deleted
 
     async def get_stats(self) -> Dict[str, Any]:
         def _stats() -> Dict[str, Any]:
@@ -186,7 +475,10 @@ class KnowledgeService:
         return await asyncio.to_thread(_stats)
 
     async def clear(self) -> bool:
-        return await asyncio.to_thread(self.vector_store.clear_collection)
+        cleared = await asyncio.to_thread(self.vector_store.clear_collection)
+        if cleared:
+            self.lexical_index.clear()
+        return cleared
 
     async def close(self) -> None:
         await asyncio.to_thread(self.vector_store.close)
@@ -204,6 +496,35 @@ class KnowledgeService:
         if not documents or not embeddings:
             return {"add_count": 0, "ids": [], "stored": False}
 
+        ids, contents, metadatas = self._document_rows(documents)
+        success = self.vector_store.add_documents(
+            ids=ids,
+            embeddings=embeddings,
+            documents=contents,
+            metadatas=metadatas,
+        )
+        if success:
+            self._index_lexically(ids, contents, metadatas)
+
+        return {"add_count": len(ids) if success else 0, "ids": ids, "stored": success}
+
+    def _index_lexically(
+        self,
+        ids: List[str],
+        contents: List[str],
+        metadatas: List[Dict[str, Any]],
+    ) -> None:
+        # 与 Milvus 中存储的元数据字段保持一致，检索结果格式不因召回来源而不同
+        fields = ("recipe_id", "name", "category", "difficulty")
+        self.lexical_index.add_many(
+            (doc_id, content, {key: metadata.get(key, "") for key in fields})
+            for doc_id, content, metadata in zip(ids, contents, metadatas)
+        )
+
+    def _document_rows(
+        self,
+        documents: Sequence[Document],
+    ) -> Tuple[List[str], List[str], List[Dict[str, Any]]]:
         ids: List[str] = []
         contents: List[str] = []
         metadatas: List[Dict[str, Any]] = []
@@ -219,15 +540,64 @@ class KnowledgeService:
             ids.append(chunk_id)
             contents.append(doc.page_content)
             metadatas.append(metadata)
+        return ids, contents, metadatas
+
+    def _prepare_recipe_batch(
+        self,
+        recipes: List[Dict[str, Any]],
+    ) -> List[Tuple[str, List[Document]]]:
+        prepared: List[Tuple[str, List[Document]]] = []
+        for recipe in recipes:
+            recipe_id = recipe.get("id") or recipe.get("recipe_id") or str(uuid4())
+            text = self._format_recipe_document(recipe)
+            documents = (
+                self._split_into_documents(text, self._recipe_metadata(recipe_id, recipe))
+                if text.strip()
+                else []
+            )
+            prepared.append((recipe_id, documents))
+        return prepared
+
+    def _insert_segment(
+        self,
+        segment: List[Tuple[int, List[Document], List[List[float]]]],
+        items: List[Dict[str, Any]],
+    ) -> None:
+        ids: List[str] = []
+        contents: List[str] = []
+        metadatas: List[Dict[str, Any]] = []
+        embeddings: List[List[float]] = []
+        for _, documents, vectors in segment:
+            # 分块编号按菜谱计算，与单条 add_recipe 生成的 ID 保持一致
+            doc_ids, doc_contents, doc_metadatas = self._document_rows(documents)
+            ids.extend(doc_ids)
+            contents.extend(doc_contents)
+            metadatas.extend(doc_metadatas)
+            embeddings.extend(vectors)
 
         success = self.vector_store.add_documents(
             ids=ids,
             embeddings=embeddings,
             documents=contents,
             metadatas=metadatas,
+            flush=False,
         )
-
-        return {"add_count": len(ids) if success else 0, "ids": ids, "stored": success}
+        for index, _, _ in segment:
+            items[index]["success"] = success
+            if not success:
+                items[index]["error"] = "milvus insert failed"
+        if success:
+            self._index_lexically(ids, contents, metadatas)
+            self.vector_store.flush_if_due(settings.KB_INGEST_FLUSH_ROWS, settings.KB_INGEST_FLUSH_INTERVAL)
+
+    @staticmethod
+    def _recipe_metadata(recipe_id: str, recipe: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "recipe_id": recipe_id,
+            "name": recipe.get("name", ""),
+            "category": recipe.get("category", ""),
+            "difficulty": recipe.get("difficulty", ""),
+        }
 
     def _format_recipe_document(self, recipe: Dict[str, Any]) -> str:
         parts: List[str] = []
@@ -276,3 +646,21 @@ class KnowledgeService:
                 parts.append(f"营养：{nutrition}")
 
         return "\n".join(parts)
+
+
+def _pack_groups(sizes: Sequence[int], limit: int) -> List[List[int]]:
+    """Group item indices so each group's total size stays within `limit` (oversized items go alone)."""
+    groups: List[List[int]] = []
+    current: List[int] = []
+    total = 0
+    for index, size in enumerate(sizes):
+        if not size:
+            continue
+        if current and total + size > limit:
+            groups.append(current)
+            current, total = [], 0
+        current.append(index)
+        total += size
+    if current:
+        groups.append(current)
+    return groups
@@ -0,0 +1,217 @@
+"""
+In-process BM25 index over knowledge-base chunks.
+
+Embeddings tend to miss exact dish names and rare ingredient terms. This
+index scores chunks lexically so `KnowledgeService.search` can fuse them
+with the Milvus ANN hits through reciprocal rank fusion (RRF).
+
+Tokenisation is Chinese-aware without a segmenter. Runs of CJK characters
+become overlapping character bigrams (a lone character stays a unigram).
+Latin letters and digits become lower-cased words.
+
+Milvus remains the source of truth. The index is built from the collection,
+kept in sync on ingest/delete/clear, and rebuilt periodically so that
+other processes' writes are picked up.
+"""
+from __future__ import annotations
+
+import heapq
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+_TOKEN_RUNS = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+|[a-z0-9]+")
+
+
+def normalize_text(text: str) -> str:
+    return unicodedata.normalize("NFKC", text or "").lower()
+
+
+def bigram_tokens(text: str) -> List[str]:
+    """Character bigrams for CJK runs, whole words for Latin/digit runs."""
+    tokens: List[str] = []
+    for run in _TOKEN_RUNS.findall(normalize_text(text)):
+        if not run.isascii() and len(run) > 1:
+            tokens.extend(run[index:index + 2] for index in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+class LexicalIndex:
+    """Thread-safe BM25 inverted index keyed by document id."""
+
+    def __init__(self, *, k1: float = 1.5, b: float = 0.75) -> None:
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._lengths: Dict[str, int] = {}
+        self._documents: Dict[str, Dict[str, Any]] = {}
+        self._total_length = 0
+        # 重建期间的增删记录，换入新索引前重放，避免丢失重建过程中的写入
+        self._journal: Optional[List[Tuple[str, Any]]] = None
+        self.built_at: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    @property
+    def ready(self) -> bool:
+        return self.built_at is not None
+
+    def add(self, doc_id: str, content: str, metadata: Optional[Dict[str, Any]] = None) -> None:
+        """Index (or re-index) one chunk; `metadata` is returned with search hits."""
+        counts = Counter(bigram_tokens(content))
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append(("add", (doc_id, content, metadata)))
+            self._remove_locked(doc_id)
+            for token, count in counts.items():
+                self._postings.setdefault(token, {})[doc_id] = count
+            length = sum(counts.values())
+            self._lengths[doc_id] = length
+            self._total_length += length
+            self._documents[doc_id] = {"id": doc_id, "content": content, "metadata": dict(metadata or {})}
+
+    def add_many(self, documents: Iterable[Tuple[str, str, Optional[Dict[str, Any]]]]) -> None:
+        for doc_id, content, metadata in documents:
+            self.add(doc_id, content, metadata)
+
+    def remove(self, doc_ids: Sequence[str]) -> None:
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append(("remove", list(doc_ids)))
+            for doc_id in doc_ids:
+                self._remove_locked(doc_id)
+
+    def remove_where(self, predicate: Callable[[Dict[str, Any]], bool]) -> int:
+        """Remove every chunk whose metadata satisfies `predicate`; returns the number removed."""
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append(("remove_where", predicate))
+            doc_ids = [doc_id for doc_id, document in self._documents.items() if predicate(document["metadata"])]
+            for doc_id in doc_ids:
+                self._remove_locked(doc_id)
+            return len(doc_ids)
+
+    def clear(self) -> None:
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append(("clear", None))
+            self._postings.clear()
+            self._lengths.clear()
+            self._documents.clear()
+            self._total_length = 0
+            self.built_at = time.monotonic()
+
+    def rebuild(self, documents: Iterable[Tuple[str, str, Optional[Dict[str, Any]]]]) -> None:
+        """Replace the whole index with `documents` (built off-lock, swapped in atomically)."""
+        fresh = LexicalIndex(k1=self.k1, b=self.b)
+        with self._lock:
+            self._journal = []
+        try:
+            fresh.add_many(documents)
+        except BaseException:
+            with self._lock:
+                self._journal = None
+            raise
+        with self._lock:
+            for op, args in self._journal:
+                if op == "add":
+                    fresh.add(*args)
+                elif op == "remove":
+                    fresh.remove(args)
+                elif op == "remove_where":
+                    fresh.remove_where(args)
+                else:
+                    fresh.clear()
+            self._journal = None
+            self._postings = fresh._postings
+            self._lengths = fresh._lengths
+            self._documents = fresh._documents
+            self._total_length = fresh._total_length
+            self.built_at = time.monotonic()
+
+    def search(self, query: str, top_k: int = 10) -> List[Dict[str, Any]]:
+        """
+        Top-k chunks by BM25; each hit carries `lexical_score`.
+
+        Hits also carry `lexical_match`: the idf-weighted share of the query's
+        indexed terms the chunk contains (0-1). Unlike BM25 it is comparable across
+        queries, so it can gate hits that have no vector similarity.
+        """
+        terms = set(bigram_tokens(query))
+        if not terms or top_k <= 0:
+            return []
+        with self._lock:
+            total = len(self._lengths)
+            if not total:
+                return []
+            avg_length = self._total_length / total
+            scores: Dict[str, float] = {}
+            matched: Dict[str, float] = {}
+            indexed_weight = 0.0
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1.0 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+                indexed_weight += idf
+                for doc_id, tf in postings.items():
+                    norm = self.k1 * (1.0 - self.b + self.b * self._lengths[doc_id] / avg_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1.0) / (tf + norm)
+                    matched[doc_id] = matched.get(doc_id, 0.0) + idf
+            best = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+            return [
+                {
+                    **self._documents[doc_id],
+                    "lexical_score": score,
+                    "lexical_match": matched[doc_id] / indexed_weight,
+                }
+                for doc_id, score in best
+            ]
+
+    def _remove_locked(self, doc_id: str) -> None:
+        if doc_id not in self._documents:
+            return
+        document = self._documents.pop(doc_id)
+        for token in set(bigram_tokens(document["content"])):
+            postings = self._postings.get(token)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[token]
+        self._total_length -= self._lengths.pop(doc_id, 0)
+
+
+def reciprocal_rank_fusion(
+    ranked: Dict[str, List[Dict[str, Any]]],
+    *,
+    k: int = 60,
+) -> List[Dict[str, Any]]:
+    """
+    Fuse ranked hit lists by `sum(1 / (k + rank))` over the lists each id appears in.
+
+    The first list's copy of a document wins on field conflicts. Every fused hit
+    carries `rrf_score` and `retrievers` (names of the lists it came from).
+    """
+    fused: Dict[str, Dict[str, Any]] = {}
+    for name, hits in ranked.items():
+        for rank, hit in enumerate(hits, start=1):
+            doc_id = hit.get("id")
+            if doc_id is None:
+                continue
+            entry = fused.get(doc_id)
+            if entry is None:
+                entry = fused[doc_id] = {**hit, "rrf_score": 0.0, "retrievers": []}
+            else:
+                for key, value in hit.items():
+                    entry.setdefault(key, value)
+            entry["rrf_score"] += 1.0 / (k + rank)
+            entry["retrievers"].append(name)
+    return sorted(fused.values(), key=lambda hit: hit["rrf_score"], reverse=True)
@@ -1,16 +1,35 @@
 """
 Fuzzy entity matcher for recipe knowledge graph queries.
+
+Scores are ``max(SequenceMatcher ratio, share of entity characters found in the
+question)`` (1.0 when the entity occurs verbatim). Instead of scoring every
+entity, a character inverted index generates candidates and bounds their
+scores: the character share is computed exactly from the postings, and the
+SequenceMatcher ratio is bounded by the multiset character overlap (and by
+rapidfuzz's LCS ratio when installed). Candidates are evaluated in descending
+bound order and evaluation stops once no remaining bound can reach the
+threshold or the current top-k, so results match an exhaustive scan.
 """
 from __future__ import annotations
 
+from collections import Counter
 from difflib import SequenceMatcher
-from typing import Dict, Iterable, List, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:  # optional vectorized scorer used to tighten the ratio bound
+    from rapidfuzz import fuzz as _rf_fuzz, process as _rf_process
+except ImportError:  # pragma: no cover - rapidfuzz is optional
+    _rf_fuzz = None
+    _rf_process = None
+
+# rapidfuzz reports percentages as floats; keep the bound conservative.
+_BOUND_EPSILON = 1e-9
 
 
 class FuzzyMatcher:
     """Approximate matcher that uses character overlap along with edit distance."""
 
-    def __init__(self, entity_dict: Dict[str, Iterable[str]]) -> None:
+    def __init__(self, entity_dict: Dict[str, Iterable[str]], *, max_scored: Optional[int] = 500) -> None:
         self.entity_dict: Dict[str, List[str]] = {
             entity_type: list(entities) for entity_type, entities in entity_dict.items()
         }
@@ -18,8 +37,145 @@ class FuzzyMatcher:
         for entity_type, entities in self.entity_dict.items():
             for entity in entities:
                 self.entity_to_type.setdefault(entity, []).append(entity_type)
+        # Upper limit on exact SequenceMatcher evaluations per call (None = unlimited).
+        self.max_scored = max_scored
+        self._build_index()
+
+    def _build_index(self) -> None:
+        self._entities: List[str] = list(self.entity_to_type)
+        self._entity_ids: Dict[str, int] = {entity: index for index, entity in enumerate(self._entities)}
+        self._postings: Dict[str, List[Tuple[int, int]]] = {}
+        self._empty_ids: List[int] = []
+        for entity_id, entity in enumerate(self._entities):
+            if not entity:
+                self._empty_ids.append(entity_id)
+            for char, count in Counter(entity).items():
+                self._postings.setdefault(char, []).append((entity_id, count))
+        # Per type: entity id -> first position in that type's list (tie-break order).
+        self._type_positions: Dict[str, Dict[int, int]] = {}
+        for entity_type, entities in self.entity_dict.items():
+            positions: Dict[int, int] = {}
+            for position, entity in enumerate(entities):
+                positions.setdefault(self._entity_ids[entity], position)
+            self._type_positions[entity_type] = positions
 
     def match(self, question: str, threshold: float = 0.85, top_k: int = 3) -> Dict[str, List[str]]:
+        if threshold <= 0:
+            return self._linear_match(question, threshold, top_k)
+
+        scored = self._top_candidates(question, self._candidates(question), threshold, top_k)
+        result: Dict[str, List[str]] = {}
+        for entity_id, _ in scored[:top_k]:
+            entity = self._entities[entity_id]
+            result[entity] = list(self.entity_to_type[entity])
+        return result
+
+    def match_entity_type(
+        self, question: str, entity_type: str, threshold: float = 0.85
+    ) -> Tuple[str | None, float]:
+        if threshold <= 0:
+            return self._linear_match_entity_type(question, entity_type, threshold)
+
+        positions = self._type_positions.get(entity_type)
+        if not positions:
+            return None, 0.0
+        candidates = {
+            entity_id: bounds
+            for entity_id, bounds in self._candidates(question).items()
+            if entity_id in positions
+        }
+        scored = self._top_candidates(question, candidates, threshold, top_k=1, order=positions)
+        if not scored or scored[0][1] <= 0.0:
+            return None, 0.0
+        entity_id, score = scored[0]
+        return self._entities[entity_id], score
+
+    # ---------------------------------------------------------------- internals
+    def _candidates(self, question: str) -> Dict[int, Tuple[float, float]]:
+        """Entity id -> (exact character share, upper bound of the SequenceMatcher ratio)."""
+        question_counts = Counter(question)
+        hits: Dict[int, int] = {}
+        overlap: Dict[int, int] = {}
+        for char, question_count in question_counts.items():
+            for entity_id, entity_count in self._postings.get(char, ()):
+                hits[entity_id] = hits.get(entity_id, 0) + entity_count
+                overlap[entity_id] = overlap.get(entity_id, 0) + min(question_count, entity_count)
+
+        question_length = len(question)
+        candidates: Dict[int, Tuple[float, float]] = {}
+        for entity_id, hit_count in hits.items():
+            entity_length = len(self._entities[entity_id])
+            share = hit_count / entity_length
+            ratio_bound = 2.0 * overlap[entity_id] / (question_length + entity_length)
+            candidates[entity_id] = (share, ratio_bound)
+        for entity_id in self._empty_ids:
+            candidates[entity_id] = (1.0, 0.0)  # "" is contained in every question
+        return candidates
+
+    def _top_candidates(
+        self,
+        question: str,
+        candidates: Dict[int, Tuple[float, float]],
+        threshold: float,
+        top_k: int,
+        order: Optional[Dict[int, int]] = None,
+    ) -> List[Tuple[int, float]]:
+        """Exact top-k (score desc, dictionary order on ties) among `candidates` scoring >= threshold."""
+        rank_key = (lambda item: (-item[0], item[1])) if order is None else (
+            lambda item: (-item[0], order[item[1]])
+        )
+        exact: Dict[int, float] = {}
+        pending: List[Tuple[float, int]] = []
+        for entity_id, (share, ratio_bound) in candidates.items():
+            entity = self._entities[entity_id]
+            if share >= 1.0 or entity in question:
+                exact[entity_id] = 1.0
+            elif ratio_bound <= share:
+                exact[entity_id] = share
+            else:
+                pending.append((ratio_bound, entity_id))
+
+        ranked = sorted(
+            ((score, entity_id) for entity_id, score in exact.items() if score >= threshold),
+            key=rank_key,
+        )
+        floor = self._floor(ranked, threshold, top_k)
+
+        pending = [item for item in pending if item[0] >= floor]
+        if pending and _rf_process is not None:
+            names = [self._entities[entity_id] for _, entity_id in pending]
+            lcs_bounds = _rf_process.cdist([question], names, scorer=_rf_fuzz.ratio)[0]
+            pending = [
+                (min(bound, float(lcs) / 100.0 + _BOUND_EPSILON), entity_id)
+                for (bound, entity_id), lcs in zip(pending, lcs_bounds)
+            ]
+        pending.sort(key=rank_key)
+
+        evaluated = 0
+        for bound, entity_id in pending:
+            if bound < floor:
+                break
+            if self.max_scored is not None and evaluated >= self.max_scored:
+                break
+            evaluated += 1
+            share = candidates[entity_id][0]
+            ratio = SequenceMatcher(None, question, self._entities[entity_id]).ratio()
+            score = max(ratio, share)
+            if score >= threshold:
+                ranked.append((score, entity_id))
+                ranked.sort(key=rank_key)
+                del ranked[top_k:]
+                floor = self._floor(ranked, threshold, top_k)
+
+        return [(entity_id, score) for score, entity_id in ranked[:top_k]]
+
+    @staticmethod
+    def _floor(ranked: List[Tuple[float, int]], threshold: float, top_k: int) -> float:
+        if top_k > 0 and len(ranked) >= top_k:
+            return max(threshold, ranked[top_k - 1][0])
+        return threshold
+
+    def _linear_match(self, question: str, threshold: float, top_k: int) -> Dict[str, List[str]]:
         candidates: List[Tuple[str, List[str], float]] = []
         for entity, types in self.entity_to_type.items():
             score = self._calculate_similarity(question, entity)
@@ -32,8 +188,8 @@ class FuzzyMatcher:
             result[entity] = list(types)
         return result
 
-    def match_entity_type(
-        self, question: str, entity_type: str, threshold: float = 0.85
+    def _linear_match_entity_type(
+        self, question: str, entity_type: str, threshold: float
     ) -> Tuple[str | None, float]:
         entities = self.entity_dict.get(entity_type, [])
         best_entity = None
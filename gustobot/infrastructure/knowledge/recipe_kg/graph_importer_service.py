@@ -4,7 +4,7 @@ Utility helpers to bootstrap the recipe knowledge graph from JSON sources.
 from __future__ import annotations
 
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional
+from typing import Any, Callable, Dict, Iterable, List, Optional
 
 from loguru import logger
 
@@ -16,6 +16,21 @@ from .recipe_json_parser import (
     load_recipe_records,
 )
 
+_import_listeners: List[Callable[[], Any]] = []
+
+
+def add_import_listener(callback: Callable[[], Any]) -> None:
+    """Register a callback run after the graph has been (re)imported, e.g. to refresh cached schemas."""
+    _import_listeners.append(callback)
+
+
+def _notify_import_listeners() -> None:
+    for callback in list(_import_listeners):
+        try:
+            callback()
+        except Exception as exc:  # pragma: no cover - listeners must not break imports
+            logger.warning(f"Graph import listener failed: {exc}")
+
 
 class RecipeGraphImporter:
     """Load recipes and ingredient metadata from JSON files into Neo4j."""
@@ -67,6 +82,7 @@ class RecipeGraphImporter:
             len(recipes),
             len(ingredients_used),
         )
+        _notify_import_listeners()
         return True
 
     def _is_graph_empty(self) -> bool:
@@ -3,19 +3,223 @@ Keyword based question classifier for the Neo4j KBQA pipeline.
 """
 from __future__ import annotations
 
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
 from dataclasses import dataclass
 from importlib import resources
-from typing import Dict, Iterable, List, Optional, Sequence, Set
+from pathlib import Path
+from types import MappingProxyType
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Set, Tuple
 
 import ahocorasick
+from loguru import logger
+
+from gustobot.config import settings
 from .fuzzy_matcher import FuzzyMatcher
 
 
+_DICT_FILES: Tuple[str, ...] = (
+    "recipe.txt",
+    "gongyi.txt",
+    "haoshi.txt",
+    "kouwei.txt",
+    "leixing.txt",
+    "yongliang.txt",
+    "caixi.txt",
+    "material.txt",
+    "deny.txt",
+)
+_ARTIFACT_FORMAT = 2
+
+RELATION_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    "HAS_MAIN_INGREDIENT": ("主食材", "主要食材", "主要材料", "由什么做", "要多少", "主料", "要用多少", "有哪些"),
+    "HAS_AUX_INGREDIENT": ("辅料", "由什么做", "需要多少", "要用多少", "有哪些"),
+}
+
+PROPERTY_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    "做法": ("做法", "怎么做", "做怎么"),
+    "口味": ("口味", "味道"),
+    "工艺": ("工艺",),
+    "类型": ("类型",),
+    "耗时": ("多久", "耗时"),
+    "菜系": ("菜系",),
+}
+
+
 def _load_dict(path) -> List[str]:
     with path.open("r", encoding="utf-8") as fp:  # type: ignore[call-arg]
         return [line.strip() for line in fp if line.strip()]
 
 
+def _default_dict_root():
+    return resources.files("gustobot.infrastructure.knowledge.recipe_kg") / "dicts"
+
+
+def dict_fingerprint(dict_root=None) -> str:
+    """Fingerprint of the dictionary files (name, size, mtime); changes whenever a dict is edited."""
+    root = Path(str(dict_root if dict_root is not None else _default_dict_root()))
+    digest = hashlib.sha256(f"v{_ARTIFACT_FORMAT}:{root.resolve()}".encode("utf-8"))
+    for name in _DICT_FILES:
+        stat = (root / name).stat()
+        digest.update(f"|{name}:{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+@dataclass(frozen=True)
+class ClassifierArtifact:
+    """
+    Immutable, prebuilt state shared by every `QuestionClassifier` in the process:
+    the dictionaries, the Aho-Corasick automaton, the word -> type map and the fuzzy matcher.
+    """
+
+    fingerprint: str
+    words: Mapping[str, Tuple[str, ...]]
+    word_type_dict: Mapping[str, Tuple[str, ...]]
+    region_tree: ahocorasick.Automaton
+    fuzzy_matcher: FuzzyMatcher
+
+
+def _build_word_type_dict(
+    region_words: Iterable[str], words: Mapping[str, Tuple[str, ...]]
+) -> Dict[str, Tuple[str, ...]]:
+    """Assign each word its first matching type, in dictionary priority order (set lookups)."""
+    priority = [
+        ("Dish", frozenset(words["recipe"])),
+        ("工艺", frozenset(words["gongyi"])),
+        ("耗时", frozenset(words["haoshi"])),
+        ("口味", frozenset(words["kouwei"])),
+        ("类型", frozenset(words["leixing"])),
+        ("菜系", frozenset(words["caixi"])),
+        ("Ingredient", frozenset(words["material"])),
+        ("relation", frozenset(term for keywords in RELATION_KEYWORDS.values() for term in keywords)),
+    ]
+    mapping: Dict[str, Tuple[str, ...]] = {}
+    for word in region_words:
+        mapping[word] = next(((label,) for label, members in priority if word in members), ())
+    return mapping
+
+
+def _build_actree(words: Iterable[str]) -> ahocorasick.Automaton:
+    tree = ahocorasick.Automaton()
+    for index, word in enumerate(words):
+        tree.add_word(word, (index, word))
+    tree.make_automaton()
+    return tree
+
+
+def build_classifier_artifact(dict_root=None) -> ClassifierArtifact:
+    """Read the dictionaries and build the classifier state from scratch."""
+    if dict_root is None:
+        dict_root = _default_dict_root()
+    words = {name[: -len(".txt")]: tuple(_load_dict(dict_root / name)) for name in _DICT_FILES}
+    relation_terms = [term for keywords in RELATION_KEYWORDS.values() for term in keywords]
+
+    region_words: Set[str] = set(relation_terms)
+    for name in ("recipe", "gongyi", "haoshi", "kouwei", "leixing", "caixi", "material"):
+        region_words.update(words[name])
+
+    fuzzy_matcher = FuzzyMatcher(
+        {
+            "Dish": words["recipe"],
+            "Ingredient": words["material"],
+            "菜系": words["caixi"],
+            "工艺": words["gongyi"],
+            "口味": words["kouwei"],
+            "类型": words["leixing"],
+            "耗时": words["haoshi"],
+        }
+    )
+    return ClassifierArtifact(
+        fingerprint=dict_fingerprint(dict_root),
+        words=MappingProxyType(words),
+        word_type_dict=MappingProxyType(_build_word_type_dict(region_words, words)),
+        region_tree=_build_actree(region_words),
+        fuzzy_matcher=fuzzy_matcher,
+    )
+
+
+def _read_cached_artifact(cache_path: Path, fingerprint: str) -> Optional[ClassifierArtifact]:
+    try:
+        with cache_path.open("rb") as fp:
+            cached_fingerprint, state = pickle.load(fp)
+    except FileNotFoundError:
+        return None
+    except Exception as exc:
+        logger.warning(f"Ignoring unreadable classifier cache {cache_path}: {exc}")
+        return None
+    if cached_fingerprint != fingerprint:
+        return None
+    words, word_type_dict, region_tree, fuzzy_matcher = state
+    return ClassifierArtifact(
+        fingerprint=fingerprint,
+        words=MappingProxyType(words),
+        word_type_dict=MappingProxyType(word_type_dict),
+        region_tree=region_tree,
+        fuzzy_matcher=fuzzy_matcher,
+    )
+
+
+def _write_cached_artifact(cache_path: Path, artifact: ClassifierArtifact) -> None:
+    state = (
+        dict(artifact.words),
+        dict(artifact.word_type_dict),
+        artifact.region_tree,
+        artifact.fuzzy_matcher,
+    )
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename so concurrently starting workers never read a partial file.
+        fd, tmp_name = tempfile.mkstemp(dir=cache_path.parent, prefix=cache_path.name, suffix=".tmp")
+        with os.fdopen(fd, "wb") as fp:
+            pickle.dump((artifact.fingerprint, state), fp, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_name, cache_path)
+    except Exception as exc:
+        logger.warning(f"Failed to write classifier cache {cache_path}: {exc}")
+
+
+def load_classifier_artifact(dict_root=None, cache_path: Optional[str] = None) -> ClassifierArtifact:
+    """
+    Load the artifact from the on-disk pickle when it matches the current dictionaries,
+    otherwise build it and refresh the pickle. An empty `cache_path` disables the disk tier.
+    """
+    fingerprint = dict_fingerprint(dict_root)
+    path = Path(cache_path) if cache_path else None
+    if path is not None:
+        artifact = _read_cached_artifact(path, fingerprint)
+        if artifact is not None:
+            return artifact
+
+    started = time.perf_counter()
+    artifact = build_classifier_artifact(dict_root)
+    logger.info(
+        f"Built recipe_kg classifier artifact in {(time.perf_counter() - started) * 1000:.0f} ms"
+    )
+    if path is not None:
+        _write_cached_artifact(path, artifact)
+    return artifact
+
+
+_artifact: Optional[ClassifierArtifact] = None
+_artifact_lock = threading.Lock()
+
+
+def get_classifier_artifact() -> ClassifierArtifact:
+    """Return the process-wide artifact for the packaged dictionaries, reloading if they changed."""
+    global _artifact
+    fingerprint = dict_fingerprint()
+    artifact = _artifact
+    if artifact is not None and artifact.fingerprint == fingerprint:
+        return artifact
+    with _artifact_lock:
+        if _artifact is None or _artifact.fingerprint != fingerprint:
+            _artifact = load_classifier_artifact(cache_path=settings.RECIPE_KG_CLASSIFIER_CACHE_PATH)
+        return _artifact
+
+
 @dataclass
 class ClassificationResult:
     question_type: str
@@ -25,91 +229,33 @@ class ClassificationResult:
 class QuestionClassifier:
     """Use keyword matching to classify recipe related questions."""
 
-    def __init__(self, dict_root=None) -> None:
-        if dict_root is None:
-            dict_root = resources.files("gustobot.infrastructure.knowledge.recipe_kg") / "dicts"
-
-        self.recipe_words = _load_dict(dict_root / "recipe.txt")
-        self.gongyi_words = _load_dict(dict_root / "gongyi.txt")
-        self.haoshi_words = _load_dict(dict_root / "haoshi.txt")
-        self.kouwei_words = _load_dict(dict_root / "kouwei.txt")
-        self.leixing_words = _load_dict(dict_root / "leixing.txt")
-        self.yongliang_words = _load_dict(dict_root / "yongliang.txt")
-        self.caixi_words = _load_dict(dict_root / "caixi.txt")
-        self.material_words = _load_dict(dict_root / "material.txt")
-        self.deny_words = _load_dict(dict_root / "deny.txt")
-
-        self.relation_keywords: Dict[str, List[str]] = {
-            "HAS_MAIN_INGREDIENT": ["主食材", "主要食材", "主要材料", "由什么做", "要多少", "主料", "要用多少", "有哪些"],
-            "HAS_AUX_INGREDIENT": ["辅料", "由什么做", "需要多少", "要用多少", "有哪些"],
-        }
-        relation_terms: List[str] = [term for keywords in self.relation_keywords.values() for term in keywords]
-
-        self.region_words: Set[str] = set(
-            self.recipe_words
-            + self.gongyi_words
-            + self.haoshi_words
-            + self.kouwei_words
-            + self.leixing_words
-            + self.caixi_words
-            + self.material_words
-            + relation_terms
-        )
-
-        self.region_tree = self._build_actree(self.region_words)
-        self.word_type_dict = self._build_word_type_dict()
-
-        self.property_keywords: Dict[str, List[str]] = {
-            "做法": ["做法", "怎么做", "做怎么"],
-            "口味": ["口味", "味道"],
-            "工艺": ["工艺"],
-            "类型": ["类型"],
-            "耗时": ["多久", "耗时"],
-            "菜系": ["菜系"],
-        }
+    def __init__(self, dict_root=None, *, artifact: Optional[ClassifierArtifact] = None) -> None:
+        if artifact is None:
+            artifact = (
+                get_classifier_artifact()
+                if dict_root is None
+                else load_classifier_artifact(dict_root)
+            )
+        self._artifact = artifact
 
-        self._fuzzy_matcher = FuzzyMatcher(
-            {
-                "Dish": self.recipe_words,
-                "Ingredient": self.material_words,
-                "菜系": self.caixi_words,
-                "工艺": self.gongyi_words,
-                "口味": self.kouwei_words,
-                "类型": self.leixing_words,
-                "耗时": self.haoshi_words,
-            }
-        )
-        self._fuzzy_threshold = 0.5
+        words = artifact.words
+        self.recipe_words = words["recipe"]
+        self.gongyi_words = words["gongyi"]
+        self.haoshi_words = words["haoshi"]
+        self.kouwei_words = words["kouwei"]
+        self.leixing_words = words["leixing"]
+        self.yongliang_words = words["yongliang"]
+        self.caixi_words = words["caixi"]
+        self.material_words = words["material"]
+        self.deny_words = words["deny"]
 
-    @staticmethod
-    def _build_actree(words: Iterable[str]) -> ahocorasick.Automaton:
-        tree = ahocorasick.Automaton()
-        for index, word in enumerate(words):
-            tree.add_word(word, (index, word))
-        tree.make_automaton()
-        return tree
-
-    def _build_word_type_dict(self) -> Dict[str, List[str]]:
-        mapping: Dict[str, List[str]] = {}
-        for word in self.region_words:
-            mapping[word] = []
-            if word in self.recipe_words:
-                mapping[word].append("Dish")
-            elif word in self.gongyi_words:
-                mapping[word].append("工艺")
-            elif word in self.haoshi_words:
-                mapping[word].append("耗时")
-            elif word in self.kouwei_words:
-                mapping[word].append("口味")
-            elif word in self.leixing_words:
-                mapping[word].append("类型")
-            elif word in self.caixi_words:
-                mapping[word].append("菜系")
-            elif word in self.material_words:
-                mapping[word].append("Ingredient")
-            elif any(word in keywords for keywords in self.relation_keywords.values()):
-                mapping[word].append("relation")
-        return mapping
+        self.relation_keywords = RELATION_KEYWORDS
+        self.property_keywords = PROPERTY_KEYWORDS
+        self.region_tree = artifact.region_tree
+        self.word_type_dict = artifact.word_type_dict
+
+        self._fuzzy_matcher = artifact.fuzzy_matcher
+        self._fuzzy_threshold = 0.5
 
     def classify(self, question: str) -> ClassificationResult:
         entities = self._extract_entities(question)
@@ -153,9 +299,9 @@ class QuestionClassifier:
         final_words = [word for word in matches if word not in stop_words]
         entities: Dict[str, List[str]] = {}
         for word in final_words:
-            labels = self.word_type_dict.get(word, [])
-            if labels and labels != ["relation"]:
-                entities[word] = labels
+            labels = self.word_type_dict.get(word, ())
+            if labels and labels != ("relation",):
+                entities[word] = list(labels)
 
         fuzzy_candidates = self._fuzzy_matcher.match(question, threshold=self._fuzzy_threshold)
         for word, labels in fuzzy_candidates.items():
@@ -166,7 +312,7 @@ class QuestionClassifier:
         return entities
 
     @staticmethod
-    def _match_keywords(options: Dict[str, List[str]], sentence: str) -> List[str]:
+    def _match_keywords(options: Mapping[str, Sequence[str]], sentence: str) -> List[str]:
         matched: List[str] = []
         for slot, keywords in options.items():
             if any(keyword in sentence for keyword in keywords):
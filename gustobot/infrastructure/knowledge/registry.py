@@ -0,0 +1,186 @@
+"""
+Process-wide registry for the Milvus-backed `KnowledgeService`.
+
+Constructing a `KnowledgeService` connects to Milvus, checks/creates the
+collection and loads it into memory. The registry does that once per process
+(at FastAPI startup), warms the collection up, monitors its health, reconnects
+after failures and closes the connection on shutdown. Every caller obtains the
+shared instance through `get_knowledge_service()`.
+"""
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from loguru import logger
+
+from gustobot.config import settings
+from .knowledge_service import KnowledgeService
+
+
+class KnowledgeServiceUnavailable(RuntimeError):
+    """Raised when Milvus cannot be reached and the reconnect backoff has not elapsed."""
+
+
+class KnowledgeServiceRegistry:
+    """Own the lifecycle of the shared `KnowledgeService`."""
+
+    def __init__(
+        self,
+        factory: Callable[[], KnowledgeService] = KnowledgeService,
+        *,
+        health_check_interval: Optional[float] = None,
+        reconnect_backoff: Optional[float] = None,
+    ) -> None:
+        self._factory = factory
+        self.health_check_interval = (
+            health_check_interval
+            if health_check_interval is not None
+            else settings.KB_HEALTH_CHECK_INTERVAL
+        )
+        self.reconnect_backoff = (
+            reconnect_backoff if reconnect_backoff is not None else settings.KB_RECONNECT_BACKOFF
+        )
+        self._service: Optional[KnowledgeService] = None
+        self._lock = threading.Lock()
+        self._monitor: Optional[asyncio.Task] = None
+        self._last_failure: float = 0.0
+        self.last_error: Optional[str] = None
+        self.last_health: Dict[str, Any] = {"status": "stopped"}
+
+    @property
+    def started(self) -> bool:
+        return self._service is not None
+
+    def get(self) -> KnowledgeService:
+        """Return the shared service, creating it on first use outside FastAPI."""
+        service = self._service
+        if service is not None:
+            return service
+        with self._lock:
+            if self._service is None:
+                if self._last_failure and time.monotonic() - self._last_failure < self.reconnect_backoff:
+                    raise KnowledgeServiceUnavailable(self.last_error or "Milvus unavailable")
+                try:
+                    self._service = self._factory()
+                    self.last_error = None
+                except Exception as exc:
+                    self._last_failure = time.monotonic()
+                    self.last_error = str(exc)
+                    raise
+            return self._service
+
+    async def start(self, *, warm_up: Optional[bool] = None) -> None:
+        """Create, optionally warm up, and start monitoring the shared service."""
+        started = time.perf_counter()
+        try:
+            service = await asyncio.to_thread(self.get)
+            if warm_up if warm_up is not None else settings.KB_WARMUP_ON_STARTUP:
+                await asyncio.to_thread(self._warm_up, service)
+            logger.info(
+                "Knowledge service ready in {:.0f} ms",
+                (time.perf_counter() - started) * 1000,
+            )
+        except Exception as exc:
+            # The API stays up; KB routes fall back until a reconnect succeeds.
+            logger.warning("Knowledge service unavailable at startup: {}", exc)
+
+        if self.health_check_interval and self._monitor is None:
+            self._monitor = asyncio.create_task(self._monitor_loop())
+
+    async def health(self, *, reconnect: bool = True) -> Dict[str, Any]:
+        """Ping Milvus and report collection state; reconnects once on failure."""
+        started = time.perf_counter()
+        try:
+            service = await asyncio.to_thread(self.get)
+            details = await asyncio.to_thread(service.vector_store.ping)
+            status = "healthy" if details.get("loaded") else "degraded"
+        except Exception as exc:
+            self.last_error = str(exc)
+            details = {"error": str(exc)}
+            status = "unhealthy"
+            if reconnect and await self.reconnect():
+                return await self.health(reconnect=False)
+
+        self.last_health = {
+            "status": status,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 2),
+            **details,
+        }
+        return self.last_health
+
+    async def reconnect(self) -> bool:
+        """Re-establish the Milvus connection, honouring the reconnect backoff."""
+        if self._last_failure and time.monotonic() - self._last_failure < self.reconnect_backoff:
+            return False
+        service = self._service
+        try:
+            if service is None:
+                await asyncio.to_thread(self.get)
+            else:
+                await asyncio.to_thread(service.vector_store.reconnect)
+            self._last_failure = 0.0
+            self.last_error = None
+            logger.info("Reconnected knowledge service to Milvus")
+            return True
+        except Exception as exc:
+            self._last_failure = time.monotonic()
+            self.last_error = str(exc)
+            logger.warning("Milvus reconnect failed: {}", exc)
+            return False
+
+    async def shutdown(self) -> None:
+        """Stop monitoring and release the Milvus connection and the reranker's HTTP pool."""
+        if self._monitor is not None:
+            self._monitor.cancel()
+            try:
+                await self._monitor
+            except asyncio.CancelledError:
+                pass
+            self._monitor = None
+
+        with self._lock:
+            service, self._service = self._service, None
+        if service is not None:
+            await asyncio.to_thread(service.vector_store.close)
+            await service.reranker.aclose()
+        self.last_health = {"status": "stopped"}
+
+    async def _monitor_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            try:
+                health = await self.health()
+                if health["status"] != "healthy":
+                    logger.warning("Knowledge service health: {}", health)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:  # pragma: no cover - defensive
+                logger.warning("Knowledge service health check failed: {}", exc)
+
+    @staticmethod
+    def _warm_up(service: KnowledgeService) -> None:
+        """Touch the loaded collection and build the lexical index so the first user query does not pay for it."""
+        store = service.vector_store
+        store.search([0.0] * store.dimension, top_k=1)
+        refresh = getattr(service, "refresh_lexical_index", None)
+        if refresh is not None and settings.KB_HYBRID_ENABLED:
+            refresh()
+
+
+_registry: Optional[KnowledgeServiceRegistry] = None
+
+
+def get_knowledge_registry() -> KnowledgeServiceRegistry:
+    """Return the process-wide knowledge service registry."""
+    global _registry
+    if _registry is None:
+        _registry = KnowledgeServiceRegistry()
+    return _registry
+
+
+def get_knowledge_service() -> KnowledgeService:
+    """Return the shared `KnowledgeService` instance."""
+    return get_knowledge_registry().get()
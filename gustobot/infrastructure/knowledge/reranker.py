@@ -1,28 +1,176 @@
-"""Reranker integration supporting multiple providers."""
+"""
+Reranker integration supporting multiple providers.
+
+- Every provider (Cohere included, through its REST API) goes through one pooled
+  `httpx.AsyncClient`, so a rerank never blocks the event loop or pays a fresh
+  TLS handshake.
+- Relevance scores are cached per (query hash, document id, model). A
+  cross-encoder score depends only on that pair, so repeated and overlapping
+  candidate sets only send the documents that have not been scored yet.
+- A latency budget and a circuit breaker keep search responsive. A call that
+  overruns `RERANK_LATENCY_BUDGET_MS` is abandoned and the candidates keep
+  their retrieval order. After `RERANK_BREAKER_FAILURES` consecutive failures
+  the provider is skipped for `RERANK_BREAKER_COOLDOWN` seconds, then a single
+  trial call decides whether it is back.
+"""
 from __future__ import annotations
 
 import asyncio
-import httpx
-from typing import Any, Dict, List, Optional
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
 
+import httpx
 from loguru import logger
 
 from gustobot.config import settings
 
+ScoreKey = Tuple[str, str, str]
+
+_JINA_URL = "https://api.jina.ai/v1/rerank"
+_VOYAGE_URL = "https://api.voyageai.com/v1/rerank"
+
+
+class RerankScoreCache:
+    """Thread-safe LRU of relevance scores sharing one TTL."""
+
+    def __init__(self, max_size: int, ttl: float, *, clock: Callable[[], float] = time.monotonic) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._items: "OrderedDict[ScoreKey, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    @staticmethod
+    def key(query: str, doc_id: str, model: str) -> ScoreKey:
+        query_hash = hashlib.sha256(query.strip().encode("utf-8")).hexdigest()
+        return query_hash, doc_id, model
+
+    def get(self, key: ScoreKey) -> Optional[float]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            expires_at, score = item
+            if expires_at <= self._clock():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return score
+
+    def set(self, key: ScoreKey, score: float) -> None:
+        if self.max_size <= 0 or self.ttl <= 0:
+            return
+        with self._lock:
+            self._items[key] = (self._clock() + self.ttl, score)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure breaker.
+
+    Once `failure_threshold` failures in a row are recorded the breaker opens and
+    `allow()` refuses calls for `cooldown` seconds. After that one trial call is
+    let through per cooldown window; a success closes the breaker again.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int,
+        cooldown: float,
+        *,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = max(0.0, cooldown)
+        self._clock = clock
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        return "half_open" if self._clock() - self._opened_at >= self.cooldown else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            now = self._clock()
+            if now - self._opened_at < self.cooldown:
+                return False
+            # 放行一次试探调用，同时重新计时，避免冷却结束后请求一拥而上
+            self._opened_at = now
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = self._clock()
+
 
 class Reranker:
     """Reranker supporting Cohere, Jina, Voyage, and custom APIs."""
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        *,
+        http_client: Optional[httpx.AsyncClient] = None,
+        cache: Optional[RerankScoreCache] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        latency_budget: Optional[float] = None,
+    ) -> None:
         self.enabled = settings.RERANK_ENABLED
         self.provider = settings.RERANK_PROVIDER.lower() if settings.RERANK_PROVIDER else None
         self.base_url = settings.RERANK_BASE_URL
         self.endpoint = settings.RERANK_ENDPOINT
+        self.cohere_url = settings.COHERE_RERANK_URL
         self.model = settings.RERANK_MODEL
         self.api_key = settings.RERANK_API_KEY
         self.top_n = settings.RERANK_TOP_N
         self.timeout = settings.RERANK_TIMEOUT
 
+        if latency_budget is None:
+            budget_ms = settings.RERANK_LATENCY_BUDGET_MS
+            latency_budget = budget_ms / 1000.0 if budget_ms > 0 else float(self.timeout)
+        self.latency_budget = latency_budget
+        self.cache = cache or RerankScoreCache(settings.RERANK_CACHE_SIZE, settings.RERANK_CACHE_TTL)
+        self.breaker = breaker or CircuitBreaker(
+            settings.RERANK_BREAKER_FAILURES,
+            settings.RERANK_BREAKER_COOLDOWN,
+        )
+        self._client = http_client
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.stats: Dict[str, int] = {
+            "requests": 0,
+            "cache_hits": 0,
+            "api_calls": 0,
+            "api_documents": 0,
+            "timeouts": 0,
+            "failures": 0,
+            "short_circuited": 0,
+        }
+
         if not self.enabled:
             logger.info("Reranker disabled via config")
             return
@@ -32,11 +180,17 @@ class Reranker:
             self.enabled = False
             return
 
+        if self.provider not in self._PROVIDERS:
+            logger.warning("Unsupported reranker provider: {}, disabling", self.provider)
+            self.enabled = False
+            return
+
         logger.info(
-            "Reranker initialized: provider=%s, model=%s, base_url=%s",
+            "Reranker initialized: provider={}, model={}, base_url={}, budget={:.0f}ms",
             self.provider,
             self.model,
             self.base_url,
+            self.latency_budget * 1000,
         )
 
     async def rerank(
@@ -45,52 +199,94 @@ class Reranker:
         documents: List[Dict[str, Any]],
         top_k: int,
     ) -> List[Dict[str, Any]]:
-        """Rerank documents based on relevance to query."""
+        """
+        Rerank documents based on relevance to query.
+
+        Reranked documents carry `rerank_score`. When the provider is unavailable
+        (breaker open, error, or over the latency budget) the first `top_k`
+        documents come back in their original order without `rerank_score`.
+        """
         if not self.enabled or not documents:
             return documents[:top_k]
 
-        try:
-            if self.provider == "custom":
-                ranked = await self._custom_rerank(query, documents, top_k)
-            elif self.provider == "cohere":
-                ranked = await asyncio.to_thread(self._cohere_rerank, query, documents, top_k)
-            elif self.provider == "jina":
-                ranked = await self._jina_rerank(query, documents, top_k)
-            elif self.provider == "voyage":
-                ranked = await self._voyage_rerank(query, documents, top_k)
-            else:
-                logger.warning(f"Unsupported reranker provider: {self.provider}")
+        self.stats["requests"] += 1
+        model = f"{self.provider}:{self.model}"
+        keys = [self.cache.key(query, self._document_id(doc), model) for doc in documents]
+        scores: Dict[int, float] = {}
+        for index, key in enumerate(keys):
+            score = self.cache.get(key)
+            if score is not None:
+                scores[index] = score
+        self.stats["cache_hits"] += len(scores)
+
+        missing = [index for index in range(len(documents)) if index not in scores]
+        if missing:
+            if not self.breaker.allow():
+                self.stats["short_circuited"] += 1
                 return documents[:top_k]
 
-            if ranked:
-                return ranked
-        except Exception as exc:
-            logger.error("Reranker failed: %s", exc, exc_info=True)
-
-        return documents[:top_k]
-
-    async def _custom_rerank(
-        self,
-        query: str,
-        documents: List[Dict[str, Any]],
-        top_k: int,
-    ) -> List[Dict[str, Any]]:
-        """Custom reranker API (e.g., BGE reranker)."""
-        if not self.base_url:
-            logger.error("Custom reranker requires RERANK_BASE_URL")
-            return documents[:top_k]
+            pending = [documents[index] for index in missing]
+            try:
+                fetched = await asyncio.wait_for(self._score(query, pending), self.latency_budget)
+            except asyncio.TimeoutError:
+                self.stats["timeouts"] += 1
+                self.breaker.record_failure()
+                logger.warning(
+                    "Reranker exceeded {:.0f}ms budget ({} documents), keeping retrieval order",
+                    self.latency_budget * 1000,
+                    len(pending),
+                )
+                return documents[:top_k]
+            except Exception as exc:
+                self.stats["failures"] += 1
+                self.breaker.record_failure()
+                logger.error("Reranker failed, keeping retrieval order: {}", exc)
+                return documents[:top_k]
 
-        # 准备文档内容
+            self.breaker.record_success()
+            for position, score in fetched.items():
+                index = missing[position]
+                scores[index] = score
+                self.cache.set(keys[index], score)
+
+        return self._order(documents, scores, top_k)
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    # ---------------------------------------------------------------- providers
+    async def _score(self, query: str, documents: Sequence[Dict[str, Any]]) -> Dict[int, float]:
+        """
+        Relevance score per position in `documents` (all of them are requested).
+
+        Providers are asked for every score (top_n = len(texts)) rather than the
+        caller's top_k: the cross-encoder scores each document either way, and the
+        score cache needs all of them so overlapping candidate sets can skip the API.
+        """
+        self.stats["api_calls"] += 1
+        self.stats["api_documents"] += len(documents)
         texts = [doc.get("content") or doc.get("document") or "" for doc in documents]
+        results = await self._PROVIDERS[self.provider](self, query, texts)
+        if not results:
+            raise RuntimeError(f"{self.provider} reranker returned no results")
 
-        # 构建请求
-        url = f"{self.base_url.rstrip('/')}{self.endpoint}"
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-        }
+        scores: Dict[int, float] = {}
+        for item in results:
+            index = item.get("index")
+            score = item.get("relevance_score")
+            if score is None:
+                score = item.get("score")
+            if index is not None and score is not None and 0 <= index < len(documents):
+                scores[index] = float(score)
+        return scores
+
+    async def _custom_rerank(self, query: str, texts: List[str]) -> List[Dict[str, Any]]:
+        """Custom reranker API (e.g., BGE reranker) in DashScope format."""
+        if not self.base_url:
+            raise RuntimeError("Custom reranker requires RERANK_BASE_URL")
 
-        # DashScope API 格式
         payload = {
             "model": self.model,
             "input": {
@@ -98,158 +294,96 @@ class Reranker:
                 "documents": texts,
             },
             "parameters": {
-                "return_documents": True,
-                "top_n": min(self.top_n or top_k, len(documents)),
-            }
+                "return_documents": False,
+                "top_n": len(texts),
+            },
         }
+        data = await self._post(f"{self.base_url.rstrip('/')}{self.endpoint}", payload)
+        # DashScope 格式: output.results
+        return (data.get("output") or {}).get("results", [])
 
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            response = await client.post(url, json=payload, headers=headers)
-            response.raise_for_status()
-            data = response.json()
-
-        # 解析响应 (DashScope 格式: output.results)
-        output = data.get("output", {})
-        results = output.get("results", [])
-
-        if not results:
-            logger.warning("Custom reranker returned no results")
-            return documents[:top_k]
-
-        # 重新排序文档
-        reranked = []
-        for item in results:
-            idx = item.get("index")
-            score = item.get("relevance_score") or item.get("score")
-
-            if idx is not None and 0 <= idx < len(documents):
-                doc = dict(documents[idx])
-                if score is not None:
-                    doc["rerank_score"] = float(score)
-                reranked.append(doc)
-
-        # 添加未被重排的文档
-        seen_ids = {doc.get("chunk_id") or doc.get("id") for doc in reranked}
-        for doc in documents:
-            doc_id = doc.get("chunk_id") or doc.get("id")
-            if doc_id not in seen_ids:
-                reranked.append(doc)
-
-        return reranked[:top_k]
-
-    async def _jina_rerank(
-        self,
-        query: str,
-        documents: List[Dict[str, Any]],
-        top_k: int,
-    ) -> List[Dict[str, Any]]:
-        """Jina AI reranker."""
-        texts = [doc.get("content") or doc.get("document") or "" for doc in documents]
-
-        url = "https://api.jina.ai/v1/rerank"
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
+    async def _cohere_rerank(self, query: str, texts: List[str]) -> List[Dict[str, Any]]:
+        """Cohere reranker via its REST API (no blocking SDK client)."""
+        payload = {
+            "model": self.model or "rerank-english-v3.0",
+            "query": query,
+            "documents": texts,
+            "top_n": len(texts),  # 分数缓存需要全部候选的分数，见 _score
         }
+        data = await self._post(self.cohere_url, payload)
+        return data.get("results", [])
 
+    async def _jina_rerank(self, query: str, texts: List[str]) -> List[Dict[str, Any]]:
+        """Jina AI reranker."""
         payload = {
             "model": self.model or "jina-reranker-v1-base-en",
             "query": query,
             "documents": texts,
-            "top_n": min(self.top_n or top_k, len(documents)),
+            "top_n": len(texts),
         }
+        data = await self._post(_JINA_URL, payload)
+        return data.get("results", [])
 
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            response = await client.post(url, json=payload, headers=headers)
-            response.raise_for_status()
-            data = response.json()
-
-        results = data.get("results", [])
-        return self._process_rerank_results(results, documents, top_k)
-
-    async def _voyage_rerank(
-        self,
-        query: str,
-        documents: List[Dict[str, Any]],
-        top_k: int,
-    ) -> List[Dict[str, Any]]:
+    async def _voyage_rerank(self, query: str, texts: List[str]) -> List[Dict[str, Any]]:
         """Voyage AI reranker."""
-        texts = [doc.get("content") or doc.get("document") or "" for doc in documents]
-
-        url = "https://api.voyageai.com/v1/rerank"
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-        }
-
         payload = {
             "model": self.model or "rerank-lite-1",
             "query": query,
             "documents": texts,
-            "top_k": min(self.top_n or top_k, len(documents)),
+            "top_k": len(texts),
         }
-
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            response = await client.post(url, json=payload, headers=headers)
-            response.raise_for_status()
-            data = response.json()
-
-        results = data.get("data", [])
-        return self._process_rerank_results(results, documents, top_k)
-
-    def _cohere_rerank(
-        self,
-        query: str,
-        documents: List[Dict[str, Any]],
-        top_k: int,
-    ) -> List[Dict[str, Any]]:
-        """Cohere reranker (synchronous)."""
-        try:
-            from cohere import Client as CohereClient
-        except ImportError as exc:
-            raise RuntimeError("cohere package not installed") from exc
-
-        client = CohereClient(self.api_key)
-        texts = [doc.get("content") or doc.get("document") or "" for doc in documents]
-
-        response = client.rerank(
-            query=query,
-            documents=texts,
-            top_n=min(self.top_n or top_k, len(documents)),
-            model=self.model or "rerank-english-v3.0",
-        )
-
-        results = [
-            {"index": r.index, "relevance_score": r.relevance_score}
-            for r in response.results
-        ]
-
-        return self._process_rerank_results(results, documents, top_k)
-
-    def _process_rerank_results(
-        self,
-        results: List[Dict[str, Any]],
+        data = await self._post(_VOYAGE_URL, payload)
+        return data.get("data", [])
+
+    _PROVIDERS = {
+        "custom": _custom_rerank,
+        "cohere": _cohere_rerank,
+        "jina": _jina_rerank,
+        "voyage": _voyage_rerank,
+    }
+
+    # ---------------------------------------------------------------- internals
+    async def _post(self, url: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        }
+        response = await self._get_client().post(url, json=payload, headers=headers)
+        response.raise_for_status()
+        return response.json()
+
+    def _get_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is not None and self._client_loop not in (None, loop):
+            # 连接池绑定在创建它的事件循环上（如脚本中多次 asyncio.run），换循环时重建
+            self._client = None
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=settings.RERANK_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.RERANK_MAX_CONNECTIONS,
+                ),
+                timeout=self.timeout,
+            )
+            self._client_loop = loop
+        return self._client
+
+    @staticmethod
+    def _document_id(doc: Dict[str, Any]) -> str:
+        doc_id = doc.get("chunk_id") or doc.get("id")
+        if doc_id is not None:
+            return str(doc_id)
+        text = doc.get("content") or doc.get("document") or ""
+        return "sha256:" + hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _order(
         documents: List[Dict[str, Any]],
+        scores: Dict[int, float],
         top_k: int,
     ) -> List[Dict[str, Any]]:
-        """Process reranker results into reordered document list."""
-        reranked = []
-
-        for item in results:
-            idx = item.get("index")
-            score = item.get("relevance_score") or item.get("score")
-
-            if idx is not None and 0 <= idx < len(documents):
-                doc = dict(documents[idx])
-                if score is not None:
-                    doc["rerank_score"] = float(score)
-                reranked.append(doc)
-
-        # 添加未被重排的文档
-        seen_ids = {doc.get("chunk_id") or doc.get("id") for doc in reranked}
-        for doc in documents:
-            doc_id = doc.get("chunk_id") or doc.get("id")
-            if doc_id not in seen_ids:
-                reranked.append(doc)
-
+        """Scored documents by descending score, then unscored ones in original order."""
+        ranked = sorted(scores, key=lambda index: scores[index], reverse=True)
+        reranked = [{**documents[index], "rerank_score": scores[index]} for index in ranked]
+        reranked.extend(doc for index, doc in enumerate(documents) if index not in scores)
         return reranked[:top_k]
@@ -0,0 +1,75 @@
+"""
+Micro-batching for concurrent knowledge-base lookups.
+
+Planner fan-out and concurrent users each issue their own KB search. A
+`MicroBatcher` holds requests for a short window (or until `max_batch`
+arrive), hands them to one `dispatch` call, and resolves each caller's
+future with its own slice of the result. For the KB, that means one
+embedding request and one Milvus search call instead of N.
+"""
+from __future__ import annotations
+
+import asyncio
+from typing import Awaitable, Callable, Dict, Generic, List, Optional, Set, Tuple, TypeVar
+
+Request = TypeVar("Request")
+Result = TypeVar("Result")
+
+
+class MicroBatcher(Generic[Request, Result]):
+    """Collects `submit` calls for `window` seconds and dispatches them as one batch."""
+
+    def __init__(
+        self,
+        dispatch: Callable[[List[Request]], Awaitable[List[Result]]],
+        *,
+        window: float,
+        max_batch: int = 32,
+    ) -> None:
+        self._dispatch = dispatch
+        self.window = max(0.0, window)
+        self.max_batch = max(1, max_batch)
+        self._pending: List[Tuple[Request, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self.stats: Dict[str, int] = {"requests": 0, "batches": 0, "max_batch": 0}
+
+    async def submit(self, request: Request) -> Result:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((request, future))
+        self.stats["requests"] += 1
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        self.stats["batches"] += 1
+        self.stats["max_batch"] = max(self.stats["max_batch"], len(batch))
+        task = asyncio.ensure_future(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[Request, asyncio.Future]]) -> None:
+        try:
+            results = await self._dispatch([request for request, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(f"Batch dispatch returned {len(results)} results for {len(batch)} requests")
+        except BaseException as exc:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            if not isinstance(exc, Exception):
+                raise
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():  # 调用方已取消时丢弃结果
+                future.set_result(result)
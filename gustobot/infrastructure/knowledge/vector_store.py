@@ -2,7 +2,11 @@
 Milvus向量数据库封装
 使用Milvus作为向量存储引擎
 """
-from typing import List, Dict, Any, Optional
+import json
+import threading
+import time
+from dataclasses import dataclass, field, replace
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
 from loguru import logger
 from pymilvus import (
     connections,
@@ -14,6 +18,92 @@ from pymilvus import (
 )
 
 
+@dataclass(frozen=True)
+class IndexProfile:
+    """Milvus 索引配置：建索引参数、默认搜索参数，以及调优时扫描的搜索参数取值"""
+
+    index_type: str
+    build_params: Dict[str, Any] = field(default_factory=dict)
+    search_params: Dict[str, Any] = field(default_factory=dict)
+    sweep_param: Optional[str] = None
+    sweep_values: Tuple[int, ...] = ()
+    min_top_k_param: Optional[str] = None  # 取值不得小于 top_k 的搜索参数（HNSW ef / DiskANN search_list）
+
+    def search_params_for(self, top_k: int, overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        params = {**self.search_params, **(overrides or {})}
+        if self.min_top_k_param and self.min_top_k_param in params:
+            params[self.min_top_k_param] = max(int(params[self.min_top_k_param]), top_k)
+        return params
+
+    def with_params(
+        self,
+        build_params: Optional[Dict[str, Any]] = None,
+        search_params: Optional[Dict[str, Any]] = None,
+    ) -> "IndexProfile":
+        return replace(
+            self,
+            build_params={**self.build_params, **(build_params or {})},
+            search_params={**self.search_params, **(search_params or {})},
+        )
+
+
+INDEX_PROFILES: Dict[str, IndexProfile] = {
+    "FLAT": IndexProfile("FLAT"),
+    "IVF_FLAT": IndexProfile(
+        "IVF_FLAT",
+        build_params={"nlist": 128},
+        search_params={"nprobe": 10},
+        sweep_param="nprobe",
+        sweep_values=(1, 2, 4, 8, 16, 32, 64, 128),
+    ),
+    "IVF_SQ8": IndexProfile(
+        "IVF_SQ8",
+        build_params={"nlist": 128},
+        search_params={"nprobe": 16},
+        sweep_param="nprobe",
+        sweep_values=(1, 2, 4, 8, 16, 32, 64, 128),
+    ),
+    "HNSW": IndexProfile(
+        "HNSW",
+        build_params={"M": 16, "efConstruction": 200},
+        search_params={"ef": 64},
+        sweep_param="ef",
+        sweep_values=(16, 32, 64, 128, 256, 512),
+        min_top_k_param="ef",
+    ),
+    "DISKANN": IndexProfile(
+        "DISKANN",
+        search_params={"search_list": 100},
+        sweep_param="search_list",
+        sweep_values=(16, 32, 64, 100, 200, 400),
+        min_top_k_param="search_list",
+    ),
+}
+
+
+def resolve_index_profile(
+    index_type: str,
+    build_params: Optional[Dict[str, Any]] = None,
+    search_params: Optional[Dict[str, Any]] = None,
+) -> IndexProfile:
+    """按索引类型取内置配置并叠加覆盖参数；未知类型沿用空参数（由 Milvus 使用默认值）"""
+    name = (index_type or "IVF_FLAT").upper()
+    profile = INDEX_PROFILES.get(name)
+    if profile is None:
+        logger.warning(f"Unknown Milvus index type {name}, using server defaults")
+        profile = IndexProfile(name)
+    return profile.with_params(build_params, search_params)
+
+
+def in_expr(field_name: str, values: Iterable[Any]) -> str:
+    """
+    `field in [...]` 过滤表达式；每个取值按 JSON 字符串转义后再拼接，
+    避免 ID 中的引号、反斜杠改变表达式
+    """
+    literals = ", ".join(json.dumps(str(value), ensure_ascii=False) for value in values)
+    return f"{field_name} in [{literals}]"
+
+
 class VectorStore:
     """Milvus向量数据库管理类"""
 
@@ -24,7 +114,9 @@ class VectorStore:
         port: int = 19530,
         dimension: int = 1536,
         index_type: str = "IVF_FLAT",
-        metric_type: str = "IP"  # Inner Product (cosine similarity)
+        metric_type: str = "IP",  # Inner Product (cosine similarity)
+        index_params: Optional[Dict[str, Any]] = None,
+        search_params: Optional[Dict[str, Any]] = None,
     ):
         """
         初始化Milvus向量数据库
@@ -34,17 +126,24 @@ class VectorStore:
             host: Milvus服务器地址
             port: Milvus服务器端口
             dimension: 向量维度
-            index_type: 索引类型 (IVF_FLAT, IVF_SQ8, HNSW等)
+            index_type: 索引配置名 (IVF_FLAT, IVF_SQ8, HNSW, DISKANN, FLAT)，见 INDEX_PROFILES
             metric_type: 距离度量类型 (IP, L2, COSINE)
+            index_params: 覆盖该配置的建索引参数 (如 {"nlist": 1024})
+            search_params: 覆盖该配置的默认搜索参数 (如 {"nprobe": 32})
         """
         self.collection_name = collection_name
         self.host = host
         self.port = port
         self.dimension = dimension
-        self.index_type = index_type
+        self.profile = resolve_index_profile(index_type, index_params, search_params)
+        self.index_type = self.profile.index_type
         self.metric_type = metric_type
 
         self.collection = None
+        # 延迟 flush：批量导入时累计未 flush 的行数与最早一次未 flush 写入的时间
+        self._flush_lock = threading.Lock()
+        self._unflushed_rows = 0
+        self._unflushed_since: Optional[float] = None
 
         self._initialize()
 
@@ -63,6 +162,7 @@ class VectorStore:
             if utility.has_collection(self.collection_name):
                 self.collection = Collection(self.collection_name)
                 logger.info(f"Loaded existing collection: {self.collection_name}")
+                self._sync_profile_with_index()
             else:
                 # 创建新集合
                 self._create_collection()
@@ -101,10 +201,13 @@ class VectorStore:
         )
 
         # 创建索引
+        self._create_index()
+
+    def _create_index(self):
         index_params = {
-            "index_type": self.index_type,
+            "index_type": self.profile.index_type,
             "metric_type": self.metric_type,
-            "params": {"nlist": 128} if self.index_type == "IVF_FLAT" else {}
+            "params": dict(self.profile.build_params),
         }
 
         self.collection.create_index(
@@ -112,14 +215,47 @@ class VectorStore:
             index_params=index_params
         )
 
-        logger.info(f"Created index with type: {self.index_type}")
+        logger.info(f"Created index with type: {self.index_type} params: {self.profile.build_params}")
+
+    def _sync_profile_with_index(self):
+        """已有集合的索引与配置不一致时，按实际索引类型选择搜索参数（重建需显式调用 rebuild_index）"""
+        try:
+            indexes = self.collection.indexes
+        except Exception as e:
+            logger.warning(f"Failed to inspect index of {self.collection_name}: {e}")
+            return
+        if not indexes:
+            return
+        actual = str(indexes[0].params.get("index_type", "")).upper()
+        if actual and actual != self.profile.index_type:
+            logger.warning(
+                f"Collection {self.collection_name} has index {actual} but {self.profile.index_type} "
+                f"is configured; searching with the {actual} profile until the index is rebuilt"
+            )
+            self.profile = resolve_index_profile(actual)
+            self.index_type = self.profile.index_type
+
+    def rebuild_index(
+        self,
+        index_type: str,
+        index_params: Optional[Dict[str, Any]] = None,
+        search_params: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """按新的索引配置重建 embedding 索引（需释放集合，期间不可检索）"""
+        self.profile = resolve_index_profile(index_type, index_params, search_params)
+        self.index_type = self.profile.index_type
+        self.collection.release()
+        self.collection.drop_index()
+        self._create_index()
+        self.collection.load()
 
     def add_documents(
         self,
         ids: List[str],
         embeddings: List[List[float]],
         documents: List[str],
-        metadatas: Optional[List[Dict[str, Any]]] = None
+        metadatas: Optional[List[Dict[str, Any]]] = None,
+        flush: bool = True,
     ) -> bool:
         """
         添加文档到向量数据库
@@ -129,6 +265,7 @@ class VectorStore:
             embeddings: 嵌入向量列表
             documents: 文档文本列表
             metadatas: 文档元数据列表
+            flush: 是否立即 flush；批量导入时传 False，由调用方通过 flush_if_due/flush 统一 flush
 
         Returns:
             是否成功
@@ -150,7 +287,12 @@ class VectorStore:
 
             # 插入数据
             self.collection.insert(entities)
-            self.collection.flush()
+            with self._flush_lock:
+                self._unflushed_rows += len(ids)
+                if self._unflushed_since is None:
+                    self._unflushed_since = time.monotonic()
+            if flush:
+                self.flush()
 
             logger.info(f"Added {len(ids)} documents to Milvus")
             return True
@@ -159,11 +301,47 @@ class VectorStore:
             logger.error(f"Failed to add documents: {e}")
             return False
 
+    def flush(self) -> bool:
+        """将已插入但未 flush 的数据落盘（封存 segment），没有待 flush 数据时直接返回"""
+        with self._flush_lock:
+            pending = self._unflushed_rows
+            if not pending:
+                return True
+            try:
+                self.collection.flush()
+            except Exception as e:
+                logger.error(f"Failed to flush collection: {e}")
+                return False
+            self._unflushed_rows = 0
+            self._unflushed_since = None
+        logger.info(f"Flushed {pending} documents to Milvus")
+        return True
+
+    def flush_if_due(self, max_rows: int = 0, max_interval: float = 0.0) -> bool:
+        """
+        未 flush 行数达到 max_rows 或距首次未 flush 写入超过 max_interval 秒时 flush
+
+        阈值为 0 表示不按该条件触发。
+
+        Returns:
+            是否执行了 flush
+        """
+        with self._flush_lock:
+            rows = self._unflushed_rows
+            since = self._unflushed_since
+        if not rows:
+            return False
+        due = (max_rows > 0 and rows >= max_rows) or (
+            max_interval > 0 and since is not None and time.monotonic() - since >= max_interval
+        )
+        return self.flush() if due else False
+
     def search(
         self,
         query_embedding: List[float],
         top_k: int = 10,
-        filter_expr: Optional[str] = None
+        filter_expr: Optional[str] = None,
+        search_params: Optional[Dict[str, Any]] = None,
     ) -> List[Dict[str, Any]]:
         """
         搜索相似文档
@@ -172,32 +350,64 @@ class VectorStore:
             query_embedding: 查询向量
             top_k: 返回结果数量
             filter_expr: 过滤表达式 (例如: "category == '家常菜'")
+            search_params: 覆盖索引配置的搜索参数 (例如: {"nprobe": 32})
 
         Returns:
             搜索结果列表
         """
+        results = self.search_batch([query_embedding], top_k, filter_expr, search_params)
+        return results[0] if results else []
+
+    def search_batch(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int = 10,
+        filter_expr: Optional[str] = None,
+        search_params: Optional[Dict[str, Any]] = None,
+        output_vectors: bool = False,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        批量搜索：多个查询向量在一次 collection.search 调用中完成
+
+        Args:
+            query_embeddings: 查询向量列表
+            top_k: 每个查询返回的结果数量
+            filter_expr: 过滤表达式，对批次内所有查询生效
+            search_params: 覆盖索引配置的搜索参数
+            output_vectors: 同时返回命中分块的向量（结果中的 embedding 字段），用于近重复裁剪
+
+        Returns:
+            与 query_embeddings 一一对应的搜索结果列表；失败时每个查询返回空列表
+        """
+        if not query_embeddings:
+            return []
         try:
             # 搜索参数
-            search_params = {
+            param = {
                 "metric_type": self.metric_type,
-                "params": {"nprobe": 10}
+                "params": self.profile.search_params_for(top_k, search_params),
             }
 
+            output_fields = ["id", "content", "recipe_id", "name", "category", "difficulty"]
+            if output_vectors:
+                output_fields.append("embedding")
+
             # 执行搜索
             results = self.collection.search(
-                data=[query_embedding],
+                data=list(query_embeddings),
                 anns_field="embedding",
-                param=search_params,
+                param=param,
                 limit=top_k,
                 expr=filter_expr,
-                output_fields=["id", "content", "recipe_id", "name", "category", "difficulty"]
+                output_fields=output_fields,
             )
 
-            # 格式化结果
+            # 格式化结果（按查询拆分）
             formatted_results = []
             for hits in results:
+                formatted_hits = []
                 for hit in hits:
-                    formatted_results.append({
+                    formatted = {
                         "id": hit.entity.get("id"),
                         "content": hit.entity.get("content"),
                         "score": float(hit.score),
@@ -207,14 +417,51 @@ class VectorStore:
                             "category": hit.entity.get("category"),
                             "difficulty": hit.entity.get("difficulty"),
                         }
-                    })
-
-            logger.info(f"Found {len(formatted_results)} results")
+                    }
+                    if output_vectors:
+                        formatted["embedding"] = hit.entity.get("embedding")
+                    formatted_hits.append(formatted)
+                formatted_results.append(formatted_hits)
+
+            logger.info(
+                f"Found {sum(len(hits) for hits in formatted_results)} results for {len(query_embeddings)} queries"
+            )
             return formatted_results
 
         except Exception as e:
             logger.error(f"Search failed: {e}")
-            return []
+            return [[] for _ in query_embeddings]
+
+    def iter_documents(self, batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """
+        遍历集合中的全部文档（不含向量），用于构建本地词法索引
+
+        Yields:
+            {"id", "content", "metadata"}，格式与 search 结果一致（无 score）
+        """
+        iterator = self.collection.query_iterator(
+            batch_size=batch_size,
+            expr='id != ""',
+            output_fields=["id", "content", "recipe_id", "name", "category", "difficulty"],
+        )
+        try:
+            while True:
+                batch = iterator.next()
+                if not batch:
+                    break
+                for entity in batch:
+                    yield {
+                        "id": entity.get("id"),
+                        "content": entity.get("content") or "",
+                        "metadata": {
+                            "recipe_id": entity.get("recipe_id"),
+                            "name": entity.get("name"),
+                            "category": entity.get("category"),
+                            "difficulty": entity.get("difficulty"),
+                        },
+                    }
+        finally:
+            iterator.close()
 
     def delete_documents(self, ids: List[str]) -> bool:
         """
@@ -227,7 +474,7 @@ class VectorStore:
             是否成功
         """
         try:
-            expr = f"id in {ids}"
+            expr = in_expr("id", ids)
             self.collection.delete(expr)
             self.collection.flush()
 
@@ -237,6 +484,27 @@ class VectorStore:
             logger.error(f"Failed to delete documents: {e}")
             return False
 
+    def delete_by_recipe(self, recipe_ids: List[str]) -> bool:
+        """
+        删除菜谱的全部分块
+
+        Args:
+            recipe_ids: 菜谱ID列表
+
+        Returns:
+            是否成功
+        """
+        try:
+            expr = in_expr("recipe_id", recipe_ids)
+            self.collection.delete(expr)
+            self.collection.flush()
+
+            logger.info(f"Deleted chunks of {len(recipe_ids)} recipes")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to delete recipes: {e}")
+            return False
+
     def get_collection_stats(self) -> Dict[str, Any]:
         """获取集合统计信息"""
         try:
@@ -246,6 +514,8 @@ class VectorStore:
                 "document_count": stats,
                 "dimension": self.dimension,
                 "index_type": self.index_type,
+                "index_params": self.profile.build_params,
+                "search_params": self.profile.search_params,
                 "metric_type": self.metric_type
             }
         except Exception as e:
@@ -265,6 +535,31 @@ class VectorStore:
             logger.error(f"Failed to clear collection: {e}")
             return False
 
+    def ping(self) -> Dict[str, Any]:
+        """
+        健康检查：确认连接可用且集合已加载
+
+        Returns:
+            包含 server_version / loaded / document_count 的字典；失败时抛出异常
+        """
+        if self.collection is None:
+            raise RuntimeError("Milvus collection is not initialised")
+        load_state = utility.load_state(self.collection_name)
+        return {
+            "server_version": utility.get_server_version(),
+            "loaded": getattr(load_state, "name", str(load_state)) == "Loaded",
+            "document_count": self.collection.num_entities,
+        }
+
+    def reconnect(self):
+        """断开并重新建立连接，复用已有集合"""
+        try:
+            connections.disconnect("default")
+        except Exception as e:
+            logger.warning(f"Failed to disconnect before reconnect: {e}")
+        self.collection = None
+        self._initialize()
+
     def close(self):
         """关闭连接"""
         try:
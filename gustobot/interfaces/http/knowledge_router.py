@@ -35,11 +35,19 @@ class SearchRequest(BaseModel):
     top_k: Optional[int] = Field(5, ge=1, le=20, description="Number of results to return")
 
 
+class BatchSearchRequest(BaseModel):
+    """Multi-query vector store search request."""
+
+    queries: List[str] = Field(..., min_length=1, max_length=256, description="Query texts")
+    top_k: Optional[int] = Field(5, ge=1, le=20, description="Number of results per query")
+
+
 class SearchResponse(BaseModel):
     """Vector store search response."""
 
     results: List[Dict[str, Any]] = Field(..., description="Matched documents")
     count: int = Field(..., description="Result count")
+    pruned: int = Field(0, description="Near-duplicate candidates pruned before reranking")
 
 
 class GraphResponse(BaseModel):
@@ -68,10 +76,10 @@ class QAResponse(BaseModel):
 
 # Dependency helpers ----------------------------------------------------------
 def get_knowledge_service():
-    """Return the vector knowledge base service."""
-    from gustobot.infrastructure.knowledge import KnowledgeService
+    """Return the shared vector knowledge base service (created at startup)."""
+    from gustobot.infrastructure.knowledge import get_knowledge_service as get_shared_service
 
-    return KnowledgeService()
+    return get_shared_service()
 
 
 @lru_cache
@@ -138,13 +146,35 @@ async def search_knowledge(
 ) -> SearchResponse:
     """Search the vector knowledge base."""
     try:
-        results = await service.search(query=request.query, top_k=request.top_k)
-        return SearchResponse(results=results, count=len(results))
+        report: Dict[str, int] = {}
+        results = await service.search(query=request.query, top_k=request.top_k, report=report)
+        return SearchResponse(results=results, count=len(results), pruned=report.get("pruned", 0))
     except Exception as exc:
         logger.error(f"Search error: {exc}")
         raise HTTPException(status_code=500, detail=str(exc))
 
 
+@router.post("/search/batch")
+async def search_knowledge_batch(
+    request: BatchSearchRequest,
+    service=Depends(get_knowledge_service),
+) -> Dict[str, Any]:
+    """Search several queries with one embedding request and one batched ANN call."""
+    try:
+        reports: List[Dict[str, int]] = []
+        results = await service.search_many(request.queries, top_k=request.top_k, reports=reports)
+        return {
+            "results": [
+                {"query": query, "results": docs, "count": len(docs), "pruned": report["pruned"]}
+                for query, docs, report in zip(request.queries, results, reports)
+            ],
+            "count": len(results),
+        }
+    except Exception as exc:
+        logger.error(f"Batch search error: {exc}")
+        raise HTTPException(status_code=500, detail=str(exc))
+
+
 @router.delete("/recipes/{recipe_id}")
 async def delete_recipe(
     recipe_id: str,
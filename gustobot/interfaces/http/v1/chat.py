@@ -3,18 +3,20 @@ Unified Chat API with Agent Integration
 
 Provides a single endpoint for chat interactions with automatic routing.
 """
-import asyncio
 import json
+import time
 import uuid
 from typing import Any, Dict, List, Optional, Union, AsyncGenerator
 from datetime import datetime
 
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Query, status
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Query, Response, status
 from fastapi.responses import StreamingResponse
+from langchain_core.messages import AIMessage, HumanMessage
 from loguru import logger
 from pydantic import BaseModel, Field
 
 from gustobot.application.agents.lg_builder import graph
+from gustobot.application.services.response_cache import CacheLookup, get_response_cache, history_digest
 from gustobot.config import settings
 from gustobot.infrastructure.core.database import get_db
 from gustobot.infrastructure.persistence.crud import chat_message, chat_session
@@ -53,7 +55,7 @@ class ChatResponse(BaseModel):
 
 class ChatStreamChunk(BaseModel):
     """Streaming response chunk"""
-    type: str = Field(..., description="Chunk type: 'message', 'metadata', 'error', 'done'")
+    type: str = Field(..., description="Chunk type: 'message', 'metadata', 'progress', 'error', 'done'")
     content: Optional[str] = None
     metadata: Optional[Dict[str, Any]] = None
     session_id: Optional[str] = None
@@ -94,11 +96,79 @@ async def save_message(db: Session, session_id: str, message: str, is_user: bool
         logger.error(f"Failed to save message: {e}")
 
 
-async def process_agent_query(message: str, session_id: str,
-                            image_path: Optional[str] = None,
-                            file_path: Optional[str] = None,
-                            ingest_incremental: Optional[bool] = None) -> Dict[str, Any]:
-    """Process query through agent system"""
+async def lookup_cached_answer(message: str, session_id: str,
+                               image_path: Optional[str] = None,
+                               file_path: Optional[str] = None) -> CacheLookup:
+    """Check the two-tier response cache (in-process LRU, then semantic Redis)"""
+    cache = get_response_cache()
+    if not cache.enabled:
+        # CHAT_CACHE_ENABLED is off by default; don't read the conversation state for nothing
+        return CacheLookup(status="bypass")
+    try:
+        snapshot = await graph.aget_state({"configurable": {"thread_id": session_id}})
+    except Exception as e:
+        # Without the earlier turns a follow-up cannot be matched safely
+        logger.warning(f"Failed to read conversation state, bypassing chat cache: {e}")
+        return CacheLookup(status="bypass")
+    return await cache.lookup(
+        message,
+        session_id=session_id,
+        image_path=image_path,
+        file_path=file_path,
+        history_key=history_digest(snapshot.values.get("messages")),
+    )
+
+
+async def _store_answer(message: str, result: Dict[str, Any], session_id: str,
+                       cache_lookup: CacheLookup,
+                       image_path: Optional[str] = None,
+                       file_path: Optional[str] = None) -> None:
+    """Write a graph answer back to the response cache, keyed on the turns that preceded it"""
+    if cache_lookup.status == "bypass":
+        return
+    await get_response_cache().store(
+        message,
+        result,
+        session_id=session_id,
+        image_path=image_path,
+        file_path=file_path,
+        history_key=cache_lookup.history_key,
+    )
+
+
+async def _record_cached_turn(message: str, answer: str, session_id: str) -> None:
+    """Append a cache-served turn to the conversation state so follow-ups see it"""
+    try:
+        await graph.aupdate_state(
+            {"configurable": {"thread_id": session_id}},
+            {"messages": [HumanMessage(content=message), AIMessage(content=answer)]},
+            as_node="respond_to_general_query",
+        )
+    except Exception as e:
+        logger.warning(f"Failed to record cached turn in conversation state: {e}")
+
+
+def _cached_result(cache_lookup: CacheLookup, session_id: str) -> Dict[str, Any]:
+    """Build the agent result for a response cache hit"""
+    cached = cache_lookup.payload
+    logger.info(f"Chat cache hit | tier={cache_lookup.tier} route={cached.get('route')}")
+    return {
+        "message": cached.get("message") or "",
+        "route": cached.get("route"),
+        "route_logic": cached.get("route_logic"),
+        "sources": cached.get("sources") or [],
+        "metadata": {
+            "session_id": session_id,
+            "cache": cache_lookup.as_metadata(),
+        }
+    }
+
+
+def _graph_run(message: str, session_id: str,
+               image_path: Optional[str] = None,
+               file_path: Optional[str] = None,
+               ingest_incremental: Optional[bool] = None) -> tuple:
+    """Build the (input_state, config) pair for one agent graph run"""
     incremental_flag = (
         settings.INGEST_INCREMENTAL_DEFAULT if ingest_incremental is None else bool(ingest_incremental)
     )
@@ -114,45 +184,71 @@ async def process_agent_query(message: str, session_id: str,
     input_state = {
         "messages": [{"type": "human", "content": message}]
     }
+    return input_state, config
+
+
+def _format_agent_result(result: Dict[str, Any], session_id: str,
+                         cache_lookup: CacheLookup) -> Dict[str, Any]:
+    """Convert the final graph state into the chat response payload"""
+    # Extract response and metadata
+    response_text = ""
+    if result.get("messages"):
+        response_text = result["messages"][-1].content
+
+    # Extract route information
+    router_info = result.get("router") or {}
+    route = router_info.get("type")
+    route_logic = router_info.get("logic")
+
+    # Extract sources if available
+    sources_raw = result.get("sources", [])
+
+    # Convert sources to expected format (list of dicts)
+    sources = []
+    if sources_raw:
+        # If sources is a list of strings, convert to list of dicts
+        if isinstance(sources_raw[0], str):
+            for src in sources_raw:
+                sources.append({"document_id": src, "source": src})
+        else:
+            # Already in correct format
+            sources = sources_raw
+
+    return {
+        "message": response_text,
+        "route": route,
+        "route_logic": route_logic,
+        "sources": sources,
+        "metadata": {
+            "session_id": session_id,
+            "agent_state": result,
+            "cache": cache_lookup.as_metadata(),
+        }
+    }
+
+
+async def process_agent_query(message: str, session_id: str,
+                            image_path: Optional[str] = None,
+                            file_path: Optional[str] = None,
+                            ingest_incremental: Optional[bool] = None,
+                            cache_lookup: Optional[CacheLookup] = None) -> Dict[str, Any]:
+    """Process query through agent system, serving repeated questions from the response cache"""
+    if cache_lookup is None:
+        cache_lookup = await lookup_cached_answer(message, session_id, image_path, file_path)
+    if cache_lookup.hit:
+        result = _cached_result(cache_lookup, session_id)
+        await _record_cached_turn(message, result["message"], session_id)
+        return result
+
+    input_state, config = _graph_run(message, session_id, image_path, file_path, ingest_incremental)
 
     try:
         # Invoke agent graph
         result = await graph.ainvoke(input_state, config=config)
 
-        # Extract response and metadata
-        response_text = ""
-        if result.get("messages"):
-            response_text = result["messages"][-1].content
-
-        # Extract route information
-        router_info = result.get("router", {})
-        route = router_info.get("type")
-        route_logic = router_info.get("logic")
-
-        # Extract sources if available
-        sources_raw = result.get("sources", [])
-
-        # Convert sources to expected format (list of dicts)
-        sources = []
-        if sources_raw:
-            # If sources is a list of strings, convert to list of dicts
-            if isinstance(sources_raw[0], str):
-                for src in sources_raw:
-                    sources.append({"document_id": src, "source": src})
-            else:
-                # Already in correct format
-                sources = sources_raw
-
-        return {
-            "message": response_text,
-            "route": route,
-            "route_logic": route_logic,
-            "sources": sources,
-            "metadata": {
-                "session_id": session_id,
-                "agent_state": result
-            }
-        }
+        response = _format_agent_result(result, session_id, cache_lookup)
+        await _store_answer(message, response, session_id, cache_lookup, image_path, file_path)
+        return response
     except Exception as e:
         logger.error(f"Agent query failed: {e}", exc_info=True)
         return {
@@ -164,46 +260,118 @@ async def process_agent_query(message: str, session_id: str,
         }
 
 
+# Nodes (main graph and KB / Neo4j sub-workflows) whose LLM tokens are the user-facing answer
+STREAM_TOKEN_NODES = frozenset({
+    "respond_to_general_query",
+    "get_additional_info",
+    "summarize",
+    "final_answer",
+    "finalize",
+})
+
+
+def _sse(chunk: ChatStreamChunk) -> str:
+    return f"data: {chunk.model_dump_json()}\n\n"
+
+
+def _token_text(chunk: Any) -> str:
+    """Text carried by an LLM stream chunk (structured-output/tool-call chunks carry none)"""
+    content = getattr(chunk, "content", "")
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(
+            part.get("text", "") if isinstance(part, dict) else str(part)
+            for part in content
+        )
+    return ""
+
+
+def _route_chunk(result: Dict[str, Any], session_id: str) -> ChatStreamChunk:
+    return ChatStreamChunk(
+        type="metadata",
+        metadata={"route": result["route"], "logic": result["route_logic"]},
+        session_id=session_id,
+        route=result["route"]
+    )
+
+
 async def stream_agent_response(message: str, session_id: str,
                                image_path: Optional[str] = None,
                                file_path: Optional[str] = None,
-                               ingest_incremental: Optional[bool] = None) -> AsyncGenerator[str, None]:
-    """Stream agent response"""
+                               ingest_incremental: Optional[bool] = None,
+                               cache_lookup: Optional[CacheLookup] = None) -> AsyncGenerator[str, None]:
+    """Stream agent response: LLM tokens as they are generated plus per-node progress events"""
     # Send initial metadata
     metadata_chunk = ChatStreamChunk(
         type="metadata",
-        metadata={"status": "processing"},
+        metadata={"status": "processing", "cache": cache_lookup.as_metadata() if cache_lookup else None},
         session_id=session_id
     )
-    yield f"data: {metadata_chunk.model_dump_json()}\n\n"
+    yield _sse(metadata_chunk)
 
     try:
-        # Process the query
-        result = await process_agent_query(message, session_id, image_path, file_path, ingest_incremental)
-
-        # Send route information
-        route_chunk = ChatStreamChunk(
-            type="metadata",
-            metadata={"route": result["route"], "logic": result["route_logic"]},
-            session_id=session_id,
-            route=result["route"]
-        )
-        yield f"data: {route_chunk.model_dump_json()}\n\n"
-
-        # Stream the response message (simulated - in real implementation, you'd stream from LLM)
-        response_text = result["message"]
-        words = response_text.split()
-        current_text = ""
-
-        for word in words:
-            current_text += word + " "
-            message_chunk = ChatStreamChunk(
-                type="message",
-                content=word + " ",
+        if cache_lookup is None:
+            cache_lookup = await lookup_cached_answer(message, session_id, image_path, file_path)
+        if cache_lookup.hit:
+            result = _cached_result(cache_lookup, session_id)
+            await _record_cached_turn(message, result["message"], session_id)
+            yield _sse(_route_chunk(result, session_id))
+            yield _sse(ChatStreamChunk(type="message", content=result["message"], session_id=session_id))
+            yield _sse(ChatStreamChunk(
+                type="done",
+                metadata={"sources": result.get("sources", [])},
                 session_id=session_id
-            )
-            yield f"data: {message_chunk.model_dump_json()}\n\n"
-            await asyncio.sleep(0.05)  # Simulate streaming delay
+            ))
+            return
+
+        input_state, config = _graph_run(message, session_id, image_path, file_path, ingest_incremental)
+        started = time.perf_counter()
+        final_state: Optional[Dict[str, Any]] = None
+        route_sent = False
+        streamed_tokens = False
+
+        async for event in graph.astream_events(input_state, config=config, version="v2"):
+            kind = event["event"]
+            node = (event.get("metadata") or {}).get("langgraph_node")
+
+            if kind == "on_chat_model_stream" and node in STREAM_TOKEN_NODES:
+                text = _token_text(event["data"].get("chunk"))
+                if text:
+                    streamed_tokens = True
+                    yield _sse(ChatStreamChunk(type="message", content=text, session_id=session_id))
+
+            elif kind == "on_chain_end" and node and event.get("name") == node and not node.startswith("__"):
+                # A graph node (main graph or sub-workflow) finished
+                output = event["data"].get("output")
+                if node == "analyze_and_route_query" and isinstance(output, dict) and output.get("router"):
+                    router_info = output["router"]
+                    yield _sse(_route_chunk(
+                        {"route": router_info.get("type"), "route_logic": router_info.get("logic")},
+                        session_id,
+                    ))
+                    route_sent = True
+                yield _sse(ChatStreamChunk(
+                    type="progress",
+                    metadata={
+                        "node": node,
+                        "status": "completed",
+                        "elapsed_ms": round((time.perf_counter() - started) * 1000),
+                    },
+                    session_id=session_id
+                ))
+
+            elif kind == "on_chain_end" and not event.get("parent_ids"):
+                final_state = event["data"].get("output")
+
+        result = _format_agent_result(final_state or {}, session_id, cache_lookup)
+        if not route_sent:
+            yield _sse(_route_chunk(result, session_id))
+        if not streamed_tokens and result["message"]:
+            # Answers assembled without a streaming LLM call (e.g. Neo4j summaries) arrive in one chunk
+            yield _sse(ChatStreamChunk(type="message", content=result["message"], session_id=session_id))
+
+        await _store_answer(message, result, session_id, cache_lookup, image_path, file_path)
 
         # Send done signal
         done_chunk = ChatStreamChunk(
@@ -211,22 +379,24 @@ async def stream_agent_response(message: str, session_id: str,
             metadata={"sources": result.get("sources", [])},
             session_id=session_id
         )
-        yield f"data: {done_chunk.model_dump_json()}\n\n"
+        yield _sse(done_chunk)
 
     except Exception as e:
+        logger.error(f"Agent stream failed: {e}", exc_info=True)
         # Send error
         error_chunk = ChatStreamChunk(
             type="error",
             content=f"处理请求时出错: {str(e)}",
             session_id=session_id
         )
-        yield f"data: {error_chunk.model_dump_json()}\n\n"
+        yield _sse(error_chunk)
 
 
 @router.post("/", response_model=ChatResponse)
 async def chat(
     request: ChatRequest,
     background_tasks: BackgroundTasks,
+    response: Response,
     db: Session = Depends(get_db)
 ) -> ChatResponse:
     """
@@ -235,6 +405,7 @@ async def chat(
     - Automatically routes queries to appropriate agents
     - Maintains conversation history
     - Supports file uploads and images
+    - Serves repeated questions from the response cache (see X-Cache headers)
     """
     # Get or create session
     session_id = get_or_create_session(db, request.session_id, request.user_id)
@@ -249,12 +420,18 @@ async def chat(
         else settings.INGEST_INCREMENTAL_DEFAULT
     )
 
+    cache_lookup = await lookup_cached_answer(
+        request.message, session_id, request.image_path, request.file_path
+    )
+    response.headers.update(cache_lookup.headers)
+
     result = await process_agent_query(
         request.message,
         session_id,
         request.image_path,
         request.file_path,
         effective_incremental,
+        cache_lookup,
     )
 
     # Save assistant message
@@ -300,6 +477,11 @@ async def chat_stream(
         else settings.INGEST_INCREMENTAL_DEFAULT
     )
 
+    # Resolve the cache before streaming so the outcome can be sent as headers
+    cache_lookup = await lookup_cached_answer(
+        request.message, session_id, request.image_path, request.file_path
+    )
+
     # Return streaming response
     return StreamingResponse(
         stream_agent_response(
@@ -308,12 +490,14 @@ async def chat_stream(
             request.image_path,
             request.file_path,
             effective_incremental,
+            cache_lookup,
         ),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
             "Connection": "keep-alive",
-            "X-Accel-Buffering": "no"  # Disable nginx buffering
+            "X-Accel-Buffering": "no",  # Disable nginx buffering
+            **cache_lookup.headers,
         }
     )
 
@@ -3,6 +3,7 @@ GustoBot FastAPI application entry point.
 """
 from __future__ import annotations
 
+import asyncio
 import os
 import uvicorn
 from fastapi import FastAPI, Request
@@ -11,10 +12,14 @@ from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 from loguru import logger
 
+from gustobot.application.agents.kg_sub_graph.kg_neo4j_conn import close_neo4j_graph
+from gustobot.application.agents.workflow_factory import get_workflow_factory
 from gustobot.application.services.lightrag_service import get_lightrag_service
 from gustobot.config import settings
 from gustobot.infrastructure.core import configure_logging
 from gustobot.infrastructure.core.database import Base, engine
+from gustobot.infrastructure.knowledge.recipe_kg.question_intent_classifier import get_classifier_artifact
+from gustobot.infrastructure.knowledge.registry import get_knowledge_registry
 from gustobot.interfaces.http import knowledge_router, lightrag_router
 from gustobot.interfaces.http.knowledge_router import get_neo4j_qa_service
 from gustobot.interfaces.http.v1 import api_router as api_v1_router
@@ -86,6 +91,13 @@ async def health_check() -> dict:
     return {"status": "healthy", "version": settings.APP_VERSION}
 
 
+@application.get("/health/knowledge")
+async def knowledge_health_check() -> JSONResponse:
+    """Milvus / knowledge base health (reconnects once if the ping fails)."""
+    health = await get_knowledge_registry().health()
+    return JSONResponse(status_code=200 if health["status"] != "unhealthy" else 503, content=health)
+
+
 @application.on_event("startup")
 async def startup_event() -> None:
     logger.info("Starting {} v{}", settings.APP_NAME, settings.APP_VERSION)
@@ -98,11 +110,35 @@ async def startup_event() -> None:
     Base.metadata.create_all(bind=engine)
     logger.info("Database tables ready")
 
+    # Connect to Milvus once and share the loaded collection across requests
+    await get_knowledge_registry().start()
+
+    # Load the prebuilt recipe_kg classifier (dictionaries + automaton) once per process
+    try:
+        await asyncio.to_thread(get_classifier_artifact)
+    except Exception as exc:
+        logger.warning("Failed to preload recipe_kg classifier: {}", exc)
+
+    # Compile the agent sub-workflows once instead of on every request
+    factory = get_workflow_factory()
+    try:
+        if settings.AGENT_WORKFLOW_BENCHMARK_ON_STARTUP:
+            await asyncio.to_thread(factory.benchmark)
+        elif settings.AGENT_WORKFLOW_WARMUP_ON_STARTUP:
+            await asyncio.to_thread(factory.warm_up)
+    except Exception as exc:
+        logger.warning("Agent workflow warm-up failed; compiling on first request: {}", exc)
+
 
 @application.on_event("shutdown")
 async def shutdown_event() -> None:
     logger.info("Shutting down {}", settings.APP_NAME)
 
+    try:
+        await get_knowledge_registry().shutdown()
+    except Exception as exc:  # pragma: no cover - defensive
+        logger.warning(f"Failed to close knowledge service cleanly: {exc}")
+
     # Ensure Neo4j connections are closed gracefully
     try:
         service = get_neo4j_qa_service()
@@ -110,6 +146,7 @@ async def shutdown_event() -> None:
         get_neo4j_qa_service.cache_clear()
     except Exception as exc:  # pragma: no cover - defensive
         logger.warning(f"Failed to close Neo4j service cleanly: {exc}")
+    close_neo4j_graph()
 
     # Cleanup LightRAG resources
     try:
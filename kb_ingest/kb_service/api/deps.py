@@ -3,9 +3,27 @@ from __future__ import annotations
 from functools import lru_cache
 
 from kb_service.core.config import Config, load_config
+from kb_service.db.pool import ConnectionPool, get_pool
+from kb_service.services.jobs import JobStore
+from kb_service.services.search import VectorSearcher
 
 
 @lru_cache
 def get_config() -> Config:
     """Provide a shared configuration instance for the application."""
     return load_config()
+
+
+@lru_cache
+def get_searcher() -> VectorSearcher:
+    """Shared searcher so the embedding/rerank clients and index state are reused across requests."""
+    return VectorSearcher(get_config())
+
+
+def get_db_pool() -> ConnectionPool:
+    return get_pool(get_config())
+
+
+@lru_cache
+def get_job_store() -> JobStore:
+    return JobStore(get_config().job_db_path)
@@ -4,16 +4,16 @@ import logging
 import tempfile
 import shutil
 from pathlib import Path
+from typing import Optional
 
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, Query, status, UploadFile, File, Form
 
-from kb_service.api.deps import get_config
-from kb_service.core.config import Config, clone_config
+from kb_service.api.deps import get_db_pool, get_job_store, get_searcher
+from kb_service.db.pool import ConnectionPool
 from kb_service.schemas.ingest import ExcelIngestRequest, MySQLIngestRequest
 from kb_service.schemas.search import SearchRequest, HybridSearchRequest
-from kb_service.services.processor import DataProcessor
+from kb_service.services.jobs import JobStore, cancel_job
 from kb_service.services.search import VectorSearcher
-from kb_service.services.mysql_ingest import MySQLIngestor
 
 logger = logging.getLogger(__name__)
 
@@ -23,27 +23,24 @@ router = APIRouter()
 @router.post(
     "/ingest/excel",
     status_code=status.HTTP_202_ACCEPTED,
-    summary="Process an Excel file and push embeddings into pgvector",
+    summary="Queue an Excel ingest job that pushes embeddings into pgvector",
 )
-def ingest_excel(payload: ExcelIngestRequest, background: BackgroundTasks, config: Config = Depends(get_config)):
+def ingest_excel(payload: ExcelIngestRequest, store: JobStore = Depends(get_job_store)):
     excel_path = Path(payload.excel_path)
     if not excel_path.exists():
         raise HTTPException(status_code=404, detail=f"Excel file not found: {excel_path}")
 
-    def run_ingest() -> None:
-        try:
-            local_config = clone_config(config)
-            local_config.excel_file_path = str(excel_path)
-            processor = DataProcessor(local_config, incremental=payload.incremental)
-            processor.process_excel()
-        except Exception:  # pragma: no cover - background task logging
-            logger.exception("Excel ingest failed for %s", excel_path)
-
-    background.add_task(run_ingest)
+    job = store.submit(
+        "excel",
+        f"excel:{excel_path.name}",
+        {"path": str(excel_path), "incremental": payload.incremental},
+    )
     mode = "增量" if payload.incremental else "全量"
-    logger.info("Excel ingest queued for %s (模式: %s)", excel_path, mode)
+    logger.info("Excel ingest queued for %s (模式: %s, 作业: %s)", excel_path, mode, job["job_id"])
     return {
-        "message": "ingest started",
+        "message": "ingest queued",
+        "job_id": job["job_id"],
+        "status": job["status"],
         "path": str(excel_path),
         "mode": "incremental" if payload.incremental else "full"
     }
@@ -52,19 +49,18 @@ def ingest_excel(payload: ExcelIngestRequest, background: BackgroundTasks, confi
 @router.post(
     "/ingest/excel/upload",
     status_code=status.HTTP_202_ACCEPTED,
-    summary="Upload an Excel file and push embeddings into pgvector",
+    summary="Upload an Excel file and queue an ingest job for it",
 )
 async def upload_and_ingest_excel(
     file: UploadFile = File(..., description="Excel file to upload"),
     incremental: bool = Form(False, description="Whether to use incremental mode"),
-    background: BackgroundTasks = None,
-    config: Config = Depends(get_config)
+    store: JobStore = Depends(get_job_store),
 ):
     """
-    上传 Excel 文件并处理：
+    上传 Excel 文件并加入入库作业队列：
     - 支持主机任意路径的文件上传
-    - 文件会保存到临时目录
-    - 处理完成后自动清理临时文件
+    - 文件会保存到临时目录，由 worker 进程处理
+    - 作业结束（成功、失败或取消）后自动清理临时文件
     """
     # 验证文件类型
     if not file.filename.endswith(('.xlsx', '.xls')):
@@ -74,7 +70,7 @@ async def upload_and_ingest_excel(
         )
 
     # 创建临时文件
-    temp_dir = tempfile.mkdtemp()
+    temp_dir = tempfile.mkdtemp(prefix="kb_upload_")
     temp_file_path = Path(temp_dir) / file.filename
 
     try:
@@ -84,30 +80,18 @@ async def upload_and_ingest_excel(
 
         logger.info("文件已上传到临时目录: %s", temp_file_path)
 
-        # 定义后台任务
-        def run_ingest() -> None:
-            try:
-                local_config = clone_config(config)
-                local_config.excel_file_path = str(temp_file_path)
-                processor = DataProcessor(local_config, incremental=incremental)
-                processor.process_excel()
-                logger.info("Excel 处理完成，文件: %s", temp_file_path)
-            except Exception:
-                logger.exception("Excel ingest failed for %s", temp_file_path)
-            finally:
-                # 清理临时文件
-                try:
-                    shutil.rmtree(temp_dir)
-                    logger.info("临时文件已清理: %s", temp_dir)
-                except Exception:
-                    logger.exception("清理临时文件失败: %s", temp_dir)
-
-        background.add_task(run_ingest)
+        job = store.submit(
+            "excel",
+            f"excel:{file.filename}",
+            {"path": str(temp_file_path), "incremental": incremental, "cleanup_dir": temp_dir},
+        )
         mode = "增量" if incremental else "全量"
-        logger.info("Excel 上传处理已加入队列: %s (模式: %s)", file.filename, mode)
+        logger.info("Excel 上传处理已加入队列: %s (模式: %s, 作业: %s)", file.filename, mode, job["job_id"])
 
         return {
-            "message": "文件上传成功，处理已开始",
+            "message": "文件上传成功，已加入处理队列",
+            "job_id": job["job_id"],
+            "status": job["status"],
             "filename": file.filename,
             "mode": "incremental" if incremental else "full",
             "size_bytes": temp_file_path.stat().st_size
@@ -123,26 +107,42 @@ async def upload_and_ingest_excel(
 @router.post(
     "/ingest/mysql",
     status_code=status.HTTP_202_ACCEPTED,
-    summary="Fetch rows from MySQL, rewrite/flatten, and store embeddings",
+    summary="Queue a job that fetches MySQL rows, rewrites/flattens them, and stores embeddings",
 )
-def ingest_mysql(
-    payload: MySQLIngestRequest,
-    background: BackgroundTasks,
-    config: Config = Depends(get_config),
+def ingest_mysql(payload: MySQLIngestRequest, store: JobStore = Depends(get_job_store)):
+    job = store.submit("mysql", f"mysql:{payload.table}", payload.model_dump())
+    logger.info("MySQL ingest queued for %s (作业: %s)", payload.table, job["job_id"])
+    return {
+        "message": "ingest queued",
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "table": payload.table,
+    }
+
+
+@router.get("/jobs", summary="List recent ingest jobs")
+def list_jobs(
+    status_filter: Optional[str] = Query(None, alias="status", description="queued / running / succeeded / failed / cancelled"),
+    limit: int = Query(50, ge=1, le=500),
+    store: JobStore = Depends(get_job_store),
 ):
-    payload_data = payload.model_dump()
+    return {"jobs": store.list(status=status_filter, limit=limit)}
 
-    def run_ingest() -> None:
-        try:
-            local_config = clone_config(config)
-            ingestor = MySQLIngestor(local_config)
-            ingestor.ingest(MySQLIngestRequest(**payload_data))
-        except Exception:  # pragma: no cover - background task logging
-            logger.exception("MySQL ingest failed for %s", payload_data.get('table'))
 
-    background.add_task(run_ingest)
-    logger.info("MySQL ingest queued for %s", payload.table)
-    return {"message": "ingest started", "table": payload.table}
+@router.get("/jobs/{job_id}", summary="Ingest job status, progress and throughput")
+def get_job(job_id: str, store: JobStore = Depends(get_job_store)):
+    job = store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return job
+
+
+@router.post("/jobs/{job_id}/cancel", summary="Cancel a queued or running ingest job")
+def cancel_ingest_job(job_id: str, store: JobStore = Depends(get_job_store)):
+    job = cancel_job(store, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return job
 
 
 @router.post(
@@ -150,8 +150,7 @@ def ingest_mysql(
     status_code=status.HTTP_200_OK,
     summary="Query pgvector for similar records",
 )
-def vector_search(payload: SearchRequest, config: Config = Depends(get_config)):
-    searcher = VectorSearcher(config)
+def vector_search(payload: SearchRequest, searcher: VectorSearcher = Depends(get_searcher)):
     results = searcher.search_similar(
         query=payload.query,
         top_k=payload.top_k,
@@ -159,6 +158,8 @@ def vector_search(payload: SearchRequest, config: Config = Depends(get_config)):
         metric=payload.metric,
         company_filter=payload.company_filter,
         source_tables=payload.source_tables,
+        ef_search=payload.ef_search,
+        probes=payload.probes,
     )
     return {"query": payload.query, "results": results, "count": len(results)}
 
@@ -168,8 +169,7 @@ def vector_search(payload: SearchRequest, config: Config = Depends(get_config)):
     status_code=status.HTTP_200_OK,
     summary="Hybrid search with vector retrieval + reranking",
 )
-def hybrid_search(payload: HybridSearchRequest, config: Config = Depends(get_config)):
-    searcher = VectorSearcher(config)
+def hybrid_search(payload: HybridSearchRequest, searcher: VectorSearcher = Depends(get_searcher)):
     return searcher.hybrid_search(
         query=payload.query,
         vector_top_k=payload.vector_top_k,
@@ -177,4 +177,15 @@ def hybrid_search(payload: HybridSearchRequest, config: Config = Depends(get_con
         threshold=payload.threshold,
         metric=payload.metric,
         source_tables=payload.source_tables,
+        ef_search=payload.ef_search,
+        probes=payload.probes,
     )
+
+
+@router.get(
+    "/db/pool",
+    status_code=status.HTTP_200_OK,
+    summary="PostgreSQL connection pool size, wait time and checkout metrics",
+)
+def db_pool_stats(pool: ConnectionPool = Depends(get_db_pool)):
+    return pool.stats()
@@ -6,9 +6,11 @@ import logging
 
 from kb_service.core.config import load_config
 from kb_service.schemas.ingest import MySQLIngestRequest
+from kb_service.services.jobs import JobWorker, start_workers, stop_workers
 from kb_service.services.mysql_ingest import MySQLIngestor
 from kb_service.services.processor import DataProcessor
 from kb_service.services.search import VectorSearcher
+from kb_service.services.vector_index import VectorIndexManager
 
 
 def process_excel(excel_path: str) -> None:
@@ -18,13 +20,33 @@ def process_excel(excel_path: str) -> None:
     processor.process_excel()
 
 
-def run_search(query: str, top_k: int, threshold: float | None, metric: str) -> None:
+def run_search(
+    query: str,
+    top_k: int,
+    threshold: float | None,
+    metric: str,
+    ef_search: int | None = None,
+    probes: int | None = None,
+) -> None:
     config = load_config()
     searcher = VectorSearcher(config)
-    results = searcher.search_similar(query=query, top_k=top_k, threshold=threshold, metric=metric)
+    results = searcher.search_similar(
+        query=query,
+        top_k=top_k,
+        threshold=threshold,
+        metric=metric,
+        ef_search=ef_search,
+        probes=probes,
+    )
     print(json.dumps(results, ensure_ascii=False, indent=2))
 
 
+def ensure_index(force: bool, index_type: str | None) -> None:
+    config = load_config()
+    result = VectorIndexManager(config).ensure_index(force=force, kind=index_type)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
 def ingest_mysql(
     connection_url: str,
     table: str,
@@ -36,6 +58,7 @@ def ingest_mysql(
     id_column: str | None,
     company_field: str | None,
     report_year_field: str | None,
+    incremental: bool = False,
 ) -> None:
     config = load_config()
     ingestor = MySQLIngestor(config)
@@ -51,11 +74,27 @@ def ingest_mysql(
         company_field=company_field,
         report_year_field=report_year_field,
         extra_metadata={},  # 添加默认空字典
+        incremental=incremental,
     )
     summary = ingestor.ingest(request)
     print(json.dumps(summary, ensure_ascii=False, indent=2))
 
 
+def run_workers(processes: int | None, once: bool) -> None:
+    config = load_config()
+    count = processes if processes is not None else max(1, config.job_workers)
+    if count <= 1 or once:
+        processed = JobWorker(config).run(once=once)
+        print(json.dumps({"jobs_processed": processed}, ensure_ascii=False))
+        return
+    workers, stop_event = start_workers(count)
+    try:
+        for process in workers:
+            process.join()
+    except KeyboardInterrupt:
+        stop_workers(workers, stop_event)
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(description="Knowledge ingestion service CLI")
     subparsers = parser.add_subparsers(dest="command", required=True)
@@ -68,6 +107,18 @@ def main() -> None:
     search_parser.add_argument("--top-k", type=int, default=10)
     search_parser.add_argument("--threshold", type=float, default=None)
     search_parser.add_argument("--metric", choices=["cosine", "l2"], default="cosine")
+    search_parser.add_argument("--ef-search", type=int, default=None, help="HNSW candidate list size")
+    search_parser.add_argument("--probes", type=int, default=None, help="IVFFlat lists to probe")
+
+    index_parser = subparsers.add_parser("ensure-index", help="Create or rebuild the pgvector ANN index")
+    index_parser.add_argument("--force", action="store_true", help="Rebuild even if the index is up to date")
+    index_parser.add_argument(
+        "--type",
+        dest="index_type",
+        choices=["auto", "hnsw", "ivfflat", "none"],
+        default=None,
+        help="Override VECTOR_INDEX_TYPE",
+    )
 
     mysql_parser = subparsers.add_parser("ingest-mysql", help="Ingest data from a MySQL table")
     mysql_parser.add_argument("connection_url", help="SQLAlchemy style MySQL connection URL")
@@ -80,6 +131,13 @@ def main() -> None:
     mysql_parser.add_argument("--id-column", help="Column to use as unique ID")
     mysql_parser.add_argument("--company-field", help="Column containing company name")
     mysql_parser.add_argument("--report-year-field", help="Column containing report year")
+    mysql_parser.add_argument(
+        "--incremental", action="store_true", help="Only re-embed rows whose content hash changed"
+    )
+
+    worker_parser = subparsers.add_parser("worker", help="Run ingest job workers against the job queue")
+    worker_parser.add_argument("--processes", type=int, default=None, help="Worker processes (default JOB_WORKERS)")
+    worker_parser.add_argument("--once", action="store_true", help="Exit when the queue is empty")
 
     args = parser.parse_args()
     logging.basicConfig(level=logging.INFO)
@@ -87,7 +145,16 @@ def main() -> None:
     if args.command == "process-excel":
         process_excel(args.path)
     elif args.command == "search":
-        run_search(args.query, top_k=args.top_k, threshold=args.threshold, metric=args.metric)
+        run_search(
+            args.query,
+            top_k=args.top_k,
+            threshold=args.threshold,
+            metric=args.metric,
+            ef_search=args.ef_search,
+            probes=args.probes,
+        )
+    elif args.command == "ensure-index":
+        ensure_index(force=args.force, index_type=args.index_type)
     elif args.command == "ingest-mysql":
         ingest_mysql(
             connection_url=args.connection_url,
@@ -100,7 +167,10 @@ def main() -> None:
             id_column=args.id_column,
             company_field=args.company_field,
             report_year_field=args.report_year_field,
+            incremental=args.incremental,
         )
+    elif args.command == "worker":
+        run_workers(args.processes, once=args.once)
 
 
 if __name__ == "__main__":
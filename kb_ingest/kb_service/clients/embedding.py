@@ -1,9 +1,14 @@
 from __future__ import annotations
 
+import hashlib
 import logging
 import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
 from enum import Enum
-from typing import List
+from typing import Dict, List, Optional, Sequence, Tuple
 
 import numpy as np
 import requests
@@ -19,19 +24,131 @@ class EmbeddingProvider(str, Enum):
     OLLAMA = "ollama"
 
 
+def embedding_cache_key(model: str, text: str) -> str:
+    """Content hash identifying the embedding of `text` under `model`."""
+    return hashlib.sha256(f"{model}\x00{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """In-memory LRU in front of an optional SQLite file, keyed by content hash."""
+
+    def __init__(self, max_size: int = 10000, path: Optional[str] = None):
+        self.max_size = max_size
+        self.path = path or None
+        self._items: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if self.path:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+            )
+            self._db.commit()
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, np.ndarray]:
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            for key in keys:
+                vector = self._items.get(key)
+                if vector is not None:
+                    self._items.move_to_end(key)
+                    found[key] = vector
+
+            missing = [key for key in keys if key not in found]
+            if self._db is not None and missing:
+                for start in range(0, len(missing), 500):
+                    chunk = missing[start:start + 500]
+                    placeholders = ",".join("?" for _ in chunk)
+                    rows = self._db.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                    ).fetchall()
+                    for key, blob in rows:
+                        vector = np.frombuffer(blob, dtype=np.float32)
+                        found[key] = vector
+                        self._remember(key, vector)
+        return found
+
+    def set_many(self, items: Dict[str, np.ndarray]) -> None:
+        if not items:
+            return
+        with self._lock:
+            for key, vector in items.items():
+                self._remember(key, vector)
+            if self._db is not None:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items.items()],
+                )
+                self._db.commit()
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        if self.max_size <= 0:
+            return
+        self._items[key] = vector
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+
+_shared_lock = threading.Lock()
+_shared_caches: Dict[Tuple[int, str], EmbeddingCache] = {}
+_shared_openai: Dict[Tuple[Optional[str], Optional[str]], OpenAI] = {}
+_shared_session: Optional[requests.Session] = None
+_inflight: Dict[str, Future] = {}
+
+
+def get_embedding_cache(config: Config) -> EmbeddingCache:
+    """Process-wide cache shared by every `EmbeddingClient` with the same settings."""
+    key = (config.embedding_cache_size, config.embedding_cache_path)
+    with _shared_lock:
+        cache = _shared_caches.get(key)
+        if cache is None:
+            cache = EmbeddingCache(config.embedding_cache_size, config.embedding_cache_path)
+            _shared_caches[key] = cache
+        return cache
+
+
+def _openai_client(api_key: Optional[str], base_url: Optional[str]) -> OpenAI:
+    with _shared_lock:
+        client = _shared_openai.get((api_key, base_url))
+        if client is None:
+            client = OpenAI(api_key=api_key, base_url=base_url)
+            _shared_openai[(api_key, base_url)] = client
+        return client
+
+
+def _http_session() -> requests.Session:
+    global _shared_session
+    with _shared_lock:
+        if _shared_session is None:
+            _shared_session = requests.Session()
+        return _shared_session
+
+
 class EmbeddingClient:
-    """Uniform embedding interface with provider specific fallbacks."""
+    """
+    Uniform embedding interface with provider specific fallbacks.
 
-    def __init__(self, config: Config):
+    Clients share pooled HTTP connections and a content-hash embedding cache
+    (memory LRU + optional SQLite file), and concurrent requests for the same
+    text wait for a single provider call.
+    """
+
+    def __init__(self, config: Config, cache: Optional[EmbeddingCache] = None):
         self.config = config
         self.provider = EmbeddingProvider(config.embedding_provider.lower())
         self.dimension = config.embedding_dimension
+        self.cache = cache or get_embedding_cache(config)
         self._setup_client()
 
     def _setup_client(self) -> None:
         if self.provider == EmbeddingProvider.OPENAI:
             api_key = self.config.embedding_api_key or os.getenv("OPENAI_API_KEY")
-            self.openai_client = OpenAI(api_key=api_key, base_url=self.config.embedding_base_url)
+            self.openai_client = _openai_client(api_key, self.config.embedding_base_url)
             model_dimensions = {
                 "text-embedding-3-small": 1536,
                 "text-embedding-3-large": 3072,
@@ -42,11 +159,53 @@ class EmbeddingClient:
         elif self.provider == EmbeddingProvider.OLLAMA:
             base = self.config.embedding_base_url or self.config.llm_base_url or "http://localhost:11434"
             self.ollama_url = f"{base.rstrip('/')}/api/embeddings"
+            self.session = _http_session()
 
     def embed_texts(self, texts: List[str]) -> np.ndarray:
         if not texts:
             return np.array([])
 
+        keys = [embedding_cache_key(self.config.embedding_model, text) for text in texts]
+        resolved = self.cache.get_many(list(dict.fromkeys(keys)))
+
+        owned: Dict[str, Future] = {}
+        waiting: Dict[str, Future] = {}
+        missing: Dict[str, str] = {}
+        with _shared_lock:
+            for key, text in zip(keys, texts):
+                if key in resolved or key in missing or key in waiting:
+                    continue
+                if key in _inflight:
+                    waiting[key] = _inflight[key]
+                else:
+                    missing[key] = text
+                    owned[key] = _inflight[key] = Future()
+
+        if missing:
+            try:
+                vectors = self._embed_uncached(list(missing.values()))
+                computed = {
+                    key: np.asarray(vector, dtype=np.float32) for key, vector in zip(missing, vectors)
+                }
+                self.cache.set_many(computed)
+            except BaseException as exc:
+                for future in owned.values():
+                    future.set_exception(exc)
+                raise
+            finally:
+                with _shared_lock:
+                    for key in owned:
+                        _inflight.pop(key, None)
+            for key, future in owned.items():
+                future.set_result(computed[key])
+            resolved.update(computed)
+
+        for key, future in waiting.items():
+            resolved[key] = future.result()
+
+        return np.stack([resolved[key] for key in keys]).astype(np.float32, copy=False)
+
+    def _embed_uncached(self, texts: List[str]) -> np.ndarray:
         if self.provider == EmbeddingProvider.OPENAI:
             return self._embed_openai(texts)
         if self.provider == EmbeddingProvider.OLLAMA:
@@ -68,7 +227,7 @@ class EmbeddingClient:
     def _embed_ollama(self, texts: List[str]) -> np.ndarray:
         embeddings: List[List[float]] = []
         for text in texts:
-            resp = requests.post(
+            resp = self.session.post(
                 self.ollama_url,
                 json={"model": self.config.embedding_model, "prompt": text},
                 timeout=60,
@@ -59,6 +59,11 @@ class Config:
     llm_fallback_to_flatten: bool = field(
         default_factory=lambda: os.getenv("LLM_FALLBACK_TO_FLATTEN", "false").lower() == "true"
     )
+    # concurrent rewriting (see services/rewriter.py)
+    llm_concurrency: int = field(default_factory=lambda: int(os.getenv("LLM_CONCURRENCY", "8")))
+    llm_rate_limit_rpm: float = field(default_factory=lambda: float(os.getenv("LLM_RATE_LIMIT_RPM", "0")))
+    llm_rate_limit_burst: int = field(default_factory=lambda: int(os.getenv("LLM_RATE_LIMIT_BURST", "0")))
+    llm_retry_max_delay: float = field(default_factory=lambda: float(os.getenv("LLM_RETRY_MAX_DELAY", "60")))
 
     # embedding settings
     embedding_provider: str = field(default_factory=lambda: os.getenv("EMBEDDING_PROVIDER", "openai"))
@@ -66,6 +71,8 @@ class Config:
     embedding_api_key: str = field(default_factory=lambda: os.getenv("EMBEDDING_API_KEY", ""))
     embedding_base_url: Optional[str] = field(default_factory=lambda: os.getenv("EMBEDDING_BASE_URL"))
     embedding_dimension: int = field(default_factory=lambda: int(os.getenv("EMBEDDING_DIMENSION", "4096")))
+    embedding_cache_size: int = field(default_factory=lambda: int(os.getenv("EMBEDDING_CACHE_SIZE", "10000")))
+    embedding_cache_path: str = field(default_factory=lambda: os.getenv("EMBEDDING_CACHE_PATH", ""))
 
     # processing behaviour
     batch_size: int = field(default_factory=lambda: int(os.getenv("BATCH_SIZE", "16")))
@@ -95,6 +102,63 @@ class Config:
         default_factory=lambda: float(os.getenv("RERANK_SCORE_FUSION_ALPHA", "0.3"))
         if os.getenv("RERANK_SCORE_FUSION_ALPHA") else None
     )
+    # 单次 rerank（含重试）的延迟预算，超出则保持向量排序；连续失败后熔断一段时间
+    rerank_latency_budget_ms: int = field(default_factory=lambda: int(os.getenv("RERANK_LATENCY_BUDGET_MS", "1500")))
+    rerank_max_connections: int = field(default_factory=lambda: int(os.getenv("RERANK_MAX_CONNECTIONS", "20")))
+    rerank_cache_size: int = field(default_factory=lambda: int(os.getenv("RERANK_CACHE_SIZE", "10000")))
+    rerank_cache_ttl: int = field(default_factory=lambda: int(os.getenv("RERANK_CACHE_TTL", "3600")))
+    rerank_breaker_failures: int = field(default_factory=lambda: int(os.getenv("RERANK_BREAKER_FAILURES", "3")))
+    rerank_breaker_cooldown: float = field(default_factory=lambda: float(os.getenv("RERANK_BREAKER_COOLDOWN", "30")))
+
+    # pgvector ANN index (see services/vector_index.py)
+    vector_index_type: str = field(default_factory=lambda: os.getenv("VECTOR_INDEX_TYPE", "auto").lower())
+    vector_index_metric: str = field(default_factory=lambda: os.getenv("VECTOR_INDEX_METRIC", "cosine").lower())
+    vector_index_min_rows: int = field(default_factory=lambda: int(os.getenv("VECTOR_INDEX_MIN_ROWS", "10000")))
+    vector_index_hnsw_max_rows: int = field(
+        default_factory=lambda: int(os.getenv("VECTOR_INDEX_HNSW_MAX_ROWS", "5000000"))
+    )
+    vector_index_auto_rebuild: bool = field(
+        default_factory=lambda: os.getenv("VECTOR_INDEX_AUTO_REBUILD", "true").lower() != "false"
+    )
+    vector_index_rebuild_growth: float = field(
+        default_factory=lambda: float(os.getenv("VECTOR_INDEX_REBUILD_GROWTH", "2.0"))
+    )
+    vector_index_maintenance_work_mem: str = field(
+        default_factory=lambda: os.getenv("VECTOR_INDEX_MAINTENANCE_WORK_MEM", "")
+    )
+    hnsw_m: int = field(default_factory=lambda: int(os.getenv("HNSW_M", "16")))
+    hnsw_ef_construction: int = field(default_factory=lambda: int(os.getenv("HNSW_EF_CONSTRUCTION", "64")))
+    hnsw_ef_search: int = field(default_factory=lambda: int(os.getenv("HNSW_EF_SEARCH", "40")))
+    ivfflat_lists: int = field(default_factory=lambda: int(os.getenv("IVFFLAT_LISTS", "0")))  # 0 = 按行数自动
+    ivfflat_probes: int = field(default_factory=lambda: int(os.getenv("IVFFLAT_PROBES", "0")))  # 0 = sqrt(lists)
+
+    # PostgreSQL connection pool (see db/pool.py)
+    db_pool_min_size: int = field(default_factory=lambda: int(os.getenv("DB_POOL_MIN_SIZE", "1")))
+    db_pool_max_size: int = field(default_factory=lambda: int(os.getenv("DB_POOL_MAX_SIZE", "10")))
+    db_pool_timeout: float = field(default_factory=lambda: float(os.getenv("DB_POOL_TIMEOUT", "30")))
+    db_statement_cache_size: int = field(
+        default_factory=lambda: int(os.getenv("DB_STATEMENT_CACHE_SIZE", "64"))
+    )
+
+    # bulk writes (see db/bulk.py)
+    db_write_batch_size: int = field(default_factory=lambda: int(os.getenv("DB_WRITE_BATCH_SIZE", "2000")))
+    bulk_copy_min_rows: int = field(default_factory=lambda: int(os.getenv("BULK_COPY_MIN_ROWS", "500")))
+    change_detect_fetch_size: int = field(
+        default_factory=lambda: int(os.getenv("CHANGE_DETECT_FETCH_SIZE", "10000"))
+    )
+
+    # streaming ingest pipeline (see services/pipeline.py)
+    pipeline_queue_size: int = field(default_factory=lambda: int(os.getenv("PIPELINE_QUEUE_SIZE", "8")))
+    ingest_checkpoint_dir: str = field(
+        default_factory=lambda: os.getenv("INGEST_CHECKPOINT_DIR", "save/checkpoints")
+    )
+    job_db_path: str = field(default_factory=lambda: os.getenv("JOB_DB_PATH", "save/jobs.sqlite3"))
+    job_workers: int = field(default_factory=lambda: int(os.getenv("JOB_WORKERS", "1")))
+    job_max_per_table: int = field(default_factory=lambda: int(os.getenv("JOB_MAX_PER_TABLE", "1")))
+    job_poll_interval: float = field(default_factory=lambda: float(os.getenv("JOB_POLL_INTERVAL", "1.0")))
+    job_heartbeat_interval: float = field(default_factory=lambda: float(os.getenv("JOB_HEARTBEAT_INTERVAL", "2.0")))
+    job_stale_seconds: float = field(default_factory=lambda: float(os.getenv("JOB_STALE_SECONDS", "60")))
+    job_worker_nice: int = field(default_factory=lambda: int(os.getenv("JOB_WORKER_NICE", "10")))
 
     db: DatabaseConfig = field(default_factory=DatabaseConfig.from_env)
 
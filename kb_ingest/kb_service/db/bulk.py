@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import io
+import logging
+import struct
+import uuid
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from psycopg2.extras import execute_values
+
+logger = logging.getLogger(__name__)
+
+_COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+_COPY_TRAILER = struct.pack(">h", -1)
+_NULL_FIELD = struct.pack(">i", -1)
+
+
+def vector_to_binary(value) -> bytes:
+    """pgvector binary wire format: uint16 dim, uint16 unused, float4[dim] big-endian."""
+    arr = np.asarray(value, dtype=">f4").ravel()
+    return struct.pack(">HH", arr.size, 0) + arr.tobytes()
+
+
+def vector_to_text(value) -> str:
+    return "[" + ",".join(map(str, np.asarray(value, dtype=np.float32).ravel().tolist())) + "]"
+
+
+def encode_copy_binary(rows: Iterable[Sequence], vector_columns: Sequence[int] = ()) -> bytes:
+    """
+    Encode rows for `COPY ... FROM STDIN WITH (FORMAT binary)`.
+
+    Columns listed in `vector_columns` (by position) are sent as pgvector
+    binary; every other non-null value is sent as UTF-8 text, so the
+    staging columns must be `text` / `vector`.
+    """
+    vector_columns = frozenset(vector_columns)
+    buffer = io.BytesIO()
+    buffer.write(_COPY_HEADER)
+    pack_len = struct.Struct(">i").pack
+    field_count = None
+    for row in rows:
+        if field_count is None:
+            field_count = struct.pack(">h", len(row))
+        parts = [field_count]
+        for idx, value in enumerate(row):
+            if value is None:
+                parts.append(_NULL_FIELD)
+                continue
+            data = vector_to_binary(value) if idx in vector_columns else str(value).encode("utf-8")
+            parts.append(pack_len(len(data)))
+            parts.append(data)
+        buffer.write(b"".join(parts))
+    buffer.write(_COPY_TRAILER)
+    return buffer.getvalue()
+
+
+def copy_rows_binary(
+    cur,
+    table: str,
+    columns: Sequence[str],
+    rows: Sequence[Sequence],
+    vector_columns: Sequence[str] = (),
+) -> None:
+    """Binary COPY `rows` into `table` (typically a staging temp table)."""
+    positions = [columns.index(name) for name in vector_columns]
+    payload = encode_copy_binary(rows, positions)
+    cur.copy_expert(
+        f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT binary)",
+        io.BytesIO(payload),
+    )
+
+
+def column_types(cur, table: str) -> Dict[str, str]:
+    """Column name -> SQL type (with typmod, e.g. `vector(1024)`) for `table`."""
+    cur.execute(
+        """
+        SELECT attname, format_type(atttypid, atttypmod)
+        FROM pg_attribute
+        WHERE attrelid = to_regclass(%s) AND attnum > 0 AND NOT attisdropped;
+        """,
+        (table,),
+    )
+    return {name: type_name for name, type_name in cur.fetchall()}
+
+
+class BulkUpserter:
+    """
+    Set-based upsert into a pgvector table.
+
+    Large batches are staged with binary `COPY` into an `ON COMMIT DROP`
+    temp table and merged with one `INSERT ... SELECT ... ON CONFLICT DO
+    UPDATE`; batches below `copy_threshold` rows go through
+    `execute_values` instead, where the COPY round trips would dominate.
+    The caller owns the transaction and commits after `upsert`.
+    """
+
+    def __init__(
+        self,
+        table: str,
+        columns: Sequence[str],
+        key_columns: Sequence[str],
+        *,
+        vector_column: str = "embedding",
+        touch: Optional[Dict[str, str]] = None,
+        copy_threshold: int = 500,
+    ) -> None:
+        self.table = table
+        self.columns = list(columns)
+        self.key_columns = list(key_columns)
+        self.vector_column = vector_column
+        self.touch = dict(touch or {})  # 更新时额外设置的列，如 created_at = CURRENT_TIMESTAMP
+        self.copy_threshold = copy_threshold
+        self._key_positions = [self.columns.index(name) for name in self.key_columns]
+        self._vector_position = self.columns.index(vector_column)
+
+    def upsert(self, conn, rows: Sequence[Sequence]) -> int:
+        rows = self._dedupe(rows)
+        if not rows:
+            return 0
+        with conn.cursor() as cur:
+            if len(rows) < self.copy_threshold:
+                self._upsert_values(cur, rows)
+            else:
+                self._upsert_copy(cur, rows)
+        return len(rows)
+
+    # ------------------------------------------------------------------ paths
+    def _conflict_clause(self) -> str:
+        updates = [f"{name} = EXCLUDED.{name}" for name in self.columns if name not in self.key_columns]
+        updates += [f"{name} = {expr}" for name, expr in self.touch.items()]
+        return f"ON CONFLICT ({', '.join(self.key_columns)}) DO UPDATE SET {', '.join(updates)}"
+
+    def _upsert_values(self, cur, rows: List[Sequence]) -> None:
+        vector_pos = self._vector_position
+        values = [
+            tuple(
+                vector_to_text(value) if idx == vector_pos and value is not None else value
+                for idx, value in enumerate(row)
+            )
+            for row in rows
+        ]
+        execute_values(
+            cur,
+            f"INSERT INTO {self.table} ({', '.join(self.columns)}) VALUES %s {self._conflict_clause()};",
+            values,
+            page_size=len(values),
+        )
+
+    def _upsert_copy(self, cur, rows: List[Sequence]) -> None:
+        types = column_types(cur, self.table)
+        stage = f"_stage_{self.table}_{uuid.uuid4().hex[:8]}"
+        stage_defs = ", ".join(
+            f"{name} {'vector' if name == self.vector_column else 'text'}" for name in self.columns
+        )
+        cur.execute(f"CREATE TEMP TABLE {stage} ({stage_defs}) ON COMMIT DROP;")
+        copy_rows_binary(cur, stage, self.columns, rows, vector_columns=[self.vector_column])
+
+        select_list = ", ".join(f"s.{name}::{types.get(name, 'text')}" for name in self.columns)
+        cur.execute(
+            f"""
+            INSERT INTO {self.table} ({', '.join(self.columns)})
+            SELECT {select_list} FROM {stage} AS s
+            {self._conflict_clause()};
+            """
+        )
+        cur.execute(f"DROP TABLE {stage};")
+
+    def _dedupe(self, rows: Sequence[Sequence]) -> List[Sequence]:
+        """Keep the last row per key: one INSERT cannot update the same row twice."""
+        keyed: Dict[Tuple, Sequence] = {}
+        unkeyed: List[Sequence] = []
+        for row in rows:
+            key = tuple(row[pos] for pos in self._key_positions)
+            if any(part is None for part in key):
+                unkeyed.append(row)
+            else:
+                keyed[key] = row
+        if len(keyed) + len(unkeyed) < len(rows):
+            logger.debug("批内重复键 %s 条，仅保留最后一条", len(rows) - len(keyed) - len(unkeyed))
+        return list(keyed.values()) + unkeyed
@@ -0,0 +1,302 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+import psycopg2
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_UNKNOWN
+from psycopg2.pool import PoolError
+from pgvector.psycopg2 import register_vector
+
+from kb_service.core.config import Config
+
+logger = logging.getLogger(__name__)
+
+# 空闲超过该时长的连接在借出前先 ping 一次，避免拿到已被服务端断开的连接
+_PING_AFTER_IDLE_SECONDS = 30.0
+
+
+class PoolTimeout(PoolError):
+    """No connection became available within the pool timeout."""
+
+
+@dataclass
+class _ConnectionState:
+    vector_registered: bool = False
+    prepared: OrderedDict[str, str] = field(default_factory=OrderedDict)  # SQL -> statement name, LRU order
+    last_used: float = field(default_factory=time.monotonic)
+
+
+class ConnectionPool:
+    """
+    Thread-safe psycopg2 connection pool shared by the searcher and the writers.
+
+    Connections are opened lazily up to `max_size`, registered with the
+    pgvector types once, and keep a per-connection cache of server-side
+    prepared statements (see `execute_prepared`). Callers block for up to
+    `timeout` seconds when every connection is checked out.
+    """
+
+    def __init__(
+        self,
+        connect_kwargs: Dict[str, str],
+        *,
+        min_size: int = 1,
+        max_size: int = 10,
+        timeout: float = 30.0,
+        statement_cache_size: int = 64,
+    ) -> None:
+        self.connect_kwargs = dict(connect_kwargs)
+        self.min_size = max(0, min(min_size, max_size))
+        self.max_size = max(1, max_size)
+        self.timeout = timeout
+        self.statement_cache_size = statement_cache_size
+
+        self._idle: List = []
+        self._states: Dict[int, _ConnectionState] = {}
+        self._slots = threading.BoundedSemaphore(self.max_size)
+        self._lock = threading.Lock()
+        self._closed = False
+
+        self._in_use = 0
+        self._checkouts = 0
+        self._waits = 0
+        self._timeouts = 0
+        self._wait_ms_total = 0.0
+        self._wait_ms_max = 0.0
+        self._connects = 0
+        self._discarded = 0
+        self._statement_prepares = 0
+        self._statement_hits = 0
+
+    # ---------------------------------------------------------------- checkout
+    @contextmanager
+    def connection(self) -> Iterator:
+        """Borrow a connection; uncommitted work is rolled back when it is returned."""
+        conn = self._checkout()
+        broken = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            self._checkin(conn, discard=broken)
+
+    def warm_up(self) -> None:
+        """Open `min_size` connections ahead of the first request."""
+        conns = []
+        try:
+            for _ in range(self.min_size):
+                conns.append(self._checkout())
+        finally:
+            for conn in conns:
+                self._checkin(conn)
+
+    def _checkout(self):
+        if self._closed:
+            raise PoolError("connection pool is closed")
+        started = time.perf_counter()
+        waited = False
+        if not self._slots.acquire(blocking=False):
+            waited = True
+            if not self._slots.acquire(timeout=self.timeout):
+                with self._lock:
+                    self._timeouts += 1
+                raise PoolTimeout(
+                    f"no PostgreSQL connection available within {self.timeout}s (max_size={self.max_size})"
+                )
+        wait_ms = (time.perf_counter() - started) * 1000
+
+        try:
+            conn = self._take_idle() or self._connect()
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._in_use += 1
+            self._checkouts += 1
+            if waited:
+                self._waits += 1
+                self._wait_ms_total += wait_ms
+                self._wait_ms_max = max(self._wait_ms_max, wait_ms)
+        return conn
+
+    def _take_idle(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                conn = self._idle.pop()
+                state = self._states.get(id(conn))
+            if conn.closed or state is None:
+                self._discard(conn)
+                continue
+            if time.monotonic() - state.last_used > _PING_AFTER_IDLE_SECONDS:
+                try:
+                    with conn.cursor() as cur:
+                        cur.execute("SELECT 1;")
+                    conn.rollback()
+                except psycopg2.Error:
+                    self._discard(conn)
+                    continue
+            return conn
+
+    def _connect(self):
+        conn = psycopg2.connect(**self.connect_kwargs)
+        with self._lock:
+            self._states[id(conn)] = _ConnectionState()
+            self._connects += 1
+        try:
+            self.ensure_vector(conn)
+        except psycopg2.ProgrammingError:
+            # 扩展尚未创建（首次入库前）；写入方执行 CREATE EXTENSION 后再调用 ensure_vector
+            conn.rollback()
+        return conn
+
+    def _checkin(self, conn, discard: bool = False) -> None:
+        if not discard and not conn.closed:
+            try:
+                status = conn.info.transaction_status
+                if status == TRANSACTION_STATUS_UNKNOWN:
+                    discard = True
+                elif status != TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                if conn.autocommit:
+                    conn.autocommit = False
+            except psycopg2.Error:
+                discard = True
+
+        with self._lock:
+            self._in_use -= 1
+            state = self._states.get(id(conn))
+            keep = not (discard or conn.closed or self._closed or state is None)
+            if keep:
+                state.last_used = time.monotonic()
+                self._idle.append(conn)
+        if not keep:
+            self._discard(conn)
+        self._slots.release()
+
+    def _discard(self, conn) -> None:
+        with self._lock:
+            self._states.pop(id(conn), None)
+            self._discarded += 1
+        try:
+            conn.close()
+        except psycopg2.Error:  # pragma: no cover - already broken
+            pass
+
+    # ---------------------------------------------------------- per-connection
+    def ensure_vector(self, conn) -> None:
+        """Register the pgvector types on `conn` once (after CREATE EXTENSION on a fresh database)."""
+        state = self._states.get(id(conn))
+        if state is not None and state.vector_registered:
+            return
+        register_vector(conn)
+        conn.commit()
+        if state is not None:
+            state.vector_registered = True
+
+    def execute_prepared(self, cur, sql: str, params: Sequence = ()) -> None:
+        """
+        Run `sql` (written with $1..$n placeholders) as a server-side prepared
+        statement, preparing it on first use for this connection. Each
+        connection keeps at most `statement_cache_size` statements; the least
+        recently used one is deallocated to make room.
+        """
+        state = self._states.get(id(cur.connection))
+        if state is None:  # connection not owned by this pool
+            raise PoolError("execute_prepared requires a pooled connection")
+
+        name = state.prepared.get(sql)
+        if name is None:
+            while state.prepared and len(state.prepared) >= self.statement_cache_size:
+                _, evicted = state.prepared.popitem(last=False)
+                cur.execute(f"DEALLOCATE {evicted}")
+            name = "kb_" + hashlib.sha1(sql.encode("utf-8")).hexdigest()[:16]
+            cur.execute(f"PREPARE {name} AS {sql}")
+            state.prepared[sql] = name
+            with self._lock:
+                self._statement_prepares += 1
+        else:
+            state.prepared.move_to_end(sql)
+            with self._lock:
+                self._statement_hits += 1
+
+        if params:
+            cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", tuple(params))
+        else:
+            cur.execute(f"EXECUTE {name}")
+
+    # ----------------------------------------------------------------- metrics
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "max_size": self.max_size,
+                "size": self._in_use + len(self._idle),
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "timeouts": self._timeouts,
+                "wait_ms_total": round(self._wait_ms_total, 2),
+                "wait_ms_avg": round(self._wait_ms_total / self._waits, 2) if self._waits else 0.0,
+                "wait_ms_max": round(self._wait_ms_max, 2),
+                "connections_opened": self._connects,
+                "connections_discarded": self._discarded,
+                "statement_prepares": self._statement_prepares,
+                "statement_cache_hits": self._statement_hits,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._discard(conn)
+
+
+_pools: Dict[Tuple[Tuple[str, str], ...], ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(config: Config) -> ConnectionPool:
+    """Process-wide pool for the database described by `config.db_config`."""
+    key = tuple(sorted(config.db_config.items()))
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = ConnectionPool(
+                    config.db_config,
+                    min_size=config.db_pool_min_size,
+                    max_size=config.db_pool_max_size,
+                    timeout=config.db_pool_timeout,
+                    statement_cache_size=config.db_statement_cache_size,
+                )
+                _pools[key] = pool
+                logger.info(
+                    "PostgreSQL 连接池已创建 (%s:%s/%s, max_size=%s)",
+                    config.db.host,
+                    config.db.port,
+                    config.db.dbname,
+                    pool.max_size,
+                )
+    return pool
+
+
+def close_pools() -> None:
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
@@ -4,7 +4,10 @@ import logging
 
 from fastapi import FastAPI
 
+from kb_service.api.deps import get_config
 from kb_service.api.routes import router as api_router
+from kb_service.db.pool import close_pools
+from kb_service.services.jobs import start_workers, stop_workers
 
 logger = logging.getLogger(__name__)
 
@@ -23,6 +26,18 @@ def create_app() -> FastAPI:
     def health_check():
         return {"status": "ok"}
 
+    @app.on_event("startup")
+    def start_job_workers() -> None:
+        # 入库作业在独立进程中执行，API 进程只负责入队与检索
+        workers = get_config().job_workers
+        app.state.job_workers = start_workers(workers) if workers > 0 else None
+
+    @app.on_event("shutdown")
+    def shutdown_pools() -> None:
+        if getattr(app.state, "job_workers", None):
+            stop_workers(*app.state.job_workers)
+        close_pools()
+
     logger.info("FastAPI application initialised")
     return app
 
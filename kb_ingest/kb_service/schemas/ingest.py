@@ -44,3 +44,7 @@ class MySQLIngestRequest(BaseModel):
         ge=1,
         description="Number of records to process per batch; defaults to processing all rows at once.",
     )
+    incremental: bool = Field(
+        default=False,
+        description="Only rewrite/embed rows whose content hash changed; reports inserted/changed/unchanged/deleted counts.",
+    )
@@ -17,6 +17,17 @@ class SearchRequest(BaseModel):
     metric: str = Field(default="cosine", description="Similarity metric (cosine or l2).")
     company_filter: Optional[str] = Field(default=None, description="Optional company name filter.")
     source_tables: Optional[list[str]] = Field(default=None, description="Filter by source tables.")
+    ef_search: Optional[int] = Field(
+        default=None,
+        ge=1,
+        le=1000,
+        description="HNSW index: candidate list size per query (higher = better recall, slower).",
+    )
+    probes: Optional[int] = Field(
+        default=None,
+        ge=1,
+        description="IVFFlat index: number of lists probed per query (higher = better recall, slower).",
+    )
 
 
 class HybridSearchRequest(BaseModel):
@@ -31,3 +42,14 @@ class HybridSearchRequest(BaseModel):
     )
     metric: str = Field(default="cosine", description="Similarity metric (cosine or l2).")
     source_tables: Optional[list[str]] = Field(default=None, description="Filter by source tables.")
+    ef_search: Optional[int] = Field(
+        default=None,
+        ge=1,
+        le=1000,
+        description="HNSW index: candidate list size per query (higher = better recall, slower).",
+    )
+    probes: Optional[int] = Field(
+        default=None,
+        ge=1,
+        description="IVFFlat index: number of lists probed per query (higher = better recall, slower).",
+    )
@@ -0,0 +1,228 @@
+from __future__ import annotations
+
+import logging
+import time
+import uuid
+from contextlib import ExitStack
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Set
+
+import psycopg2
+
+from kb_service.db.bulk import copy_rows_binary
+from kb_service.db.pool import ConnectionPool
+from kb_service.services.utils import CONTENT_HASH_PREFIX, compute_content_hash, content_fingerprint
+
+_STAGE = "_kb_change_stage"
+_SEEN = "_kb_change_seen"
+_STAGE_COLUMNS = ("position", "source_table", "source_id", "content_hash")
+
+
+@dataclass
+class ChangeReport:
+    inserted: int = 0
+    changed: int = 0
+    unchanged: int = 0
+    deleted: int = 0  # 库中存在、本次同步未出现的行（仅统计，不删除）
+    migrated: int = 0  # 旧 MD5 哈希校验一致后就地升级的行
+    elapsed_s: float = 0.0
+
+    def as_dict(self) -> Dict[str, object]:
+        data = asdict(self)
+        data["elapsed_s"] = round(self.elapsed_s, 2)
+        return data
+
+
+def item_fingerprint(item: dict) -> str:
+    """Content hash of an ingest item, computed once and cached on the item for the write path."""
+    fingerprint = item.get("content_hash")
+    if not fingerprint:
+        fingerprint = content_fingerprint(item.get("original_data") or {})
+        item["content_hash"] = fingerprint
+    return fingerprint
+
+
+class ChangeDetector:
+    """
+    Incremental change detection for searchable_documents, done server-side.
+
+    Each `filter` call binary-COPYs `(source_table, source_id, hash)` into a
+    temp table, LEFT JOINs it against searchable_documents and streams back
+    only the rows that are new or changed, through a named cursor in
+    `fetch_size` chunks. The detector holds one pooled connection for its
+    lifetime. The keys it has seen stay in a second temp table, so `finish`
+    can count documents that have disappeared from the source.
+    Stored hashes without the `b2:` prefix are the legacy MD5 format. They
+    are verified on the client and upgraded in place, so switching hash
+    format does not re-embed the whole table.
+    """
+
+    def __init__(
+        self,
+        pool: ConnectionPool,
+        logger: Optional[logging.Logger] = None,
+        *,
+        table: str = "searchable_documents",
+        fetch_size: int = 10000,
+    ):
+        self.pool = pool
+        self.logger = logger or logging.getLogger(__name__)
+        self.table = table
+        self.fetch_size = max(1, fetch_size)
+        self.report = ChangeReport()
+        self.source_tables: Set[str] = set()
+        self._stack: Optional[ExitStack] = None
+        self._conn = None
+        self._table_exists = False
+
+    def __enter__(self) -> "ChangeDetector":
+        self._stack = ExitStack()
+        self._conn = self._stack.enter_context(self.pool.connection())
+        self._check_table()
+        with self._conn.cursor() as cur:
+            cur.execute(
+                f"CREATE TEMP TABLE IF NOT EXISTS {_STAGE} "
+                "(position text, source_table text, source_id text, content_hash text);"
+            )
+            cur.execute(
+                f"CREATE TEMP TABLE IF NOT EXISTS {_SEEN} "
+                "(source_table text, source_id text, PRIMARY KEY (source_table, source_id));"
+            )
+            cur.execute(f"TRUNCATE {_SEEN};")
+        self._conn.commit()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        try:
+            if self._conn is not None and not self._conn.closed:
+                self._conn.rollback()
+                with self._conn.cursor() as cur:
+                    cur.execute(f"DROP TABLE IF EXISTS {_STAGE}; DROP TABLE IF EXISTS {_SEEN};")
+                self._conn.commit()
+        except psycopg2.Error as exc_drop:  # 连接已损坏时由连接池丢弃
+            self.logger.debug("清理增量检测临时表失败: %s", exc_drop)
+        finally:
+            self._stack.close()
+            self._conn = None
+
+    def filter(self, items: List[dict]) -> List[dict]:
+        """Return the new or changed items, in input order."""
+        if not items:
+            return []
+        started = time.perf_counter()
+        rows = [
+            (str(position), item.get("source_table"), item.get("source_id"), item_fingerprint(item))
+            for position, item in enumerate(items)
+        ]
+        self.source_tables.update(row[1] for row in rows if row[1] is not None)
+
+        conn = self._conn
+        self._stage(rows)
+        if not self._table_exists and not self._check_table():
+            conn.commit()
+            self.report.inserted += len(items)
+            self.report.elapsed_s += time.perf_counter() - started
+            return list(items)
+
+        # 只回传新增/变化的行；未变化的行不离开数据库
+        changed_positions: List[int] = []
+        migrate_positions: List[int] = []
+        inserted = changed = 0
+        with conn.cursor(name=f"kb_changes_{uuid.uuid4().hex[:8]}") as stream:
+            stream.itersize = self.fetch_size
+            stream.execute(
+                f"""
+                SELECT s.position::int, d.content_hash, d.source_id IS NULL
+                FROM {_STAGE} AS s
+                LEFT JOIN {self.table} AS d
+                  ON d.source_table = s.source_table AND d.source_id = s.source_id
+                WHERE d.content_hash IS DISTINCT FROM s.content_hash
+                ORDER BY s.position::int;
+                """
+            )
+            for position, stored_hash, missing in stream:
+                if missing:
+                    inserted += 1
+                    changed_positions.append(position)
+                elif self._legacy_match(stored_hash, items[position]):
+                    migrate_positions.append(position)
+                else:
+                    changed += 1
+                    changed_positions.append(position)
+
+        if migrate_positions:
+            with conn.cursor() as cur:
+                cur.execute(
+                    f"""
+                    UPDATE {self.table} AS d SET content_hash = s.content_hash
+                    FROM {_STAGE} AS s
+                    WHERE s.position = ANY(%s)
+                      AND d.source_table = s.source_table AND d.source_id = s.source_id;
+                    """,
+                    ([str(position) for position in migrate_positions],),
+                )
+        conn.commit()
+
+        self.report.inserted += inserted
+        self.report.changed += changed
+        self.report.migrated += len(migrate_positions)
+        self.report.unchanged += len(items) - inserted - changed
+        self.report.elapsed_s += time.perf_counter() - started
+        self.logger.info(
+            "增量检测: 新增 %s, 变化 %s, 未变化 %s（其中升级旧哈希 %s）",
+            inserted,
+            changed,
+            len(items) - inserted - changed,
+            len(migrate_positions),
+        )
+        return [items[position] for position in changed_positions]
+
+    def finish(self, count_deleted: bool = True) -> ChangeReport:
+        """
+        Count rows of the synced source tables that were not seen; returns the cumulative report.
+
+        Pass `count_deleted=False` when part of the source was skipped (e.g. a resumed run),
+        since the unseen rows are then not necessarily gone.
+        """
+        if count_deleted and self._table_exists and self.source_tables:
+            with self._conn.cursor() as cur:
+                cur.execute(
+                    f"""
+                    SELECT COUNT(*) FROM {self.table} AS d
+                    WHERE d.source_table = ANY(%s)
+                      AND NOT EXISTS (
+                        SELECT 1 FROM {_SEEN} AS k
+                        WHERE k.source_table = d.source_table AND k.source_id = d.source_id
+                      );
+                    """,
+                    (sorted(self.source_tables),),
+                )
+                self.report.deleted = int(cur.fetchone()[0])
+            self._conn.commit()
+        self.logger.info("增量检测汇总: %s", self.report.as_dict())
+        return self.report
+
+    def _check_table(self) -> bool:
+        with self._conn.cursor() as cur:
+            cur.execute("SELECT to_regclass(%s);", (self.table,))
+            self._table_exists = cur.fetchone()[0] is not None
+        return self._table_exists
+
+    def _stage(self, rows: List[tuple]) -> None:
+        with self._conn.cursor() as cur:
+            cur.execute(f"TRUNCATE {_STAGE};")
+            copy_rows_binary(cur, _STAGE, _STAGE_COLUMNS, rows)
+            cur.execute(
+                f"""
+                INSERT INTO {_SEEN} (source_table, source_id)
+                SELECT DISTINCT source_table, source_id FROM {_STAGE}
+                WHERE source_table IS NOT NULL AND source_id IS NOT NULL
+                ON CONFLICT DO NOTHING;
+                """
+            )
+
+    @staticmethod
+    def _legacy_match(stored_hash: Optional[str], item: dict) -> bool:
+        if not stored_hash or stored_hash.startswith(CONTENT_HASH_PREFIX):
+            return False
+        return stored_hash == compute_content_hash(item.get("original_data") or {})
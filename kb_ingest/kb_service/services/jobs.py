@@ -0,0 +1,388 @@
+from __future__ import annotations
+
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from kb_service.core.config import Config, clone_config, load_config
+from kb_service.services.pipeline import IngestCancelled, IngestProgress
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATUSES = (SUCCEEDED, FAILED, CANCELLED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ingest_jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    source TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    progress TEXT NOT NULL DEFAULT '{}',
+    result TEXT,
+    error TEXT,
+    worker TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    heartbeat_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS ix_ingest_jobs_status ON ingest_jobs (status, created_at);
+"""
+
+
+def _iso(ts: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(ts).isoformat(timespec="seconds") if ts else None
+
+
+class JobStore:
+    """
+    SQLite-backed ingest job queue shared by the API process and worker processes.
+
+    Jobs survive restarts: a job whose worker stops heartbeating is put back
+    in the queue (Excel ingests then resume from their pipeline checkpoint).
+    `claim` runs under `BEGIN IMMEDIATE`, so concurrent workers never take
+    the same job and the per-source concurrency limit holds across processes.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # autocommit；需要原子性的 claim 显式 BEGIN IMMEDIATE
+        conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def submit(self, kind: str, source: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        job_id = uuid.uuid4().hex
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO ingest_jobs (id, kind, source, payload, status, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, kind, source, json.dumps(payload, ensure_ascii=False), QUEUED, time.time()),
+            )
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM ingest_jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_job(row) if row else None
+
+    def payload(self, job_id: str) -> Dict[str, Any]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT payload FROM ingest_jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row["payload"]) if row else {}
+
+    def list(self, status: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        sql = "SELECT * FROM ingest_jobs"
+        params: tuple = ()
+        if status:
+            sql += " WHERE status = ?"
+            params = (status,)
+        sql += " ORDER BY created_at DESC LIMIT ?"
+        with self._connect() as conn:
+            rows = conn.execute(sql, params + (limit,)).fetchall()
+        return [self._to_job(row) for row in rows]
+
+    def claim(self, worker_id: str, max_per_source: int) -> Optional[Dict[str, Any]]:
+        """Atomically take the oldest queued job whose source is below its running limit."""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    """
+                    SELECT j.id FROM ingest_jobs j
+                    WHERE j.status = ?
+                      AND (SELECT COUNT(*) FROM ingest_jobs r WHERE r.status = ? AND r.source = j.source) < ?
+                    ORDER BY j.created_at
+                    LIMIT 1
+                    """,
+                    (QUEUED, RUNNING, max(1, max_per_source)),
+                ).fetchone()
+                if row is not None:
+                    now = time.time()
+                    conn.execute(
+                        """
+                        UPDATE ingest_jobs
+                        SET status = ?, worker = ?, attempts = attempts + 1, progress = '{}',
+                            started_at = ?, heartbeat_at = ?
+                        WHERE id = ?
+                        """,
+                        (RUNNING, worker_id, now, now, row["id"]),
+                    )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        return self.get(row["id"])
+
+    def heartbeat(self, job_id: str, progress: Dict[str, int]) -> bool:
+        """Store a progress snapshot; returns True when cancellation was requested."""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE ingest_jobs SET progress = ?, heartbeat_at = ? WHERE id = ? AND status = ?",
+                (json.dumps(progress), time.time(), job_id, RUNNING),
+            )
+            row = conn.execute("SELECT cancel_requested FROM ingest_jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row["cancel_requested"])
+
+    def finish(
+        self,
+        job_id: str,
+        status: str,
+        progress: Optional[Dict[str, int]] = None,
+        result: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None,
+    ) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                """
+                UPDATE ingest_jobs
+                SET status = ?, progress = COALESCE(?, progress), result = ?, error = ?, finished_at = ?
+                WHERE id = ?
+                """,
+                (
+                    status,
+                    json.dumps(progress) if progress is not None else None,
+                    json.dumps(result, ensure_ascii=False, default=str) if result is not None else None,
+                    error,
+                    time.time(),
+                    job_id,
+                ),
+            )
+
+    def request_cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Queued jobs are cancelled at once; running jobs stop at their next row or batch."""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE ingest_jobs SET status = ?, cancel_requested = 1, finished_at = ? WHERE id = ? AND status = ?",
+                (CANCELLED, time.time(), job_id, QUEUED),
+            )
+            conn.execute(
+                "UPDATE ingest_jobs SET cancel_requested = 1 WHERE id = ? AND status = ?",
+                (job_id, RUNNING),
+            )
+        return self.get(job_id)
+
+    def requeue_stale(self, stale_seconds: float) -> int:
+        """Put running jobs back in the queue when their worker stopped heartbeating."""
+        cutoff = time.time() - stale_seconds
+        with self._connect() as conn:
+            conn.execute(
+                """
+                UPDATE ingest_jobs SET status = ?, finished_at = ?
+                WHERE status = ? AND heartbeat_at < ? AND cancel_requested = 1
+                """,
+                (CANCELLED, time.time(), RUNNING, cutoff),
+            )
+            cursor = conn.execute(
+                "UPDATE ingest_jobs SET status = ?, worker = NULL WHERE status = ? AND heartbeat_at < ?",
+                (QUEUED, RUNNING, cutoff),
+            )
+        return cursor.rowcount
+
+    @staticmethod
+    def _to_job(row: sqlite3.Row) -> Dict[str, Any]:
+        progress = json.loads(row["progress"] or "{}")
+        elapsed = 0.0
+        if row["started_at"]:
+            end = row["finished_at"] if row["status"] in FINISHED_STATUSES and row["finished_at"] else time.time()
+            elapsed = max(0.0, end - row["started_at"])
+        throughput = {
+            "rows_read_per_s": round(progress.get("rows_read", 0) / elapsed, 2) if elapsed else 0.0,
+            "rows_written_per_s": round(progress.get("rows_written", 0) / elapsed, 2) if elapsed else 0.0,
+        }
+        # payload 可能包含数据库连接串等敏感信息，不对外返回
+        return {
+            "job_id": row["id"],
+            "kind": row["kind"],
+            "source": row["source"],
+            "status": row["status"],
+            "cancel_requested": bool(row["cancel_requested"]),
+            "progress": progress,
+            "throughput": throughput,
+            "elapsed_s": round(elapsed, 1),
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+            "worker": row["worker"],
+            "attempts": row["attempts"],
+            "created_at": _iso(row["created_at"]),
+            "started_at": _iso(row["started_at"]),
+            "finished_at": _iso(row["finished_at"]),
+        }
+
+
+def cancel_job(store: JobStore, job_id: str) -> Optional[Dict[str, Any]]:
+    """Request cancellation; removes the uploaded file of a job that was still queued."""
+    job = store.request_cancel(job_id)
+    if job is not None and job["status"] == CANCELLED:
+        cleanup_dir = store.payload(job_id).get("cleanup_dir")
+        if cleanup_dir:
+            shutil.rmtree(cleanup_dir, ignore_errors=True)
+    return job
+
+
+# ---------------------------------------------------------------------- executors
+def _run_excel(config: Config, payload: Dict[str, Any], progress: IngestProgress) -> Dict[str, Any]:
+    from kb_service.services.processor import DataProcessor
+
+    config.excel_file_path = payload["path"]
+    processor = DataProcessor(config, incremental=bool(payload.get("incremental")), progress=progress)
+    processor.process_excel()
+    return {
+        "rows_rewritten": sum(processor.sheet_counts.values()),
+        "sheets": processor.sheet_counts,
+        "pipeline": processor.pipeline_metrics,
+        "changes": processor.change_report,
+        "output_dir": str(processor.output_dir),
+    }
+
+
+def _run_mysql(config: Config, payload: Dict[str, Any], progress: IngestProgress) -> Dict[str, Any]:
+    from kb_service.schemas.ingest import MySQLIngestRequest
+    from kb_service.services.mysql_ingest import MySQLIngestor
+
+    ingestor = MySQLIngestor(config, progress=progress)
+    return ingestor.ingest(MySQLIngestRequest(**payload))
+
+
+EXECUTORS: Dict[str, Callable[[Config, Dict[str, Any], IngestProgress], Dict[str, Any]]] = {
+    "excel": _run_excel,
+    "mysql": _run_mysql,
+}
+
+
+class JobWorker:
+    """Claims jobs from the store and runs them one at a time, heartbeating progress."""
+
+    def __init__(
+        self,
+        config: Config,
+        store: Optional[JobStore] = None,
+        worker_id: Optional[str] = None,
+        logger: Optional[logging.Logger] = None,
+    ):
+        self.config = config
+        self.store = store or JobStore(config.job_db_path)
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.logger = logger or logging.getLogger(__name__)
+
+    def run(self, stop_event=None, once: bool = False) -> int:
+        """Process jobs until `stop_event` is set (or the queue is empty when `once`); returns jobs run."""
+        processed = 0
+        while stop_event is None or not stop_event.is_set():
+            requeued = self.store.requeue_stale(self.config.job_stale_seconds)
+            if requeued:
+                self.logger.warning("%s 个作业的 worker 心跳超时，已重新入队", requeued)
+            job = self.store.claim(self.worker_id, self.config.job_max_per_table)
+            if job is None:
+                if once:
+                    break
+                time.sleep(self.config.job_poll_interval)
+                continue
+            self.run_job(job)
+            processed += 1
+        return processed
+
+    def run_job(self, job: Dict[str, Any]) -> str:
+        job_id = job["job_id"]
+        payload = self.store.payload(job_id)
+        progress = IngestProgress()
+        done = threading.Event()
+
+        def beat() -> None:
+            while not done.wait(self.config.job_heartbeat_interval):
+                try:
+                    if self.store.heartbeat(job_id, progress.snapshot()):
+                        progress.cancel()
+                except sqlite3.Error as exc:  # pragma: no cover - transient lock contention
+                    self.logger.warning("作业 %s 心跳失败: %s", job_id, exc)
+
+        heartbeat = threading.Thread(target=beat, name=f"kb-job-heartbeat-{job_id[:8]}", daemon=True)
+        heartbeat.start()
+        self.logger.info("开始执行作业 %s (%s, 来源 %s)", job_id, job["kind"], job["source"])
+        status, result, error = FAILED, None, None
+        try:
+            executor = EXECUTORS.get(job["kind"])
+            if executor is None:
+                raise ValueError(f"Unknown job kind: {job['kind']}")
+            result = executor(clone_config(self.config), payload, progress)
+            status = SUCCEEDED
+        except IngestCancelled:
+            status = CANCELLED
+        except Exception as exc:
+            self.logger.exception("作业 %s 执行失败", job_id)
+            error = f"{type(exc).__name__}: {exc}"
+        finally:
+            done.set()
+            heartbeat.join()
+            self.store.finish(job_id, status, progress=progress.snapshot(), result=result, error=error)
+            cleanup_dir = payload.get("cleanup_dir")
+            if cleanup_dir:
+                shutil.rmtree(cleanup_dir, ignore_errors=True)
+        self.logger.info("作业 %s 结束: %s", job_id, status)
+        return status
+
+
+def _worker_process(stop_event) -> None:
+    """Entry point of a spawned worker process."""
+    config = load_config()
+    if config.job_worker_nice > 0 and hasattr(os, "nice"):
+        os.nice(config.job_worker_nice)  # 让出 CPU，优先保证同机 API 的检索延迟
+    logging.basicConfig(level=logging.INFO)
+    try:
+        JobWorker(config).run(stop_event=stop_event)
+    except KeyboardInterrupt:
+        pass
+
+
+def start_workers(count: int):
+    """Spawn `count` worker processes; returns `(processes, stop_event)` for `stop_workers`."""
+    ctx = multiprocessing.get_context("spawn")
+    stop_event = ctx.Event()
+    processes = []
+    for index in range(count):
+        process = ctx.Process(target=_worker_process, args=(stop_event,), name=f"kb-job-worker-{index}", daemon=True)
+        process.start()
+        processes.append(process)
+    return processes, stop_event
+
+
+def stop_workers(processes, stop_event, timeout: float = 10.0) -> None:
+    """
+    Ask workers to exit after their current job; terminate those still busy
+    after `timeout`. Their jobs are requeued once the heartbeat goes stale.
+    """
+    stop_event.set()
+    deadline = time.monotonic() + timeout
+    for process in processes:
+        process.join(max(0.0, deadline - time.monotonic()))
+        if process.is_alive():
+            process.terminate()
+            process.join()
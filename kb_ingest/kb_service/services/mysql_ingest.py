@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 import logging
-import time
+from contextlib import ExitStack
 from typing import Dict, List, Optional
 
 import pandas as pd
@@ -12,46 +12,67 @@ from kb_service.clients.llm import LLMClient
 from kb_service.core.config import Config
 from kb_service.prompts.manager import PromptManager, SchemaColumn, build_prompt_manager_from_env
 from kb_service.schemas.ingest import MySQLIngestRequest
-from kb_service.services.utils import flatten_row
+from kb_service.services.change_detection import ChangeDetector
+from kb_service.services.pipeline import IngestProgress
+from kb_service.services.rewriter import RowRewriter
+from kb_service.services.utils import flatten_frame, iter_records
 from kb_service.services.vector_store import VectorStoreWriter
 
 
 class MySQLIngestor:
     """Ingests MySQL rows, rewrites or flattens them, and writes embeddings."""
 
-    def __init__(self, config: Config, prompt_manager: Optional[PromptManager] = None):
+    def __init__(
+        self,
+        config: Config,
+        prompt_manager: Optional[PromptManager] = None,
+        progress: Optional[IngestProgress] = None,
+    ):
         self.config = config
         self.prompt_manager = prompt_manager or build_prompt_manager_from_env()
         self.llm_client = LLMClient(config)
+        self.rewriter = RowRewriter(config, self.llm_client)
         self.vector_writer = VectorStoreWriter(config)
+        self.progress = progress
         self.logger = logging.getLogger(__name__)
 
-    def ingest(self, request: MySQLIngestRequest) -> Dict[str, int]:
+    def ingest(self, request: MySQLIngestRequest) -> Dict[str, object]:
         engine = create_engine(request.connection_url)
         total_rows = 0
         embedded_rows = 0
+        detector: Optional[ChangeDetector] = None
 
-        with engine.connect() as conn:
+        with ExitStack() as stack:
+            conn = stack.enter_context(engine.connect())
+            if request.incremental:
+                # 整次同步共用一个检测会话，结束时统计源表中已不存在的行
+                detector = stack.enter_context(self.vector_writer.change_detector(self.logger))
             schema = self._fetch_schema(conn, request.table)
             query = self._build_query(request)
 
             chunks = pd.read_sql_query(query, conn, chunksize=request.chunk_size)
             if isinstance(chunks, pd.DataFrame):
-                embedded_rows += self._process_chunk(chunks, schema, request)
-                total_rows += len(chunks)
-            else:
-                for chunk in chunks:
-                    total_rows += len(chunk)
-                    embedded_rows += self._process_chunk(chunk, schema, request)
+                chunks = [chunks]
+            for chunk in chunks:
+                total_rows += len(chunk)
+                if self.progress is not None:
+                    self.progress.check()
+                    self.progress.add(rows_total=len(chunk))
+                embedded_rows += self._process_chunk(chunk, schema, request, detector)
+            changes = detector.finish() if detector is not None else None
 
         self.logger.info("MySQL ingest完成: 共读取 %s 条, 写入 %s 条", total_rows, embedded_rows)
-        return {"rows_read": total_rows, "rows_embedded": embedded_rows}
+        summary: Dict[str, object] = {"rows_read": total_rows, "rows_embedded": embedded_rows}
+        if changes is not None:
+            summary["changes"] = changes.as_dict()
+        return summary
 
     def _process_chunk(
         self,
         chunk: pd.DataFrame,
         schema: List[SchemaColumn],
         request: MySQLIngestRequest,
+        detector: Optional[ChangeDetector] = None,
     ) -> int:
         if chunk.empty:
             return 0
@@ -60,30 +81,44 @@ class MySQLIngestor:
         template_key = request.prompt_key or request.table
         override_template = request.prompt_template
         effective_schema = schema or [SchemaColumn(name=str(col)) for col in chunk.columns]
-
-        for idx, row in chunk.iterrows():
-            row_dict = {k: (None if pd.isna(v) else v) for k, v in row.to_dict().items()}
+        # 缺失值统一为 None；flatten 模式整块按列扁平化
+        chunk = chunk.astype(object).where(chunk.notna(), None)
+        flat_texts = None
+        if request.mode == "flatten":
+            flat_texts = flatten_frame(chunk, self.config, extra=request.extra_metadata)
+
+        def prepare(task):
+            position, (idx, row_dict) = task
             merged_meta = {**row_dict, **request.extra_metadata}
+            if flat_texts is not None:
+                return row_dict, merged_meta, flat_texts[position]
+
+            system_prompt, user_prompt = self.prompt_manager.get_prompt(
+                template_key,
+                merged_meta,
+                schema=effective_schema,
+                override_template=override_template,
+                context_table_name=request.table,
+            )
+            return row_dict, merged_meta, self.rewriter.generate(user_prompt, system_prompt)
+
+        # flatten 模式直接在当前线程处理；LLM 模式并发重写，结果按原行序输出
+        for (_position, (idx, _row)), (row_dict, merged_meta, content) in self.rewriter.map_ordered(
+            enumerate(iter_records(chunk)), prepare, concurrent=request.mode != "flatten"
+        ):
+            # 只有 LLM 模式会因为没有返回内容而跳过；flatten 模式的空文本照常写入
+            failed = not content and flat_texts is None
+            if self.progress is not None:
+                self.progress.add(rows_read=1, rows_failed=int(failed))
+                self.progress.check()
+            if failed:
+                self.logger.warning("跳过第 %s 行，LLM 未返回内容", idx)
+                continue
 
             source_id = self._extract_identifier(row_dict, request.id_column, idx)
             company_name = self._extract_optional_field(row_dict, request.company_field)
             report_year = self._extract_optional_field(row_dict, request.report_year_field)
 
-            if request.mode == "flatten":
-                content = flatten_row(merged_meta, self.config)
-            else:
-                system_prompt, user_prompt = self.prompt_manager.get_prompt(
-                    template_key,
-                    merged_meta,
-                    schema=effective_schema,
-                    override_template=override_template,
-                    context_table_name=request.table,
-                )
-                content = self._generate_with_retry(user_prompt, system_prompt)
-                if not content:
-                    self.logger.warning("跳过第 %s 行，LLM 未返回内容", idx)
-                    continue
-
             items.append(
                 {
                     "source_table": request.table,
@@ -95,22 +130,15 @@ class MySQLIngestor:
                 }
             )
 
+        if detector is not None and items:
+            items = detector.filter(items)
         if not items:
             return 0
 
-        return self.vector_writer.upsert(items, self.logger)
-
-    def _generate_with_retry(self, prompt: str, system_prompt: str) -> Optional[str]:
-        for attempt in range(self.config.retry_times):
-            try:
-                content = self.llm_client.generate(prompt, system_prompt)
-                if content:
-                    return content
-            except Exception as exc:
-                self.logger.warning("LLM 生成失败 (尝试 %s/%s): %s", attempt + 1, self.config.retry_times, exc)
-                if attempt < self.config.retry_times - 1:
-                    time.sleep(self.config.retry_delay)
-        return None
+        written = self.vector_writer.upsert(items, self.logger)
+        if self.progress is not None:
+            self.progress.add(rows_written=written)
+        return written
 
     def _extract_identifier(self, row: Dict, id_column: Optional[str], fallback_idx: int) -> str:
         if id_column and id_column in row and row[id_column] is not None:
@@ -0,0 +1,348 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from kb_service.core.config import Config
+from kb_service.services.change_detection import ChangeDetector, ChangeReport
+from kb_service.services.vector_store import EMBED_BATCH_SIZE, VectorStoreWriter
+
+_END = object()
+
+
+class _Stopped(Exception):
+    """Raised inside a stage when another stage failed."""
+
+
+class IngestCancelled(Exception):
+    """Raised inside an ingest once its job has been cancelled."""
+
+
+class IngestProgress:
+    """
+    Thread-safe row counters an ingest updates while it runs.
+
+    Job workers read `snapshot()` for the progress API and call `cancel()`
+    when cancellation is requested; the ingest calls `check()` between rows
+    and batches and stops with `IngestCancelled`.
+    """
+
+    FIELDS = ("rows_total", "rows_read", "rows_failed", "rows_written")
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counts: Dict[str, int] = dict.fromkeys(self.FIELDS, 0)
+        self._cancelled = threading.Event()
+
+    def add(self, **deltas: int) -> None:
+        with self._lock:
+            for key, value in deltas.items():
+                self._counts[key] = self._counts.get(key, 0) + int(value)
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def check(self) -> None:
+        if self._cancelled.is_set():
+            raise IngestCancelled()
+
+
+@dataclass
+class Envelope:
+    """One source row flowing through the pipeline; `item` is None when rewriting failed."""
+
+    table: str
+    position: int
+    item: Optional[dict]
+
+
+@dataclass
+class StageMetrics:
+    name: str
+    items: int = 0
+    batches: int = 0
+    busy_s: float = 0.0
+    wait_in_s: float = 0.0  # 等待上游
+    wait_out_s: float = 0.0  # 下游队列已满（背压）
+
+    def as_dict(self) -> Dict[str, object]:
+        data = asdict(self)
+        for key in ("busy_s", "wait_in_s", "wait_out_s"):
+            data[key] = round(data[key], 2)
+        data["items_per_s"] = round(self.items / self.busy_s, 1) if self.busy_s else 0.0
+        return data
+
+
+class IngestCheckpoint:
+    """
+    Last committed source row per table, persisted as JSON so an interrupted
+    run resumes after the last batch that reached the database.
+    """
+
+    def __init__(self, path: Path, logger: Optional[logging.Logger] = None):
+        self.path = Path(path)
+        self.logger = logger or logging.getLogger(__name__)
+        self.positions: Dict[str, int] = {}
+        self.rows_committed = 0
+        if self.path.exists():
+            try:
+                data = json.loads(self.path.read_text(encoding="utf-8"))
+                self.positions = {str(k): int(v) for k, v in data.get("positions", {}).items()}
+                self.rows_committed = int(data.get("rows_committed", 0))
+            except (OSError, ValueError) as exc:
+                self.logger.warning("断点文件无法读取，将从头处理: %s (%s)", self.path, exc)
+
+    @classmethod
+    def for_file(cls, directory: str, source: Path, logger: Optional[logging.Logger] = None) -> "IngestCheckpoint":
+        """Checkpoint keyed by the source file's path, size and mtime; an edited file starts over."""
+        stat = source.stat()
+        key = f"{source.resolve()}|{stat.st_size}|{stat.st_mtime_ns}"
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+        return cls(Path(directory) / f"{source.stem}-{digest}.json", logger)
+
+    @property
+    def resumed(self) -> bool:
+        return bool(self.positions)
+
+    def done(self, table: str, position: int) -> bool:
+        return position <= self.positions.get(table, -1)
+
+    def commit(self, envelopes: List[Envelope], rows: int) -> None:
+        for env in envelopes:
+            self.positions[env.table] = max(self.positions.get(env.table, -1), env.position)
+        self.rows_committed += rows
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(
+            json.dumps({"positions": self.positions, "rows_committed": self.rows_committed}, ensure_ascii=False),
+            encoding="utf-8",
+        )
+        os.replace(tmp, self.path)
+
+    def clear(self) -> None:
+        self.path.unlink(missing_ok=True)
+
+
+class IngestPipeline:
+    """
+    Streaming rewrite → embed → write pipeline.
+
+    The caller supplies an iterator of `Envelope`s (reading and LLM
+    rewriting happen while it is consumed). Each stage runs on its own
+    thread and hands batches to the next through a bounded queue, so a slow
+    stage applies backpressure instead of letting rows pile up in memory.
+    After every committed database batch the checkpoint records the last
+    source row it covered.
+    """
+
+    def __init__(
+        self,
+        writer: VectorStoreWriter,
+        config: Config,
+        logger: Optional[logging.Logger] = None,
+        checkpoint: Optional[IngestCheckpoint] = None,
+        incremental: bool = False,
+        progress: Optional[IngestProgress] = None,
+    ):
+        self.writer = writer
+        self.config = config
+        self.logger = logger or logging.getLogger(__name__)
+        self.checkpoint = checkpoint
+        self.incremental = incremental
+        self.progress = progress
+        self.metrics = {name: StageMetrics(name) for name in ("rewrite", "embed", "write")}
+        queue_size = max(1, config.pipeline_queue_size)
+        self._to_embed: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._to_write: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._error: Optional[BaseException] = None
+        self._vector_dim = 0
+        self._detector: Optional[ChangeDetector] = None
+        self.changes: Optional[ChangeReport] = None
+
+    def run(self, source: Iterable[Envelope]) -> int:
+        """Drive the pipeline to completion; returns the number of rows written."""
+        self._vector_dim = self.writer.prepare(self.logger)
+        if self.incremental:
+            self._detector = self.writer.change_detector(self.logger).__enter__()
+        workers = [
+            threading.Thread(target=self._guard, args=(self._rewrite_stage, source), name="kb-pipeline-rewrite"),
+            threading.Thread(target=self._guard, args=(self._embed_stage,), name="kb-pipeline-embed"),
+        ]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+
+        total = 0
+        try:
+            total = self._write_stage()
+        except _Stopped:
+            pass
+        except BaseException as exc:
+            self._fail(exc)
+        finally:
+            for worker in workers:
+                worker.join()
+            if self._detector is not None:
+                try:
+                    if self._error is None:
+                        # 断点续传时已提交的行不会再经过检测，缺失行统计不可信
+                        resumed = self.checkpoint is not None and self.checkpoint.resumed
+                        self.changes = self._detector.finish(count_deleted=not resumed)
+                finally:
+                    self._detector.__exit__(None, None, None)
+
+        self._log_metrics()
+        if self._error is not None:
+            raise self._error
+
+        self.logger.info("✓ 嵌入并入库完成，共处理 %s 条", total)
+        if total and self.config.vector_index_auto_rebuild:
+            self.writer.maintain_index(self.logger)
+        return total
+
+    # ------------------------------------------------------------------ stages
+    def _rewrite_stage(self, source: Iterable[Envelope]) -> None:
+        metrics = self.metrics["rewrite"]
+        iterator = iter(source)
+        batch: List[Envelope] = []
+        try:
+            while True:
+                started = time.perf_counter()
+                env = next(iterator, _END)
+                metrics.busy_s += time.perf_counter() - started
+                if env is _END:
+                    break
+                metrics.items += 1
+                batch.append(env)
+                if len(batch) >= EMBED_BATCH_SIZE:
+                    self._put(self._to_embed, batch, metrics)
+                    metrics.batches += 1
+                    batch = []
+            if batch:
+                self._put(self._to_embed, batch, metrics)
+                metrics.batches += 1
+            self._put(self._to_embed, _END, metrics)
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()  # 停止重写线程池
+
+    def _embed_stage(self) -> None:
+        metrics = self.metrics["embed"]
+        while True:
+            batch = self._get(self._to_embed, metrics)
+            if batch is _END:
+                self._put(self._to_write, _END, metrics)
+                return
+            started = time.perf_counter()
+            items = [env.item for env in batch if env.item is not None]
+            if self._detector is not None and items:
+                items = self._detector.filter(items)
+            rows = self.writer.build_rows(items, self._vector_dim) if items else []
+            metrics.busy_s += time.perf_counter() - started
+            metrics.items += len(rows)
+            metrics.batches += 1
+            self._put(self._to_write, (batch, rows), metrics)
+
+    def _write_stage(self) -> int:
+        metrics = self.metrics["write"]
+        write_batch_size = max(EMBED_BATCH_SIZE, self.config.db_write_batch_size)
+        pending_envs: List[Envelope] = []
+        pending_rows: List[tuple] = []
+        total = 0
+        while True:
+            entry = self._get(self._to_write, metrics)
+            if entry is _END:
+                break
+            if self.progress is not None:
+                self.progress.check()
+            envs, rows = entry
+            pending_envs.extend(envs)
+            pending_rows.extend(rows)
+            if len(pending_rows) >= write_batch_size or len(pending_envs) >= write_batch_size:
+                total += self._flush(pending_envs, pending_rows, metrics)
+                pending_envs, pending_rows = [], []
+        if pending_envs:
+            total += self._flush(pending_envs, pending_rows, metrics)
+        return total
+
+    def _flush(self, envelopes: List[Envelope], rows: List[tuple], metrics: StageMetrics) -> int:
+        started = time.perf_counter()
+        written = self.writer.write_rows(rows, self.logger) if rows else 0
+        if self.checkpoint is not None:
+            self.checkpoint.commit(envelopes, written)
+        if self.progress is not None:
+            self.progress.add(rows_written=written)
+        metrics.busy_s += time.perf_counter() - started
+        metrics.items += written
+        metrics.batches += 1
+        return written
+
+    # ------------------------------------------------------------------ plumbing
+    def _guard(self, stage, *args) -> None:
+        try:
+            stage(*args)
+        except _Stopped:
+            pass
+        except BaseException as exc:  # pragma: no cover - surfaced by run()
+            self._fail(exc)
+
+    def _fail(self, exc: BaseException) -> None:
+        if self._error is None:
+            self._error = exc
+        self._stop.set()
+
+    def _put(self, target: queue.Queue, value, metrics: StageMetrics) -> None:
+        started = time.perf_counter()
+        while True:
+            if self._stop.is_set():
+                raise _Stopped()
+            try:
+                target.put(value, timeout=0.2)
+                break
+            except queue.Full:
+                continue
+        metrics.wait_out_s += time.perf_counter() - started
+
+    def _get(self, source: queue.Queue, metrics: StageMetrics):
+        started = time.perf_counter()
+        while True:
+            if self._stop.is_set():
+                raise _Stopped()
+            try:
+                value = source.get(timeout=0.2)
+                break
+            except queue.Empty:
+                continue
+        metrics.wait_in_s += time.perf_counter() - started
+        return value
+
+    def _log_metrics(self) -> None:
+        for stage in self.metrics.values():
+            self.logger.info(
+                "流水线阶段 %s: %s 条 / %s 批, 忙碌 %.1fs, 等待上游 %.1fs, 背压等待 %.1fs, %.1f 条/秒",
+                stage.name,
+                stage.items,
+                stage.batches,
+                stage.busy_s,
+                stage.wait_in_s,
+                stage.wait_out_s,
+                stage.as_dict()["items_per_s"],
+            )
@@ -5,33 +5,43 @@ import json
 import logging
 import re
 import sys
-import time
 from datetime import date, datetime
 from pathlib import Path
-from typing import Dict, Iterable, List, Optional
+from typing import Dict, Iterator, List, Optional
 
 import numpy as np
 import pandas as pd
-import psycopg2
 
 from kb_service.clients.llm import LLMClient
 from kb_service.core.config import Config
 from kb_service.prompts.manager import PromptManager, build_prompt_manager_from_env
 from kb_service.prompts.manager import SchemaColumn
-from kb_service.services.utils import flatten_row
+from kb_service.services.pipeline import Envelope, IngestCheckpoint, IngestPipeline, IngestProgress
+from kb_service.services.rewriter import RowRewriter
+from kb_service.services.utils import flatten_frame, flatten_row, iter_records
 from kb_service.services.vector_store import VectorStoreWriter
 
 
 class DataProcessor:
     """High-level pipeline that flattens tabular data, rewrites rows, and writes to pgvector."""
 
-    def __init__(self, config: Config, prompt_manager: Optional[PromptManager] = None, incremental: bool = False):
+    def __init__(
+        self,
+        config: Config,
+        prompt_manager: Optional[PromptManager] = None,
+        incremental: bool = False,
+        progress: Optional[IngestProgress] = None,
+    ):
         self.config = config
         self.llm_client = LLMClient(config) if config.use_llm else None
         self.prompt_manager = prompt_manager or build_prompt_manager_from_env()
         self.vector_writer = VectorStoreWriter(config)
-        self.processed_data: List[Dict] = []
+        self.rewriter = RowRewriter(config, self.llm_client)
+        self.sheet_counts: Dict[str, int] = {}  # 各工作表成功重写的行数
+        self.pipeline_metrics: Dict[str, Dict] = {}
+        self.change_report: Optional[Dict] = None  # 增量模式的新增/变化/未变化/缺失统计
         self.incremental = incremental  # 是否启用增量模式
+        self.progress = progress  # 作业队列运行时上报进度、响应取消
 
         # 为本次处理创建时间戳目录
         self.timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
@@ -91,8 +101,8 @@ class DataProcessor:
     def _convert_for_json(self, obj):
         if pd.isna(obj):
             return None
-        if isinstance(obj, pd.Timestamp):
-            return obj.strftime("%Y-%m-%d %H:%M:%S")
+        if isinstance(obj, (pd.Timestamp, datetime, date)):
+            return pd.Timestamp(obj).strftime("%Y-%m-%d %H:%M:%S")
         if isinstance(obj, (pd.Timedelta, pd.Period)):
             return str(obj)
         if isinstance(obj, np.integer):
@@ -118,85 +128,138 @@ class DataProcessor:
         total_sheets = len(xls.sheet_names)
         self.logger.info("发现 %s 个工作表", total_sheets)
 
-        for idx, sheet_name in enumerate(xls.sheet_names, start=1):
-            self.logger.info("[%s/%s] 处理工作表: %s", idx, total_sheets, sheet_name)
-            self._process_sheet(xls, sheet_name)
+        if not self.config.db:
+            for _ in self._iter_sheets(xls, None):
+                pass
+            self._save_summary()
+            self.logger.info("✅ 所有处理完成！")
+            return
+
+        # 重写、嵌入、写库三段流水线并行；每个写库批次提交后记录断点，中断后重跑同一文件会从断点继续
+        checkpoint = IngestCheckpoint.for_file(
+            self.config.ingest_checkpoint_dir,
+            Path(self.config.excel_file_path),
+            self.logger,
+        )
+        if checkpoint.resumed:
+            self.logger.info(
+                "检测到断点 %s（已提交 %s 条），跳过已入库的行继续处理",
+                checkpoint.path,
+                checkpoint.rows_committed,
+            )
+        pipeline = IngestPipeline(
+            self.vector_writer,
+            self.config,
+            self.logger,
+            checkpoint=checkpoint,
+            incremental=self.incremental,
+            progress=self.progress,
+        )
+        pipeline.run(self._iter_sheets(xls, checkpoint))
+        self.pipeline_metrics = {name: stage.as_dict() for name, stage in pipeline.metrics.items()}
+        if pipeline.changes is not None:
+            self.change_report = pipeline.changes.as_dict()
+        checkpoint.clear()
 
         self._save_summary()
-        if self.config.db:
-            self._embed_and_store(incremental=self.incremental)
         self.logger.info("✅ 所有处理完成！")
 
-    def _process_sheet(self, xls: pd.ExcelFile, sheet_name: str) -> None:
+    def _iter_sheets(self, xls: pd.ExcelFile, checkpoint: Optional[IngestCheckpoint]) -> Iterator[Envelope]:
+        total_sheets = len(xls.sheet_names)
+        for idx, sheet_name in enumerate(xls.sheet_names, start=1):
+            self.logger.info("[%s/%s] 处理工作表: %s", idx, total_sheets, sheet_name)
+            yield from self._process_sheet(xls, sheet_name, checkpoint)
+
+    def _process_sheet(
+        self,
+        xls: pd.ExcelFile,
+        sheet_name: str,
+        checkpoint: Optional[IngestCheckpoint] = None,
+    ) -> Iterator[Envelope]:
         df = pd.read_excel(xls, sheet_name=sheet_name)
         total_rows = len(df)
-        self.logger.info("  共 %s 行数据", total_rows)
+        self.logger.info("  共 %s 行数据 (并发: %s)", total_rows, self.rewriter.concurrency)
 
         processed_count = success_count = fail_count = 0
         schema = [SchemaColumn(name=str(col)) for col in df.columns]
+        # 不走 LLM 时整表一次性按列扁平化，结果与逐行 flatten_row 相同
+        flat_texts = None if self.config.use_llm else flatten_frame(df, self.config)
 
-        for start_idx in range(0, total_rows, self.config.batch_size):
-            end_idx = min(start_idx + self.config.batch_size, total_rows)
-            batch_df = df.iloc[start_idx:end_idx]
-            self.logger.info("  处理批次 %s-%s/%s...", start_idx + 1, end_idx, total_rows)
-
-            for row_idx, row in batch_df.iterrows():
-                processed_count += 1
-                progress = processed_count / total_rows * 100
-                self.logger.info("  进度: %.1f%% (%s/%s)", progress, processed_count, total_rows)
-
-                prev_count = len(self.processed_data)
-                self._process_row(sheet_name, row_idx, row, schema)
-                if len(self.processed_data) > prev_count:
-                    success_count += 1
-                else:
-                    fail_count += 1
+        rows = (
+            (position, row_idx, row_dict)
+            for position, (row_idx, row_dict) in enumerate(iter_records(df))
+            if checkpoint is None or not checkpoint.done(sheet_name, position)
+        )
+        if checkpoint is not None and checkpoint.positions.get(sheet_name, -1) >= 0:
+            processed_count = min(total_rows, checkpoint.positions[sheet_name] + 1)
+            self.logger.info("  断点续传：跳过前 %s 行", processed_count)
+        if self.progress is not None:
+            self.progress.add(rows_total=total_rows, rows_read=processed_count)
+
+        # LLM 重写在线程池中并发执行，结果按原行序依次写入 CSV/TXT 并送入嵌入阶段
+        for (position, row_idx, row_dict), rewritten_text in self.rewriter.map_ordered(
+            rows,
+            lambda task: self._rewrite_row(
+                sheet_name,
+                task[1],
+                task[2],
+                schema,
+                flat_texts[task[0]] if flat_texts is not None else None,
+            ),
+        ):
+            processed_count += 1
+            progress = processed_count / total_rows * 100
+            self.logger.info("  进度: %.1f%% (%s/%s)", progress, processed_count, total_rows)
+
+            item = self._record_row(sheet_name, row_idx, row_dict, rewritten_text)
+            if item is not None:
+                success_count += 1
+            else:
+                fail_count += 1
+            if self.progress is not None:
+                self.progress.add(rows_read=1, rows_failed=int(item is None))
+                self.progress.check()
+            yield Envelope(sheet_name, position, item)
 
         self.logger.info("  工作表完成 - 成功: %s, 失败: %s", success_count, fail_count)
 
-    def _process_row(
+    def _rewrite_row(
         self,
         sheet_name: str,
         row_idx: int,
-        row: pd.Series,
+        row_dict: dict,
         schema: List[SchemaColumn],
-    ) -> None:
-        row_dict = row.to_dict()
+        flat_text: Optional[str] = None,
+    ) -> Optional[str]:
+        """Runs on a rewrite worker thread; must not touch the output files."""
         if not self.config.use_llm:
-            rewritten_text = flatten_row(row_dict, self.config)
-            system_prompt = user_prompt = ""
-        else:
-            system_prompt, user_prompt = self.prompt_manager.get_prompt(
-                sheet_name,
-                row_dict,
-                schema=schema,
+            return flat_text if flat_text is not None else flatten_row(row_dict, self.config)
+
+        system_prompt, user_prompt = self.prompt_manager.get_prompt(
+            sheet_name,
+            row_dict,
+            schema=schema,
+        )
+        rewritten_text = self.rewriter.generate(user_prompt, system_prompt, label=f"第 {row_idx + 1} 行")
+        if not rewritten_text and self.config.llm_fallback_to_flatten:
+            self.logger.warning(
+                "    LLM 多次失败，第 %s 行改用扁平化结果",
+                row_idx + 1,
             )
-            rewritten_text = None
-            for attempt in range(self.config.retry_times):
-                try:
-                    rewritten_text = self.llm_client.generate(user_prompt, system_prompt)
-                    if rewritten_text:
-                        break
-                except Exception as exc:
-                    self.logger.warning(
-                        "    第 %s 行处理失败 (尝试 %s/%s): %s",
-                        row_idx + 1,
-                        attempt + 1,
-                        self.config.retry_times,
-                        exc,
-                    )
-                    if attempt < self.config.retry_times - 1:
-                        time.sleep(self.config.retry_delay)
-            if not rewritten_text and self.config.llm_fallback_to_flatten:
-                self.logger.warning(
-                    "    LLM 多次失败，第 %s 行改用扁平化结果",
-                    row_idx + 1,
-                )
-                rewritten_text = flatten_row(row_dict, self.config)
+            rewritten_text = flatten_row(row_dict, self.config)
+        return rewritten_text
 
+    def _record_row(
+        self,
+        sheet_name: str,
+        row_idx: int,
+        row_dict: dict,
+        rewritten_text: Optional[str],
+    ) -> Optional[Dict]:
+        """Append a rewritten row to the CSV/TXT outputs and return it as a vector-store item."""
         if not rewritten_text:
             self.logger.warning("    ✗ 第 %s 行处理失败", row_idx + 1)
-            return
+            return None
 
         clean_dict = self._prepare_row_dict(row_dict)
         company_name = clean_dict.get("公司名称", clean_dict.get("company_name", ""))
@@ -212,10 +275,26 @@ class DataProcessor:
             "processed_time": datetime.now().isoformat(),
         }
 
-        self.processed_data.append(result)
+        self.sheet_counts[sheet_name] = self.sheet_counts.get(sheet_name, 0) + 1
         self._append_to_files(result)
         self.logger.info("    ✔ 第 %s 行处理成功并已写入文件", row_idx + 1)
 
+        # 与 CSV 中的 original_data 一致（经 JSON 往返），保证内容哈希与恢复流程相同
+        original_data = json.loads(result["original_data"])
+        company_name = company_name or (
+            original_data.get("company_name(企业名称)")
+            or original_data.get("company_name")
+            or original_data.get("企业名称")
+        )
+        return {
+            "source_table": sheet_name,
+            "source_id": result["source_id"],
+            "company_name": company_name or "",
+            "report_year": result["report_year"],
+            "rewritten_content": rewritten_text,
+            "original_data": original_data,
+        }
+
     def _append_to_files(self, result: Dict) -> None:
         with open(self.csv_path, "a", encoding="utf-8-sig", newline="") as fh:
             writer = csv.DictWriter(
@@ -241,63 +320,24 @@ class DataProcessor:
             fh.write("-" * 80 + "\n\n")
 
     def _save_summary(self) -> None:
-        if not self.processed_data:
+        if not self.sheet_counts:
             self.logger.warning("没有数据需要汇总")
             return
 
-        total_count = len(self.processed_data)
-        sheets_processed: Dict[str, int] = {}
-        for item in self.processed_data:
-            sheet = item["source_table"]
-            sheets_processed[sheet] = sheets_processed.get(sheet, 0) + 1
+        total_count = sum(self.sheet_counts.values())
 
         with open(self.txt_path, "a", encoding="utf-8") as fh:
             fh.write("\n" + "=" * 80 + "\n")
             fh.write("处理完成汇总:\n")
             fh.write(f"总处理记录数: {total_count}\n")
             fh.write("各工作表处理数量:\n")
-            for sheet, count in sheets_processed.items():
+            for sheet, count in self.sheet_counts.items():
                 fh.write(f"  - {sheet}: {count} 条\n")
             fh.write(f"完成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
             fh.write("=" * 80 + "\n")
 
         self.logger.info("✓ 汇总信息已保存，共处理 %s 条记录", total_count)
 
-    def _embed_and_store(self, incremental: bool = False) -> None:
-        if not self.processed_data:
-            self.logger.info("没有可入库的数据，跳过嵌入。")
-            return
-
-        items = []
-        for data in self.processed_data:
-            original = data.get("original_data")
-            parsed_original = original
-            if isinstance(original, str):
-                try:
-                    parsed_original = json.loads(original)
-                except Exception:
-                    parsed_original = original
-
-            company_name = data.get("company_name")
-            if not company_name and isinstance(parsed_original, dict):
-                company_name = (
-                    parsed_original.get("company_name(企业名称)")
-                    or parsed_original.get("company_name")
-                    or parsed_original.get("企业名称")
-                )
-
-            item = {
-                "source_table": data["source_table"],
-                "source_id": data["source_id"],
-                "company_name": company_name or "",
-                "report_year": data.get("report_year", ""),
-                "rewritten_content": data["rewritten_content"],
-                "original_data": parsed_original,
-            }
-            items.append(item)
-
-        self.vector_writer.upsert(items, self.logger, incremental=incremental)
-
     # The following helper methods mirror the legacy script for recovery and maintenance flows
     # and will be progressively refactored into smaller services.
 
@@ -466,9 +506,6 @@ class DataProcessor:
         company_name: Optional[str] = None,
         regenerate_content: bool = True,
     ):
-        conn = psycopg2.connect(**self.config.db_config)
-        cur = conn.cursor()
-
         conditions = []
         params: List = []
 
@@ -493,9 +530,10 @@ class DataProcessor:
             WHERE {' AND '.join(conditions)}
         """
 
-        cur.execute(sql, params)
-        rows = cur.fetchall()
-        conn.close()
+        with self.vector_writer.pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(sql, params)
+                rows = cur.fetchall()
 
         if not rows:
             self.logger.warning("未找到符合条件的记录")
@@ -503,35 +541,29 @@ class DataProcessor:
 
         self.logger.info("找到 %s 条记录", len(rows))
 
+        def regenerate(row) -> Optional[str]:
+            source_table, _source_id, _content, _company, _year, metadata = row
+            if not (regenerate_content and self.config.use_llm):
+                return None
+            original_data = {}
+            if metadata:
+                try:
+                    original_data = json.loads(metadata)
+                except json.JSONDecodeError:
+                    pass
+
+            schema = [SchemaColumn(name=str(k)) for k in original_data.keys()]
+            system_prompt, user_prompt = self.prompt_manager.get_prompt(
+                source_table,
+                original_data,
+                schema=schema,
+            )
+            return self.rewriter.generate(user_prompt, system_prompt)
+
         items = []
-        for row in rows:
+        for row, new_content in self.rewriter.map_ordered(rows, regenerate):
             source_table, source_id, content, company_name, report_year, metadata = row
             if regenerate_content and self.config.use_llm:
-                original_data = {}
-                if metadata:
-                    try:
-                        original_data = json.loads(metadata)
-                    except json.JSONDecodeError:
-                        pass
-
-                schema = [SchemaColumn(name=str(k)) for k in original_data.keys()]
-                system_prompt, user_prompt = self.prompt_manager.get_prompt(
-                    source_table,
-                    original_data,
-                    schema=schema,
-                )
-
-                new_content = None
-                for attempt in range(self.config.retry_times):
-                    try:
-                        new_content = self.llm_client.generate(user_prompt, system_prompt)
-                        if new_content:
-                            break
-                    except Exception as exc:
-                        self.logger.warning("生成失败 (尝试 %s): %s", attempt + 1, exc)
-                        if attempt < self.config.retry_times - 1:
-                            time.sleep(self.config.retry_delay)
-
                 if new_content:
                     content = new_content
                     self.logger.info("✓ 重新生成: %s-%s", source_table, source_id)
@@ -557,18 +589,16 @@ class DataProcessor:
             self.logger.error("必须指定表名和记录ID")
             return
 
-        conn = psycopg2.connect(**self.config.db_config)
-        cur = conn.cursor()
-
-        cur.execute(
-            """
-            DELETE FROM searchable_documents
-            WHERE source_table = %s AND source_id = ANY(%s)
-            """,
-            (source_table, source_ids),
-        )
-        deleted = cur.rowcount
-        conn.commit()
-        conn.close()
+        with self.vector_writer.pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    DELETE FROM searchable_documents
+                    WHERE source_table = %s AND source_id = ANY(%s)
+                    """,
+                    (source_table, source_ids),
+                )
+                deleted = cur.rowcount
+            conn.commit()
 
         self.logger.info("✓ 已删除 %s 条记录", deleted)
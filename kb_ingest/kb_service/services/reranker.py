@@ -1,11 +1,26 @@
+"""
+Reranker client for the pgvector search path.
+
+The search path is synchronous (sync FastAPI routes over a psycopg pool), so the
+client stays blocking but behaves like the API-side async reranker:
+
+- one pooled `requests.Session` shared by every request thread;
+- scores cached per (query hash, document id, model), only unseen documents are sent;
+- a latency budget covering retries, and a consecutive-failure circuit breaker.
+  When either trips, `rerank` returns None and the caller keeps vector order.
+"""
 from __future__ import annotations
 
+import hashlib
 import logging
 import math
+import threading
 import time
-from typing import Iterable, List, Optional
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
 
 import requests
+from requests.adapters import HTTPAdapter
 
 from kb_service.core.config import Config
 
@@ -17,6 +32,82 @@ class RerankAPIError(Exception):
     pass
 
 
+class RerankBudgetExceeded(RerankAPIError):
+    """延迟预算耗尽"""
+    pass
+
+
+class RerankScoreCache:
+    """线程安全的 rerank 分数 LRU，键为 (query_hash, doc_id, model)"""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._items: "OrderedDict[Tuple[str, str, str], Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(query: str, doc_id: str, model: str) -> Tuple[str, str, str]:
+        return hashlib.sha256(query.strip().encode("utf-8")).hexdigest(), doc_id, model
+
+    def get(self, key: Tuple[str, str, str]) -> Optional[float]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            expires_at, score = item
+            if expires_at <= time.monotonic():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return score
+
+    def set(self, key: Tuple[str, str, str], score: float) -> None:
+        if self.max_size <= 0 or self.ttl <= 0:
+            return
+        with self._lock:
+            self._items[key] = (time.monotonic() + self.ttl, score)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+
+class CircuitBreaker:
+    """连续失败达到阈值后熔断 cooldown 秒；冷却结束后每个冷却周期放行一次试探请求"""
+
+    def __init__(self, failure_threshold: int, cooldown: float):
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = max(0.0, cooldown)
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            now = time.monotonic()
+            if now - self._opened_at < self.cooldown:
+                return False
+            self._opened_at = now
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
 class RerankerClient:
     """
     重排序客户端，支持两种模式：
@@ -28,6 +119,19 @@ class RerankerClient:
         self.config = config
         self.timeout = config.rerank_timeout
         self.provider = config.rerank_provider.lower()
+        budget_ms = config.rerank_latency_budget_ms
+        self.latency_budget = budget_ms / 1000.0 if budget_ms > 0 else float(self.timeout)
+        self.cache = RerankScoreCache(config.rerank_cache_size, config.rerank_cache_ttl)
+        self.breaker = CircuitBreaker(config.rerank_breaker_failures, config.rerank_breaker_cooldown)
+
+        # 所有请求线程共用一个连接池，避免每次 rerank 重新建立 TLS 连接
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=max(1, config.rerank_max_connections),
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
 
         # 根据 provider 初始化
         if self.provider == "cohere":
@@ -81,7 +185,8 @@ class RerankerClient:
             top_n: 返回前 N 个结果（None 则使用配置）
 
         Returns:
-            重排序后的结果列表，格式: [{"id": str, "score": float}, ...]
+            重排序后的结果列表，格式: [{"id": str, "score": float}, ...]；
+            服务不可用（熔断、失败或超出延迟预算）时返回 None，调用方保持向量排序
         """
         documents = []
         for item in candidates:
@@ -101,27 +206,55 @@ class RerankerClient:
         if top_n is None:
             top_n = self.config.rerank_top_n
 
-        # 根据模式调用不同的 API
+        # 命中缓存的文档不再请求，只对未打过分的文档调用 API
+        model_key = f"{self.mode}:{self.model or ''}"
+        keys = {doc["id"]: self.cache.key(query, doc["id"], model_key) for doc in documents}
+        scores: Dict[str, float] = {}
+        for doc_id, key in keys.items():
+            score = self.cache.get(key)
+            if score is not None:
+                scores[doc_id] = score
+        missing = [doc for doc in documents if doc["id"] not in scores]
+
+        if missing:
+            if not self.breaker.allow():
+                logger.warning("Reranker 已熔断，跳过重排序")
+                return None
+            deadline = time.monotonic() + self.latency_budget
+            if self.mode == "cohere":
+                fetched = self._rerank_cohere(query, missing, deadline)
+            else:
+                fetched = self._rerank_custom(query, missing, deadline)
+            if fetched is None:
+                self.breaker.record_failure()
+                return None
+            self.breaker.record_success()
+            for doc_id, score in fetched.items():
+                scores[doc_id] = score
+                self.cache.set(keys[doc_id], score)
+
+        reranked = [{"id": doc_id, "score": score} for doc_id, score in scores.items()]
+        reranked.sort(key=lambda x: x["score"], reverse=True)
         if self.mode == "cohere":
-            return self._rerank_cohere(query, documents, top_n)
-        else:
-            return self._rerank_custom(query, documents)
+            reranked = reranked[:top_n]
+        return reranked or None
 
     def _rerank_cohere(
         self,
         query: str,
         documents: List[dict],
-        top_n: int,
-    ) -> Optional[List[dict]]:
-        """调用 Cohere Rerank API"""
+        deadline: float,
+    ) -> Optional[Dict[str, float]]:
+        """调用 Cohere Rerank API，返回 {id: score}"""
         # Cohere API 期望的文档格式是字符串列表
         doc_texts = [doc["text"] for doc in documents]
 
+        # 请求全部文档的分数以便缓存，截断到 top_n 由 rerank 统一处理
         payload = {
             "model": self.model,
             "query": query,
             "documents": doc_texts,
-            "top_n": min(top_n, len(doc_texts)),
+            "top_n": len(doc_texts),
         }
         headers = {
             "Authorization": f"Bearer {self.api_key}",
@@ -134,6 +267,7 @@ class RerankerClient:
                 self.endpoint,
                 headers=headers,
                 payload=payload,
+                deadline=deadline,
                 retries=3,
             )
             elapsed = (time.time() - start) * 1000
@@ -149,29 +283,15 @@ class RerankerClient:
             logger.warning("Cohere Rerank 返回空结果")
             return None
 
-        # 转换为统一格式，使用原始 documents 的 id
-        reranked = []
-        for item in results:
-            index = item.get("index")
-            score = item.get("relevance_score")
-            if index is None or score is None:
-                continue
-            if 0 <= index < len(documents):
-                reranked.append({
-                    "id": documents[index]["id"],
-                    "score": float(score),
-                })
-
-        # Cohere 已按分数排序，但我们再确保一次
-        reranked.sort(key=lambda x: x["score"], reverse=True)
-        return reranked or None
+        return self._scores_by_id(results, documents)
 
     def _rerank_custom(
         self,
         query: str,
         documents: List[dict],
-    ) -> Optional[List[dict]]:
-        """调用自建 Reranker 服务"""
+        deadline: float,
+    ) -> Optional[Dict[str, float]]:
+        """调用自建 Reranker 服务，返回 {id: score}"""
         # 提取文本列表（服务期望字符串数组，不是dict数组）
         doc_texts = [doc["text"] for doc in documents]
 
@@ -189,14 +309,13 @@ class RerankerClient:
 
         start = time.time()
         try:
-            response = requests.post(
+            data = self._post_with_retry(
                 self.endpoint,
-                json=payload,
                 headers=headers,
-                timeout=self.timeout,
+                payload=payload,
+                deadline=deadline,
+                retries=1,
             )
-            response.raise_for_status()
-            data = response.json()
             elapsed = (time.time() - start) * 1000
             logger.info("自建 Rerank 完成 (%.1f ms)", elapsed)
         except Exception as exc:
@@ -209,48 +328,60 @@ class RerankerClient:
             logger.warning("自建 Reranker 响应格式无效: %s", data)
             return None
 
-        reranked = []
+        return self._scores_by_id(results, documents)
+
+    @staticmethod
+    def _scores_by_id(results: List[dict], documents: List[dict]) -> Optional[Dict[str, float]]:
+        """服务返回的是 index 和 relevance_score，映射回原始文档 id"""
+        scores: Dict[str, float] = {}
         for item in results:
-            # 服务返回的是index和relevance_score，需要映射回原始文档
             index = item.get("index")
-            score = item.get("relevance_score") or item.get("score")
+            score = item.get("relevance_score")
+            if score is None:
+                score = item.get("score")
             if index is None or score is None:
                 continue
             if 0 <= index < len(documents):
                 try:
-                    reranked.append({"id": documents[index]["id"], "score": float(score)})
-                except (TypeError, ValueError, KeyError):
+                    scores[documents[index]["id"]] = float(score)
+                except (TypeError, ValueError):
                     continue
-
-        reranked.sort(key=lambda x: x["score"], reverse=True)
-        return reranked or None
+        return scores or None
 
     def _post_with_retry(
         self,
         url: str,
         headers: dict,
         payload: dict,
+        deadline: float,
         retries: int = 3,
         backoff: float = 0.8,
     ) -> dict:
-        """带重试的 POST 请求，用于处理 API 限流"""
+        """带重试的 POST 请求，用于处理 API 限流；单次超时与退避等待都不超过剩余延迟预算"""
         last_error = None
         for i in range(retries):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise RerankBudgetExceeded(f"超出 {self.latency_budget * 1000:.0f} ms 延迟预算: {last_error}")
             try:
-                response = requests.post(url, headers=headers, json=payload, timeout=self.timeout)
+                response = self.session.post(
+                    url,
+                    headers=headers,
+                    json=payload,
+                    timeout=min(self.timeout, remaining),
+                )
                 if response.status_code == 429:  # rate limit
-                    wait_time = backoff * (2 ** i)
-                    logger.warning("遇到限流 (429)，等待 %.1f 秒后重试...", wait_time)
-                    time.sleep(wait_time)
-                    continue
+                    raise RerankAPIError("遇到限流 (429)")
                 response.raise_for_status()
                 return response.json()
             except Exception as e:
                 last_error = e
-                if i < retries - 1:
-                    wait_time = backoff * (2 ** i)
+                wait_time = backoff * (2 ** i)
+                if i < retries - 1 and time.monotonic() + wait_time < deadline:
                     logger.warning("请求失败，等待 %.1f 秒后重试: %s", wait_time, e)
                     time.sleep(wait_time)
+                else:
+                    break
         raise RerankAPIError(f"Rerank 请求失败（重试 {retries} 次）: {last_error}")
 
     @staticmethod
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple, TypeVar
+
+from kb_service.clients.llm import LLMClient
+from kb_service.core.config import Config
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, bursting up to `capacity`."""
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: float,
+        *,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Block until `tokens` are available; returns the seconds spent waiting."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                delay = (tokens - self._tokens) / self.rate
+            self._sleep(delay)
+            waited += delay
+
+
+_buckets: Dict[Tuple[str, str], TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def get_rate_limiter(config: Config) -> Optional[TokenBucket]:
+    """Process-wide bucket per LLM provider endpoint; None when LLM_RATE_LIMIT_RPM is unset."""
+    if config.llm_rate_limit_rpm <= 0:
+        return None
+    key = (config.llm_provider.lower(), config.llm_base_url or "")
+    with _buckets_lock:
+        bucket = _buckets.get(key)
+        if bucket is None:
+            capacity = config.llm_rate_limit_burst or max(1, config.llm_concurrency)
+            bucket = TokenBucket(config.llm_rate_limit_rpm / 60.0, capacity)
+            _buckets[key] = bucket
+    return bucket
+
+
+class RowRewriter:
+    """
+    Concurrent LLM row rewriting.
+
+    Rows run on a bounded thread pool (LLM_CONCURRENCY) and results are
+    yielded in input order, so CSV/TXT output and vector writes keep the
+    source row order. Requests share the provider's token bucket; a failed
+    row backs off with jitter on its own worker while other rows continue.
+
+    A backing-off row keeps its worker asleep, so while rows are retrying
+    fewer than LLM_CONCURRENCY requests are in flight. The bucket is only
+    charged per request sent, never for the backoff, so retries cannot push
+    the request rate past LLM_RATE_LIMIT_RPM.
+    """
+
+    def __init__(self, config: Config, llm_client: Optional[LLMClient], logger: Optional[logging.Logger] = None):
+        self.config = config
+        self.llm_client = llm_client
+        self.logger = logger or logging.getLogger(__name__)
+        self.concurrency = max(1, config.llm_concurrency) if llm_client is not None else 1
+        self.limiter = get_rate_limiter(config)
+
+    def generate(self, prompt: str, system_prompt: str = "", label: str = "") -> Optional[str]:
+        retry_times = max(1, self.config.retry_times)
+        for attempt in range(retry_times):
+            if self.limiter is not None:
+                self.limiter.acquire()
+            try:
+                content = self.llm_client.generate(prompt, system_prompt)
+                if content:
+                    return content
+            except Exception as exc:
+                self.logger.warning(
+                    "    %s处理失败 (尝试 %s/%s): %s",
+                    f"{label} " if label else "",
+                    attempt + 1,
+                    retry_times,
+                    exc,
+                )
+                if attempt < retry_times - 1:
+                    # 退避期间占用当前工作线程（计入 LLM_CONCURRENCY），但不消耗限流令牌
+                    time.sleep(self.backoff(attempt))
+        return None
+
+    def backoff(self, attempt: int) -> float:
+        """Exponential backoff from RETRY_DELAY with equal jitter, capped at LLM_RETRY_MAX_DELAY."""
+        delay = min(self.config.llm_retry_max_delay, self.config.retry_delay * (2 ** attempt))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def map_ordered(
+        self,
+        items: Iterable[T],
+        fn: Callable[[T], R],
+        concurrent: bool = True,
+    ) -> Iterator[Tuple[T, R]]:
+        """Apply `fn` concurrently and yield `(item, result)` pairs in input order."""
+        if self.concurrency == 1 or not concurrent:
+            for item in items:
+                yield item, fn(item)
+            return
+
+        window = self.concurrency * 4  # 限制已提交未输出的行数，避免整表驻留内存
+        executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="kb-rewrite")
+        pending = deque()
+        try:
+            for item in items:
+                pending.append((item, executor.submit(fn, item)))
+                if len(pending) >= window:
+                    head, future = pending.popleft()
+                    yield head, future.result()
+            while pending:
+                head, future = pending.popleft()
+                yield head, future.result()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
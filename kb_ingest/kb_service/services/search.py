@@ -3,14 +3,19 @@ from __future__ import annotations
 import json
 import logging
 import re
+import time
 from typing import List, Optional
 
-import psycopg2
-from pgvector.psycopg2 import register_vector
+import numpy as np
 
 from kb_service.clients.embedding import EmbeddingClient
 from kb_service.core.config import Config
+from kb_service.db.pool import get_pool
 from kb_service.services.reranker import RerankerClient
+from kb_service.services.vector_index import VectorIndexManager, apply_search_settings
+
+# 索引描述（类型/参数/pgvector 版本）缓存时长；索引重建后最多延迟这么久生效
+_INDEX_STATE_TTL_SECONDS = 30.0
 
 
 class VectorSearcher:
@@ -20,6 +25,10 @@ class VectorSearcher:
         self.config = config
         self.embedding_client = EmbeddingClient(config)
         self.logger = logging.getLogger(__name__)
+        self.index_manager = VectorIndexManager(config, logger=self.logger)
+        self.pool = get_pool(config)
+        self._index_state = None
+        self._index_state_at = 0.0
         self.rerank_client: RerankerClient | None = None
         if self.config.rerank_enabled:
             try:
@@ -41,63 +50,75 @@ class VectorSearcher:
         metric: str = "cosine",
         company_filter: Optional[str] = None,
         source_tables: Optional[List[str]] = None,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
     ) -> List[dict]:
         self.logger.info("开始搜索: %s... (metric=%s)", query[:50], metric)
 
         qvec = self.embedding_client.embed_texts([query])[0]
-        qvec = qvec.tolist() if hasattr(qvec, "tolist") else list(qvec)
+        qvec = np.asarray(qvec, dtype=np.float32)
 
+        # 相似度 SQL 以服务端预编译语句执行（$n 占位符）：查询向量作为参数出现在 ORDER BY 中，
+        # 规划器才能使用 HNSW/IVFFlat 索引扫描；LIMIT 写成常量，避免通用计划按未知行数估算
+        params: List[object] = [qvec]
+        q = "$1::vector"
         if metric == "l2":
-            order_expr = "embedding <-> q.v"
-            sim_expr = "1.0 / (1.0 + (embedding <-> q.v))"
-            dist_expr = "embedding <-> q.v"
+            order_expr = f"embedding <-> {q}"
+            sim_expr = f"1.0 / (1.0 + (embedding <-> {q}))"
+            dist_expr = f"embedding <-> {q}"
         else:
-            order_expr = "embedding <=> q.v"
-            sim_expr = "1.0 - (embedding <=> q.v)"
-            dist_expr = "embedding <-> q.v"
-
-        sql = f"""
-        WITH q AS (SELECT %s::vector AS v)
-        SELECT
-          id, source_table, source_id, metadata, content,
-          {sim_expr}  AS similarity,
-          {dist_expr} AS distance
-        FROM searchable_documents, q
-        WHERE embedding IS NOT NULL
-        """
-        params: List = [qvec]
+            order_expr = f"embedding <=> {q}"
+            sim_expr = f"1.0 - (embedding <=> {q})"
+            dist_expr = f"embedding <-> {q}"
+
+        def bind(value: object) -> str:
+            params.append(value)
+            return f"${len(params)}"
+
+        filters = ""
 
         if company_filter:
             # 使用 JSONB 查询
-            sql += " AND (metadata->>'company_name' ILIKE %s OR metadata->>'企业名称' ILIKE %s)"
-            params.append(f"%{company_filter}%")
-            params.append(f"%{company_filter}%")
+            company = bind(f"%{company_filter}%")
+            filters += f" AND (metadata->>'company_name' ILIKE {company} OR metadata->>'企业名称' ILIKE {company})"
 
         if source_tables:
-            sql += " AND source_table = ANY(%s)"
-            params.append(source_tables)
+            filters += f" AND source_table = ANY({bind(list(source_tables))}::text[])"
 
         if threshold is not None:
-            sql += f" AND ({sim_expr}) >= %s::float8"
-            params.append(float(threshold))
-
-        sql += f" ORDER BY {order_expr} LIMIT %s;"
-        params.append(int(top_k))
+            filters += f" AND ({sim_expr}) >= {bind(float(threshold))}::float8"
+
+        with self.pool.connection() as conn:
+            index_plan, pgvector_version = self._describe_index(conn)
+            if index_plan is not None and index_plan.metric == metric:
+                order_expr = index_plan.order_expr(q)
+                apply_search_settings(
+                    conn,
+                    self.index_manager.search_settings(
+                        index_plan,
+                        pgvector_version,
+                        top_k=int(top_k),
+                        ef_search=ef_search,
+                        probes=probes,
+                        filtered=bool(filters),
+                    ),
+                    self.logger,
+                )
 
-        rows = []
-        conn = psycopg2.connect(**self.config.db_config)
-        try:
-            register_vector(conn)
+            sql = f"""
+            SELECT
+              id, source_table, source_id, metadata, content,
+              {sim_expr}  AS similarity,
+              {dist_expr} AS distance
+            FROM searchable_documents
+            WHERE embedding IS NOT NULL{filters}
+            ORDER BY {order_expr}
+            LIMIT {int(top_k)};
+            """
             with conn.cursor() as cur:
-                try:
-                    cur.execute("SET ivfflat.probes = 10;")
-                except Exception:  # pragma: no cover - optional extension
-                    pass
-                self.logger.debug(cur.mogrify(sql, params).decode())
-                cur.execute(sql, params)
+                self.pool.execute_prepared(cur, sql, params)
                 rows = cur.fetchall()
-        finally:
-            conn.close()
+            conn.commit()
 
         results = []
         for row in rows:
@@ -140,6 +161,15 @@ class VectorSearcher:
         self.logger.info("找到 %s 个相似结果", len(results))
         return results
 
+    def _describe_index(self, conn):
+        """Cached `VectorIndexManager.describe`, refreshed every few seconds."""
+        now = time.monotonic()
+        if self._index_state is None or now - self._index_state_at > _INDEX_STATE_TTL_SECONDS:
+            with conn.cursor() as cur:
+                self._index_state = self.index_manager.describe(cur)
+            self._index_state_at = now
+        return self._index_state
+
     def hybrid_search(
         self,
         query: str,
@@ -148,6 +178,8 @@ class VectorSearcher:
         threshold: Optional[float] = None,
         metric: str = "cosine",
         source_tables: Optional[List[str]] = None,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
     ) -> dict:
         """
         混合召回：向量检索 + Rerank 精排
@@ -159,6 +191,8 @@ class VectorSearcher:
             threshold: 相似度阈值
             metric: 距离度量方式
             source_tables: 限制检索的表范围
+            ef_search: HNSW 索引的检索候选数（覆盖 HNSW_EF_SEARCH）
+            probes: IVFFlat 索引的探测列表数（覆盖 IVFFLAT_PROBES）
 
         Returns:
             包含 vector_results, rerank_results, hybrid_results 的字典
@@ -172,6 +206,8 @@ class VectorSearcher:
             threshold=threshold,
             metric=metric,
             source_tables=source_tables,
+            ef_search=ef_search,
+            probes=probes,
         )
 
         # 2. Rerank（如果启用且有结果）
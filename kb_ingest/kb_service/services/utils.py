@@ -3,13 +3,22 @@ from __future__ import annotations
 import hashlib
 import json
 import re
+from dataclasses import dataclass
 from datetime import date, datetime
-from typing import Dict, Mapping
+from functools import lru_cache
+from typing import Dict, Hashable, Iterator, List, Mapping, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 
 from kb_service.core.config import Config
 
+_TRAILING_PAREN = re.compile(r"\s*\([^()]*\)\s*$")
+_UNNAMED = re.compile(r"^Unnamed[:\s]", flags=re.I)
+_DATE_TYPES = (pd.Timestamp, datetime, date)
+_SKIP_TEXT = frozenset({"", "-", "nan", "NaN"})
+_EMPTY_TEXT = _SKIP_TEXT | {"None", "null"}
+
 
 def flatten_row(row: Mapping[str, object], config: Config) -> str:
     """Convert a row dict into a flattened `key: value` string for embedding."""
@@ -18,15 +27,8 @@ def flatten_row(row: Mapping[str, object], config: Config) -> str:
     seen: Dict[str, object] = {}
 
     for key, value in row.items():
-        if key is None:
-            continue
-        normalized_key = str(key).strip().replace("（", "(").replace("）", ")")
-        while True:
-            stripped = re.sub(r"\s*\([^()]*\)\s*$", "", normalized_key)
-            if stripped == normalized_key:
-                break
-            normalized_key = stripped
-        if re.match(r"^Unnamed[:\s]", normalized_key, flags=re.I):
+        normalized_key = normalize_key(key)
+        if normalized_key is None:
             continue
 
         if normalized_key not in seen or (not _nonempty(seen[normalized_key]) and _nonempty(value)):
@@ -53,6 +55,188 @@ def flatten_row(row: Mapping[str, object], config: Config) -> str:
     return flat_text
 
 
+@lru_cache(maxsize=4096, typed=True)
+def normalize_key(key: Hashable) -> Optional[str]:
+    """Strip trailing `(unit)` groups from a column name; None for unnamed/absent columns."""
+    if key is None:
+        return None
+    normalized_key = str(key).strip().replace("（", "(").replace("）", ")")
+    while True:
+        stripped = _TRAILING_PAREN.sub("", normalized_key)
+        if stripped == normalized_key:
+            break
+        normalized_key = stripped
+    if _UNNAMED.match(normalized_key):
+        return None
+    return normalized_key
+
+
+@dataclass(frozen=True)
+class FlattenPlan:
+    """
+    Column plan for one schema: the normalized keys in output order and, for
+    each key, the positions of the source columns that collapse into it.
+    """
+
+    keys: Tuple[str, ...]
+    sources: Tuple[Tuple[int, ...], ...]
+
+
+def build_flatten_plan(columns: Tuple[Hashable, ...]) -> FlattenPlan:
+    """
+    Normalize a schema's column names once. Mirrors `flatten_row` on the
+    row dict: a repeated raw name keeps its first position and its last
+    value; keys that normalize alike are merged in first-seen order.
+    """
+    # 带上类型作为缓存键，避免 1 / 1.0 / True 这类相等的列名共用同一份计划
+    return _build_flatten_plan(tuple((type(column), column) for column in columns))
+
+
+@lru_cache(maxsize=256)
+def _build_flatten_plan(typed_columns: Tuple[Tuple[type, Hashable], ...]) -> FlattenPlan:
+    raw: Dict[Hashable, int] = {}
+    for position, (_, column) in enumerate(typed_columns):
+        raw[column] = position
+    grouped: Dict[str, List[int]] = {}
+    for column, position in raw.items():
+        key = normalize_key(column)
+        if key is not None:
+            grouped.setdefault(key, []).append(position)
+    return FlattenPlan(
+        keys=tuple(grouped),
+        sources=tuple(tuple(positions) for positions in grouped.values()),
+    )
+
+
+def frame_values(df: pd.DataFrame) -> np.ndarray:
+    """
+    Object matrix of the frame's values, boxed the way `df.iterrows()` boxes
+    them (numeric frames upcast, datetimes as Timestamp). Unlike iterrows no
+    dtype is re-inferred per row, so a missing cell stays NaN/None instead of
+    becoming NaT in a row whose other cells are all dates.
+    """
+    values = df.values
+    if values.dtype.kind in "mM":
+        return df.astype(object).values
+    if values.dtype != object:
+        return values.astype(object)
+    return values
+
+
+def iter_records(df: pd.DataFrame) -> Iterator[Tuple[Hashable, dict]]:
+    """`(index, row_dict)` pairs like `(idx, row.to_dict())` from `iterrows()`, without a Series per row."""
+    columns = list(df.columns)
+    for label, row in zip(df.index, frame_values(df)):
+        yield label, dict(zip(columns, row))
+
+
+_to_text = np.frompyfunc(lambda value: str(value).strip(), 1, 1)
+_format_date = np.frompyfunc(
+    lambda value: pd.Timestamp(value).isoformat(sep=" ", timespec="seconds") if isinstance(value, _DATE_TYPES) else value,
+    1,
+    1,
+)
+_in_skip = np.frompyfunc(_SKIP_TEXT.__contains__, 1, 1)
+_in_empty = np.frompyfunc(_EMPTY_TEXT.__contains__, 1, 1)
+
+
+def flatten_frame(
+    df: pd.DataFrame,
+    config: Config,
+    extra: Optional[Mapping[str, object]] = None,
+) -> List[str]:
+    """
+    Batch form of `flatten_row`: one flattened string per DataFrame row,
+    byte-identical to `flatten_row({**row.to_dict(), **extra}, config)`.
+
+    Key normalization comes from the cached per-schema `FlattenPlan`; NA,
+    date formatting, text cleaning and duplicate-key selection are computed
+    column-wise over the whole chunk.
+    """
+    rows = len(df)
+    if rows == 0:
+        return []
+    values = frame_values(df)
+    columns = list(df.columns)
+    constants: Dict[int, Tuple[str, bool, bool, bool]] = {}
+    for key, value in (extra or {}).items():
+        # 与 {**row, **extra} 相同：同名列被覆盖（位置不变），新键追加在末尾
+        state = _cell_state(value)
+        matched = [index for index, column in enumerate(columns) if column == key]
+        if not matched:
+            matched = [len(columns)]
+            columns.append(key)
+        for index in matched:
+            constants[index] = state
+    plan = build_flatten_plan(tuple(columns))
+
+    text: Dict[int, np.ndarray] = {}
+    emit: Dict[int, np.ndarray] = {}
+    filled: Dict[int, np.ndarray] = {}
+    kept: Dict[int, np.ndarray] = {}
+    for position in {p for group in plan.sources for p in group}:
+        if position in constants:
+            const_text, const_emit, const_filled, const_kept = constants[position]
+            text[position] = np.full(rows, const_text, dtype=object)
+            emit[position] = np.full(rows, const_emit)
+            filled[position] = np.full(rows, const_filled)
+            kept[position] = np.full(rows, const_kept)
+            continue
+        raw = values[:, position]
+        column = _format_date(raw).astype(object)
+        column_text = _to_text(column).astype(object)
+        text[position] = column_text
+        present = ~pd.isna(column)
+        not_empty = ~_in_empty(column_text).astype(bool)
+        emit[position] = present & ~_in_skip(column_text).astype(bool)
+        # flatten_row 判断新值是否非空用原值（NaT 为空），判断已保存值用日期格式化后的值
+        filled[position] = ~pd.isna(raw) & not_empty
+        kept[position] = present & not_empty
+
+    pieces: List[np.ndarray] = []
+    for key, group in zip(plan.keys, plan.sources):
+        if len(group) == 1:
+            chosen_text, chosen_emit = text[group[0]], emit[group[0]]
+        else:
+            # 同名键取第一个非空值，全部为空时保留第一个
+            stacked = np.vstack([kept[group[0]]] + [filled[p] for p in group[1:]])
+            choice = np.where(stacked.any(axis=0), stacked.argmax(axis=0), 0)
+            row_index = np.arange(rows)
+            chosen_text = np.vstack([text[p] for p in group])[choice, row_index]
+            chosen_emit = np.vstack([emit[p] for p in group])[choice, row_index]
+        piece = np.full(rows, None, dtype=object)
+        piece[chosen_emit] = f"{key}{config.flat_kv_sep}" + chosen_text[chosen_emit]
+        pieces.append(piece)
+
+    sep = config.flat_sep
+    max_len = config.flat_max_len
+    results: List[str] = []
+    for row in zip(*pieces) if pieces else [()] * rows:
+        flat_text = sep.join([piece for piece in row if piece is not None])
+        if max_len > 0 and len(flat_text) > max_len:
+            flat_text = flat_text[:max_len]
+        results.append(flat_text)
+    return results
+
+
+def _cell_state(value) -> Tuple[str, bool, bool, bool]:
+    """
+    Scalar `(text, emitted, non-empty, non-empty once stored)` for one
+    value, following `flatten_row` exactly.
+    """
+    filled = _nonempty(value)
+    if isinstance(value, _DATE_TYPES):
+        value = pd.Timestamp(value).isoformat(sep=" ", timespec="seconds")
+    text = str(value).strip()
+    emitted = value is not None and text not in _SKIP_TEXT
+    if emitted:
+        try:
+            emitted = bool(pd.notna(value))
+        except Exception:  # pragma: no cover
+            pass
+    return text, emitted, filled, _nonempty(value)
+
+
 def _nonempty(value) -> bool:
     if value is None:
         return False
@@ -64,28 +248,45 @@ def _nonempty(value) -> bool:
     return str(value).strip() not in {"", "-", "nan", "NaN", "None", "null"}
 
 
+def canonical_json(data: Dict | str) -> str:
+    """Stable serialization used for content hashing (sorted keys, non-JSON values via str)."""
+    if isinstance(data, dict):
+        return json.dumps(data, sort_keys=True, ensure_ascii=False, default=str)
+    return str(data)
+
+
 def compute_content_hash(data: Dict | str, algorithm: str = "md5") -> str:
     """
     计算数据的哈希值，用于检测内容变化
 
     Args:
         data: 字典或字符串数据
-        algorithm: 哈希算法，支持 'md5', 'sha256'
+        algorithm: 哈希算法，支持 'md5', 'sha256', 'blake2b'
 
     Returns:
         哈希值的十六进制字符串
     """
-    if isinstance(data, dict):
-        # 将字典转为稳定的JSON字符串（排序key）
-        content = json.dumps(data, sort_keys=True, ensure_ascii=False, default=str)
-    else:
-        content = str(data)
+    # 将字典转为稳定的JSON字符串（排序key）
+    content = canonical_json(data)
 
     # 计算哈希
     if algorithm == "sha256":
         hasher = hashlib.sha256()
+    elif algorithm == "blake2b":
+        hasher = hashlib.blake2b(digest_size=16)
     else:
         hasher = hashlib.md5()
 
     hasher.update(content.encode("utf-8"))
     return hasher.hexdigest()
+
+
+CONTENT_HASH_PREFIX = "b2:"
+
+
+def content_fingerprint(data: Dict | str) -> str:
+    """
+    searchable_documents.content_hash 的当前格式：`b2:` + 128 位 BLAKE2b。
+    不带前缀的旧值是 `compute_content_hash(data)` 的 MD5，增量检测时会就地升级。
+    """
+    return CONTENT_HASH_PREFIX + compute_content_hash(data, algorithm="blake2b")
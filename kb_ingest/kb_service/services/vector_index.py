@@ -0,0 +1,338 @@
+from __future__ import annotations
+
+import json
+import logging
+import math
+import re
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import psycopg2
+
+from kb_service.core.config import Config
+
+DEFAULT_TABLE = "searchable_documents"
+
+# pgvector: HNSW/IVFFlat 索引对 vector 最多支持 2000 维；更高维度需要 halfvec 表达式索引（>= 0.7.0，最多 4000 维）
+VECTOR_INDEX_MAX_DIM = 2000
+HALFVEC_INDEX_MAX_DIM = 4000
+
+_OPCLASSES = {
+    ("vector", "cosine"): "vector_cosine_ops",
+    ("vector", "l2"): "vector_l2_ops",
+    ("halfvec", "cosine"): "halfvec_cosine_ops",
+    ("halfvec", "l2"): "halfvec_l2_ops",
+}
+_OPERATORS = {"cosine": "<=>", "l2": "<->"}
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def parse_version(text: Optional[str]) -> Tuple[int, ...]:
+    """'0.7.4' -> (0, 7, 4)；未安装扩展时返回 (0,)。"""
+    parts = []
+    for piece in str(text or "0").split("."):
+        digits = "".join(ch for ch in piece if ch.isdigit())
+        parts.append(int(digits or 0))
+    return tuple(parts)
+
+
+@dataclass
+class IndexPlan:
+    """A managed ANN index definition; stored as JSON in the index comment."""
+
+    kind: str  # "hnsw" | "ivfflat"
+    metric: str  # "cosine" | "l2"
+    dim: int
+    storage: str = "vector"  # "vector" | "halfvec"
+    params: Dict[str, int] = field(default_factory=dict)
+    rows: int = 0
+
+    @property
+    def opclass(self) -> str:
+        return _OPCLASSES[(self.storage, self.metric)]
+
+    def column_expr(self, column: str = "embedding") -> str:
+        if self.storage == "halfvec":
+            return f"({column}::halfvec({self.dim}))"
+        return column
+
+    def order_expr(self, query: str, column: str = "embedding") -> str:
+        """ORDER BY 表达式，与索引表达式一致以便规划器使用索引扫描。"""
+        return f"{self.column_expr(column)} {_OPERATORS[self.metric]} ({query})::{self.storage}({self.dim})"
+
+    def create_sql(self, table: str, name: str, concurrently: bool = True) -> str:
+        options = ", ".join(f"{key} = {int(value)}" for key, value in sorted(self.params.items()))
+        return (
+            f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}{name} ON {table} "
+            f"USING {self.kind} ({self.column_expr()} {self.opclass}) WITH ({options})"
+        )
+
+    def signature(self) -> tuple:
+        """(kind, metric, dim, storage, params)"""
+        return self.kind, self.metric, self.dim, self.storage, tuple(sorted(self.params.items()))
+
+    def to_comment(self) -> str:
+        return json.dumps(asdict(self), sort_keys=True)
+
+    @classmethod
+    def from_comment(cls, text: Optional[str]) -> Optional["IndexPlan"]:
+        if not text:
+            return None
+        try:
+            data = json.loads(text)
+            return cls(
+                kind=data["kind"],
+                metric=data["metric"],
+                dim=int(data["dim"]),
+                storage=data.get("storage", "vector"),
+                params={key: int(value) for key, value in (data.get("params") or {}).items()},
+                rows=int(data.get("rows") or 0),
+            )
+        except (ValueError, KeyError, TypeError):
+            return None
+
+
+class VectorIndexManager:
+    """
+    Lifecycle of the HNSW/IVFFlat index on `<table>.embedding`.
+
+    The index type is chosen from the row count (exact scan below
+    `vector_index_min_rows`, HNSW up to `vector_index_hnsw_max_rows`, IVFFlat
+    beyond). Rebuilds use CREATE INDEX CONCURRENTLY under a temporary name and
+    swap it in, so searches keep running during bulk ingests.
+    """
+
+    def __init__(self, config: Config, table: str = DEFAULT_TABLE, logger: Optional[logging.Logger] = None):
+        if not _IDENTIFIER.match(table):
+            raise ValueError(f"Invalid table name: {table!r}")
+        self.config = config
+        self.table = table
+        self.index_name = f"idx_{table}_embedding_ann"
+        self.logger = logger or logging.getLogger(__name__)
+
+    # ------------------------------------------------------------------ planning
+    def plan(
+        self,
+        rows: int,
+        dim: int,
+        version: Tuple[int, ...],
+        kind: Optional[str] = None,
+    ) -> Optional[IndexPlan]:
+        """Index that should exist for `rows` vectors of `dim` dimensions (None = exact scan)."""
+        kind = (kind or self.config.vector_index_type or "auto").lower()
+        if kind == "none":
+            return None
+        if kind == "auto":
+            if rows < self.config.vector_index_min_rows:
+                return None
+            kind = "hnsw" if rows <= self.config.vector_index_hnsw_max_rows else "ivfflat"
+        if kind not in ("hnsw", "ivfflat"):
+            raise ValueError(f"Unsupported vector index type: {kind}")
+        if kind == "hnsw" and version < (0, 5, 0):
+            self.logger.warning("pgvector %s 不支持 HNSW，改用 IVFFlat。", ".".join(map(str, version)))
+            kind = "ivfflat"
+
+        storage = "vector"
+        if dim > VECTOR_INDEX_MAX_DIM:
+            if dim <= HALFVEC_INDEX_MAX_DIM and version >= (0, 7, 0):
+                storage = "halfvec"
+            else:
+                self.logger.warning(
+                    "向量维度 %s 超出 pgvector %s 的索引上限，保持精确扫描（可降低 EMBEDDING_DIMENSION）。",
+                    dim,
+                    ".".join(map(str, version)),
+                )
+                return None
+
+        metric = self.config.vector_index_metric if self.config.vector_index_metric in _OPERATORS else "cosine"
+        if kind == "hnsw":
+            params = {"m": self.config.hnsw_m, "ef_construction": self.config.hnsw_ef_construction}
+        else:
+            params = {"lists": self._ivfflat_lists(rows)}
+        return IndexPlan(kind=kind, metric=metric, dim=dim, storage=storage, params=params, rows=rows)
+
+    def _ivfflat_lists(self, rows: int) -> int:
+        # pgvector 推荐：100 万行以内 rows / 1000，以上 sqrt(rows)
+        if self.config.ivfflat_lists > 0:
+            return self.config.ivfflat_lists
+        if rows <= 1_000_000:
+            return max(rows // 1000, 1)
+        return max(int(math.sqrt(rows)), 1)
+
+    def needs_rebuild(self, current: Optional[IndexPlan], plan: IndexPlan) -> Optional[str]:
+        if current is None:
+            return "missing"
+        if plan.kind != "ivfflat" or self.config.ivfflat_lists > 0:
+            return "definition changed" if current.signature() != plan.signature() else None
+        # 自动 lists 随行数变化：只在其它定义变化或行数大幅增长时重建
+        # （IVFFlat 的聚类中心在建索引时确定，数据量大幅增长后召回率下降）
+        if current.signature()[:4] != plan.signature()[:4]:
+            return "definition changed"
+        if plan.rows >= max(current.rows, 1) * self.config.vector_index_rebuild_growth:
+            return "row count grew"
+        return None
+
+    def search_settings(
+        self,
+        plan: Optional[IndexPlan],
+        version: Tuple[int, ...],
+        top_k: int,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+        filtered: bool = False,
+    ) -> Dict[str, str]:
+        """Session GUCs for one query against `plan` (empty for exact scans)."""
+        if plan is None:
+            return {}
+        settings: Dict[str, str] = {}
+        if plan.kind == "hnsw":
+            # HNSW 单次扫描最多返回 ef_search 条，保证不少于 top_k
+            settings["hnsw.ef_search"] = str(max(ef_search or self.config.hnsw_ef_search, top_k))
+            if filtered and version >= (0, 8, 0):
+                settings["hnsw.iterative_scan"] = "strict_order"
+        else:
+            lists = int(plan.params.get("lists") or 1)
+            default_probes = self.config.ivfflat_probes or max(int(round(math.sqrt(lists))), 1)
+            settings["ivfflat.probes"] = str(min(probes or default_probes, lists))
+        return settings
+
+    # ---------------------------------------------------------------- inspection
+    def describe(self, cur) -> Tuple[Optional[IndexPlan], Tuple[int, ...]]:
+        """Return the valid managed index (if any) and the pgvector version."""
+        cur.execute(
+            """
+            SELECT
+              (SELECT extversion FROM pg_extension WHERE extname = 'vector'),
+              i.indisvalid,
+              obj_description(i.indexrelid, 'pg_class')
+            FROM (SELECT 1) AS one
+            LEFT JOIN pg_index i ON i.indexrelid = to_regclass(%s)
+            """,
+            (self.index_name,),
+        )
+        version_text, is_valid, comment = cur.fetchone()
+        plan = IndexPlan.from_comment(comment) if is_valid else None
+        return plan, parse_version(version_text)
+
+    def _table_stats(self, cur) -> Tuple[int, Optional[int]]:
+        cur.execute("SELECT to_regclass(%s);", (self.table,))
+        if cur.fetchone()[0] is None:
+            return 0, None
+        cur.execute(
+            """
+            SELECT atttypmod
+            FROM pg_attribute
+            WHERE attrelid = to_regclass(%s) AND attname = 'embedding' AND NOT attisdropped;
+            """,
+            (self.table,),
+        )
+        row = cur.fetchone()
+        if row is None or int(row[0]) <= 0:
+            return 0, None
+        cur.execute(f"SELECT COUNT(*) FROM {self.table} WHERE embedding IS NOT NULL;")
+        return int(cur.fetchone()[0]), int(row[0])
+
+    def _ann_indexes(self, cur) -> List[str]:
+        """All HNSW/IVFFlat indexes on the table, including unmanaged legacy ones."""
+        cur.execute(
+            """
+            SELECT indexname
+            FROM pg_indexes
+            WHERE schemaname = current_schema()
+              AND tablename = %s
+              AND indexdef ~* 'USING (hnsw|ivfflat)';
+            """,
+            (self.table,),
+        )
+        return [row[0] for row in cur.fetchall()]
+
+    # ----------------------------------------------------------------- lifecycle
+    def ensure_index(self, force: bool = False, kind: Optional[str] = None) -> Dict[str, object]:
+        """Create, rebuild or drop the managed index so it matches the current table size."""
+        conn = psycopg2.connect(**self.config.db_config)
+        conn.autocommit = True  # CREATE INDEX CONCURRENTLY 不能在事务块中执行
+        try:
+            with conn.cursor() as cur:
+                rows, dim = self._table_stats(cur)
+                if dim is None:
+                    return {"action": "skipped", "reason": f"{self.table}.embedding not found"}
+                current, version = self.describe(cur)
+                plan = self.plan(rows, dim, version, kind)
+
+                if plan is None:
+                    # 精确扫描：移除残留的 ANN 索引（例如 init.sql 在空表上建的 IVFFlat，召回率很差）
+                    obsolete = self._ann_indexes(cur)
+                    if obsolete:
+                        self._swap(conn, cur, None)
+                        self.logger.info("已删除向量索引 %s，改用精确扫描", ", ".join(obsolete))
+                        return {"action": "dropped", "indexes": obsolete, "rows": rows}
+                    return {"action": "skipped", "reason": "exact scan", "rows": rows}
+
+                reason = "forced" if force else self.needs_rebuild(current, plan)
+                if reason is None:
+                    return {"action": "unchanged", "index": asdict(current), "rows": rows}
+
+                started = time.perf_counter()
+                self._build(conn, cur, plan)
+                build_ms = (time.perf_counter() - started) * 1000
+                self.logger.info(
+                    "✓ 向量索引 %s 已重建（%s, 原因: %s, 行数: %s, 耗时: %.0fms）",
+                    self.index_name,
+                    plan.kind,
+                    reason,
+                    rows,
+                    build_ms,
+                )
+                return {"action": "rebuilt", "reason": reason, "index": asdict(plan), "build_ms": round(build_ms, 1)}
+        finally:
+            conn.close()
+
+    def _build(self, conn, cur, plan: IndexPlan) -> None:
+        staging = f"{self.index_name}_new"
+        # 清理上次中断的并发构建留下的无效索引
+        cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {staging};")
+        if self.config.vector_index_maintenance_work_mem:
+            cur.execute(
+                "SELECT set_config('maintenance_work_mem', %s, false);",
+                (self.config.vector_index_maintenance_work_mem,),
+            )
+        cur.execute(plan.create_sql(self.table, staging, concurrently=True))
+        cur.execute(f"COMMENT ON INDEX {staging} IS %s;", (plan.to_comment(),))
+        self._swap(conn, cur, staging)
+
+    def _swap(self, conn, cur, staging: Optional[str]) -> None:
+        """Atomically replace every ANN index on the table with `staging` (or none)."""
+        obsolete = [name for name in self._ann_indexes(cur) if name != staging]
+        conn.autocommit = False
+        try:
+            for name in obsolete:
+                cur.execute(f'DROP INDEX IF EXISTS "{name}";')
+            if staging is not None:
+                cur.execute(f"ALTER INDEX {staging} RENAME TO {self.index_name};")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.autocommit = True
+
+
+def apply_search_settings(conn, settings: Dict[str, str], logger: Optional[logging.Logger] = None) -> None:
+    """
+    Set GUCs for the current transaction only, so pooled connections do not
+    carry them into the next request; unsupported settings (older pgvector)
+    are skipped without aborting the transaction.
+    """
+    with conn.cursor() as cur:
+        for name, value in settings.items():
+            try:
+                cur.execute(
+                    "SAVEPOINT kb_search_setting; "
+                    "SELECT set_config(%s, %s, true); "
+                    "RELEASE SAVEPOINT kb_search_setting;",
+                    (name, value),
+                )
+            except psycopg2.Error as exc:
+                cur.execute("ROLLBACK TO SAVEPOINT kb_search_setting; RELEASE SAVEPOINT kb_search_setting;")
+                (logger or logging.getLogger(__name__)).debug("跳过不支持的检索参数 %s=%s: %s", name, value, exc)
@@ -2,14 +2,32 @@ from __future__ import annotations
 
 import json
 import logging
+import time
 from typing import Iterable, List, Optional
 
-import psycopg2
-from pgvector.psycopg2 import register_vector
+import numpy as np
 
 from kb_service.clients.embedding import EmbeddingClient
 from kb_service.core.config import Config
-from kb_service.services.utils import compute_content_hash
+from kb_service.db.bulk import BulkUpserter
+from kb_service.db.pool import get_pool
+from kb_service.services.change_detection import ChangeDetector, item_fingerprint
+from kb_service.services.vector_index import VectorIndexManager
+
+EMBED_BATCH_SIZE = 32
+
+DOCUMENT_COLUMNS = (
+    "source_table",
+    "source_id",
+    "content",
+    "embedding",
+    "company_name",
+    "report_year",
+    "credit_no",
+    "origin_status",
+    "metadata",
+    "content_hash",
+)
 
 
 class VectorStoreWriter:
@@ -19,6 +37,14 @@ class VectorStoreWriter:
         self.config = config
         self.embedding_client = embedding_client or EmbeddingClient(config)
         self.logger = logging.getLogger(__name__)
+        self.pool = get_pool(config)
+        self.bulk = BulkUpserter(
+            "searchable_documents",
+            DOCUMENT_COLUMNS,
+            ("source_table", "source_id"),
+            touch={"created_at": "CURRENT_TIMESTAMP"},
+            copy_threshold=config.bulk_copy_min_rows,
+        )
 
     def upsert(
         self,
@@ -35,83 +61,93 @@ class VectorStoreWriter:
 
         # 增量模式：过滤出需要处理的数据
         if incremental:
-            items = self._filter_changed_items(items, log)
+            items = self.filter_changed_items(items, log)
             if not items:
                 log.info("增量模式：所有数据均未变化，跳过处理。")
                 return 0
             log.info("增量模式：检测到 %s 条数据需要更新", len(items))
 
+        vector_dim = self.prepare(log)
+
+        # 嵌入按 API 批次计算，写库按 DB_WRITE_BATCH_SIZE 累积后一次性批量 upsert
+        write_batch_size = max(EMBED_BATCH_SIZE, self.config.db_write_batch_size)
+        pending: List[tuple] = []
+        total = 0
+        for start in range(0, len(items), EMBED_BATCH_SIZE):
+            pending.extend(self.build_rows(items[start:start + EMBED_BATCH_SIZE], vector_dim, offset=start))
+            if len(pending) >= write_batch_size:
+                total += self.write_rows(pending, log)
+                pending = []
+
+        if pending:
+            total += self.write_rows(pending, log)
+
+        log.info("✓ 嵌入并入库完成，共处理 %s 条", total)
+
+        if total and self.config.vector_index_auto_rebuild:
+            self.maintain_index(log)
+        return total
+
+    def prepare(self, log: logging.Logger) -> int:
+        """Ensure the extension and table exist; returns the embedding dimension."""
         vector_dim = int(getattr(self.embedding_client, "dimension", 0) or 0)
         if vector_dim <= 0:
             probe_vec = self.embedding_client.embed_texts(["__probe__"])[0]
             vector_dim = len(probe_vec)
             self.embedding_client.dimension = vector_dim
 
-        conn = psycopg2.connect(**self.config.db_config)
-        cur = conn.cursor()
-        cur.execute("CREATE EXTENSION IF NOT EXISTS vector;")
-        conn.commit()
-        register_vector(conn)
+        with self.pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("CREATE EXTENSION IF NOT EXISTS vector;")
+            conn.commit()
+            self.pool.ensure_vector(conn)
+            self._ensure_table(conn, vector_dim, log)
+        return vector_dim
+
+    def build_rows(self, items: List[dict], vector_dim: int, offset: int = 0) -> List[tuple]:
+        """Embed one API batch of items and return rows in DOCUMENT_COLUMNS order."""
+        texts = [item.get("rewritten_content") or "" for item in items]
+        embeddings = self.embedding_client.embed_texts(texts) if texts else []
+
+        for idx, embedding in enumerate(embeddings):
+            if len(embedding) != vector_dim:
+                raise ValueError(
+                    f"第 {offset + idx + 1} 条嵌入维度为 {len(embedding)}，与模型维度 {vector_dim} 不一致。"
+                )
 
-        self._ensure_table(conn, vector_dim, log)
+        return [
+            (
+                item.get("source_table"),
+                item.get("source_id"),
+                item.get("rewritten_content") or "",
+                self._to_vector(embedding),
+                self._maybe_text(item.get("company_name")),
+                self._maybe_text(item.get("report_year")),
+                self._maybe_text(item.get("credit_no")),
+                self._maybe_text(item.get("origin_status")),
+                self._serialize_metadata(item.get("original_data")),
+                # 内容哈希（增量检测时已计算并缓存在 item 上）
+                item_fingerprint(item),
+            )
+            for item, embedding in zip(items, embeddings)
+        ]
 
-        batch_size = 32
-        total = 0
-        for start in range(0, len(items), batch_size):
-            batch = items[start:start + batch_size]
-            texts = [item.get("rewritten_content") or "" for item in batch]
-            embeddings = self.embedding_client.embed_texts(texts)
-
-            for idx, embedding in enumerate(embeddings):
-                if len(embedding) != vector_dim:
-                    raise ValueError(
-                        f"第 {start + idx + 1} 条嵌入维度为 {len(embedding)}，与模型维度 {vector_dim} 不一致。"
-                    )
-
-            for item, embedding in zip(batch, embeddings):
-                emb_list = self._to_float_list(embedding)
-                meta = self._serialize_metadata(item.get("original_data"))
-
-                # 计算内容哈希
-                content_hash = compute_content_hash(item.get("original_data") or {})
-
-                cur.execute(
-                    """
-                    INSERT INTO searchable_documents
-                      (source_table, source_id, content, embedding,
-                       company_name, report_year, credit_no, origin_status, metadata, content_hash)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (source_table, source_id)
-                      DO UPDATE SET
-                        content       = EXCLUDED.content,
-                        embedding     = EXCLUDED.embedding,
-                        company_name  = EXCLUDED.company_name,
-                        report_year   = EXCLUDED.report_year,
-                        credit_no     = EXCLUDED.credit_no,
-                        origin_status = EXCLUDED.origin_status,
-                        metadata      = EXCLUDED.metadata,
-                        content_hash  = EXCLUDED.content_hash,
-                        created_at    = CURRENT_TIMESTAMP;
-                    """,
-                    (
-                        item.get("source_table"),
-                        item.get("source_id"),
-                        item.get("rewritten_content") or "",
-                        emb_list,
-                        self._maybe_text(item.get("company_name")),
-                        self._maybe_text(item.get("report_year")),
-                        self._maybe_text(item.get("credit_no")),
-                        self._maybe_text(item.get("origin_status")),
-                        meta,
-                        content_hash,
-                    ),
-                )
+    def write_rows(self, rows: List[tuple], log: logging.Logger) -> int:
+        """嵌入计算期间不占用连接，仅在写入本批时借出。"""
+        started = time.perf_counter()
+        with self.pool.connection() as conn:
+            written = self.bulk.upsert(conn, rows)
             conn.commit()
-            total += len(batch)
+        log.info("已写入 %s 条（%.0fms）", written, (time.perf_counter() - started) * 1000)
+        return len(rows)
 
-        conn.close()
-        log.info("✓ 嵌入并入库完成，共处理 %s 条", total)
-        return total
+    def maintain_index(self, log: logging.Logger) -> None:
+        """批量写入后按当前行数创建/并发重建 ANN 索引；失败不影响本次入库。"""
+        try:
+            result = VectorIndexManager(self.config, logger=log).ensure_index()
+            log.info("向量索引维护: %s", result.get("action"))
+        except Exception as exc:  # pragma: no cover - index maintenance is best effort
+            log.warning("向量索引维护失败，检索将暂时使用现有索引/精确扫描: %s", exc)
 
     def _ensure_table(self, conn, vector_dim: int, log: logging.Logger) -> None:
         cur = conn.cursor()
@@ -238,14 +274,14 @@ class VectorStoreWriter:
         text = str(value).strip()
         return text or None
 
-    def _to_float_list(self, embedding) -> List[float]:
-        if hasattr(embedding, "tolist"):
-            embedding = embedding.tolist()
-        if isinstance(embedding, (list, tuple)) and embedding and isinstance(embedding[0], (list, tuple)):
-            embedding = [x for row in embedding for x in row]
-        return [float(x) for x in embedding]
+    def _to_vector(self, embedding) -> np.ndarray:
+        return np.asarray(embedding, dtype=np.float32).ravel()
+
+    def change_detector(self, log: logging.Logger) -> ChangeDetector:
+        """Server-side change detection session; reuse one per sync run to get deleted counts."""
+        return ChangeDetector(self.pool, log, fetch_size=self.config.change_detect_fetch_size)
 
-    def _filter_changed_items(self, items: List[dict], log: logging.Logger) -> List[dict]:
+    def filter_changed_items(self, items: List[dict], log: logging.Logger) -> List[dict]:
         """
         过滤出内容发生变化的数据项
 
@@ -258,62 +294,5 @@ class VectorStoreWriter:
         """
         if not items:
             return []
-
-        # 批量查询现有记录的哈希值
-        conn = psycopg2.connect(**self.config.db_config)
-        cur = conn.cursor()
-
-        try:
-            # 构建查询条件
-            conditions = [(item.get("source_table"), item.get("source_id")) for item in items]
-
-            # 批量查询
-            query = """
-                SELECT source_table, source_id, content_hash
-                FROM searchable_documents
-                WHERE (source_table, source_id) IN %s
-            """
-            cur.execute(query, (tuple(conditions),))
-            existing_hashes = {
-                (row[0], row[1]): row[2] for row in cur.fetchall()
-            }
-
-            log.info("从数据库查询到 %s 条现有记录的哈希", len(existing_hashes))
-
-        finally:
-            conn.close()
-
-        # 过滤变化的数据
-        changed_items = []
-        skipped_count = 0
-
-        for item in items:
-            source_table = item.get("source_table")
-            source_id = item.get("source_id")
-            original_data = item.get("original_data") or {}
-
-            # 计算新数据的哈希
-            new_hash = compute_content_hash(original_data)
-
-            # 查找现有哈希
-            key = (source_table, source_id)
-            existing_hash = existing_hashes.get(key)
-
-            if existing_hash is None:
-                # 新记录
-                changed_items.append(item)
-                log.debug("新记录: %s/%s", source_table, source_id)
-            elif existing_hash != new_hash:
-                # 内容变化
-                changed_items.append(item)
-                log.debug("内容变化: %s/%s (旧哈希: %s, 新哈希: %s)",
-                         source_table, source_id, existing_hash[:8], new_hash[:8])
-            else:
-                # 内容未变化，跳过
-                skipped_count += 1
-                log.debug("跳过未变化: %s/%s", source_table, source_id)
-
-        log.info("增量检测结果: 需更新 %s 条, 跳过 %s 条",
-                len(changed_items), skipped_count)
-
-        return changed_items
+        with self.change_detector(log) as detector:
+            return detector.filter(items)
@@ -12,11 +12,12 @@ import json
 import logging
 from typing import Iterable, List, Optional
 
-import psycopg2
-from pgvector.psycopg2 import register_vector
+import numpy as np
 
 from kb_service.clients.embedding import EmbeddingClient
 from kb_service.core.config import Config
+from kb_service.db.bulk import BulkUpserter
+from kb_service.db.pool import get_pool
 
 
 class VectorStoreWriterGeneric:
@@ -26,6 +27,14 @@ class VectorStoreWriterGeneric:
         self.config = config
         self.embedding_client = embedding_client or EmbeddingClient(config)
         self.logger = logging.getLogger(__name__)
+        self.pool = get_pool(config)
+        self.bulk = BulkUpserter(
+            "searchable_documents",
+            ("source_table", "source_id", "content", "embedding", "metadata"),
+            ("source_table", "source_id"),
+            touch={"created_at": "CURRENT_TIMESTAMP"},
+            copy_threshold=config.bulk_copy_min_rows,
+        )
 
     def upsert(self, items: Iterable[dict], logger: Optional[logging.Logger] = None) -> int:
         """
@@ -56,18 +65,18 @@ class VectorStoreWriterGeneric:
             vector_dim = len(probe_vec)
             self.embedding_client.dimension = vector_dim
 
-        # 连接数据库
-        conn = psycopg2.connect(**self.config.db_config)
-        cur = conn.cursor()
-        cur.execute("CREATE EXTENSION IF NOT EXISTS vector;")
-        conn.commit()
-        register_vector(conn)
-
-        # 确保表存在
-        self._ensure_table(conn, vector_dim, log)
+        # 确保扩展与表存在
+        with self.pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("CREATE EXTENSION IF NOT EXISTS vector;")
+            conn.commit()
+            self.pool.ensure_vector(conn)
+            self._ensure_table(conn, vector_dim, log)
 
-        # 批量处理
+        # 批量处理：嵌入按 API 批次计算，写库累积到 DB_WRITE_BATCH_SIZE 后批量 upsert
         batch_size = 32
+        write_batch_size = max(batch_size, self.config.db_write_batch_size)
+        pending: List[tuple] = []
         total = 0
         for start in range(0, len(items), batch_size):
             batch = items[start:start + batch_size]
@@ -81,40 +90,35 @@ class VectorStoreWriterGeneric:
                         f"第 {start + idx + 1} 条嵌入维度为 {len(embedding)}，与模型维度 {vector_dim} 不一致。"
                     )
 
-            # 插入数据
             for item, embedding in zip(batch, embeddings):
-                emb_list = self._to_float_list(embedding)
-
-                # 将所有原始数据序列化为 JSON
-                meta = self._serialize_metadata(item.get("original_data"))
-
-                cur.execute(
-                    """
-                    INSERT INTO searchable_documents
-                      (source_table, source_id, content, embedding, metadata)
-                    VALUES (%s, %s, %s, %s, %s)
-                    ON CONFLICT (source_table, source_id)
-                      DO UPDATE SET
-                        content    = EXCLUDED.content,
-                        embedding  = EXCLUDED.embedding,
-                        metadata   = EXCLUDED.metadata,
-                        created_at = CURRENT_TIMESTAMP;
-                    """,
+                pending.append(
                     (
                         item.get("source_table"),
                         item.get("source_id"),
                         item.get("rewritten_content") or "",
-                        emb_list,
-                        meta,  # JSONB
-                    ),
+                        self._to_vector(embedding),
+                        # 将所有原始数据序列化为 JSON
+                        self._serialize_metadata(item.get("original_data")),
+                    )
                 )
-            conn.commit()
-            total += len(batch)
 
-        conn.close()
+            if len(pending) >= write_batch_size:
+                total += self._write_rows(pending)
+                pending = []
+
+        if pending:
+            total += self._write_rows(pending)
+
         log.info("✓ 嵌入并入库完成，共处理 %s 条", total)
         return total
 
+    def _write_rows(self, rows: List[tuple]) -> int:
+        """插入数据（嵌入计算期间不占用连接）"""
+        with self.pool.connection() as conn:
+            self.bulk.upsert(conn, rows)
+            conn.commit()
+        return len(rows)
+
     def _ensure_table(self, conn, vector_dim: int, log: logging.Logger) -> None:
         """
         确保表存在，如果不存在则创建
@@ -255,19 +259,14 @@ class VectorStoreWriterGeneric:
             return raw_meta
         return json.dumps(raw_meta, ensure_ascii=False, default=str)
 
-    def _to_float_list(self, embedding) -> List[float]:
+    def _to_vector(self, embedding) -> np.ndarray:
         """
-        将 embedding 转换为 float 列表
+        将 embedding 转换为一维 float32 数组（嵌套列表会被展平）
 
         Args:
             embedding: numpy array、list 或 tuple
 
         Returns:
-            float 列表
+            float32 数组，写库时以 pgvector 二进制格式发送
         """
-        if hasattr(embedding, "tolist"):
-            embedding = embedding.tolist()
-        if isinstance(embedding, (list, tuple)) and embedding and isinstance(embedding[0], (list, tuple)):
-            # 展平嵌套列表
-            embedding = [x for row in embedding for x in row]
-        return [float(x) for x in embedding]
+        return np.asarray(embedding, dtype=np.float32).ravel()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+语义缓存写入 / 淘汰基准测试
+
+对比旧版写入路径（三个独立键 + 每次写入 SCAN 全部 meta 键排序淘汰）与新版
+RedisSemanticCache（单个哈希 + 访问时间有序集合，MULTI 管道写入，ZPOPMIN 淘汰）
+在缓存已满时的单次写入延迟与 Redis 往返次数。默认使用内存版 FakeRedis；
+传入 --redis-url 可在真实 Redis 上运行（会清空所用前缀下的键）。
+注意 FakeRedis 的 ZPOPMIN 为线性实现，延迟会随规模增长；真实 Redis 为 O(log N)，
+往返次数才是与规模无关的指标。
+
+运行方式:
+    python scripts/bench_cache_eviction.py --entries 10000 100000
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from loguru import logger
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+sys.path.insert(0, str(project_root / "tests"))
+
+from conftest import FakeRedis  # noqa: E402
+from gustobot.application.services.redis_cache import (  # noqa: E402
+    RedisSemanticCache,
+    _decode,
+    _now_timestamp,
+    _pack_vector,
+)
+
+VECTOR = [0.1] * 64
+
+
+async def _embed(text: str):
+    return VECTOR
+
+
+async def legacy_update(redis, namespace: str, digest: str, max_size: int, ttl: int) -> None:
+    """旧版 update()：写入 vec/resp/meta 三个键后扫描全部 meta 键做 LRU 淘汰。"""
+    now = _now_timestamp()
+    await redis.set(f"{namespace}:vec:{digest}", json.dumps(VECTOR), ex=ttl)
+    await redis.set(f"{namespace}:resp:{digest}", "answer", ex=ttl)
+    meta = {"created_at": now, "last_access": now, "access_count": 1}
+    await redis.set(f"{namespace}:meta:{digest}", json.dumps(meta), ex=ttl)
+
+    entries = []
+    async for raw_key in redis.scan_iter(match=f"{namespace}:meta:*"):
+        payload = await redis.get(raw_key)
+        if payload:
+            entries.append((json.loads(_decode(payload)).get("last_access", 0), _decode(raw_key)))
+    if len(entries) <= max_size:
+        return
+    entries.sort()
+    for _, key in entries[: len(entries) - max_size]:
+        hash_id = key.split(":")[-1]
+        await redis.delete(
+            f"{namespace}:vec:{hash_id}",
+            f"{namespace}:resp:{hash_id}",
+            f"{namespace}:meta:{hash_id}",
+        )
+
+
+async def _prefill_legacy(redis, namespace: str, entries: int, batch: int = 1000) -> None:
+    for start in range(0, entries, batch):
+        async with redis.pipeline(transaction=False) as pipe:
+            for idx in range(start, min(start + batch, entries)):
+                digest = RedisSemanticCache._message_hash(f"seed-{idx}")
+                pipe.set(f"{namespace}:vec:{digest}", json.dumps(VECTOR))
+                pipe.set(f"{namespace}:resp:{digest}", "answer")
+                pipe.set(f"{namespace}:meta:{digest}", json.dumps({"last_access": idx, "access_count": 1}))
+            await pipe.execute()
+
+
+async def _prefill_new(redis, namespace: str, entries: int, batch: int = 1000) -> None:
+    for start in range(0, entries, batch):
+        async with redis.pipeline(transaction=False) as pipe:
+            for idx in range(start, min(start + batch, entries)):
+                digest = RedisSemanticCache._message_hash(f"seed-{idx}")
+                pipe.hset(
+                    f"{namespace}:entry:{digest}",
+                    mapping={"vec": _pack_vector(VECTOR), "resp": "answer", "last_access": idx},
+                )
+                pipe.zadd(f"{namespace}:access", {digest: idx})
+            await pipe.execute()
+
+
+async def _clear(redis, prefix: str) -> None:
+    keys = [key async for key in redis.scan_iter(match=f"{prefix}:*")]
+    for start in range(0, len(keys), 1000):
+        await redis.delete(*keys[start:start + 1000])
+
+
+def _report(name: str, entries: int, latencies, trips) -> None:
+    print(
+        f"[{name}] entries={entries} writes={len(latencies)} "
+        f"p50={statistics.median(latencies):.3f}ms max={max(latencies):.3f}ms "
+        f"round_trips/write={statistics.mean(trips):.0f}"
+    )
+
+
+async def bench(entries: int, writes: int, legacy_writes: int, redis_url: str = "") -> None:
+    if redis_url:
+        from redis.asyncio import Redis
+
+        redis = Redis.from_url(redis_url, decode_responses=False)
+    else:
+        redis = FakeRedis()
+
+    # 旧版路径：缓存已满，每次写入都会扫描 + 淘汰一条
+    namespace = "bench-legacy"
+    await _prefill_legacy(redis, namespace, entries)
+    latencies, trips = [], []
+    for idx in range(legacy_writes):
+        before = getattr(redis, "round_trips", 0)
+        t0 = time.perf_counter()
+        await legacy_update(redis, namespace, RedisSemanticCache._message_hash(f"new-{idx}"), entries, 600)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        trips.append(getattr(redis, "round_trips", 0) - before)
+    _report("legacy", entries, latencies, trips)
+    await _clear(redis, namespace)
+
+    # 新版路径：单哈希 + 有序集合
+    namespace = "bench-zset"
+    await _prefill_new(redis, namespace, entries)
+    cache = RedisSemanticCache(redis_client=redis, prefix=namespace, max_cache_size=entries, ttl=600)
+    cache._get_embedding = _embed  # type: ignore[assignment]
+    latencies, trips = [], []
+    for idx in range(writes):
+        before = getattr(redis, "round_trips", 0)
+        t0 = time.perf_counter()
+        await cache.update([{"role": "user", "content": f"new-{idx}"}], "answer")
+        latencies.append((time.perf_counter() - t0) * 1000)
+        trips.append(getattr(redis, "round_trips", 0) - before)
+    _report("sorted-set", entries, latencies, trips)
+    await _clear(redis, namespace)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--writes", type=int, default=500, help="新版路径的写入次数")
+    parser.add_argument("--legacy-writes", type=int, default=5, help="旧版路径的写入次数（每次 O(N)）")
+    parser.add_argument("--redis-url", default="", help="使用真实 Redis 而非 FakeRedis")
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    for entries in args.entries:
+        asyncio.run(bench(entries, args.writes, args.legacy_writes, args.redis_url))
+
+
+if __name__ == "__main__":
+    main()
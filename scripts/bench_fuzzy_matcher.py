@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+菜谱实体模糊匹配基准测试
+
+在随包分发的 recipe_kg 词典（约 1.2 万菜名 + 0.8 万食材）上，对比逐实体全量打分
+（旧实现）与字符倒排索引 + 上界剪枝（新实现）的延迟，并校验两者结果一致。
+p99 超过 --target-p99-ms 时以非零状态码退出，便于接入 CI。
+
+运行方式:
+    python scripts/bench_fuzzy_matcher.py --queries 300 --target-p99-ms 25
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+from gustobot.infrastructure.knowledge.recipe_kg.question_intent_classifier import (  # noqa: E402
+    build_classifier_artifact,
+)
+
+_PREFIXES = ["", "请问", "我想做", "家常的"]
+_SUFFIXES = ["怎么做", "的主料有哪些", "要多久", "是什么口味", "需要多少盐", ""]
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(pct * len(ordered)))]
+
+
+def _questions(entities, count, seed):
+    """由词典实体构造问题：原词、截断、乱序（模拟错别字/口语化表述）。"""
+    rng = random.Random(seed)
+    questions = []
+    for _ in range(count):
+        entity = rng.choice(entities)
+        variant = rng.choice(
+            [entity, entity[:-1] or entity, entity[1:] or entity, "".join(rng.sample(entity, len(entity)))]
+        )
+        questions.append(rng.choice(_PREFIXES) + variant + rng.choice(_SUFFIXES))
+    return questions
+
+
+def _measure(fn, questions):
+    latencies = []
+    results = []
+    for question in questions:
+        started = time.perf_counter()
+        results.append(fn(question))
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies, results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark recipe_kg fuzzy entity matching")
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--threshold", type=float, default=0.5, help="QuestionClassifier 使用 0.5")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--target-p99-ms", type=float, default=25.0)
+    parser.add_argument("--linear-sample", type=int, default=50, help="全量打分较慢，只对前 N 个问题对比")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    matcher = build_classifier_artifact().fuzzy_matcher
+    questions = _questions(matcher._entities, args.queries, args.seed)
+
+    indexed_ms, indexed_results = _measure(
+        lambda q: matcher.match(q, threshold=args.threshold, top_k=args.top_k), questions
+    )
+    sample = questions[: args.linear_sample]
+    linear_ms, linear_results = _measure(
+        lambda q: matcher._linear_match(q, args.threshold, args.top_k), sample
+    )
+    mismatches = sum(
+        1 for expected, actual in zip(linear_results, indexed_results) if list(expected.items()) != list(actual.items())
+    )
+
+    print(f"entities={len(matcher._entities)} queries={len(questions)} threshold={args.threshold}")
+    for name, samples in (("linear", linear_ms), ("indexed", indexed_ms)):
+        print(
+            f"[{name}] n={len(samples)} p50={statistics.median(samples):.2f}ms "
+            f"p99={_percentile(samples, 0.99):.2f}ms max={max(samples):.2f}ms"
+        )
+    print(f"result mismatches vs linear: {mismatches}/{len(sample)}")
+
+    p99 = _percentile(indexed_ms, 0.99)
+    if mismatches or p99 > args.target_p99_ms:
+        print(f"FAIL: p99 {p99:.2f}ms (target {args.target_p99_ms}ms), mismatches={mismatches}")
+        return 1
+    print(f"OK: p99 {p99:.2f}ms <= {args.target_p99_ms}ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+kb_ingest 批量写库基准测试（searchable_documents 同构临时表）
+
+对比三种写入方式在首次插入与重复 upsert（全部命中 ON CONFLICT）下的吞吐：
+  - legacy   : 原实现，逐行 INSERT ... ON CONFLICT，向量以 Python float 列表发送，每 32 行提交
+  - values   : BulkUpserter 的 execute_values 路径
+  - copy     : BulkUpserter 的二进制 COPY → 临时表 → 集合式 INSERT ... SELECT ... ON CONFLICT 路径
+连接参数读取 PGHOST/PGPORT/PGUSER/PGPASSWORD/PGDATABASE。
+
+运行方式:
+    python scripts/bench_kb_bulk_upsert.py --rows 20000 --dim 1024 --write-batch 2000
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import psycopg2
+from pgvector.psycopg2 import register_vector
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root / "kb_ingest"))
+
+from kb_service.core.config import load_config  # noqa: E402
+from kb_service.db.bulk import BulkUpserter  # noqa: E402
+from kb_service.services.vector_store import DOCUMENT_COLUMNS  # noqa: E402
+
+TABLE = "bench_searchable_documents"
+
+
+def _create_table(conn, dim):
+    with conn.cursor() as cur:
+        cur.execute("CREATE EXTENSION IF NOT EXISTS vector;")
+        cur.execute(f"DROP TABLE IF EXISTS {TABLE};")
+        cur.execute(
+            f"""
+            CREATE TABLE {TABLE} (
+                id BIGSERIAL PRIMARY KEY,
+                source_table TEXT, source_id TEXT, content TEXT,
+                embedding vector({dim}),
+                company_name TEXT, report_year TEXT, credit_no TEXT, origin_status TEXT,
+                metadata TEXT, content_hash TEXT DEFAULT '',
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE (source_table, source_id)
+            );
+            """
+        )
+    conn.commit()
+
+
+def _rows(rng, count, dim):
+    vectors = rng.normal(size=(count, dim)).astype(np.float32)
+    return [
+        (
+            "bench",
+            str(i),
+            f"第 {i} 条测试记录，" + "内容" * 80,
+            vectors[i],
+            f"公司{i % 500}",
+            "2024",
+            f"91{i:016d}",
+            "存续",
+            json.dumps({"id": i, "name": f"公司{i % 500}"}, ensure_ascii=False),
+            f"{i:064x}",
+        )
+        for i in range(count)
+    ]
+
+
+def _legacy(conn, rows):
+    sql = f"""
+        INSERT INTO {TABLE} ({', '.join(DOCUMENT_COLUMNS)})
+        VALUES ({', '.join(['%s'] * len(DOCUMENT_COLUMNS))})
+        ON CONFLICT (source_table, source_id) DO UPDATE SET
+          content = EXCLUDED.content, embedding = EXCLUDED.embedding,
+          company_name = EXCLUDED.company_name, report_year = EXCLUDED.report_year,
+          credit_no = EXCLUDED.credit_no, origin_status = EXCLUDED.origin_status,
+          metadata = EXCLUDED.metadata, content_hash = EXCLUDED.content_hash,
+          created_at = CURRENT_TIMESTAMP;
+    """
+    with conn.cursor() as cur:
+        for start in range(0, len(rows), 32):
+            for row in rows[start:start + 32]:
+                cur.execute(sql, row[:3] + ([float(x) for x in row[3]],) + row[4:])
+            conn.commit()
+
+
+def _bulk(conn, rows, write_batch, copy_threshold):
+    upserter = BulkUpserter(
+        TABLE,
+        DOCUMENT_COLUMNS,
+        ("source_table", "source_id"),
+        touch={"created_at": "CURRENT_TIMESTAMP"},
+        copy_threshold=copy_threshold,
+    )
+    for start in range(0, len(rows), write_batch):
+        upserter.upsert(conn, rows[start:start + write_batch])
+        conn.commit()
+
+
+def _timed(fn):
+    started = time.perf_counter()
+    fn()
+    return time.perf_counter() - started
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark searchable_documents upsert paths")
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--write-batch", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    config = load_config()
+    rows = _rows(np.random.default_rng(args.seed), args.rows, args.dim)
+    modes = {
+        "legacy": lambda conn: _legacy(conn, rows),
+        "values": lambda conn: _bulk(conn, rows, args.write_batch, copy_threshold=args.write_batch + 1),
+        "copy": lambda conn: _bulk(conn, rows, args.write_batch, copy_threshold=1),
+    }
+
+    conn = psycopg2.connect(**config.db_config)
+    report = {"rows": args.rows, "dim": args.dim, "write_batch": args.write_batch}
+    try:
+        for name, run in modes.items():
+            _create_table(conn, args.dim)
+            register_vector(conn)
+            insert_s = _timed(lambda: run(conn))
+            update_s = _timed(lambda: run(conn))
+            report[name] = {
+                "insert_s": round(insert_s, 2),
+                "insert_rows_per_s": round(args.rows / insert_s),
+                "upsert_s": round(update_s, 2),
+                "upsert_rows_per_s": round(args.rows / update_s),
+            }
+        for name in ("values", "copy"):
+            report[name]["insert_speedup"] = round(report["legacy"]["insert_s"] / report[name]["insert_s"], 1)
+            report[name]["upsert_speedup"] = round(report["legacy"]["upsert_s"] / report[name]["upsert_s"], 1)
+    finally:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP TABLE IF EXISTS {TABLE};")
+        conn.commit()
+        conn.close()
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+kb_ingest 行扁平化基准测试（历史菜谱源头.xlsx 按倍数放大）
+
+对比两种方式把工作表转成嵌入文本：
+  - legacy : 原实现，DataFrame.iterrows() + 逐行 flatten_row（每行每列做正则与空值判断）
+  - frame  : iter_records 取行 + flatten_frame（列名按 schema 规范化一次，清洗按列向量化）
+并逐行校验 frame 输出与对同一行值调用 flatten_row 的结果完全一致。
+
+运行方式:
+    python scripts/bench_kb_flatten.py --scale 5000 --repeat 3
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root / "kb_ingest"))
+
+from kb_service.core.config import load_config  # noqa: E402
+from kb_service.services.utils import flatten_frame, flatten_row, iter_records  # noqa: E402
+
+DEFAULT_EXCEL = project_root / "data" / "kb" / "历史菜谱源头.xlsx"
+
+
+def _legacy(df, config):
+    return [flatten_row(row.to_dict(), config) for _, row in df.iterrows()]
+
+
+def _frame(df, config):
+    records = [row for _, row in iter_records(df)]  # 入库流程仍需要原始行字典
+    return records, flatten_frame(df, config)
+
+
+def _best(fn, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark row flattening for kb_ingest")
+    parser.add_argument("--excel", default=str(DEFAULT_EXCEL))
+    parser.add_argument("--scale", type=int, default=5000, help="Repeat each sheet N times")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    config = load_config()
+    xls = pd.ExcelFile(args.excel)
+    report = {"excel": args.excel, "scale": args.scale, "sheets": {}}
+    total_legacy = total_frame = 0.0
+    total_rows = 0
+
+    for sheet in xls.sheet_names:
+        base = pd.read_excel(xls, sheet_name=sheet)
+        df = pd.concat([base] * args.scale, ignore_index=True)
+        legacy_s, _ = _best(lambda: _legacy(df, config), args.repeat)
+        frame_s, (records, texts) = _best(lambda: _frame(df, config), args.repeat)
+
+        mismatches = sum(1 for row, text in zip(records, texts) if flatten_row(row, config) != text)
+        report["sheets"][sheet] = {
+            "rows": len(df),
+            "columns": len(df.columns),
+            "legacy_s": round(legacy_s, 3),
+            "frame_s": round(frame_s, 3),
+            "speedup": round(legacy_s / frame_s, 1) if frame_s else None,
+            "mismatches": mismatches,
+        }
+        total_legacy += legacy_s
+        total_frame += frame_s
+        total_rows += len(df)
+
+    report["total"] = {
+        "rows": total_rows,
+        "legacy_rows_per_s": round(total_rows / total_legacy) if total_legacy else None,
+        "frame_rows_per_s": round(total_rows / total_frame) if total_frame else None,
+        "speedup": round(total_legacy / total_frame, 1) if total_frame else None,
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 1 if any(sheet["mismatches"] for sheet in report["sheets"].values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
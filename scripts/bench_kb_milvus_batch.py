@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Milvus 菜谱批量导入基准测试
+
+对比两种导入方式（使用模拟的嵌入服务与 Milvus，按参数注入网络往返与 flush 延迟，无需外部服务）：
+  - legacy : 原实现，逐条 add_recipe（每个菜谱一次嵌入请求 + 一次 insert + 一次 flush）
+  - batch  : add_recipes_batch（整体切分、按请求上限分组并发嵌入、大 segment 插入、结束时 flush 一次）
+
+运行方式:
+    python scripts/bench_kb_milvus_batch.py --recipes 10000 --embed-rtt 0.05 --flush-latency 0.2
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+from gustobot.config import settings  # noqa: E402
+from gustobot.infrastructure.knowledge.knowledge_service import KnowledgeService  # noqa: E402
+
+
+class FakeEmbedder:
+    """每次请求固定往返延迟，超过单次请求上限的输入按上限拆成多次顺序请求。"""
+
+    def __init__(self, rtt: float, max_batch_size: int, dim: int) -> None:
+        self.rtt = rtt
+        self.max_batch_size = max_batch_size
+        self.dim = dim
+        self.calls = 0
+
+    async def aembed_documents(self, texts):
+        for _ in range(0, len(texts), self.max_batch_size):
+            self.calls += 1
+            await asyncio.sleep(self.rtt)
+        return [[float(len(text) % 7)] * self.dim for text in texts]
+
+
+class FakeMilvus:
+    """insert 每次固定开销 + 按行开销，flush 固定开销（Milvus 中 flush 需封存 segment，代价最高）。"""
+
+    def __init__(self, insert_latency: float, row_latency: float, flush_latency: float) -> None:
+        self.insert_latency = insert_latency
+        self.row_latency = row_latency
+        self.flush_latency = flush_latency
+        self.rows = {}
+        self.inserts = 0
+        self.flushes = 0
+        self.unflushed = 0
+
+    def add_documents(self, ids, embeddings, documents, metadatas=None, flush=True):
+        self.inserts += 1
+        time.sleep(self.insert_latency + self.row_latency * len(ids))
+        for doc_id, document in zip(ids, documents):
+            self.rows[doc_id] = document
+        self.unflushed += len(ids)
+        if flush:
+            self.flush()
+        return True
+
+    def flush(self):
+        if self.unflushed:
+            self.flushes += 1
+            time.sleep(self.flush_latency)
+            self.unflushed = 0
+        return True
+
+    def flush_if_due(self, max_rows=0, max_interval=0.0):
+        if max_rows and self.unflushed >= max_rows:
+            return self.flush()
+        return False
+
+
+def _recipes(count: int):
+    return [
+        {
+            "id": f"bench_{index}",
+            "name": f"测试菜谱{index}",
+            "category": "家常菜",
+            "difficulty": "简单",
+            "ingredients": ["鸡蛋", "番茄", "葱花", "盐"],
+            "steps": [f"第{step}步：处理食材并翻炒均匀，注意火候。" for step in range(1, 6)],
+            "tips": "出锅前调味。",
+        }
+        for index in range(count)
+    ]
+
+
+def _service(args):
+    service = KnowledgeService(vector_store=FakeMilvus(args.insert_latency, args.row_latency, args.flush_latency))
+    service.embedder = FakeEmbedder(args.embed_rtt, args.embed_batch, args.dim)
+    return service
+
+
+async def _legacy(service, recipes):
+    success = 0
+    for recipe in recipes:
+        success += await service.add_recipe(recipe["id"], recipe)
+    return success
+
+
+async def _run(args) -> dict:
+    recipes = _recipes(args.recipes)
+    report = {"recipes": args.recipes}
+
+    legacy = _service(args)
+    started = time.perf_counter()
+    legacy_ok = await _legacy(legacy, recipes[: args.legacy_sample])
+    legacy_s = (time.perf_counter() - started) * args.recipes / args.legacy_sample
+    report["legacy"] = {
+        "sampled": args.legacy_sample,
+        "success": legacy_ok,
+        "estimated_s": round(legacy_s, 2),
+        "embed_calls_per_recipe": legacy.embedder.calls / args.legacy_sample,
+        "flushes_per_recipe": legacy.vector_store.flushes / args.legacy_sample,
+    }
+
+    batch = _service(args)
+    started = time.perf_counter()
+    result = await batch.add_recipes_batch(recipes)
+    batch_s = time.perf_counter() - started
+    report["batch"] = {
+        "success": result["success"],
+        "error": result["error"],
+        "rows": len(batch.vector_store.rows),
+        "seconds": round(batch_s, 2),
+        "embed_calls": batch.embedder.calls,
+        "inserts": batch.vector_store.inserts,
+        "flushes": batch.vector_store.flushes,
+    }
+    report["speedup"] = round(legacy_s / batch_s, 1) if batch_s else None
+
+    # 两种方式写入的分块 ID 与内容必须一致
+    expected = _service(args)
+    await _legacy(expected, recipes[: args.legacy_sample])
+    report["id_mismatches"] = sum(
+        1 for doc_id, text in expected.vector_store.rows.items() if batch.vector_store.rows.get(doc_id) != text
+    )
+    return report
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark batched Milvus recipe ingestion")
+    parser.add_argument("--recipes", type=int, default=10000)
+    parser.add_argument("--legacy-sample", type=int, default=200, help="Recipes timed on the legacy path (extrapolated)")
+    parser.add_argument("--embed-rtt", type=float, default=0.05, help="Seconds per embedding request")
+    parser.add_argument("--embed-batch", type=int, default=64, help="Max texts per embedding request")
+    parser.add_argument("--insert-latency", type=float, default=0.005, help="Seconds per Milvus insert call")
+    parser.add_argument("--row-latency", type=float, default=0.00002, help="Seconds per inserted row")
+    parser.add_argument("--flush-latency", type=float, default=0.2, help="Seconds per Milvus flush")
+    parser.add_argument("--dim", type=int, default=8)
+    args = parser.parse_args()
+    args.legacy_sample = max(1, min(args.legacy_sample, args.recipes))
+
+    settings.KB_INGEST_EMBED_BATCH_SIZE = args.embed_batch
+    report = asyncio.run(_run(args))
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 1 if report["batch"]["error"] or report["id_mismatches"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
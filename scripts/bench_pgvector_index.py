@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+pgvector ANN 索引基准测试（kb_ingest / searchable_documents）
+
+在临时表中写入聚类分布的合成向量（默认 1 万 / 10 万 / 100 万行），先用精确扫描
+得到每个查询的真实 top-k 与基线延迟，再分别构建 HNSW、IVFFlat 索引（与
+VectorIndexManager 相同的 DDL 与查询表达式），扫描 ef_search / probes 取值，
+报告 recall@k 与 p50/p99 延迟。连接参数读取 PGHOST/PGPORT/PGUSER/PGPASSWORD/PGDATABASE。
+
+运行方式:
+    python scripts/bench_pgvector_index.py --rows 10000,100000,1000000 --dim 256 --queries 200
+"""
+
+import argparse
+import io
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import psycopg2
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root / "kb_ingest"))
+
+from kb_service.core.config import load_config  # noqa: E402
+from kb_service.services.vector_index import VectorIndexManager, apply_search_settings  # noqa: E402
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(pct * len(ordered)))]
+
+
+def _int_list(text):
+    return [int(part) for part in text.split(",") if part.strip()]
+
+
+def _clustered(rng, centers, count, noise):
+    labels = rng.integers(0, len(centers), size=count)
+    vectors = centers[labels] + rng.normal(scale=noise, size=(count, centers.shape[1]))
+    return vectors.astype(np.float32)
+
+
+def _load_table(conn, table, rows, dim, centers, rng, noise, chunk=50_000):
+    with conn.cursor() as cur:
+        cur.execute(f"DROP TABLE IF EXISTS {table};")
+        cur.execute(f"CREATE TABLE {table} (id BIGSERIAL PRIMARY KEY, embedding vector({dim}));")
+        for start in range(0, rows, chunk):
+            block = _clustered(rng, centers, min(chunk, rows - start), noise)
+            buffer = io.StringIO()
+            for vector in block:
+                buffer.write("[" + ",".join(f"{x:.6f}" for x in vector) + "]\n")
+            buffer.seek(0)
+            cur.copy_expert(f"COPY {table} (embedding) FROM STDIN", buffer)
+        cur.execute(f"ANALYZE {table};")
+    conn.commit()
+
+
+def _run_queries(conn, sql, queries, top_k):
+    latencies, hits = [], []
+    with conn.cursor() as cur:
+        for query in queries:
+            started = time.perf_counter()
+            cur.execute(sql, {"qvec": query.tolist(), "top_k": top_k})
+            hits.append([row[0] for row in cur.fetchall()])
+            latencies.append((time.perf_counter() - started) * 1000)
+    conn.commit()
+    return latencies, hits
+
+
+def _recall(truth, hits, top_k):
+    total = sum(len(set(expected[:top_k]) & set(found)) for expected, found in zip(truth, hits))
+    return total / float(top_k * len(truth))
+
+
+def _summary(latencies):
+    return {
+        "p50_ms": round(_percentile(latencies, 0.50), 2),
+        "p99_ms": round(_percentile(latencies, 0.99), 2),
+    }
+
+
+def bench_size(config, rows, args, rng):
+    table = f"bench_vectors_{rows}"
+    centers = rng.normal(size=(args.clusters, args.dim)).astype(np.float32)
+    queries = _clustered(rng, centers, args.queries, args.noise)
+
+    conn = psycopg2.connect(**config.db_config)
+    report = {"rows": rows, "dim": args.dim, "top_k": args.top_k}
+    try:
+        with conn.cursor() as cur:
+            cur.execute("CREATE EXTENSION IF NOT EXISTS vector;")
+        conn.commit()
+        started = time.perf_counter()
+        _load_table(conn, table, rows, args.dim, centers, rng, args.noise)
+        report["load_s"] = round(time.perf_counter() - started, 1)
+
+        manager = VectorIndexManager(config, table=table)
+        exact_sql = (
+            f"SELECT id FROM {table} ORDER BY embedding <=> %(qvec)s::vector LIMIT %(top_k)s;"
+        )
+        exact_ms, truth = _run_queries(conn, exact_sql, queries, args.top_k)  # 尚未建索引：顺序扫描
+        report["exact"] = _summary(exact_ms)
+
+        for kind, knob, values in (("hnsw", "ef_search", args.ef_search), ("ivfflat", "probes", args.probes)):
+            build = manager.ensure_index(force=True, kind=kind)
+            with conn.cursor() as cur:
+                plan, version = manager.describe(cur)
+            conn.commit()
+            sql = (
+                f"SELECT id FROM {table} ORDER BY {plan.order_expr('%(qvec)s::vector')} LIMIT %(top_k)s;"
+            )
+            sweeps = []
+            for value in values:
+                settings = manager.search_settings(plan, version, args.top_k, **{knob: value})
+                apply_search_settings(conn, settings)
+                latencies, hits = _run_queries(conn, sql, queries, args.top_k)
+                sweeps.append(
+                    {
+                        knob: value,
+                        "settings": settings,
+                        f"recall@{args.top_k}": round(_recall(truth, hits, args.top_k), 4),
+                        **_summary(latencies),
+                    }
+                )
+            report[kind] = {"params": plan.params, "build_ms": build.get("build_ms"), "sweep": sweeps}
+    finally:
+        if not args.keep:
+            with conn.cursor() as cur:
+                cur.execute(f"DROP TABLE IF EXISTS {table};")
+            conn.commit()
+        conn.close()
+    return report
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark pgvector HNSW/IVFFlat recall and latency")
+    parser.add_argument("--rows", type=_int_list, default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--dim", type=int, default=256, help="1M 行 x 1024 维约需 4GB 表空间")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--noise", type=float, default=0.3)
+    parser.add_argument("--ef-search", type=_int_list, default=[40, 100, 200])
+    parser.add_argument("--probes", type=_int_list, default=[1, 10, 32])
+    parser.add_argument("--keep", action="store_true", help="保留临时表以便复查")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    config = load_config()
+    rng = np.random.default_rng(args.seed)
+    reports = [bench_size(config, rows, args, rng) for rows in args.rows]
+    print(json.dumps(reports, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+语义缓存查找基准测试
+
+对比旧版 RedisSemanticCache（SCAN + 逐键 GET）与 IndexedSemanticCache（进程内向量索引）
+在不同缓存规模下的查找延迟与 Redis 往返次数。默认使用内存版 FakeRedis，无需 Redis 服务。
+
+运行方式:
+    python scripts/bench_semantic_cache.py --entries 10000 100000 --dim 1024
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+sys.path.insert(0, str(project_root / "tests"))
+
+from conftest import FakeRedis  # noqa: E402
+from gustobot.application.services.redis_cache import RedisSemanticCache  # noqa: E402
+from gustobot.application.services.semantic_cache import (  # noqa: E402
+    IndexedSemanticCache,
+    create_vector_index,
+)
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(pct * len(ordered)))]
+
+
+def bench_index(entries: int, dim: int, backend: str, queries: int) -> None:
+    """测量纯索引检索延迟（不含 embedding 与 Redis）。"""
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((entries, dim)).astype(np.float32)
+    index = create_vector_index(dim, backend)
+
+    started = time.perf_counter()
+    index.add_many([str(idx) for idx in range(entries)], vectors)
+    build_s = time.perf_counter() - started
+
+    latencies = []
+    for vector in vectors[rng.integers(0, entries, size=queries)]:
+        probe = vector + rng.normal(0, 0.01, size=dim).astype(np.float32)
+        t0 = time.perf_counter()
+        index.search(probe, k=1)
+        latencies.append((time.perf_counter() - t0) * 1000)
+
+    print(
+        f"[index:{type(index).__name__}] entries={entries} dim={dim} build={build_s:.1f}s "
+        f"p50={statistics.median(latencies):.3f}ms p99={_percentile(latencies, 0.99):.3f}ms"
+    )
+
+
+async def bench_caches(entries: int, dim: int, backend: str, queries: int) -> None:
+    """端到端对比两种缓存的 lookup（embedding 固定返回预生成向量）。"""
+    rng = np.random.default_rng(1)
+    vectors = rng.standard_normal((entries, dim)).astype(np.float32)
+    texts = [f"问题{idx}" for idx in range(entries)]
+    lookup = dict(zip(texts, vectors.tolist()))
+
+    async def embed(text: str):
+        return lookup[text]
+
+    scan_redis, indexed_redis = FakeRedis(), FakeRedis()
+    scan_cache = RedisSemanticCache(redis_client=scan_redis, max_cache_size=entries + 1)
+    scan_cache._get_embedding = embed  # type: ignore[assignment]
+    indexed_cache = IndexedSemanticCache(
+        redis_client=indexed_redis,
+        max_cache_size=entries + 1,
+        index_backend=backend,
+        sync_interval=0,
+        embedding_fn=embed,
+    )
+
+    # 直接写入底层存储以加快预热；两种后端共用同一条目哈希布局
+    for text, vector in zip(texts, vectors):
+        digest = RedisSemanticCache._message_hash(text)
+        entry = {"vec": vector.tobytes(), "resp": "answer", "last_access": 0, "access_count": 1}
+        await scan_redis.hset(f"semantic:entry:{digest}", mapping=entry)
+        await indexed_redis.hset(f"semantic:entry:{digest}", mapping=entry)
+    await indexed_cache.lookup([{"role": "user", "content": texts[0]}])  # 构建索引
+
+    for name, cache, redis, sample in (
+        ("scan", scan_cache, scan_redis, min(queries, 5)),
+        ("indexed", indexed_cache, indexed_redis, queries),
+    ):
+        latencies, trips = [], []
+        for text in rng.choice(texts, size=sample):
+            redis.round_trips = 0
+            t0 = time.perf_counter()
+            await cache.lookup([{"role": "user", "content": str(text)}])
+            latencies.append((time.perf_counter() - t0) * 1000)
+            trips.append(redis.round_trips)
+        print(
+            f"[cache:{name}] entries={entries} p50={statistics.median(latencies):.3f}ms "
+            f"p99={_percentile(latencies, 0.99):.3f}ms round_trips={statistics.mean(trips):.0f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--backend", default="auto", choices=["auto", "hnsw", "numpy"])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--end-to-end", action="store_true", help="同时对比两种缓存的完整 lookup")
+    args = parser.parse_args()
+
+    for entries in args.entries:
+        bench_index(entries, args.dim, args.backend, args.queries)
+        if args.end_to_end:
+            asyncio.run(bench_caches(entries, args.dim, args.backend, args.queries))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""
+Benchmark per-request construction cost of the Neo4j multi-tool workflow.
+
+Compares the old behaviour (new ChatOpenAI, Neo4j connection, Cypher example
+retriever and `compile()` on every request) with the cached `WorkflowFactory`.
+Requires the same environment as the API (OPENAI_API_KEY, Neo4j); when Neo4j
+is unreachable the rebuilt numbers exclude the connection cost.
+
+Usage:
+    python scripts/bench_workflow_factory.py --iterations 10
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from gustobot.application.agents.workflow_factory import get_workflow_factory  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=5)
+    args = parser.parse_args()
+
+    result = get_workflow_factory().benchmark(iterations=args.iterations)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Milvus 索引搜索参数离线调优
+
+读取集合中全部向量，用 numpy 精确检索得到查询集的真实 top-k，再按当前索引配置逐一扫描
+nprobe / ef / search_list，统计 recall@k 与单查询延迟，推荐满足目标召回率的最低成本取值，
+并输出可直接写入 .env 的 MILVUS_SEARCH_PARAMS。
+
+查询集：
+  --queries FILE  每行一个问题（推荐，留出的真实用户问题），经嵌入服务向量化
+  --sample N      未提供问题文件时，从集合中随机抽取 N 个已存向量作为查询
+
+运行方式:
+    python scripts/tune_milvus_index.py --queries data/kb/eval_queries.txt --top-k 10 --target-recall 0.95
+    python scripts/tune_milvus_index.py --sample 200 --index-type HNSW --rebuild
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+from gustobot.config import settings  # noqa: E402
+from gustobot.infrastructure.knowledge.embedding_service import get_embedding_service  # noqa: E402
+from gustobot.infrastructure.knowledge.index_tuning import (  # noqa: E402
+    exact_top_k,
+    load_vectors,
+    recommend,
+    sweep,
+)
+from gustobot.infrastructure.knowledge.vector_store import VectorStore  # noqa: E402
+
+
+def _queries(args, corpus: np.ndarray) -> np.ndarray:
+    if args.queries:
+        lines = [line.strip() for line in Path(args.queries).read_text(encoding="utf-8").splitlines()]
+        texts = [line for line in lines if line]
+        service = get_embedding_service(
+            settings.EMBEDDING_MODEL,
+            api_key=settings.EMBEDDING_API_KEY or settings.LLM_API_KEY,
+            dimension=settings.EMBEDDING_DIMENSION,
+        )
+        return np.asarray(service.embed_sync(texts), dtype=np.float32)
+    rng = np.random.default_rng(args.seed)
+    picks = rng.choice(corpus.shape[0], size=min(args.sample, corpus.shape[0]), replace=False)
+    return corpus[picks]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Sweep Milvus search params against exact search")
+    parser.add_argument("--collection", default=settings.MILVUS_COLLECTION)
+    parser.add_argument("--queries", help="Text file with one held-out query per line")
+    parser.add_argument("--sample", type=int, default=200, help="Stored vectors to sample as queries")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    parser.add_argument("--values", type=int, nargs="*", help="Sweep values (default: profile's)")
+    parser.add_argument("--index-type", help="Profile to tune (default: configured for the collection)")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the index with --index-type first")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    index_type, index_params, search_params = settings.milvus_index_config(args.collection)
+    store = VectorStore(
+        collection_name=args.collection,
+        host=settings.MILVUS_HOST,
+        port=settings.MILVUS_PORT,
+        dimension=settings.EMBEDDING_DIMENSION,
+        index_type=index_type,
+        metric_type=settings.MILVUS_METRIC_TYPE,
+        index_params=index_params,
+        search_params=search_params,
+    )
+    try:
+        if args.rebuild and args.index_type:
+            store.rebuild_index(args.index_type, index_params if args.index_type.upper() == index_type else None)
+        elif args.index_type and args.index_type.upper() != store.index_type:
+            print(f"集合当前索引为 {store.index_type}，如需调优 {args.index_type} 请加 --rebuild", file=sys.stderr)
+            return 2
+
+        ids, corpus = load_vectors(store)
+        if not ids:
+            print(f"集合 {args.collection} 为空", file=sys.stderr)
+            return 2
+        queries = _queries(args, corpus)
+        truth = [[ids[row] for row in hits] for hits in exact_top_k(corpus, queries, args.top_k, store.metric_type)]
+        points = sweep(store, queries, truth, args.top_k, args.values)
+        best = recommend(points, args.target_recall, store.profile.sweep_param)
+
+        report = {
+            "collection": args.collection,
+            "index_type": store.index_type,
+            "index_params": store.profile.build_params,
+            "vectors": len(ids),
+            "queries": int(queries.shape[0]),
+            "top_k": args.top_k,
+            "target_recall": args.target_recall,
+            "sweep": [point.as_dict() for point in points],
+            "recommended": best.as_dict() if best else None,
+        }
+        if best is not None:
+            env = []
+            if store.index_type != index_type:
+                env.append(f"MILVUS_INDEX_PROFILES={args.collection}:{store.index_type}")
+            if store.profile.sweep_param:
+                value = best.params[store.profile.sweep_param]
+                env.append(f"MILVUS_SEARCH_PARAMS={args.collection}:{store.profile.sweep_param}={value}")
+            report["env"] = env
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return 0 if best is not None else 1
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,319 @@
+"""
+共享测试夹具
+
+提供一个进程内的 Redis 假实现，覆盖缓存模块用到的异步命令，
+便于在没有 Redis 服务的环境下运行单元测试。
+"""
+import fnmatch
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import pytest
+
+project_root = Path(__file__).resolve().parents[1]
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+
+def _to_bytes(value: Any) -> bytes:
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, float):
+        return repr(value).encode("utf-8")
+    return str(value).encode("utf-8")
+
+
+def _run_sync(coroutine: Any) -> Any:
+    """Drive a FakeRedis coroutine that never suspends (used from Lua callbacks)."""
+    try:
+        coroutine.send(None)
+    except StopIteration as stop:
+        return stop.value
+    raise RuntimeError("FakeRedis command suspended")
+
+
+class FakeScript:
+    """
+    `register_script` result that runs the Lua source against FakeRedis.
+
+    Uses lupa (`pip install lupa`); tests that reach a script are skipped when it
+    is not installed. `redis.call` supports the commands the cache scripts use.
+    """
+
+    def __init__(self, redis: "FakeRedis", script: str) -> None:
+        self._redis = redis
+        self.script = script
+
+    async def __call__(self, keys=(), args=(), client=None) -> Any:
+        lupa = pytest.importorskip("lupa")
+        self._redis.round_trips += 1
+        lua = lupa.LuaRuntime(encoding=None)
+        redis_table = lua.table_from({b"call": lambda *command: self._call(lua, *command)})
+        lua.globals()[b"redis"] = redis_table
+        lua.globals()[b"KEYS"] = lua.table_from([_to_bytes(key) for key in keys])
+        lua.globals()[b"ARGV"] = lua.table_from([_to_bytes(arg) for arg in args])
+        result = lua.execute(self.script.encode("utf-8"))
+        return int(result) if isinstance(result, float) else result
+
+    def _call(self, lua: Any, command: bytes, *args: bytes) -> Any:
+        name = command.decode("utf-8").lower()
+        redis = self._redis
+        if name == "hset":
+            key, *pairs = args
+            return _run_sync(redis.hset(key, mapping=dict(zip(pairs[::2], pairs[1::2])), _count=False))
+        if name == "zadd":
+            key, *rest = args
+            nx = rest[0].upper() == b"NX"
+            score, member = rest[1:] if nx else rest
+            return _run_sync(redis.zadd(key, {member: float(score)}, nx=nx, _count=False))
+        if name == "expire":
+            return _run_sync(redis.expire(args[0], int(args[1]), _count=False))
+        if name == "zrange":
+            members = _run_sync(redis.zrange(args[0], int(args[1]), int(args[2]), _count=False))
+            return lua.table_from(members)
+        method = {"del": "delete"}.get(name, name)
+        return _run_sync(getattr(redis, method)(*args, _count=False))
+
+
+class FakePipeline:
+    """Queue commands and replay them against the owning FakeRedis."""
+
+    def __init__(self, redis: "FakeRedis") -> None:
+        self._redis = redis
+        self._commands: List[Tuple[str, tuple, dict]] = []
+
+    def __getattr__(self, name: str):
+        if not hasattr(self._redis, name):
+            raise AttributeError(name)
+
+        def _queue(*args, **kwargs):
+            self._commands.append((name, args, kwargs))
+            return self
+
+        return _queue
+
+    async def execute(self) -> List[Any]:
+        self._redis.round_trips += 1
+        results = []
+        for name, args, kwargs in self._commands:
+            results.append(await getattr(self._redis, name)(*args, _count=False, **kwargs))
+        self._commands = []
+        return results
+
+    async def __aenter__(self) -> "FakePipeline":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self._commands = []
+
+
+class FakeRedis:
+    """Minimal in-memory stand-in for `redis.asyncio.Redis` (bytes responses)."""
+
+    def __init__(self) -> None:
+        self._data: Dict[bytes, Any] = {}
+        self._expiry: Dict[bytes, float] = {}
+        self.round_trips = 0
+
+    # -- helpers -----------------------------------------------------------
+    def _count(self, enabled: bool) -> None:
+        if enabled:
+            self.round_trips += 1
+
+    def _alive(self, key: bytes) -> bool:
+        deadline = self._expiry.get(key)
+        if deadline is not None and deadline <= time.time():
+            self._data.pop(key, None)
+            self._expiry.pop(key, None)
+        return key in self._data
+
+    def pipeline(self, transaction: bool = True) -> FakePipeline:
+        return FakePipeline(self)
+
+    def register_script(self, script: str) -> FakeScript:
+        return FakeScript(self, script)
+
+    # -- strings -----------------------------------------------------------
+    async def get(self, key, *, _count: bool = True) -> Optional[bytes]:
+        self._count(_count)
+        key = _to_bytes(key)
+        return self._data.get(key) if self._alive(key) else None
+
+    async def set(self, key, value, ex: Optional[int] = None, *, _count: bool = True) -> bool:
+        self._count(_count)
+        key = _to_bytes(key)
+        self._data[key] = _to_bytes(value)
+        self._expiry.pop(key, None)
+        if ex:
+            self._expiry[key] = time.time() + ex
+        return True
+
+    async def mget(self, keys, *args, _count: bool = True) -> List[Optional[bytes]]:
+        self._count(_count)
+        names = list(keys) if isinstance(keys, (list, tuple)) else [keys]
+        names.extend(args)
+        return [await self.get(name, _count=False) for name in names]
+
+    # -- keys --------------------------------------------------------------
+    async def delete(self, *keys, _count: bool = True) -> int:
+        self._count(_count)
+        removed = 0
+        for key in keys:
+            key = _to_bytes(key)
+            if self._alive(key):
+                removed += 1
+            self._data.pop(key, None)
+            self._expiry.pop(key, None)
+        return removed
+
+    async def exists(self, *keys, _count: bool = True) -> int:
+        self._count(_count)
+        return sum(1 for key in keys if self._alive(_to_bytes(key)))
+
+    async def expire(self, key, seconds: int, *, _count: bool = True) -> bool:
+        self._count(_count)
+        key = _to_bytes(key)
+        if not self._alive(key):
+            return False
+        self._expiry[key] = time.time() + seconds
+        return True
+
+    async def scan_iter(self, match: Optional[str] = None, count: Optional[int] = None):
+        self.round_trips += 1
+        pattern = match or "*"
+        for key in list(self._data):
+            if self._alive(key) and fnmatch.fnmatchcase(key.decode("utf-8"), pattern):
+                yield key
+
+    # -- hashes ------------------------------------------------------------
+    def _hash(self, key: bytes, create: bool = False) -> Optional[Dict[bytes, bytes]]:
+        if not self._alive(key):
+            if not create:
+                return None
+            self._data[key] = {}
+        return self._data[key]
+
+    async def hset(self, key, field=None, value=None, mapping=None, *, _count: bool = True) -> int:
+        self._count(_count)
+        bucket = self._hash(_to_bytes(key), create=True)
+        items = dict(mapping or {})
+        if field is not None:
+            items[field] = value
+        added = 0
+        for item_field, item_value in items.items():
+            item_field = _to_bytes(item_field)
+            added += item_field not in bucket
+            bucket[item_field] = _to_bytes(item_value)
+        return added
+
+    async def hget(self, key, field, *, _count: bool = True) -> Optional[bytes]:
+        self._count(_count)
+        bucket = self._hash(_to_bytes(key))
+        return bucket.get(_to_bytes(field)) if bucket else None
+
+    async def hmget(self, key, *fields, _count: bool = True) -> List[Optional[bytes]]:
+        self._count(_count)
+        bucket = self._hash(_to_bytes(key)) or {}
+        return [bucket.get(_to_bytes(field)) for field in fields]
+
+    async def hgetall(self, key, *, _count: bool = True) -> Dict[bytes, bytes]:
+        self._count(_count)
+        return dict(self._hash(_to_bytes(key)) or {})
+
+    async def hincrby(self, key, field, amount: int = 1, *, _count: bool = True) -> int:
+        self._count(_count)
+        bucket = self._hash(_to_bytes(key), create=True)
+        field = _to_bytes(field)
+        value = int(bucket.get(field, b"0")) + int(amount)
+        bucket[field] = _to_bytes(value)
+        return value
+
+    # -- sorted sets -------------------------------------------------------
+    def _zset(self, key: bytes, create: bool = False) -> Optional[Dict[bytes, float]]:
+        return self._hash(key, create=create)
+
+    async def hsetnx(self, key, field, value, *, _count: bool = True) -> bool:
+        self._count(_count)
+        bucket = self._hash(_to_bytes(key), create=True)
+        field = _to_bytes(field)
+        if field in bucket:
+            return False
+        bucket[field] = _to_bytes(value)
+        return True
+
+    async def zadd(self, key, mapping, nx: bool = False, *, _count: bool = True) -> int:
+        self._count(_count)
+        bucket = self._zset(_to_bytes(key), create=True)
+        added = 0
+        for member, score in mapping.items():
+            member = _to_bytes(member)
+            if nx and member in bucket:
+                continue
+            added += member not in bucket
+            bucket[member] = float(score)
+        return added
+
+    async def zincrby(self, key, amount: float, value, *, _count: bool = True) -> float:
+        self._count(_count)
+        bucket = self._zset(_to_bytes(key), create=True)
+        member = _to_bytes(value)
+        bucket[member] = bucket.get(member, 0.0) + amount
+        return bucket[member]
+
+    async def zscore(self, key, value, *, _count: bool = True) -> Optional[float]:
+        self._count(_count)
+        return (self._zset(_to_bytes(key)) or {}).get(_to_bytes(value))
+
+    async def zcard(self, key, *, _count: bool = True) -> int:
+        self._count(_count)
+        return len(self._zset(_to_bytes(key)) or {})
+
+    async def zrem(self, key, *values, _count: bool = True) -> int:
+        self._count(_count)
+        bucket = self._zset(_to_bytes(key)) or {}
+        return sum(bucket.pop(_to_bytes(value), None) is not None for value in values)
+
+    async def zrange(self, key, start: int, end: int, *, _count: bool = True) -> List[bytes]:
+        self._count(_count)
+        bucket = self._zset(_to_bytes(key)) or {}
+        ordered = [member for member, _ in sorted(bucket.items(), key=lambda item: (item[1], item[0]))]
+        return ordered[start:] if end == -1 else ordered[start:end + 1]
+
+
+@pytest.fixture
+def fake_redis() -> FakeRedis:
+    """Fresh in-memory Redis replacement for each test."""
+    return FakeRedis()
+
+
+@pytest.fixture
+def make_semantic_cache(request, fake_redis):
+    """
+    Factory for an IndexedSemanticCache backed by `fake_redis`.
+
+    Questions are embedded by looking them up in the test module's `VECTORS`.
+    Keyword arguments override the defaults.
+    """
+    from gustobot.application.services.semantic_cache import IndexedSemanticCache
+
+    vectors = request.module.VECTORS
+
+    async def embedding(text: str):
+        return vectors[text]
+
+    def build(**kwargs):
+        params = {
+            "redis_client": fake_redis,
+            "score_threshold": 0.95,
+            "max_cache_size": 10,
+            "ttl": 60,
+            "index_backend": "numpy",
+            "sync_interval": 0,
+            "embedding_fn": embedding,
+        }
+        params.update(kwargs)
+        return IndexedSemanticCache(**params)
+
+    return build
@@ -0,0 +1,9 @@
+"""
+kb_ingest 测试：服务以 kb_service.* 方式导入，与容器内的运行方式一致
+"""
+import sys
+from pathlib import Path
+
+KB_INGEST_ROOT = Path(__file__).resolve().parents[2] / "kb_ingest"
+if str(KB_INGEST_ROOT) not in sys.path:
+    sys.path.insert(0, str(KB_INGEST_ROOT))
@@ -0,0 +1,148 @@
+"""
+PGCOPY 二进制编码与 BulkUpserter 写入路径测试（不连接数据库）
+"""
+import json
+import struct
+
+import numpy as np
+import pytest
+
+from kb_service.db import bulk
+from kb_service.db.bulk import BulkUpserter, encode_copy_binary, vector_to_binary, vector_to_text
+
+HEADER = b"PGCOPY\n\xff\r\n\x00" + b"\x00\x00\x00\x00" + b"\x00\x00\x00\x00"
+TRAILER = b"\xff\xff"
+
+
+def parse_copy(payload):
+    """按 PostgreSQL 二进制 COPY 格式逐字节拆出每行的字段（NULL 为 None）"""
+    assert payload.startswith(HEADER) and payload.endswith(TRAILER)
+    body, offset, rows = payload[len(HEADER):-len(TRAILER)], 0, []
+    while offset < len(body):
+        (count,) = struct.unpack_from(">h", body, offset)
+        offset += 2
+        fields = []
+        for _ in range(count):
+            (length,) = struct.unpack_from(">i", body, offset)
+            offset += 4
+            if length == -1:
+                fields.append(None)
+                continue
+            fields.append(body[offset:offset + length])
+            offset += length
+        rows.append(fields)
+    return rows
+
+
+def test_vector_to_binary_layout():
+    data = vector_to_binary([1.0, -2.5, 0.0])
+    assert data[:4] == b"\x00\x03\x00\x00"  # uint16 维度 + uint16 保留位
+    assert data[4:] == struct.pack(">3f", 1.0, -2.5, 0.0)
+    # 二维数组与 float64 输入按 float4 展平
+    assert vector_to_binary(np.array([[0.5], [1.5]], dtype=np.float64)) == b"\x00\x02\x00\x00" + struct.pack(">2f", 0.5, 1.5)
+    assert vector_to_text([1, 0.5]) == "[1.0,0.5]"
+
+
+def test_empty_copy_is_header_and_trailer():
+    assert encode_copy_binary([]) == HEADER + TRAILER
+
+
+def test_encode_text_int_jsonb_vector_and_null_fields():
+    metadata = json.dumps({"名称": "红烧肉", "year": 2024}, ensure_ascii=False)
+    payload = encode_copy_binary(
+        [
+            ("recipes", 42, metadata, [0.25, 1.0]),
+            ("菜谱", None, None, None),
+        ],
+        vector_columns=[3],
+    )
+
+    assert payload[len(HEADER):len(HEADER) + 2] == b"\x00\x04"  # 每行以 int16 字段数开头
+    rows = parse_copy(payload)
+    assert rows == [
+        [b"recipes", b"42", metadata.encode("utf-8"), b"\x00\x02\x00\x00" + struct.pack(">2f", 0.25, 1.0)],
+        ["菜谱".encode("utf-8"), None, None, None],
+    ]
+    # NULL 字段只有长度 -1，没有数据
+    assert payload.count(b"\xff\xff\xff\xff") == 3
+
+
+class FakeCursor:
+    def __init__(self, types):
+        self.types = types
+        self.statements = []
+        self.copies = []
+
+    def execute(self, sql, params=None):
+        self.statements.append(" ".join(sql.split()))
+
+    def fetchall(self):
+        return list(self.types.items())
+
+    def copy_expert(self, sql, stream):
+        self.copies.append((sql, stream.read()))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class FakeConnection:
+    def __init__(self, types):
+        self.cur = FakeCursor(types)
+
+    def cursor(self):
+        return self.cur
+
+
+@pytest.fixture
+def upserter():
+    return BulkUpserter(
+        "docs",
+        ["source_id", "content", "embedding", "metadata"],
+        ["source_id"],
+        touch={"created_at": "CURRENT_TIMESTAMP"},
+        copy_threshold=3,
+    )
+
+
+@pytest.fixture
+def values_calls(monkeypatch):
+    calls = []
+    monkeypatch.setattr(bulk, "execute_values", lambda cur, sql, values, page_size: calls.append((sql, values)))
+    return calls
+
+
+def test_small_batches_use_execute_values(upserter, values_calls):
+    conn = FakeConnection({})
+    rows = [("a", "x", [1.0, 2.0], "{}"), ("b", None, None, None), ("a", "y", [3.0, 4.0], "{}")]
+
+    # 同键行只保留最后一条，去重后不足阈值
+    assert upserter.upsert(conn, rows) == 2
+    (sql, values), = values_calls
+    assert sql.startswith("INSERT INTO docs (source_id, content, embedding, metadata) VALUES %s ON CONFLICT (source_id)")
+    assert "created_at = CURRENT_TIMESTAMP" in sql
+    assert values == [("a", "y", "[3.0,4.0]", "{}"), ("b", None, None, None)]
+    assert conn.cur.copies == []
+
+
+def test_batches_at_threshold_are_staged_with_binary_copy(upserter, values_calls):
+    conn = FakeConnection({"source_id": "text", "content": "text", "embedding": "vector(2)", "metadata": "jsonb"})
+    rows = [(f"id{index}", f"内容{index}", [float(index), 0.5], '{"k": 1}') for index in range(3)]
+
+    assert upserter.upsert(conn, rows) == 3
+    assert values_calls == []
+    _, create, insert, drop = conn.cur.statements
+    stage = create.split()[3]
+    assert create == f"CREATE TEMP TABLE {stage} (source_id text, content text, embedding vector, metadata text) ON COMMIT DROP;"
+    assert insert.startswith(
+        "INSERT INTO docs (source_id, content, embedding, metadata) SELECT s.source_id::text, s.content::text, "
+        f"s.embedding::vector(2), s.metadata::jsonb FROM {stage} AS s ON CONFLICT"
+    )
+    assert drop == f"DROP TABLE {stage};"
+
+    (copy_sql, payload), = conn.cur.copies
+    assert copy_sql == f"COPY {stage} (source_id, content, embedding, metadata) FROM STDIN WITH (FORMAT binary)"
+    assert parse_copy(payload)[2] == [b"id2", "内容2".encode("utf-8"), vector_to_binary([2.0, 0.5]), b'{"k": 1}']
@@ -0,0 +1,182 @@
+"""
+增量变更检测测试：用内存中的假 PostgreSQL 连接模拟暂存表与 searchable_documents
+"""
+from contextlib import contextmanager
+
+import pytest
+
+from kb_service.services import change_detection
+from kb_service.services.change_detection import ChangeDetector, item_fingerprint
+from kb_service.services.utils import compute_content_hash
+
+
+class FakeDatabase:
+    """按 ChangeDetector 发出的语句维护暂存行、已见键与文档哈希"""
+
+    def __init__(self, documents=None, table_exists=True) -> None:
+        self.documents = dict(documents or {})  # (source_table, source_id) -> content_hash
+        self.table_exists = table_exists
+        self.stage = []
+        self.seen = set()
+        self.updates = 0
+
+
+class FakeCursor:
+    def __init__(self, connection, name=None) -> None:
+        self.connection = connection
+        self.name = name
+        self.itersize = 0
+        self._result = []
+
+    def execute(self, sql, params=None):
+        db = self.connection.db
+        statement = " ".join(sql.split())
+        if statement.startswith("SELECT to_regclass"):
+            self._result = [("searchable_documents" if db.table_exists else None,)]
+        elif statement.startswith("TRUNCATE _kb_change_seen"):
+            db.seen.clear()
+        elif statement.startswith("TRUNCATE _kb_change_stage"):
+            db.stage = []
+        elif statement.startswith("INSERT INTO _kb_change_seen"):
+            db.seen.update((table, source_id) for _, table, source_id, _ in db.stage if table and source_id)
+        elif statement.startswith("SELECT s.position::int"):
+            assert self.name, "changed rows must be streamed through a named cursor"
+            rows = []
+            for position, table, source_id, new_hash in db.stage:
+                stored = db.documents.get((table, source_id))
+                missing = (table, source_id) not in db.documents
+                if stored != new_hash:
+                    rows.append((int(position), stored, missing))
+            self._result = sorted(rows)
+        elif statement.startswith("UPDATE searchable_documents"):
+            positions = set(params[0])
+            for position, table, source_id, new_hash in db.stage:
+                if position in positions:
+                    db.documents[(table, source_id)] = new_hash
+                    db.updates += 1
+        elif statement.startswith("SELECT COUNT(*)"):
+            tables = set(params[0])
+            self._result = [(sum(1 for key in db.documents if key[0] in tables and key not in db.seen),)]
+        elif not statement.startswith(("CREATE TEMP TABLE", "DROP TABLE")):
+            raise AssertionError(f"unexpected SQL: {statement}")
+
+    def fetchone(self):
+        return self._result[0]
+
+    def __iter__(self):
+        return iter(self._result)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class FakeConnection:
+    closed = 0
+
+    def __init__(self, db) -> None:
+        self.db = db
+
+    def cursor(self, name=None):
+        return FakeCursor(self, name)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class FakePool:
+    def __init__(self, db) -> None:
+        self.db = db
+
+    @contextmanager
+    def connection(self):
+        yield FakeConnection(self.db)
+
+
+@pytest.fixture(autouse=True)
+def stage_rows(monkeypatch):
+    # COPY 编码由 test_bulk 覆盖，这里直接把行放进暂存表
+    def copy_rows(cur, table, columns, rows):
+        assert table == "_kb_change_stage"
+        cur.connection.db.stage = [tuple(row) for row in rows]
+
+    monkeypatch.setattr(change_detection, "copy_rows_binary", copy_rows)
+
+
+def item(source_id, data, table="recipes"):
+    return {"source_table": table, "source_id": source_id, "original_data": data}
+
+
+def stored(*items):
+    return {(entry["source_table"], entry["source_id"]): item_fingerprint(dict(entry)) for entry in items}
+
+
+def test_counts_inserted_changed_unchanged_and_deleted():
+    db = FakeDatabase(
+        stored(
+            item("1", {"name": "红烧肉"}),
+            item("2", {"name": "麻婆豆腐"}),
+            item("3", {"name": "已下架"}),
+            item("9", {"name": "其他表"}, table="users"),
+        )
+    )
+    batch = [item("1", {"name": "红烧肉"}), item("2", {"name": "麻婆豆腐（微辣）"}), item("4", {"name": "宫保鸡丁"})]
+
+    with ChangeDetector(FakePool(db)) as detector:
+        changed = detector.filter(batch)
+        report = detector.finish()
+
+    assert [entry["source_id"] for entry in changed] == ["2", "4"]
+    assert all(entry["content_hash"].startswith("b2:") for entry in batch)
+    assert report.as_dict() | {"elapsed_s": 0} == {
+        "inserted": 1,
+        "changed": 1,
+        "unchanged": 1,
+        "deleted": 1,  # 只统计本次同步涉及的表
+        "migrated": 0,
+        "elapsed_s": 0,
+    }
+
+
+def test_deleted_counts_rows_seen_in_any_batch():
+    db = FakeDatabase(stored(item("1", {"n": 1}), item("2", {"n": 2}), item("3", {"n": 3})))
+    with ChangeDetector(FakePool(db)) as detector:
+        detector.filter([item("1", {"n": 1})])
+        detector.filter([item("2", {"n": 2})])
+        assert detector.finish().deleted == 1
+        assert detector.finish(count_deleted=False).unchanged == 2
+
+
+def test_legacy_md5_hash_is_upgraded_once():
+    data = {"name": "红烧肉", "price": 12}
+    db = FakeDatabase({("recipes", "1"): compute_content_hash(data), ("recipes", "2"): compute_content_hash({"old": 1})})
+
+    with ChangeDetector(FakePool(db)) as detector:
+        changed = detector.filter([item("1", data), item("2", {"old": 2})])
+        first = detector.finish()
+    # 旧 MD5 与内容一致：不重新嵌入，只就地升级哈希；内容不一致的仍算变化
+    assert [entry["source_id"] for entry in changed] == ["2"]
+    assert (first.unchanged, first.changed, first.migrated) == (1, 1, 1)
+    assert db.documents[("recipes", "1")].startswith("b2:")
+    assert db.updates == 1
+
+    with ChangeDetector(FakePool(db)) as detector:
+        changed = detector.filter([item("1", data)])
+        second = detector.finish()
+    assert changed == []
+    assert (second.unchanged, second.changed, second.migrated) == (1, 0, 0)
+    assert db.updates == 1
+
+
+def test_missing_table_treats_everything_as_inserted():
+    db = FakeDatabase(table_exists=False)
+    with ChangeDetector(FakePool(db)) as detector:
+        batch = [item("1", {"n": 1}), item("2", {"n": 2})]
+        assert detector.filter(batch) == batch
+        report = detector.finish()
+    assert (report.inserted, report.deleted) == (2, 0)
@@ -0,0 +1,66 @@
+"""
+flatten_frame 与逐行 flatten_row 的随机等价性测试
+"""
+import random
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from kb_service.core.config import Config
+from kb_service.services.utils import build_flatten_plan, flatten_frame, flatten_row, iter_records
+
+# 含重名、归一化后同名（去掉单位括号）、空白与 Unnamed 列名
+COLUMN_NAMES = ["名称", "名称（kg）", "价格(元)", "价格", "", " ", "Unnamed: 3", "备注", "备注", 1, 1.0, "日期"]
+TEXT_VALUES = ["红烧肉", "  麻婆豆腐 ", "", "-", "nan", "NaN", "None", "null", None, np.nan, pd.NaT, 0, "0"]
+
+
+def _column(rng, rows):
+    kind = rng.choice(["int", "float", "bool", "text", "mixed", "datetime", "date"])
+    if kind == "int":
+        return pd.Series([rng.randint(-5, 5) for _ in range(rows)], dtype="int64")
+    if kind == "float":
+        return pd.Series([rng.choice([1.5, -0.0, 3.0, np.nan]) for _ in range(rows)], dtype="float64")
+    if kind == "bool":
+        return pd.Series([rng.random() < 0.5 for _ in range(rows)], dtype="bool")
+    if kind == "text":
+        return pd.Series([rng.choice(TEXT_VALUES[:9]) for _ in range(rows)], dtype=object)
+    if kind == "datetime":
+        return pd.Series(
+            [rng.choice([pd.Timestamp("2024-03-01 08:30:15"), pd.NaT]) for _ in range(rows)],
+            dtype="datetime64[ns]",
+        )
+    if kind == "date":
+        return pd.Series([rng.choice([date(2023, 1, 2), None]) for _ in range(rows)], dtype=object)
+    choices = TEXT_VALUES + [2.5, True, datetime(2022, 5, 6, 7, 8, 9), pd.Timestamp("2021-01-01")]
+    return pd.Series([rng.choice(choices) for _ in range(rows)], dtype=object)
+
+
+def _frame(rng):
+    rows = rng.randint(1, 6)
+    names = [rng.choice(COLUMN_NAMES) for _ in range(rng.randint(1, 7))]
+    df = pd.DataFrame({index: _column(rng, rows) for index in range(len(names))})
+    df.columns = names
+    if rng.random() < 0.3:
+        # 所有列同为日期或同为数值时 values 的 dtype 不是 object
+        df = df.select_dtypes(include=[rng.choice(["number", "datetime"])])
+    return df
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_flatten_frame_matches_flatten_row(seed):
+    rng = random.Random(seed)
+    df = _frame(rng)
+    config = Config(flat_sep=" | ", flat_kv_sep=": ", flat_max_len=rng.choice([0, 40, 4000]))
+    extra = rng.choice([None, {}, {"来源": "mysql"}, {"备注": None}, {"名称": "覆盖", "表": "recipes"}])
+
+    expected = [flatten_row({**row, **(extra or {})}, config) for _, row in iter_records(df)]
+    assert flatten_frame(df, config, extra) == expected
+
+
+def test_flatten_plan_merges_normalized_columns():
+    plan = build_flatten_plan(("名称", "Unnamed: 1", "名称（kg）", "价格(元)", "名称", 1, 1.0))
+    # 重名的原始列取第一次出现的位置和最后一个值；1 与 1.0 类型不同但归一化为同一个键
+    assert plan.keys == ("名称", "价格", "1")
+    assert plan.sources == ((4, 2), (3,), (6,))
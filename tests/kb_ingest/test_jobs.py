@@ -0,0 +1,138 @@
+"""
+入库作业队列测试（临时 SQLite 文件上的 JobStore 与 JobWorker）
+"""
+import sqlite3
+import time
+
+import pytest
+
+from kb_service.core.config import Config
+from kb_service.services import jobs
+from kb_service.services.jobs import CANCELLED, QUEUED, RUNNING, SUCCEEDED, JobStore, JobWorker, cancel_job
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.sqlite3"))
+
+
+def make_worker(store, **overrides):
+    defaults = {"job_heartbeat_interval": 0.01, "job_stale_seconds": 60, "job_max_per_table": 1}
+    return JobWorker(Config(**{**defaults, **overrides}), store=store, worker_id="w1")
+
+
+def test_submit_get_and_list(store):
+    first = store.submit("excel", "recipes.xlsx", {"path": "/tmp/recipes.xlsx"})
+    second = store.submit("mysql", "orders", {"connection_url": "mysql://secret@db/shop", "table": "orders"})
+
+    assert first["status"] == QUEUED and first["attempts"] == 0
+    assert store.get(first["job_id"]) == first
+    assert store.get("missing") is None
+    # 载荷可能含连接串，只能通过 payload() 取得，不出现在对外的作业信息中
+    assert "payload" not in second
+    assert store.payload(second["job_id"])["table"] == "orders"
+
+    assert [job["job_id"] for job in store.list()] == [second["job_id"], first["job_id"]]
+    assert [job["job_id"] for job in store.list(status=QUEUED, limit=1)] == [second["job_id"]]
+    assert store.list(status=RUNNING) == []
+
+
+def test_cancel_queued_job_removes_upload(store, tmp_path):
+    upload = tmp_path / "upload"
+    upload.mkdir()
+    job = store.submit("excel", "recipes.xlsx", {"path": str(upload / "a.xlsx"), "cleanup_dir": str(upload)})
+
+    cancelled = cancel_job(store, job["job_id"])
+    assert cancelled["status"] == CANCELLED and cancelled["cancel_requested"]
+    assert not upload.exists()
+    assert store.claim("w1", 1) is None
+    assert cancel_job(store, "missing") is None
+
+
+def test_cancel_running_job_stops_at_next_check(store, monkeypatch):
+    def slow_ingest(config, payload, progress):
+        progress.add(rows_total=100)
+        while True:
+            progress.add(rows_read=1)
+            progress.check()
+            time.sleep(0.005)
+
+    monkeypatch.setitem(jobs.EXECUTORS, "slow", slow_ingest)
+    job = store.submit("slow", "recipes", {})
+    worker = make_worker(store)
+    claimed = store.claim(worker.worker_id, 1)
+
+    # 运行中的作业只标记取消请求，由 worker 心跳转达给 ingest
+    assert cancel_job(store, job["job_id"])["status"] == RUNNING
+    assert worker.run_job(claimed) == CANCELLED
+    finished = store.get(job["job_id"])
+    assert finished["status"] == CANCELLED
+    assert finished["progress"]["rows_total"] == 100
+
+
+def test_stale_heartbeat_is_requeued_and_claimed_again(store):
+    job = store.submit("excel", "recipes.xlsx", {})
+    assert store.claim("w1", 1)["worker"] == "w1"
+    assert store.requeue_stale(60) == 0
+
+    with sqlite3.connect(store.path) as conn:
+        conn.execute("UPDATE ingest_jobs SET heartbeat_at = ?", (time.time() - 120,))
+    assert store.requeue_stale(60) == 1
+    requeued = store.get(job["job_id"])
+    assert requeued["status"] == QUEUED and requeued["worker"] is None
+
+    again = store.claim("w2", 1)
+    assert again["job_id"] == job["job_id"]
+    assert again["worker"] == "w2" and again["attempts"] == 2
+
+
+def test_stale_job_with_cancel_request_is_cancelled(store):
+    job = store.submit("excel", "recipes.xlsx", {})
+    store.claim("w1", 1)
+    store.request_cancel(job["job_id"])
+    with sqlite3.connect(store.path) as conn:
+        conn.execute("UPDATE ingest_jobs SET heartbeat_at = ?", (time.time() - 120,))
+
+    assert store.requeue_stale(60) == 0
+    assert store.get(job["job_id"])["status"] == CANCELLED
+
+
+def test_claim_enforces_max_jobs_per_table(store):
+    first = store.submit("mysql", "orders", {})
+    second = store.submit("mysql", "orders", {})
+    other = store.submit("mysql", "users", {})
+
+    assert store.claim("w1", 1)["job_id"] == first["job_id"]
+    # 同一张表已有作业在运行，跳过排在前面的 second
+    assert store.claim("w2", 1)["job_id"] == other["job_id"]
+    assert store.claim("w3", 1) is None
+
+    store.finish(first["job_id"], SUCCEEDED)
+    assert store.claim("w3", 1)["job_id"] == second["job_id"]
+
+
+def test_claim_allows_parallel_jobs_up_to_limit(store):
+    for _ in range(3):
+        store.submit("mysql", "orders", {})
+    assert store.claim("w1", 2) is not None
+    assert store.claim("w2", 2) is not None
+    assert store.claim("w3", 2) is None
+
+
+def test_worker_runs_queue_until_empty(store, monkeypatch):
+    def ingest(config, payload, progress):
+        progress.add(rows_read=payload["rows"], rows_written=payload["rows"])
+        if payload["rows"] < 0:
+            raise ValueError("bad rows")
+        return {"rows_embedded": payload["rows"]}
+
+    monkeypatch.setitem(jobs.EXECUTORS, "fake", ingest)
+    ok = store.submit("fake", "a", {"rows": 3})
+    bad = store.submit("fake", "b", {"rows": -1})
+    unknown = store.submit("nope", "c", {})
+
+    assert make_worker(store).run(once=True) == 3
+    assert store.get(ok["job_id"])["result"] == {"rows_embedded": 3}
+    assert store.get(ok["job_id"])["progress"]["rows_written"] == 3
+    assert store.get(bad["job_id"])["error"] == "ValueError: bad rows"
+    assert store.get(unknown["job_id"])["error"] == "ValueError: Unknown job kind: nope"
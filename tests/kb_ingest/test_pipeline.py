@@ -0,0 +1,106 @@
+"""
+流式入库流水线测试：写库批次提交后记录断点，重跑时跳过已入库的行
+"""
+import logging
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+from kb_service.core.config import Config
+from kb_service.services import processor as processor_module
+from kb_service.services.pipeline import IngestCheckpoint, IngestPipeline, IngestProgress
+from kb_service.services.processor import DataProcessor
+from kb_service.services.rewriter import RowRewriter
+from kb_service.services.vector_store import EMBED_BATCH_SIZE
+
+
+class FakeWriter:
+    """build_rows 只保留 source_id；fail_on 指定第几次 write_rows 抛错，模拟中途断开"""
+
+    def __init__(self, fail_on=None) -> None:
+        self.fail_on = fail_on
+        self.batches = []
+
+    def prepare(self, logger):
+        return 4
+
+    def build_rows(self, items, vector_dim):
+        return [(item["source_table"], item["source_id"]) for item in items]
+
+    def write_rows(self, rows, log):
+        if len(self.batches) + 1 == self.fail_on:
+            raise ConnectionError("server closed the connection")
+        self.batches.append(list(rows))
+        return len(rows)
+
+    @property
+    def written(self):
+        return [row for batch in self.batches for row in batch]
+
+
+@pytest.fixture
+def processor(tmp_path, monkeypatch):
+    frames = {
+        "菜谱": pd.DataFrame({"名称": [f"菜{index}" for index in range(EMBED_BATCH_SIZE * 3 + 5)]}),
+        "食材": pd.DataFrame({"名称": ["盐", "糖"]}),
+    }
+    monkeypatch.setattr(processor_module.pd, "read_excel", lambda xls, sheet_name: frames[sheet_name])
+
+    config = Config(use_llm=False, db_write_batch_size=0, pipeline_queue_size=2, vector_index_auto_rebuild=False)
+    instance = DataProcessor.__new__(DataProcessor)
+    instance.config = config
+    instance.rewriter = RowRewriter(config, None)
+    instance.progress = None
+    instance.sheet_counts = {}
+    instance.csv_path = str(tmp_path / "processed_data.csv")
+    instance.txt_path = str(tmp_path / "processed_data.txt")
+    instance.logger = logging.getLogger("test")
+    instance.xls = SimpleNamespace(sheet_names=list(frames))
+    instance.total_rows = sum(len(frame) for frame in frames.values())
+    return instance
+
+
+def run(processor, writer, checkpoint, progress=None):
+    processor.progress = progress
+    pipeline = IngestPipeline(writer, processor.config, processor.logger, checkpoint=checkpoint, progress=progress)
+    return pipeline.run(processor._iter_sheets(processor.xls, checkpoint))
+
+
+def test_resume_skips_rows_already_written(processor, tmp_path):
+    path = tmp_path / "checkpoint.json"
+
+    first = FakeWriter(fail_on=3)
+    with pytest.raises(ConnectionError):
+        run(processor, first, IngestCheckpoint(path))
+    committed = len(first.written)
+    assert committed == EMBED_BATCH_SIZE * 2
+
+    checkpoint = IngestCheckpoint(path)
+    assert checkpoint.resumed
+    assert checkpoint.positions == {"菜谱": committed - 1}
+    assert checkpoint.rows_committed == committed
+
+    second = FakeWriter()
+    progress = IngestProgress()
+    assert run(processor, second, checkpoint, progress) == processor.total_rows - committed
+    # 续跑只写入断点之后的行，两次合起来每行恰好一次
+    expected = [("菜谱", str(index)) for index in range(EMBED_BATCH_SIZE * 3 + 5)] + [("食材", "0"), ("食材", "1")]
+    assert second.written == expected[committed:]
+    assert first.written + second.written == expected
+    assert checkpoint.positions == {"菜谱": EMBED_BATCH_SIZE * 3 + 4, "食材": 1}
+    assert IngestCheckpoint(path).rows_committed == processor.total_rows
+    # 进度计数把跳过的行算作已读
+    assert progress.snapshot()["rows_read"] == processor.total_rows
+    assert progress.snapshot()["rows_written"] == processor.total_rows - committed
+
+
+def test_checkpoint_for_file_starts_over_when_source_changes(tmp_path):
+    source = tmp_path / "data.xlsx"
+    source.write_bytes(b"v1")
+    checkpoint = IngestCheckpoint.for_file(str(tmp_path / "checkpoints"), source)
+    checkpoint.commit([SimpleNamespace(table="菜谱", position=9)], 10)
+    assert IngestCheckpoint.for_file(str(tmp_path / "checkpoints"), source).done("菜谱", 9)
+
+    source.write_bytes(b"version 2")
+    assert not IngestCheckpoint.for_file(str(tmp_path / "checkpoints"), source).resumed
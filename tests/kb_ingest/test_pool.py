@@ -0,0 +1,147 @@
+"""
+ConnectionPool 测试（以假的 psycopg2.connect 代替数据库）
+"""
+import hashlib
+import threading
+
+import psycopg2
+import pytest
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_INTRANS
+
+from kb_service.db import pool as pool_module
+from kb_service.db.pool import ConnectionPool, PoolTimeout
+
+
+class FakeCursor:
+    def __init__(self, connection) -> None:
+        self.connection = connection
+
+    def execute(self, sql, params=None):
+        self.connection.statements.append(sql)
+        self.connection.info.transaction_status = TRANSACTION_STATUS_INTRANS
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class FakeInfo:
+    transaction_status = TRANSACTION_STATUS_IDLE
+
+
+class FakeConnection:
+    def __init__(self) -> None:
+        self.closed = 0
+        self.autocommit = False
+        self.info = FakeInfo()
+        self.statements = []
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.info.transaction_status = TRANSACTION_STATUS_IDLE
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.info.transaction_status = TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+@pytest.fixture
+def connections(monkeypatch):
+    opened = []
+
+    def connect(**kwargs):
+        conn = FakeConnection()
+        opened.append(conn)
+        return conn
+
+    monkeypatch.setattr(pool_module.psycopg2, "connect", connect)
+    monkeypatch.setattr(pool_module, "register_vector", lambda conn: None)
+    return opened
+
+
+def make_pool(**kwargs):
+    return ConnectionPool({"dbname": "test"}, **kwargs)
+
+
+def test_checkout_times_out_when_pool_is_exhausted(connections):
+    pool = make_pool(max_size=1, timeout=0.05)
+    with pool.connection():
+        with pytest.raises(PoolTimeout):
+            with pool.connection():
+                pass
+    stats = pool.stats()
+    assert stats["timeouts"] == 1 and stats["in_use"] == 0
+    # 超时后槽位没有泄漏，连接归还后可以再次借出
+    with pool.connection() as conn:
+        assert conn is connections[0]
+
+
+def test_waiting_checkout_gets_the_returned_connection(connections):
+    pool = make_pool(max_size=1, timeout=5.0)
+    borrowed = []
+    with pool.connection() as first:
+        waiter = threading.Thread(target=lambda: borrowed.append(pool._checkout()))
+        waiter.start()
+        waiter.join(0.05)
+        assert waiter.is_alive()
+    waiter.join(1.0)
+    assert borrowed == [first]
+    assert pool.stats()["waits"] == 1
+
+
+def test_returned_connection_is_rolled_back(connections):
+    pool = make_pool(max_size=2)
+    with pool.connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("INSERT INTO t VALUES (1)")
+        conn.autocommit = True
+    assert conn.rollbacks == 1
+    assert conn.autocommit is False
+    assert conn.info.transaction_status == TRANSACTION_STATUS_IDLE
+    with pool.connection() as again:
+        assert again is conn
+
+
+def test_broken_connection_is_discarded(connections):
+    pool = make_pool(max_size=1)
+    with pytest.raises(psycopg2.OperationalError):
+        with pool.connection() as broken:
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+    assert broken.closed
+
+    with pool.connection() as conn:
+        assert conn is not broken
+    assert len(connections) == 2
+    assert pool.stats()["connections_discarded"] == 1
+
+    # 归还前已被关闭的连接同样不会放回空闲列表
+    with pool.connection() as conn:
+        conn.close()
+    with pool.connection() as fresh:
+        assert fresh is not conn
+    assert len(connections) == 3
+
+
+def test_statement_cache_deallocates_least_recently_used(connections):
+    pool = make_pool(max_size=1, statement_cache_size=2)
+    with pool.connection() as conn:
+        with conn.cursor() as cur:
+            pool.execute_prepared(cur, "SELECT $1", (1,))
+            pool.execute_prepared(cur, "SELECT $1 + 1", (1,))
+            pool.execute_prepared(cur, "SELECT $1", (2,))  # 命中，变为最近使用
+            pool.execute_prepared(cur, "SELECT $1 + 2", (1,))
+
+    state = pool._states[id(conn)]
+    assert list(state.prepared) == ["SELECT $1", "SELECT $1 + 2"]
+    evicted = hashlib.sha1(b"SELECT $1 + 1").hexdigest()[:16]
+    assert f"DEALLOCATE kb_{evicted}" in conn.statements
+    assert sum(sql.startswith("PREPARE") for sql in conn.statements) == 3
+    assert pool.stats()["statement_cache_hits"] == 1
@@ -0,0 +1,199 @@
+"""
+并发行重写测试：令牌桶限速、按输入顺序输出、在途窗口，以及 MySQL 入库的跳过规则
+"""
+import logging
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from kb_service.core.config import Config
+from kb_service.schemas.ingest import MySQLIngestRequest
+from kb_service.services.mysql_ingest import MySQLIngestor
+from kb_service.services.rewriter import RowRewriter, TokenBucket
+
+
+class FakeClock:
+    """sleep 只推进时间，不真正等待"""
+
+    def __init__(self) -> None:
+        self.now = 1000.0
+        self.sleeps = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class FakeLLM:
+    """按 prompt 依次返回预设结果；结果为异常时抛出"""
+
+    def __init__(self, replies=None) -> None:
+        self.replies = {prompt: list(values) for prompt, values in (replies or {}).items()}
+        self.calls = []
+
+    def generate(self, prompt, system_prompt=""):
+        self.calls.append(prompt)
+        values = self.replies.get(prompt)
+        reply = values.pop(0) if values else f"改写:{prompt}"
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+
+def make_config(**overrides):
+    defaults = {"llm_concurrency": 4, "llm_rate_limit_rpm": 0, "retry_times": 3, "retry_delay": 0}
+    return Config(**{**defaults, **overrides})
+
+
+def test_token_bucket_bursts_then_paces_requests():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2.0, capacity=3, clock=clock, sleep=clock.sleep)
+
+    # 突发额度内不等待
+    assert [bucket.acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+    # 之后每 0.5 秒放行一个请求
+    assert bucket.acquire() == pytest.approx(0.5)
+    assert bucket.acquire() == pytest.approx(0.5)
+    assert clock.now == pytest.approx(1001.0)
+
+    # 空闲再久，令牌也不超过 capacity
+    clock.now += 60
+    assert [bucket.acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.acquire() == pytest.approx(0.5)
+
+
+def test_token_bucket_limits_rate_across_threads():
+    bucket = TokenBucket(rate=200.0, capacity=1)
+    started = time.monotonic()
+    workers = [threading.Thread(target=bucket.acquire) for _ in range(9)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    # 第一个令牌来自初始额度，其余 8 个按 200/s 补充
+    assert time.monotonic() - started >= 8 / 200.0 * 0.9
+
+
+def test_map_ordered_yields_in_input_order_with_bounded_window():
+    rewriter = RowRewriter(make_config(llm_concurrency=3), FakeLLM())
+    pulled = []
+
+    def items():
+        for index in range(30):
+            pulled.append(index)
+            yield index
+
+    lock = threading.Lock()
+    running = [0, 0]  # 当前并发数, 最大并发数
+
+    def fn(item):
+        with lock:
+            running[0] += 1
+            running[1] = max(running[1], running[0])
+        # 前面的行更慢，完成顺序与输入顺序相反
+        time.sleep(0.002 * (item % 5))
+        with lock:
+            running[0] -= 1
+        return item * 10
+
+    outputs = []
+    for item, result in rewriter.map_ordered(items(), fn):
+        # 已提交但尚未输出的行数不超过窗口 concurrency * 4
+        assert len(pulled) - len(outputs) <= 3 * 4
+        outputs.append((item, result))
+
+    assert outputs == [(index, index * 10) for index in range(30)]
+    assert running[1] <= 3
+
+
+def test_map_ordered_runs_inline_when_not_concurrent():
+    rewriter = RowRewriter(make_config(), FakeLLM())
+    threads = set()
+
+    def fn(item):
+        threads.add(threading.current_thread())
+        return item
+
+    assert list(rewriter.map_ordered(range(5), fn, concurrent=False)) == [(i, i) for i in range(5)]
+    assert threads == {threading.current_thread()}
+
+
+def test_generate_retries_until_content():
+    llm = FakeLLM({"p": [RuntimeError("429"), "", "ok"]})
+    rewriter = RowRewriter(make_config(), llm)
+    assert rewriter.generate("p") == "ok"
+    assert llm.calls == ["p", "p", "p"]
+
+    failing = FakeLLM({"q": [RuntimeError("down")] * 3})
+    assert RowRewriter(make_config(), failing).generate("q") is None
+    assert len(failing.calls) == 3
+
+
+def test_generate_takes_a_token_per_attempt():
+    clock = FakeClock()
+    rewriter = RowRewriter(make_config(), FakeLLM({"p": [RuntimeError("429"), "ok"]}))
+    rewriter.limiter = TokenBucket(rate=1.0, capacity=1, clock=clock, sleep=clock.sleep)
+    assert rewriter.generate("p") == "ok"
+    # 重试也要取令牌：第二次请求等待 1 秒
+    assert clock.sleeps == [pytest.approx(1.0)]
+
+
+def test_backoff_grows_with_jitter_and_cap():
+    rewriter = RowRewriter(make_config(retry_delay=2, llm_retry_max_delay=10), FakeLLM())
+    for attempt, delay in [(0, 2), (1, 4), (2, 8), (5, 10)]:
+        for _ in range(20):
+            assert delay / 2 <= rewriter.backoff(attempt) <= delay
+
+
+class FakePrompts:
+    def get_prompt(self, table_name, row_data, schema=None, override_template=None, context_table_name=None):
+        return "", str(row_data.get("name") or "")
+
+
+class FakeWriter:
+    def __init__(self) -> None:
+        self.items = []
+
+    def upsert(self, items, logger=None):
+        self.items.extend(items)
+        return len(items)
+
+
+def make_ingestor(llm):
+    ingestor = MySQLIngestor.__new__(MySQLIngestor)
+    ingestor.config = make_config(retry_times=1)
+    ingestor.prompt_manager = FakePrompts()
+    ingestor.llm_client = llm
+    ingestor.rewriter = RowRewriter(ingestor.config, llm)
+    ingestor.vector_writer = FakeWriter()
+    ingestor.progress = None
+    ingestor.logger = logging.getLogger("test")
+    return ingestor
+
+
+def test_rewrite_mode_skips_rows_without_llm_content():
+    ingestor = make_ingestor(FakeLLM({"b": [""]}))
+    chunk = pd.DataFrame({"id": [1, 2, 3], "name": ["a", "b", "c"]})
+    request = MySQLIngestRequest(connection_url="mysql://", table="t", extra_metadata={}, id_column="id")
+
+    assert ingestor._process_chunk(chunk, [], request) == 2
+    assert [(item["source_id"], item["rewritten_content"]) for item in ingestor.vector_writer.items] == [
+        ("1", "改写:a"),
+        ("3", "改写:c"),
+    ]
+
+
+def test_flatten_mode_keeps_rows_with_empty_text():
+    ingestor = make_ingestor(FakeLLM())
+    chunk = pd.DataFrame({"name": ["红烧肉", None]})
+    request = MySQLIngestRequest(connection_url="mysql://", table="t", extra_metadata={}, mode="flatten")
+
+    # 与逐行 flatten_row 时一致：扁平化结果为空的行照常写入
+    assert ingestor._process_chunk(chunk, [], request) == 2
+    assert [item["rewritten_content"] for item in ingestor.vector_writer.items] == ["name: 红烧肉", ""]
+    assert ingestor.llm_client.calls == []
@@ -0,0 +1,115 @@
+"""
+pgvector 索引规划测试：索引类型、IVFFlat lists 与重建判断
+"""
+import math
+from dataclasses import replace
+
+import pytest
+
+from kb_service.core.config import Config
+from kb_service.services.vector_index import IndexPlan, VectorIndexManager
+
+PGVECTOR = (0, 8, 0)
+
+
+def make_manager(**overrides):
+    defaults = {
+        "vector_index_type": "auto",
+        "vector_index_metric": "cosine",
+        "vector_index_min_rows": 10_000,
+        "vector_index_hnsw_max_rows": 5_000_000,
+        "vector_index_rebuild_growth": 2.0,
+        "hnsw_m": 16,
+        "hnsw_ef_construction": 64,
+        "ivfflat_lists": 0,
+        "ivfflat_probes": 0,
+    }
+    return VectorIndexManager(Config(**{**defaults, **overrides}))
+
+
+@pytest.mark.parametrize(
+    "rows, dim, version, overrides, expected",
+    [
+        (0, 1024, PGVECTOR, {}, None),
+        (9_999, 1024, PGVECTOR, {}, None),
+        (10_000, 1024, PGVECTOR, {}, ("hnsw", "vector")),
+        (5_000_000, 1024, PGVECTOR, {}, ("hnsw", "vector")),
+        (5_000_001, 1024, PGVECTOR, {}, ("ivfflat", "vector")),
+        (50_000, 1024, (0, 4, 4), {}, ("ivfflat", "vector")),  # HNSW 需要 pgvector 0.5
+        (50_000, 3072, PGVECTOR, {}, ("hnsw", "halfvec")),
+        (50_000, 3072, (0, 6, 0), {}, None),  # halfvec 索引需要 0.7
+        (50_000, 4096, PGVECTOR, {}, None),  # 超过 halfvec 索引的 4000 维上限
+        (100, 1024, PGVECTOR, {"vector_index_type": "ivfflat"}, ("ivfflat", "vector")),
+        (10_000_000, 1024, PGVECTOR, {"vector_index_type": "none"}, None),
+    ],
+)
+def test_plan_chooses_index_by_rows(rows, dim, version, overrides, expected):
+    plan = make_manager(**overrides).plan(rows, dim, version)
+    assert (plan and (plan.kind, plan.storage)) == expected
+
+
+def test_plan_rejects_unknown_index_type():
+    with pytest.raises(ValueError):
+        make_manager(vector_index_type="diskann").plan(50_000, 1024, PGVECTOR)
+
+
+@pytest.mark.parametrize(
+    "rows, lists",
+    [
+        (100, 1),
+        (250_000, 250),
+        (1_000_000, 1_000),
+        (4_000_000, 2_000),
+        (100_000_000, 10_000),
+    ],
+)
+def test_ivfflat_lists_follow_row_count(rows, lists):
+    manager = make_manager(vector_index_type="ivfflat")
+    plan = manager.plan(rows, 1024, PGVECTOR)
+    assert plan.params == {"lists": lists}
+    # 100 万行以上 lists = sqrt(rows)，默认 probes ≈ sqrt(lists)
+    if rows > 1_000_000:
+        assert lists == math.isqrt(rows)
+    probes = int(manager.search_settings(plan, PGVECTOR, top_k=10)["ivfflat.probes"])
+    assert probes == max(round(math.sqrt(lists)), 1)
+
+
+def test_fixed_ivfflat_lists_override_row_count():
+    plan = make_manager(vector_index_type="ivfflat", ivfflat_lists=300).plan(4_000_000, 1024, PGVECTOR)
+    assert plan.params == {"lists": 300}
+
+
+BASE = IndexPlan(kind="ivfflat", metric="cosine", dim=1024, params={"lists": 100}, rows=100_000)
+
+
+@pytest.mark.parametrize(
+    "current, planned, reason",
+    [
+        (None, BASE, "missing"),
+        (BASE, replace(BASE, rows=150_000, params={"lists": 150}), None),
+        (BASE, replace(BASE, rows=199_999, params={"lists": 199}), None),
+        (BASE, replace(BASE, rows=200_000, params={"lists": 200}), "row count grew"),
+        (BASE, replace(BASE, metric="l2"), "definition changed"),
+        (BASE, replace(BASE, storage="halfvec"), "definition changed"),
+        (BASE, replace(BASE, kind="hnsw", params={"m": 16, "ef_construction": 64}), "definition changed"),
+        (
+            replace(BASE, kind="hnsw", params={"m": 16, "ef_construction": 64}),
+            replace(BASE, kind="hnsw", params={"m": 16, "ef_construction": 64}, rows=10_000_000),
+            None,
+        ),
+        (
+            replace(BASE, kind="hnsw", params={"m": 16, "ef_construction": 64}),
+            replace(BASE, kind="hnsw", params={"m": 32, "ef_construction": 64}),
+            "definition changed",
+        ),
+    ],
+)
+def test_needs_rebuild(current, planned, reason):
+    assert make_manager().needs_rebuild(current, planned) == reason
+
+
+def test_plan_round_trips_through_index_comment():
+    plan = make_manager().plan(50_000, 3072, PGVECTOR)
+    assert IndexPlan.from_comment(plan.to_comment()) == plan
+    assert IndexPlan.from_comment("not json") is None
+    assert plan.order_expr("%s") == "(embedding::halfvec(3072)) <=> (%s)::halfvec(3072)"
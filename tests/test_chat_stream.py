@@ -0,0 +1,116 @@
+"""
+/chat/stream 真流式输出测试：逐 token 转发 LLM 输出并推送节点进度（不依赖外部服务）
+"""
+import asyncio
+import json
+from typing import Annotated, Any, Dict, List, Optional, TypedDict
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, AnyMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.graph import END, START, StateGraph
+from langgraph.graph.message import add_messages
+
+from gustobot.application.services.response_cache import CacheLookup, ResponseCache
+from gustobot.interfaces.http.v1 import chat
+
+
+class FakeState(TypedDict, total=False):
+    messages: Annotated[List[AnyMessage], add_messages]
+    router: Dict[str, Any]
+
+
+class RecordingCache:
+    def __init__(self) -> None:
+        self.stored: List[Dict[str, Any]] = []
+
+    async def store(self, message: str, response: Dict[str, Any], **kwargs) -> None:
+        self.stored.append(response)
+
+
+def _build_graph(streaming: bool):
+    model = GenericFakeChatModel(messages=iter([AIMessage(content="先 焯水 再 红烧")]))
+
+    async def analyze_and_route_query(state: FakeState) -> FakeState:
+        return {"router": {"type": "general-query", "logic": "闲聊"}}
+
+    async def respond_to_general_query(state: FakeState, config: RunnableConfig) -> FakeState:
+        if streaming:
+            return {"messages": [await model.ainvoke(state["messages"], config=config)]}
+        return {"messages": [AIMessage(content="先 焯水 再 红烧")]}
+
+    builder = StateGraph(FakeState)
+    builder.add_node("analyze_and_route_query", analyze_and_route_query)
+    builder.add_node("respond_to_general_query", respond_to_general_query)
+    builder.add_edge(START, "analyze_and_route_query")
+    builder.add_edge("analyze_and_route_query", "respond_to_general_query")
+    builder.add_edge("respond_to_general_query", END)
+    return builder.compile()
+
+
+def _collect(monkeypatch, streaming: bool, lookup: Optional[CacheLookup] = None):
+    cache = RecordingCache()
+    monkeypatch.setattr(chat, "graph", _build_graph(streaming))
+    monkeypatch.setattr(chat, "get_response_cache", lambda: cache)
+
+    async def run() -> List[Dict[str, Any]]:
+        chunks = []
+        async for line in chat.stream_agent_response(
+            "红烧肉怎么做", "s1", cache_lookup=lookup or CacheLookup(status="miss")
+        ):
+            assert line.startswith("data: ") and line.endswith("\n\n")
+            chunks.append(json.loads(line[len("data: "):]))
+        return chunks
+
+    return asyncio.run(run()), cache
+
+
+def test_stream_forwards_llm_tokens_and_progress(monkeypatch) -> None:
+    chunks, cache = _collect(monkeypatch, streaming=True)
+
+    types = [chunk["type"] for chunk in chunks]
+    messages = [chunk["content"] for chunk in chunks if chunk["type"] == "message"]
+    assert len(messages) > 1  # token by token, not one final blob
+    assert "".join(messages) == "先 焯水 再 红烧"
+
+    progress = [chunk["metadata"]["node"] for chunk in chunks if chunk["type"] == "progress"]
+    assert progress == ["analyze_and_route_query", "respond_to_general_query"]
+    route = next(chunk for chunk in chunks if chunk.get("route"))
+    assert route["route"] == "general-query"
+    assert types.index("metadata", 1) < types.index("message")  # route arrives before the answer
+    assert types[-1] == "done"
+    assert cache.stored[0]["message"] == "先 焯水 再 红烧"
+
+
+def test_stream_without_llm_tokens_sends_answer_once(monkeypatch) -> None:
+    chunks, cache = _collect(monkeypatch, streaming=False)
+
+    messages = [chunk["content"] for chunk in chunks if chunk["type"] == "message"]
+    assert messages == ["先 焯水 再 红烧"]
+    assert chunks[-1]["type"] == "done"
+
+
+def test_stream_cache_hit_skips_graph(monkeypatch) -> None:
+    lookup = CacheLookup(
+        status="hit",
+        tier="lru",
+        payload={"message": "缓存答案", "route": "kb-query", "sources": [{"source": "kb"}]},
+    )
+    chunks, cache = _collect(monkeypatch, streaming=True, lookup=lookup)
+
+    assert [chunk["type"] for chunk in chunks] == ["metadata", "metadata", "message", "done"]
+    assert chunks[2]["content"] == "缓存答案"
+    assert chunks[3]["metadata"]["sources"] == [{"source": "kb"}]
+    assert cache.stored == []
+
+
+def test_disabled_cache_skips_conversation_state(monkeypatch) -> None:
+    class NoStateGraph:
+        async def aget_state(self, config):
+            raise AssertionError("conversation state should not be read")
+
+    monkeypatch.setattr(chat, "graph", NoStateGraph())
+    monkeypatch.setattr(chat, "get_response_cache", lambda: ResponseCache(enabled=False))
+
+    lookup = asyncio.run(chat.lookup_cached_answer("红烧肉怎么做", "s1"))
+    assert lookup.status == "bypass"
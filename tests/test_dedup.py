@@ -0,0 +1,109 @@
+"""
+近重复候选裁剪测试（MinHash 文本相似 + 向量余弦折叠，不依赖 Milvus 与 rerank 服务）
+"""
+import asyncio
+
+import pytest
+
+from gustobot.config import settings
+from gustobot.infrastructure.knowledge.dedup import MinHasher, prune_near_duplicates
+from gustobot.infrastructure.knowledge.knowledge_service import KnowledgeService
+
+GONGBAO = "菜名：宫保鸡丁\n菜系：川菜\n历史：宫保鸡丁由清朝四川总督丁宝桢创制，丁宝桢被追赠太子太保，尊称丁宫保，菜因此得名。"
+# 重复上传：仅空白与标点不同
+GONGBAO_REUPLOAD = "菜名：宫保鸡丁 菜系：川菜。历史：宫保鸡丁由清朝四川总督丁宝桢创制，丁宝桢被追赠太子太保，尊称丁宫保，菜因此得名！"
+YUXIANG = "菜名：鱼香肉丝\n菜系：川菜\n历史：鱼香肉丝起源于四川民间，以泡辣椒、姜、葱、蒜模拟鱼香味。"
+MAPO = "菜名：麻婆豆腐\n菜系：川菜\n历史：麻婆豆腐相传为清朝同治年间成都陈兴盛饭铺老板娘陈刘氏所创。"
+
+
+def test_minhash_estimates_shingle_similarity():
+    hasher = MinHasher()
+    original = hasher.signature(GONGBAO)
+
+    assert hasher.similarity(original, hasher.signature(GONGBAO_REUPLOAD)) == 1.0
+    assert hasher.similarity(original, hasher.signature(YUXIANG)) < 0.2
+    assert hasher.signature("  ，。") is None
+
+
+def test_prune_keeps_best_ranked_copy_and_collapses_close_vectors():
+    hits = [
+        {"id": "g1", "content": GONGBAO, "embedding": [1.0, 0.0, 0.0]},
+        {"id": "y1", "content": YUXIANG, "embedding": [0.0, 1.0, 0.0]},
+        {"id": "g2", "content": GONGBAO_REUPLOAD, "embedding": [0.0, 0.0, 1.0]},
+        # 文本不同但向量几乎相同（改写后的同一段内容）
+        {"id": "y2", "content": MAPO, "embedding": [0.01, 1.0, 0.0]},
+    ]
+
+    kept, pruned = prune_near_duplicates(hits, jaccard_threshold=0.8, embedding_threshold=0.97)
+
+    assert pruned == 2
+    assert [hit["id"] for hit in kept] == ["g1", "y1"]
+    assert kept[0]["near_duplicates"] == ["g2"]
+    assert kept[1]["near_duplicates"] == ["y2"]
+    assert all("embedding" not in hit for hit in kept)
+
+    kept, pruned = prune_near_duplicates(hits, jaccard_threshold=0.8, embedding_threshold=None)
+    assert [hit["id"] for hit in kept] == ["g1", "y1", "y2"]
+
+
+class FakeEmbedder:
+    async def aembed_documents(self, texts):
+        return [[0.0] for _ in texts]
+
+
+class FakeVectorStore:
+    def __init__(self) -> None:
+        self.output_vectors = []
+
+    def search_batch(self, embeddings, top_k=10, filter_expr=None, search_params=None, output_vectors=False):
+        self.output_vectors.append(output_vectors)
+        hits = [
+            {"id": "g1", "content": GONGBAO, "score": 0.9, "embedding": [1.0, 0.0]},
+            {"id": "g2", "content": GONGBAO_REUPLOAD, "score": 0.85, "embedding": [0.6, 0.8]},
+            {"id": "y1", "content": YUXIANG, "score": 0.8, "embedding": [0.0, 1.0]},
+        ]
+        return [hits[:top_k] for _ in embeddings]
+
+
+class RecordingReranker:
+    enabled = True
+
+    def __init__(self) -> None:
+        self.sent = []
+
+    async def rerank(self, query, documents, top_k):
+        self.sent.append([doc["id"] for doc in documents])
+        return [{**doc, "rerank_score": 1.0} for doc in documents][:top_k]
+
+
+@pytest.fixture
+def knowledge(monkeypatch):
+    monkeypatch.setattr(settings, "KB_HYBRID_ENABLED", False)
+    monkeypatch.setattr(settings, "KB_SEARCH_BATCH_WINDOW_MS", 0.0)
+    monkeypatch.setattr(settings, "KB_DEDUP_ENABLED", True)
+    service = KnowledgeService(vector_store=FakeVectorStore())
+    service.embedder = FakeEmbedder()
+    service.reranker = RecordingReranker()
+    return service
+
+
+def test_search_prunes_before_rerank_and_reports(knowledge):
+    report = {}
+    results = asyncio.run(knowledge.search("宫保鸡丁的由来", top_k=3, report=report))
+
+    assert knowledge.vector_store.output_vectors == [True]
+    assert knowledge.reranker.sent == [["g1", "y1"]]
+    assert [hit["id"] for hit in results] == ["g1", "y1"]
+    assert results[0]["near_duplicates"] == ["g2"]
+    assert all("embedding" not in hit for hit in results)
+    assert report == {"candidates": 3, "pruned": 1}
+
+
+def test_dedup_can_be_disabled(knowledge, monkeypatch):
+    monkeypatch.setattr(settings, "KB_DEDUP_ENABLED", False)
+    reports = []
+    results = asyncio.run(knowledge.search_many(["宫保鸡丁的由来"], top_k=3, reports=reports))
+
+    assert knowledge.vector_store.output_vectors == [False]
+    assert [hit["id"] for hit in results[0]] == ["g1", "g2", "y1"]
+    assert reports == [{"candidates": 3, "pruned": 0}]
@@ -0,0 +1,162 @@
+"""
+共享嵌入服务测试（连接复用、请求合并、两级缓存）
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from gustobot.config import settings
+from gustobot.infrastructure.knowledge import embedding_service
+from gustobot.infrastructure.knowledge.embedding_service import EmbeddingService, get_embedding_service
+
+
+class FakeEmbeddingsAPI:
+    """Stand-in for `AsyncOpenAI().embeddings` that records every call."""
+
+    def __init__(self, gate: asyncio.Event = None) -> None:
+        self.calls = []
+        self.gate = gate
+
+    async def create(self, *, model, input, timeout=None):
+        self.calls.append(list(input))
+        if self.gate is not None:
+            await self.gate.wait()
+        data = [
+            SimpleNamespace(index=idx, embedding=[float(len(text)), float(idx), 1.0])
+            for idx, text in enumerate(input)
+        ]
+        return SimpleNamespace(data=data)
+
+
+def _make_service(api, **kwargs):
+    params = {
+        "model": "test-embedding",
+        "cache_size": 16,
+        "persistent_cache": False,
+        "async_client": SimpleNamespace(embeddings=api),
+    }
+    params.update(kwargs)
+    return EmbeddingService(**params)
+
+
+def test_lru_serves_repeated_texts_and_preserves_order():
+    api = FakeEmbeddingsAPI()
+    service = _make_service(api)
+
+    async def scenario():
+        first = await service.embed(["红烧肉", "", "红烧肉"])
+        second = await service.embed(["红烧肉"])
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert api.calls == [["红烧肉", " "]]
+    assert first[0] == first[2] == second[0] == [3.0, 0.0, 1.0]
+    assert service.stats["lru_hits"] == 1
+
+
+def test_concurrent_identical_texts_share_one_call():
+    async def scenario():
+        api = FakeEmbeddingsAPI(gate=asyncio.Event())
+        service = _make_service(api)
+        tasks = [asyncio.create_task(service.embed_query("宫保鸡丁")) for _ in range(5)]
+        await asyncio.sleep(0)
+        api.gate.set()
+        return api, service, await asyncio.gather(*tasks)
+
+    api, service, vectors = asyncio.run(scenario())
+    assert len(api.calls) == 1
+    assert all(vector == vectors[0] for vector in vectors)
+    assert service.stats["coalesced"] == 4
+
+
+def test_failed_call_propagates_to_waiters_and_is_not_cached():
+    class FailingAPI(FakeEmbeddingsAPI):
+        async def create(self, **kwargs):
+            self.calls.append(kwargs["input"])
+            await asyncio.sleep(0)
+            raise RuntimeError("boom")
+
+    api = FailingAPI()
+    service = _make_service(api)
+
+    async def scenario():
+        return await asyncio.gather(
+            service.embed_query("麻婆豆腐"),
+            service.embed_query("麻婆豆腐"),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert len(api.calls) == 1
+    assert not service._inflight
+    with pytest.raises(RuntimeError):
+        asyncio.run(service.embed_query("麻婆豆腐"))
+    assert len(api.calls) == 2
+
+
+def test_cancelling_the_owner_does_not_fail_coalesced_waiters():
+    async def scenario():
+        api = FakeEmbeddingsAPI(gate=asyncio.Event())
+        service = _make_service(api)
+        owner = asyncio.create_task(service.embed_query("回锅肉"))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(service.embed_query("回锅肉"))
+        await asyncio.sleep(0)
+        owner.cancel()
+        await asyncio.sleep(0)
+        api.gate.set()
+        vector = await waiter
+        cached = await service.embed_query("回锅肉")
+        return api, service, owner, vector, cached
+
+    api, service, owner, vector, cached = asyncio.run(scenario())
+    assert owner.cancelled()
+    assert vector == cached == [3.0, 0.0, 1.0]
+    assert len(api.calls) == 1
+    assert service.stats["coalesced"] == 1
+    assert not service._inflight
+
+
+def test_persistent_tier_is_shared_between_processes(fake_redis):
+    writer_api, reader_api = FakeEmbeddingsAPI(), FakeEmbeddingsAPI()
+    writer = _make_service(writer_api, persistent_cache=True, redis_client=fake_redis)
+    reader = _make_service(reader_api, persistent_cache=True, redis_client=fake_redis)
+
+    async def scenario():
+        expected = await writer.embed(["鱼香肉丝", "回锅肉"])
+        return expected, await reader.embed(["回锅肉", "鱼香肉丝"])
+
+    expected, cached = asyncio.run(scenario())
+    assert reader_api.calls == []
+    assert cached == [expected[1], expected[0]]
+    assert reader.stats["persistent_hits"] == 2
+
+
+def test_shared_service_is_keyed_on_credentials_and_request_shape(monkeypatch):
+    monkeypatch.setattr(embedding_service, "_services", {})
+    monkeypatch.setattr(settings, "EMBEDDING_CACHE_BACKEND", "none")
+    monkeypatch.setattr(settings, "EMBEDDING_BASE_URL", None)
+    monkeypatch.setattr(settings, "EMBEDDING_API_KEY", None)
+    # OPENAI_API_BASE / OPENAI_API_KEY 是 LLM_BASE_URL / LLM_API_KEY 的别名
+    monkeypatch.setattr(settings, "LLM_BASE_URL", "https://openai.example/v1")
+    monkeypatch.setattr(settings, "LLM_API_KEY", "sk-openai")
+
+    shared = get_embedding_service("m")
+    assert get_embedding_service("m", api_key="sk-openai", request_timeout=60) is shared
+    # 未配置 EMBEDDING_* 时沿用 OPENAI_API_BASE / OPENAI_API_KEY
+    assert (shared.base_url, shared._api_key) == ("https://openai.example/v1", "sk-openai")
+
+    variants = [
+        get_embedding_service("m", api_key="sk-other"),
+        get_embedding_service("m", dimension=512),
+        get_embedding_service("m", request_timeout=5.0),
+        get_embedding_service("m", max_batch_size=8),
+        get_embedding_service("m", base_url="https://other.example/v1"),
+    ]
+    assert len({id(service) for service in [shared, *variants]}) == 6
+    assert (variants[1].dimension, variants[2].request_timeout, variants[3].max_batch_size) == (512, 5.0, 8)
+
+    monkeypatch.setattr(settings, "EMBEDDING_API_KEY", "sk-embedding")
+    assert get_embedding_service("m")._api_key == "sk-embedding"
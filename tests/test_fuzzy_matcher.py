@@ -0,0 +1,46 @@
+"""
+索引化模糊匹配测试：结果与逐实体全量打分一致（含并列顺序与按类型匹配）
+"""
+from gustobot.infrastructure.knowledge.recipe_kg.fuzzy_matcher import FuzzyMatcher
+
+ENTITIES = {
+    "Dish": ["宫保鸡丁", "鱼香肉丝", "红烧肉", "番茄炒蛋", "麻婆豆腐", "红烧排骨", "宫保虾球"],
+    "Ingredient": ["鸡丁", "猪肉", "番茄", "鸡蛋", "豆腐", "排骨", "虾仁", "红烧肉"],
+    "口味": ["麻辣", "鱼香", "酱香"],
+}
+QUESTIONS = [
+    "宫保鸡丁怎么做",
+    "保宫丁鸡的做法",
+    "红烧的排骨要多久",
+    "番茄鸡蛋",
+    "我想吃麻辣的豆腐",
+    "今天天气怎么样",
+    "",
+]
+
+
+def test_match_equals_linear_scan() -> None:
+    matcher = FuzzyMatcher(ENTITIES)
+    for question in QUESTIONS:
+        for threshold in (0.3, 0.5, 0.85):
+            for top_k in (1, 3, 10):
+                expected = matcher._linear_match(question, threshold, top_k)
+                actual = matcher.match(question, threshold=threshold, top_k=top_k)
+                assert list(actual.items()) == list(expected.items()), (question, threshold, top_k)
+
+
+def test_match_entity_type_equals_linear_scan() -> None:
+    matcher = FuzzyMatcher(ENTITIES)
+    for question in QUESTIONS:
+        for entity_type in ("Dish", "Ingredient", "口味", "未知"):
+            for threshold in (0.3, 0.5, 0.85):
+                expected = matcher._linear_match_entity_type(question, entity_type, threshold)
+                assert matcher.match_entity_type(question, entity_type, threshold) == expected
+
+
+def test_result_shape_lists_all_types() -> None:
+    matcher = FuzzyMatcher(ENTITIES)
+
+    result = matcher.match("红烧肉怎么做", threshold=0.85, top_k=3)
+
+    assert result["红烧肉"] == ["Dish", "Ingredient"]
@@ -0,0 +1,90 @@
+"""
+Milvus 索引配置与离线调优测试（不依赖 Milvus）
+"""
+from types import SimpleNamespace
+
+import numpy as np
+
+from gustobot.config.settings import Settings
+from gustobot.infrastructure.knowledge.index_tuning import exact_top_k, recall_at_k, recommend, sweep
+from gustobot.infrastructure.knowledge.vector_store import resolve_index_profile
+
+
+class FakeCollection:
+    """按 nprobe 截断候选集合模拟近似检索：nprobe 越大越接近精确结果"""
+
+    def __init__(self, ids, corpus):
+        self.ids = ids
+        self.corpus = corpus
+
+    def search(self, data, anns_field, param, limit, output_fields):
+        query = np.asarray(data, dtype=np.float32)
+        visible = max(limit, len(self.ids) * param["params"]["nprobe"] // 8)
+        rows = exact_top_k(self.corpus[:visible], query, limit)[0]
+        return [[SimpleNamespace(id=self.ids[row]) for row in rows]]
+
+
+def test_profiles_resolve_with_overrides():
+    profile = resolve_index_profile("hnsw", {"M": 32}, {"ef": 8})
+    assert profile.build_params == {"M": 32, "efConstruction": 200}
+    # ef 不得小于 top_k
+    assert profile.search_params_for(top_k=20) == {"ef": 20}
+    assert resolve_index_profile("IVF_SQ8").search_params_for(10, {"nprobe": 4}) == {"nprobe": 4}
+    assert resolve_index_profile("SCANN").build_params == {}
+
+
+def test_settings_per_collection_index_config():
+    config = Settings(
+        MILVUS_INDEX_TYPE="IVF_FLAT",
+        MILVUS_INDEX_PROFILES="recipes:hnsw, faq:IVF_SQ8",
+        MILVUS_INDEX_PARAMS="recipes:M=32,faq:nlist=1024",
+        MILVUS_SEARCH_PARAMS="recipes:ef=96",
+    )
+    assert config.milvus_index_config("recipes") == ("HNSW", {"M": 32}, {"ef": 96})
+    assert config.milvus_index_config("faq") == ("IVF_SQ8", {"nlist": 1024}, {})
+    assert config.milvus_index_config("other") == ("IVF_FLAT", {}, {})
+
+
+def test_settings_index_params_keep_their_types():
+    config = Settings(
+        MILVUS_INDEX_PROFILES="recipes:IVF_FLAT",
+        MILVUS_INDEX_PARAMS="recipes:nlist=1024",
+        MILVUS_SEARCH_PARAMS="recipes:nprobe=16, recipes:radius=0.8, recipes:range_filter=1e0, recipes:level=high",
+    )
+    _, index_params, search_params = config.milvus_index_config("recipes")
+    assert index_params == {"nlist": 1024}
+    assert search_params == {"nprobe": 16, "radius": 0.8, "range_filter": 1.0, "level": "high"}
+    assert isinstance(search_params["nprobe"], int)
+    assert isinstance(search_params["radius"], float)
+
+
+def test_exact_top_k_metrics():
+    corpus = np.array([[1, 0], [0, 1], [0.6, 0.8], [10, 0]], dtype=np.float32)
+    query = np.array([[1, 0]], dtype=np.float32)
+    assert exact_top_k(corpus, query, 2, "IP").tolist() == [[3, 0]]
+    assert exact_top_k(corpus, query, 2, "L2").tolist() == [[0, 2]]
+    assert exact_top_k(corpus, query, 2, "COSINE")[0][0] in (0, 3)
+    assert recall_at_k([["a", "b"], ["c", "x"]], [["a", "b"], ["c", "d"]]) == 0.75
+
+
+def test_sweep_recommends_cheapest_setting_meeting_target():
+    rng = np.random.default_rng(0)
+    corpus = rng.standard_normal((400, 8)).astype(np.float32)
+    ids = [f"doc_{index}" for index in range(len(corpus))]
+    queries = corpus[rng.choice(len(corpus), size=20, replace=False)]
+    truth = [[ids[row] for row in hits] for hits in exact_top_k(corpus, queries, 5)]
+    store = SimpleNamespace(
+        collection=FakeCollection(ids, corpus),
+        profile=resolve_index_profile("IVF_FLAT"),
+        metric_type="IP",
+    )
+
+    points = sweep(store, queries, truth, top_k=5, values=[1, 2, 4, 8])
+    assert [point.params["nprobe"] for point in points] == [1, 2, 4, 8]
+    assert points[-1].recall == 1.0
+    assert points[0].recall < 1.0
+
+    best = recommend(points, target_recall=1.0, sweep_param="nprobe")
+    assert best is points[-1]
+    assert recommend(points, target_recall=0.0, sweep_param="nprobe") is points[0]
+    assert recommend(points[:1], target_recall=1.0, sweep_param="nprobe") is None
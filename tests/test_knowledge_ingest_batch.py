@@ -0,0 +1,164 @@
+"""
+知识库批量导入测试（add_recipes_batch、延迟 flush 与按 ID 删除，不依赖 Milvus 与嵌入服务）
+"""
+import asyncio
+
+import pytest
+
+from gustobot.config import settings
+from gustobot.infrastructure.knowledge import vector_store as vector_store_module
+from gustobot.infrastructure.knowledge.knowledge_service import KnowledgeService
+from gustobot.infrastructure.knowledge.vector_store import VectorStore, in_expr
+
+
+class FakeEmbedder:
+    """先提交的请求后返回，打乱完成顺序；含 boom 的批次抛错，并记录同时在途的请求数"""
+
+    def __init__(self) -> None:
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def aembed_documents(self, texts):
+        self.calls.append(list(texts))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.01 / len(self.calls))
+            if any("boom" in text for text in texts):
+                raise RuntimeError("embedding backend down")
+            return [[float(len(text))] for text in texts]
+        finally:
+            self.in_flight -= 1
+
+
+class FakeVectorStore:
+    def __init__(self) -> None:
+        self.inserted = []
+        self.flush_checks = []
+        self.flushes = 0
+
+    def add_documents(self, ids, embeddings, documents, metadatas=None, flush=True):
+        assert flush is False
+        self.inserted.append(list(ids))
+        return True
+
+    def flush_if_due(self, max_rows=0, max_interval=0.0):
+        self.flush_checks.append((max_rows, max_interval))
+        return False
+
+    def flush(self):
+        self.flushes += 1
+        return True
+
+
+class FakeCollection:
+    def __init__(self) -> None:
+        self.inserts = 0
+        self.flushes = 0
+        self.deletes = []
+
+    def insert(self, entities):
+        self.inserts += 1
+
+    def delete(self, expr):
+        self.deletes.append(expr)
+
+    def flush(self):
+        self.flushes += 1
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setattr(settings, "KB_INGEST_EMBED_BATCH_SIZE", 1)
+    monkeypatch.setattr(settings, "KB_INGEST_EMBED_CONCURRENCY", 2)
+    monkeypatch.setattr(settings, "KB_INGEST_INSERT_BATCH_SIZE", 2)
+    knowledge = KnowledgeService(vector_store=FakeVectorStore())
+    knowledge.embedder = FakeEmbedder()
+    return knowledge
+
+
+def _recipe(recipe_id, name):
+    return {"id": recipe_id, "name": name, "category": "家常菜"}
+
+
+def test_batch_results_follow_input_order(service):
+    recipes = [_recipe(f"r{index}", f"菜{index}") for index in range(5)]
+    result = asyncio.run(service.add_recipes_batch(recipes))
+
+    assert [item["recipe_id"] for item in result["items"]] == ["r0", "r1", "r2", "r3", "r4"]
+    assert result["success"] == result["total"] == 5
+    assert result["flushed"] is True
+    # 嵌入请求逐个补位，同时在途的不超过并发上限
+    assert len(service.embedder.calls) == 5
+    assert service.embedder.max_in_flight == 2
+    # 每个 segment 插入后检查一次是否需要 flush，最后统一 flush 一次
+    inserted = [doc_id for batch in service.vector_store.inserted for doc_id in batch]
+    assert sorted(inserted) == [f"r{index}_0" for index in range(5)]
+    assert len(service.vector_store.flush_checks) == len(service.vector_store.inserted)
+    assert service.vector_store.flushes == 1
+
+
+def test_failed_embedding_only_fails_its_recipes(service):
+    recipes = [_recipe("r0", "红烧肉"), _recipe("r1", "boom"), _recipe("r2", "麻婆豆腐"), {"id": "r3"}]
+    result = asyncio.run(service.add_recipes_batch(recipes))
+
+    items = {item["recipe_id"]: item for item in result["items"]}
+    assert result["success"] == 2 and result["error"] == 2
+    assert items["r0"]["success"] and items["r2"]["success"]
+    assert not items["r1"]["success"]
+    assert items["r1"]["error"].startswith("embedding failed")
+    assert items["r3"]["error"] == "empty recipe document"
+    inserted = sorted(doc_id for batch in service.vector_store.inserted for doc_id in batch)
+    assert inserted == ["r0_0", "r2_0"]
+
+
+def test_flush_waits_for_row_threshold_or_interval(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(VectorStore, "_initialize", lambda self: None)
+    monkeypatch.setattr(vector_store_module.time, "monotonic", lambda: now[0])
+    store = VectorStore()
+    store.collection = FakeCollection()
+
+    assert store.flush_if_due(max_rows=3, max_interval=5.0) is False  # 没有待 flush 的数据
+
+    assert store.add_documents(["a", "b"], [[0.1], [0.2]], ["a", "b"], flush=False)
+    assert store.flush_if_due(max_rows=3, max_interval=5.0) is False
+    now[0] += 4.9
+    assert store.flush_if_due(max_rows=3, max_interval=5.0) is False
+    assert store.collection.flushes == 0
+
+    # 行数达到阈值
+    store.add_documents(["c"], [[0.3]], ["c"], flush=False)
+    assert store.flush_if_due(max_rows=3, max_interval=5.0) is True
+    assert store.collection.flushes == 1
+
+    # 间隔从 flush 后第一次写入重新计时
+    now[0] += 10.0
+    store.add_documents(["d"], [[0.4]], ["d"], flush=False)
+    now[0] += 4.0
+    assert store.flush_if_due(max_rows=3, max_interval=5.0) is False
+    now[0] += 1.0
+    assert store.flush_if_due(max_rows=3, max_interval=5.0) is True
+    assert store.collection.flushes == 2
+
+    # 阈值为 0 时不按该条件触发；flush() 在没有待 flush 数据时不访问 Milvus
+    store.add_documents(["e"], [[0.5]], ["e"], flush=False)
+    now[0] += 60.0
+    assert store.flush_if_due() is False
+    assert store.flush() is True and store.flush() is True
+    assert store.collection.flushes == 3
+
+
+def test_delete_filters_escape_ids(monkeypatch):
+    monkeypatch.setattr(VectorStore, "_initialize", lambda self: None)
+    store = VectorStore()
+    store.collection = FakeCollection()
+
+    assert store.delete_by_recipe(['r1', 'a"] or id != "', "红烧肉\\"])
+    assert store.delete_documents(["r1_0"])
+    assert store.collection.deletes == [
+        'recipe_id in ["r1", "a\\"] or id != \\"", "红烧肉\\\\"]',
+        'id in ["r1_0"]',
+    ]
+    assert in_expr("recipe_id", []) == "recipe_id in []"
@@ -0,0 +1,114 @@
+"""
+KnowledgeService 进程级注册表测试（不依赖 Milvus）
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from gustobot.infrastructure.knowledge.registry import (
+    KnowledgeServiceRegistry,
+    KnowledgeServiceUnavailable,
+)
+
+
+class FakeVectorStore:
+    dimension = 4
+
+    def __init__(self) -> None:
+        self.searches = 0
+        self.reconnects = 0
+        self.closed = False
+        self.healthy = True
+
+    def search(self, embedding, top_k=10, filter_expr=None):
+        self.searches += 1
+        return []
+
+    def ping(self):
+        if not self.healthy:
+            raise ConnectionError("milvus down")
+        return {"server_version": "v2.3", "loaded": True, "document_count": 3}
+
+    def reconnect(self):
+        self.reconnects += 1
+        self.healthy = True
+
+    def close(self):
+        self.closed = True
+
+
+class FakeReranker:
+    def __init__(self) -> None:
+        self.closed = False
+
+    async def aclose(self):
+        self.closed = True
+
+
+class CountingFactory:
+    def __init__(self, failures: int = 0) -> None:
+        self.calls = 0
+        self.failures = failures
+        self.store = FakeVectorStore()
+        self.reranker = FakeReranker()
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise ConnectionError("cannot connect")
+        return SimpleNamespace(vector_store=self.store, reranker=self.reranker)
+
+
+def _registry(factory, **kwargs):
+    params = {"health_check_interval": 0, "reconnect_backoff": 60}
+    params.update(kwargs)
+    return KnowledgeServiceRegistry(factory, **params)
+
+
+def test_service_is_created_once_and_warmed_up():
+    factory = CountingFactory()
+    registry = _registry(factory)
+
+    async def scenario():
+        await registry.start(warm_up=True)
+        return registry.get(), registry.get()
+
+    first, second = asyncio.run(scenario())
+    assert first is second
+    assert factory.calls == 1
+    assert factory.store.searches == 1
+
+
+def test_startup_failure_is_tolerated_and_backed_off():
+    factory = CountingFactory(failures=1)
+    registry = _registry(factory)
+
+    asyncio.run(registry.start(warm_up=False))
+    assert not registry.started
+    with pytest.raises(KnowledgeServiceUnavailable):
+        registry.get()
+    assert factory.calls == 1
+
+    registry.reconnect_backoff = 0
+    assert registry.get() is registry.get()
+    assert factory.calls == 2
+
+
+def test_health_reconnects_and_shutdown_closes():
+    factory = CountingFactory()
+    registry = _registry(factory, reconnect_backoff=0)
+
+    async def scenario():
+        await registry.start(warm_up=False)
+        factory.store.healthy = False
+        health = await registry.health()
+        await registry.shutdown()
+        return health
+
+    health = asyncio.run(scenario())
+    assert health["status"] == "healthy"
+    assert factory.store.reconnects == 1
+    assert factory.store.closed
+    assert factory.reranker.closed
+    assert not registry.started
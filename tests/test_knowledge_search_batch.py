@@ -0,0 +1,97 @@
+"""
+知识库批量检索测试（search_many 与并发请求微批合并，不依赖 Milvus 与嵌入服务）
+"""
+import asyncio
+
+import pytest
+
+from gustobot.config import settings
+from gustobot.infrastructure.knowledge.knowledge_service import KnowledgeService
+from gustobot.infrastructure.knowledge.search_batcher import MicroBatcher
+
+
+class FakeEmbedder:
+    def __init__(self) -> None:
+        self.calls = []
+
+    async def aembed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(text))] for text in texts]
+
+
+class FakeVectorStore:
+    """每个查询返回以查询向量标记的候选，便于校验结果拆分是否对应原查询"""
+
+    def __init__(self) -> None:
+        self.calls = []
+
+    def search_batch(self, embeddings, top_k=10, filter_expr=None, search_params=None, output_vectors=False):
+        self.calls.append((len(embeddings), top_k, filter_expr))
+        return [
+            [{"id": f"{vector[0]}-{rank}", "content": "", "score": 0.9 - rank * 0.1} for rank in range(top_k)]
+            for vector in embeddings
+        ]
+
+
+@pytest.fixture
+def service(monkeypatch):
+    def build(window_ms=0.0):
+        monkeypatch.setattr(settings, "KB_SEARCH_BATCH_WINDOW_MS", window_ms)
+        knowledge = KnowledgeService(vector_store=FakeVectorStore())
+        knowledge.embedder = FakeEmbedder()
+        knowledge.reranker.enabled = False
+        return knowledge
+
+    return build
+
+
+def test_search_many_uses_one_embedding_and_one_ann_call(service):
+    knowledge = service()
+    results = asyncio.run(knowledge.search_many(["a", "", "abc"], top_k=2, similarity_threshold=0.0))
+
+    assert knowledge.embedder.calls == [["a", "abc"]]
+    assert knowledge.vector_store.calls == [(2, 2, None)]
+    assert [[doc["id"] for doc in docs] for docs in results] == [["1.0-0", "1.0-1"], [], ["3.0-0", "3.0-1"]]
+
+
+def test_concurrent_searches_are_micro_batched(service):
+    knowledge = service(window_ms=50)
+
+    async def scenario():
+        return await asyncio.gather(
+            knowledge.search("a", top_k=1, similarity_threshold=0.0),
+            knowledge.search("ab", top_k=3, similarity_threshold=0.0),
+            knowledge.search("abc", top_k=2, similarity_threshold=0.0, filter_expr="category == '汤'"),
+        )
+
+    first, second, third = asyncio.run(scenario())
+
+    assert knowledge.embedder.calls == [["a", "ab", "abc"]]
+    # 同一过滤条件合并为一次检索，召回数取批次内最大值后按请求截断
+    assert sorted(knowledge.vector_store.calls, key=str) == sorted(
+        [(2, 3, None), (1, 2, "category == '汤'")], key=str
+    )
+    assert [doc["id"] for doc in first] == ["1.0-0"]
+    assert [doc["id"] for doc in second] == ["2.0-0", "2.0-1", "2.0-2"]
+    assert [doc["id"] for doc in third] == ["3.0-0", "3.0-1"]
+
+
+def test_micro_batcher_flushes_at_max_batch_and_propagates_errors():
+    async def dispatch(requests):
+        if "boom" in requests:
+            raise ValueError("dispatch failed")
+        return [request.upper() for request in requests]
+
+    async def scenario():
+        batcher = MicroBatcher(dispatch, window=10.0, max_batch=2)
+        # 达到 max_batch 立即发出，不等待 10 秒窗口
+        results = await asyncio.wait_for(asyncio.gather(batcher.submit("x"), batcher.submit("y")), 1.0)
+        failed = await asyncio.wait_for(
+            asyncio.gather(batcher.submit("boom"), batcher.submit("z"), return_exceptions=True), 1.0
+        )
+        return results, failed, batcher.stats
+
+    results, failed, stats = asyncio.run(scenario())
+    assert results == ["X", "Y"]
+    assert all(isinstance(item, ValueError) for item in failed)
+    assert stats == {"requests": 4, "batches": 2, "max_batch": 2}
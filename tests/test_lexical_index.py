@@ -0,0 +1,155 @@
+"""
+本地 BM25 词法索引与混合检索（RRF 融合、跳过 rerank）测试，不依赖 Milvus
+"""
+import asyncio
+
+import pytest
+
+from gustobot.config import settings
+from gustobot.infrastructure.knowledge.knowledge_service import KnowledgeService
+from gustobot.infrastructure.knowledge.lexical_index import (
+    LexicalIndex,
+    bigram_tokens,
+    reciprocal_rank_fusion,
+)
+
+DOCS = {
+    "gongbao_0": ("菜名：宫保鸡丁\n食材：鸡胸肉、花生米、干辣椒", "宫保鸡丁"),
+    "yuxiang_0": ("菜名：鱼香肉丝\n食材：猪里脊、木耳、胡萝卜", "鱼香肉丝"),
+    "tomato_0": ("菜名：番茄炒蛋\n食材：番茄、鸡蛋", "番茄炒蛋"),
+}
+
+
+def test_bigram_tokens_mix_cjk_and_words():
+    assert bigram_tokens("宫保鸡丁 BBQ-sauce 2勺") == ["宫保", "保鸡", "鸡丁", "bbq", "sauce", "2", "勺"]
+
+
+def test_bm25_ranks_exact_name_and_tracks_removal():
+    index = LexicalIndex()
+    for doc_id, (content, name) in DOCS.items():
+        index.add(doc_id, content, {"name": name})
+
+    hits = index.search("宫保鸡丁怎么做", top_k=2)
+    assert hits[0]["id"] == "gongbao_0"
+    assert hits[0]["metadata"] == {"name": "宫保鸡丁"}
+    # "怎么做"不在索引中，不计入覆盖率
+    assert hits[0]["lexical_match"] == pytest.approx(1.0)
+
+    index.remove(["gongbao_0"])
+    assert all(hit["id"] != "gongbao_0" for hit in index.search("宫保鸡丁"))
+    assert len(index) == 2
+
+
+def test_rebuild_replays_writes_made_during_the_rebuild():
+    index = LexicalIndex()
+
+    def documents():
+        yield "yuxiang_0", DOCS["yuxiang_0"][0], {}
+        # 重建过程中并发写入新分块
+        index.add("tomato_0", DOCS["tomato_0"][0], {})
+        yield "gongbao_0", DOCS["gongbao_0"][0], {}
+
+    index.rebuild(documents())
+    assert index.ready
+    assert {hit["id"] for hit in index.search("番茄 鱼香 宫保", top_k=5)} == {"yuxiang_0", "tomato_0", "gongbao_0"}
+
+
+def test_reciprocal_rank_fusion_merges_lists():
+    fused = reciprocal_rank_fusion(
+        {"vector": [{"id": "a", "score": 0.9}, {"id": "b", "score": 0.8}], "lexical": [{"id": "b"}, {"id": "c"}]},
+        k=60,
+    )
+    assert [hit["id"] for hit in fused] == ["b", "a", "c"]
+    assert fused[0]["retrievers"] == ["vector", "lexical"]
+    assert fused[0]["score"] == 0.8
+
+
+class FakeEmbedder:
+    async def aembed_documents(self, texts):
+        return [[0.0] for _ in texts]
+
+
+class FakeVectorStore:
+    """向量检索总是把鱼香肉丝排在首位，模拟 embedding 漏掉精确菜名"""
+
+    def search_batch(self, embeddings, top_k=10, filter_expr=None, search_params=None, output_vectors=False):
+        hit = {"id": "yuxiang_0", "content": DOCS["yuxiang_0"][0], "score": 0.6, "metadata": {"name": "鱼香肉丝"}}
+        return [[hit] for _ in embeddings]
+
+    def __init__(self) -> None:
+        self.deleted_recipes = []
+
+    def iter_documents(self):
+        for doc_id, (content, name) in DOCS.items():
+            yield {"id": doc_id, "content": content, "metadata": {"recipe_id": doc_id.rsplit("_", 1)[0], "name": name}}
+
+    def delete_by_recipe(self, recipe_ids):
+        self.deleted_recipes.extend(recipe_ids)
+        return True
+
+
+class CountingReranker:
+    enabled = True
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    async def rerank(self, query, documents, top_k):
+        self.calls += 1
+        return [{**doc, "rerank_score": 1.0} for doc in documents][:top_k]
+
+
+@pytest.fixture
+def hybrid_service(monkeypatch):
+    monkeypatch.setattr(settings, "KB_HYBRID_ENABLED", True)
+    monkeypatch.setattr(settings, "KB_SEARCH_BATCH_WINDOW_MS", 0.0)
+    service = KnowledgeService(vector_store=FakeVectorStore())
+    service.embedder = FakeEmbedder()
+    service.reranker = CountingReranker()
+    return service
+
+
+def test_exact_dish_name_is_found_lexically_without_reranking(hybrid_service):
+    results = asyncio.run(hybrid_service.search("宫保鸡丁怎么做", top_k=2))
+
+    assert results[0]["id"] == "gongbao_0"
+    assert results[0]["retrievers"] == ["lexical"]
+    assert hybrid_service.reranker.calls == 0
+
+
+def test_fused_candidates_are_reranked_when_retrievers_disagree(hybrid_service):
+    results = asyncio.run(hybrid_service.search("有花生米的菜", top_k=2))
+
+    assert hybrid_service.reranker.calls == 1
+    assert {hit["id"] for hit in results} == {"gongbao_0", "yuxiang_0"}
+
+
+def test_filtered_searches_stay_vector_only(hybrid_service):
+    results = asyncio.run(hybrid_service.search("宫保鸡丁", top_k=2, filter_expr="category == '川菜'"))
+
+    assert [hit["id"] for hit in results] == ["yuxiang_0"]
+    assert "retrievers" not in results[0]
+
+
+def test_weak_lexical_only_hits_are_dropped_without_rerank(hybrid_service, monkeypatch):
+    hybrid_service.reranker.enabled = False
+    query = "鸡丁、鸡蛋和猪里脊哪个好"
+
+    results = asyncio.run(hybrid_service.search(query, top_k=3))
+    # 鸡丁、鸡蛋各只覆盖问题中已索引词的四分之一
+    assert [hit["id"] for hit in results] == ["yuxiang_0"]
+
+    monkeypatch.setattr(settings, "KB_LEXICAL_MATCH_THRESHOLD", 0.2)
+    results = asyncio.run(hybrid_service.search(query, top_k=3))
+    assert {hit["id"] for hit in results} == {"yuxiang_0", "gongbao_0", "tomato_0"}
+    assert hybrid_service.reranker.calls == 0
+
+
+def test_delete_recipe_removes_all_of_its_chunks(hybrid_service):
+    asyncio.run(hybrid_service.search("宫保鸡丁", top_k=1))
+    hybrid_service.lexical_index.add("gongbao_1", "做法：鸡丁滑油后与花生米同炒", {"recipe_id": "gongbao"})
+
+    assert asyncio.run(hybrid_service.delete_recipe("gongbao"))
+    assert hybrid_service.vector_store.deleted_recipes == ["gongbao"]
+    assert hybrid_service.lexical_index.search("宫保鸡丁 花生米") == []
+    assert len(hybrid_service.lexical_index) == 2
@@ -0,0 +1,97 @@
+"""
+共享 Neo4j 连接的版本化 schema 缓存测试（不依赖 Neo4j）
+"""
+import threading
+
+import pytest
+
+from gustobot.application.agents.kg_sub_graph import kg_neo4j_conn
+from gustobot.application.agents.kg_sub_graph.agentic_rag_agents.components.text2cypher.validation import (
+    validators,
+)
+from gustobot.infrastructure.knowledge.recipe_kg import graph_importer_service
+
+
+class FakeGraph:
+    def __init__(self) -> None:
+        self.gate = threading.Event()
+        self.gate.set()
+        self.refreshes = 0
+        self.schema_reads = 0
+        self.structured_schema = {
+            "node_props": {"Dish": [{"property": "name", "type": "STRING", "values": ["宫保鸡丁"]}]},
+            "rel_props": {},
+            "relationships": [{"start": "Dish", "type": "HAS_INGREDIENT", "end": "Ingredient"}],
+            "metadata": {"constraint": [], "index": []},
+        }
+
+    @property
+    def get_structured_schema(self):
+        self.schema_reads += 1
+        return self.structured_schema
+
+    def refresh_schema(self) -> None:
+        self.gate.wait(5)
+        self.refreshes += 1
+
+
+@pytest.fixture
+def shared_graph(monkeypatch):
+    cache = kg_neo4j_conn.Neo4jSchemaCache(ttl=0)
+    graph = FakeGraph()
+    cache.graph = graph
+    cache.mark_loaded()
+    monkeypatch.setattr(kg_neo4j_conn, "_schema_cache", cache)
+    return graph
+
+
+def test_shared_graph_is_reused_and_refresh_bumps_version(shared_graph) -> None:
+    assert kg_neo4j_conn.get_neo4j_graph() is shared_graph
+    assert kg_neo4j_conn.get_neo4j_graph() is shared_graph
+    version = kg_neo4j_conn.get_neo4j_schema_version()
+
+    assert kg_neo4j_conn.refresh_neo4j_schema() == version + 1
+    assert shared_graph.refreshes == 1
+
+
+def test_ttl_expiry_refreshes_schema_in_background(shared_graph) -> None:
+    cache = kg_neo4j_conn.get_neo4j_schema_cache()
+    cache.ttl = 60
+    cache.loaded_at -= 120
+    version = cache.version
+    shared_graph.gate.clear()
+
+    # 刷新阻塞期间调用方立即拿到旧连接，且只启动一次刷新
+    assert kg_neo4j_conn.get_neo4j_graph() is shared_graph
+    assert kg_neo4j_conn.get_neo4j_graph() is shared_graph
+    assert shared_graph.refreshes == 0 and cache.version == version
+
+    shared_graph.gate.set()
+    with cache._lock:
+        pass
+
+    assert shared_graph.refreshes == 1
+    assert cache.version == version + 1
+    assert not cache.is_stale()
+
+
+def test_validation_schema_is_parsed_once_per_version(shared_graph) -> None:
+    first = validators.get_structured_schema(shared_graph)
+    assert validators.get_structured_schema(shared_graph) is first
+    assert shared_graph.schema_reads == 1
+
+    kg_neo4j_conn.refresh_neo4j_schema()
+
+    assert validators.get_structured_schema(shared_graph) is not first
+    assert shared_graph.schema_reads == 2
+
+    other = FakeGraph()
+    validators.get_structured_schema(other)
+    validators.get_structured_schema(other)
+    assert other.schema_reads == 2  # graphs other than the shared one are not cached
+
+
+def test_graph_import_triggers_schema_refresh(shared_graph) -> None:
+    graph_importer_service._notify_import_listeners()
+
+    assert shared_graph.refreshes == 1
@@ -0,0 +1,80 @@
+"""
+recipe_kg 问题分类器预构建产物测试：类型优先级、进程内共享、磁盘缓存按词典变化失效
+"""
+import os
+import shutil
+from importlib import resources
+from pathlib import Path
+
+import pytest
+
+from gustobot.infrastructure.knowledge.recipe_kg import question_intent_classifier as qc
+
+
+@pytest.fixture
+def dict_root(tmp_path) -> Path:
+    source = resources.files("gustobot.infrastructure.knowledge.recipe_kg") / "dicts"
+    root = tmp_path / "dicts"
+    shutil.copytree(str(source), root)
+    return root
+
+
+def test_word_types_follow_dictionary_priority() -> None:
+    words = {
+        "recipe": ("宫保鸡丁",),
+        "gongyi": ("炒",),
+        "haoshi": (),
+        "kouwei": ("麻辣",),
+        "leixing": (),
+        "caixi": ("宫保鸡丁", "川菜"),
+        "material": ("炒", "鸡丁"),
+    }
+    region = {"宫保鸡丁", "炒", "麻辣", "川菜", "鸡丁", "主料"}
+
+    mapping = qc._build_word_type_dict(region, words)
+
+    assert mapping["宫保鸡丁"] == ("Dish",)
+    assert mapping["炒"] == ("工艺",)
+    assert mapping["川菜"] == ("菜系",)
+    assert mapping["鸡丁"] == ("Ingredient",)
+    assert mapping["主料"] == ("relation",)
+
+
+def test_classifiers_share_the_process_artifact(monkeypatch) -> None:
+    monkeypatch.setattr(qc.settings, "RECIPE_KG_CLASSIFIER_CACHE_PATH", "")
+    monkeypatch.setattr(qc, "_artifact", None)
+
+    first = qc.QuestionClassifier()
+    second = qc.QuestionClassifier()
+
+    assert first.region_tree is second.region_tree
+    result = first.classify("宫保鸡丁怎么做")
+    assert result.question_type == "recipe_property"
+    assert result.args["nodes"]["宫保鸡丁"][0] == "Dish"
+
+
+def test_disk_cache_is_reused_until_dicts_change(dict_root, tmp_path, monkeypatch) -> None:
+    cache_path = str(tmp_path / "cache" / "classifier.pkl")
+    builds = []
+    original_build = qc.build_classifier_artifact
+
+    def counting_build(root=None):
+        builds.append(root)
+        return original_build(root)
+
+    monkeypatch.setattr(qc, "build_classifier_artifact", counting_build)
+
+    built = qc.load_classifier_artifact(dict_root, cache_path)
+    cached = qc.load_classifier_artifact(dict_root, cache_path)
+    assert len(builds) == 1
+    assert cached.fingerprint == built.fingerprint
+    assert dict(cached.word_type_dict) == dict(built.word_type_dict)
+
+    with (dict_root / "kouwei.txt").open("a", encoding="utf-8") as fp:
+        fp.write("\n测试新口味\n")
+    stat = (dict_root / "kouwei.txt").stat()
+    os.utime(dict_root / "kouwei.txt", ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+    rebuilt = qc.load_classifier_artifact(dict_root, cache_path)
+    assert len(builds) == 2
+    assert rebuilt.word_type_dict["测试新口味"] == ("口味",)
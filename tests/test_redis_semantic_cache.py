@@ -0,0 +1,156 @@
+"""
+RedisSemanticCache 有序集合淘汰测试
+"""
+import asyncio
+
+import pytest
+
+from gustobot.application.services.redis_cache import RedisSemanticCache
+
+VECTORS = {
+    "红烧肉怎么做": [1.0, 0.0, 0.0],
+    "宫保鸡丁的历史": [0.0, 1.0, 0.0],
+    "麻婆豆腐": [0.0, 0.0, 1.0],
+}
+
+
+async def _fake_embedding(text: str):
+    return VECTORS[text]
+
+
+def _messages(text: str):
+    return [{"role": "user", "content": text}]
+
+
+def _make_cache(redis, **kwargs):
+    params = {"redis_client": redis, "score_threshold": 0.95, "max_cache_size": 2, "ttl": 60}
+    params.update(kwargs)
+    cache = RedisSemanticCache(**params)
+    cache._get_embedding = _fake_embedding
+    return cache
+
+
+def _entry_keys(redis):
+    return {key.decode("utf-8") for key in redis._data if b":entry:" in key}
+
+
+def _entry_key(text: str) -> str:
+    return f"semantic:entry:{RedisSemanticCache._message_hash(text)}"
+
+
+def test_write_is_single_hash_and_constant_round_trips(fake_redis):
+    cache = _make_cache(fake_redis)
+
+    async def scenario():
+        trips = []
+        for text in ("红烧肉怎么做", "宫保鸡丁的历史", "麻婆豆腐"):
+            fake_redis.round_trips = 0
+            await cache.update(_messages(text), text)
+            trips.append(fake_redis.round_trips)
+        return trips
+
+    # 写入、计分与超出容量时的淘汰都在同一个 Lua 脚本中完成
+    assert asyncio.run(scenario()) == [1, 1, 1]
+    assert _entry_keys(fake_redis) == {_entry_key("宫保鸡丁的历史"), _entry_key("麻婆豆腐")}
+    assert asyncio.run(fake_redis.zcard("semantic:access")) == 2
+
+
+def test_lru_keeps_recently_read_entry(fake_redis):
+    cache = _make_cache(fake_redis)
+
+    async def scenario():
+        await cache.update(_messages("红烧肉怎么做"), "a")
+        await cache.update(_messages("宫保鸡丁的历史"), "b")
+        hit = await cache.lookup(_messages("红烧肉怎么做"))
+        await cache.update(_messages("麻婆豆腐"), "c")
+        return hit
+
+    assert asyncio.run(scenario()) == "a"
+    assert _entry_keys(fake_redis) == {_entry_key("红烧肉怎么做"), _entry_key("麻婆豆腐")}
+
+
+def test_lfu_evicts_least_frequently_used(fake_redis):
+    cache = _make_cache(fake_redis, eviction_policy="lfu")
+
+    async def scenario():
+        await cache.update(_messages("宫保鸡丁的历史"), "b")
+        await cache.update(_messages("红烧肉怎么做"), "a")
+        await cache.lookup(_messages("宫保鸡丁的历史"))
+        await cache.update(_messages("麻婆豆腐"), "c")
+
+    asyncio.run(scenario())
+    assert _entry_key("红烧肉怎么做") not in _entry_keys(fake_redis)
+    assert _entry_key("宫保鸡丁的历史") in _entry_keys(fake_redis)
+
+
+def test_lfu_restore_keeps_access_count(fake_redis):
+    cache = _make_cache(fake_redis, eviction_policy="lfu")
+
+    async def scenario():
+        await cache.update(_messages("宫保鸡丁的历史"), "b")
+        await cache.lookup(_messages("宫保鸡丁的历史"))
+        await cache.lookup(_messages("宫保鸡丁的历史"))
+        await cache.update(_messages("宫保鸡丁的历史"), "b2")
+        message_hash = RedisSemanticCache._message_hash("宫保鸡丁的历史")
+        return (
+            await fake_redis.zscore("semantic:access", message_hash),
+            await fake_redis.hget(_entry_key("宫保鸡丁的历史"), "access_count"),
+            await cache.lookup(_messages("宫保鸡丁的历史")),
+        )
+
+    score, access_count, response = asyncio.run(scenario())
+    assert score == 3
+    assert access_count == b"3"
+    assert response == "b2"
+
+
+def test_full_lfu_cache_keeps_the_entry_just_written(fake_redis):
+    cache = _make_cache(fake_redis, eviction_policy="lfu")
+
+    async def scenario():
+        # 三个条目访问次数相同（均为 1）；最后写入的条目按成员名排在最前
+        for text in ("红烧肉怎么做", "麻婆豆腐", "宫保鸡丁的历史"):
+            await cache.update(_messages(text), text)
+        return await cache.lookup(_messages("宫保鸡丁的历史"))
+
+    assert asyncio.run(scenario()) == "宫保鸡丁的历史"
+    assert _entry_key("宫保鸡丁的历史") in _entry_keys(fake_redis)
+    assert len(_entry_keys(fake_redis)) == 2
+    assert asyncio.run(fake_redis.zcard("semantic:access")) == 2
+
+
+def test_scores_of_expired_entries_are_pruned_on_miss(fake_redis):
+    cache = _make_cache(fake_redis, eviction_policy="lfu")
+
+    async def scenario():
+        await cache.update(_messages("红烧肉怎么做"), "a")
+        for _ in range(3):
+            await cache.lookup(_messages("红烧肉怎么做"))
+        # 条目哈希按 TTL 过期，访问计分仍留在有序集合中
+        await fake_redis.delete(_entry_key("红烧肉怎么做"))
+        miss = await cache.lookup(_messages("宫保鸡丁的历史"))
+        await cache.update(_messages("宫保鸡丁的历史"), "b")
+        await cache.update(_messages("麻婆豆腐"), "c")
+        return miss
+
+    assert asyncio.run(scenario()) is None
+    assert _entry_keys(fake_redis) == {_entry_key("宫保鸡丁的历史"), _entry_key("麻婆豆腐")}
+
+
+def test_expired_entry_is_removed_from_access_set(fake_redis):
+    cache = _make_cache(fake_redis)
+
+    async def scenario():
+        await cache.update(_messages("麻婆豆腐"), "c")
+        # 模拟仅剩向量、响应已过期的条目
+        await fake_redis.hset(_entry_key("麻婆豆腐"), "resp", b"")
+        return await cache.lookup(_messages("麻婆豆腐"))
+
+    assert asyncio.run(scenario()) is None
+    assert not fake_redis._data.get(b"semantic:access")
+    assert not _entry_keys(fake_redis)
+
+
+def test_unknown_eviction_policy_is_rejected(fake_redis):
+    with pytest.raises(ValueError):
+        _make_cache(fake_redis, eviction_policy="fifo")
@@ -0,0 +1,158 @@
+"""
+Reranker 测试：共享连接池、分数缓存、延迟预算与熔断降级（使用 httpx MockTransport，不访问外部服务）
+"""
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+
+from gustobot.config import settings
+from gustobot.infrastructure.knowledge.knowledge_service import KnowledgeService
+from gustobot.infrastructure.knowledge.reranker import CircuitBreaker, Reranker
+
+DOCUMENTS = [
+    {"id": "a", "content": "番茄炒蛋", "score": 0.9},
+    {"id": "b", "content": "宫保鸡丁", "score": 0.8},
+    {"id": "c", "content": "鱼香肉丝", "score": 0.7},
+]
+
+
+class FakeRerankAPI:
+    """DashScope 格式的 rerank 接口：分数按文本在 ranking 中的位置给出，可模拟慢响应"""
+
+    def __init__(self, ranking, delay: float = 0.0) -> None:
+        self.ranking = ranking
+        self.delay = delay
+        self.requests = []
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        payload = json.loads(request.content)
+        texts = payload["input"]["documents"]
+        self.requests.append(texts)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        results = [
+            {"index": index, "relevance_score": 1.0 - self.ranking.index(text) * 0.1}
+            for index, text in enumerate(texts)
+        ]
+        return httpx.Response(200, json={"output": {"results": results}})
+
+
+@pytest.fixture
+def reranker(monkeypatch):
+    monkeypatch.setattr(settings, "RERANK_ENABLED", True)
+    monkeypatch.setattr(settings, "RERANK_PROVIDER", "custom")
+    monkeypatch.setattr(settings, "RERANK_BASE_URL", "http://rerank.test")
+    monkeypatch.setattr(settings, "RERANK_API_KEY", "test-key")
+
+    def build(api, **kwargs):
+        client = httpx.AsyncClient(transport=httpx.MockTransport(api))
+        return Reranker(http_client=client, **kwargs)
+
+    return build
+
+
+def test_scores_are_cached_and_only_unseen_documents_are_sent(reranker):
+    api = FakeRerankAPI(["鱼香肉丝", "番茄炒蛋", "宫保鸡丁", "清蒸鲈鱼"])
+    service = reranker(api)
+
+    async def scenario():
+        first = await service.rerank("家常菜", DOCUMENTS[:2], top_k=2)
+        second = await service.rerank("家常菜", DOCUMENTS + [{"id": "d", "content": "清蒸鲈鱼"}], top_k=3)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+
+    assert [doc["id"] for doc in first] == ["a", "b"]
+    assert [doc["id"] for doc in second] == ["c", "a", "b"]
+    assert second[0]["rerank_score"] == pytest.approx(1.0)
+    assert api.requests == [["番茄炒蛋", "宫保鸡丁"], ["鱼香肉丝", "清蒸鲈鱼"]]
+    assert service.stats["cache_hits"] == 2
+
+
+def test_slow_reranker_falls_back_within_budget_and_trips_breaker(reranker):
+    api = FakeRerankAPI(["鱼香肉丝", "宫保鸡丁", "番茄炒蛋"], delay=5.0)
+    service = reranker(api, latency_budget=0.05, breaker=CircuitBreaker(2, cooldown=60))
+
+    async def scenario():
+        outcomes = []
+        for query in ("家常菜", "下饭菜", "快手菜"):
+            started = time.perf_counter()
+            ranked = await service.rerank(query, DOCUMENTS, top_k=2)
+            outcomes.append((ranked, time.perf_counter() - started))
+        return outcomes
+
+    outcomes = asyncio.run(scenario())
+
+    for ranked, elapsed in outcomes:
+        assert [doc["id"] for doc in ranked] == ["a", "b"]
+        assert all("rerank_score" not in doc for doc in ranked)
+        assert elapsed < 1.0
+    # 两次超时后熔断，第三次不再请求
+    assert len(api.requests) == 2
+    assert service.breaker.state == "open"
+    assert service.stats["timeouts"] == 2 and service.stats["short_circuited"] == 1
+
+
+def test_breaker_lets_one_trial_through_after_cooldown():
+    now = [0.0]
+    breaker = CircuitBreaker(1, cooldown=10, clock=lambda: now[0])
+
+    breaker.record_failure()
+    assert not breaker.allow()
+    now[0] = 10.0
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+class FakeEmbedder:
+    async def aembed_documents(self, texts):
+        return [[0.0] for _ in texts]
+
+
+class FakeVectorStore:
+    def search_batch(self, embeddings, top_k=10, filter_expr=None, search_params=None, output_vectors=False):
+        return [[dict(doc) for doc in DOCUMENTS[:top_k]] for _ in embeddings]
+
+
+def test_search_keeps_vector_results_when_reranker_is_down(reranker, monkeypatch):
+    monkeypatch.setattr(settings, "KB_HYBRID_ENABLED", False)
+    monkeypatch.setattr(settings, "KB_SEARCH_BATCH_WINDOW_MS", 0.0)
+    monkeypatch.setattr(settings, "KB_RERANK_SCORE_THRESHOLD", 0.8)
+
+    async def unavailable(request):
+        return httpx.Response(503)
+
+    knowledge = KnowledgeService(vector_store=FakeVectorStore())
+    knowledge.embedder = FakeEmbedder()
+    knowledge.reranker = reranker(unavailable)
+
+    results = asyncio.run(knowledge.search("家常菜", top_k=2, similarity_threshold=0.5))
+
+    # 无 rerank_score 时不按 rerank 阈值过滤，避免降级后结果被清空
+    assert [doc["id"] for doc in results] == ["a", "b"]
+
+
+def test_cohere_uses_its_own_endpoint_and_scores_every_document(reranker, monkeypatch):
+    monkeypatch.setattr(settings, "RERANK_PROVIDER", "cohere")
+    monkeypatch.setattr(settings, "COHERE_RERANK_URL", "https://cohere.test/v2/rerank")
+    requests = []
+
+    async def api(request: httpx.Request) -> httpx.Response:
+        payload = json.loads(request.content)
+        requests.append((str(request.url), payload["top_n"]))
+        results = [{"index": index, "relevance_score": index * 0.1} for index in range(len(payload["documents"]))]
+        return httpx.Response(200, json={"results": results})
+
+    service = reranker(api)
+    ranked = asyncio.run(service.rerank("家常菜", DOCUMENTS, top_k=1))
+
+    # RERANK_BASE_URL 属于 custom 接口，不会发给 Cohere
+    assert requests == [("https://cohere.test/v2/rerank", 3)]
+    assert [doc["id"] for doc in ranked] == ["c"]
+    assert len(service.cache) == 3
@@ -0,0 +1,162 @@
+"""
+/chat 两级响应缓存测试
+"""
+import asyncio
+
+from gustobot.application.services.response_cache import ResponseCache, history_digest, normalize_question
+
+VECTORS = {
+    "红烧肉怎么做": [1.0, 0.0, 0.0],
+    "红烧肉怎么做啊": [0.99, 0.05, 0.0],
+    "生成一张红烧肉的图片": [0.0, 1.0, 0.0],
+    "宫保鸡丁的历史": [0.0, 0.0, 1.0],
+    "那它要煮多久": [0.0, 0.0, 1.0],
+}
+ROUTE_TTLS = {"graphrag-query": 60, "image-query": 60, "kb-query": 60, "file-query": 0}
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _answer(route: str, message: str = "先焯水再红烧"):
+    return {"message": message, "route": route, "route_logic": "test", "sources": []}
+
+
+def _make_cache(semantic=None, **kwargs):
+    params = {
+        "enabled": True,
+        "lru_size": 8,
+        "semantic_enabled": semantic is not None,
+        "semantic_cache": semantic,
+        "route_ttls": ROUTE_TTLS,
+        "session_routes": ["image-query", "file-query"],
+    }
+    params.update(kwargs)
+    return ResponseCache(**params)
+
+
+async def _drain(cache: ResponseCache) -> None:
+    if cache._pending:
+        await asyncio.gather(*cache._pending)
+
+
+def test_normalize_question():
+    assert normalize_question("  红烧肉　怎么做？？ ") == "红烧肉 怎么做"
+    assert normalize_question("ＡＢＣ  Recipe!") == "abc recipe"
+
+
+def test_disabled_cache_bypasses():
+    cache = _make_cache(enabled=False)
+
+    async def scenario():
+        stored = await cache.store("红烧肉怎么做", _answer("graphrag-query"), session_id="s1")
+        return stored, await cache.lookup("红烧肉怎么做", session_id="s1")
+
+    stored, lookup = asyncio.run(scenario())
+    assert stored is False
+    assert lookup.status == "bypass"
+    assert lookup.headers == {"X-Cache": "BYPASS"}
+
+
+def test_lru_hit_across_sessions_and_route_ttl():
+    clock = FakeClock()
+    cache = _make_cache(clock=clock)
+
+    async def scenario():
+        first = await cache.lookup("红烧肉怎么做", session_id="s1")
+        await cache.store("红烧肉怎么做", _answer("graphrag-query"), session_id="s1")
+        second = await cache.lookup("红烧肉怎么做？", session_id="s2")
+        clock.now = 61
+        expired = await cache.lookup("红烧肉怎么做", session_id="s2")
+        return first, second, expired
+
+    first, second, expired = asyncio.run(scenario())
+    assert first.status == "miss"
+    assert second.hit and second.tier == "lru"
+    assert second.headers == {"X-Cache": "HIT", "X-Cache-Tier": "lru", "X-Cache-Route": "graphrag-query"}
+    assert expired.status == "miss"
+
+
+def test_session_routes_and_attachments_stay_in_session():
+    cache = _make_cache()
+
+    async def scenario():
+        await cache.store("生成一张红烧肉的图片", _answer("image-query", "img"), session_id="s1")
+        await cache.store(
+            "分析这张图", _answer("image-query", "analysis"), session_id="s1", image_path="/tmp/a.png"
+        )
+        file_stored = await cache.store(
+            "导入菜谱", _answer("file-query", "done"), session_id="s1", file_path="/tmp/a.xlsx"
+        )
+        return (
+            file_stored,
+            await cache.lookup("生成一张红烧肉的图片", session_id="s1"),
+            await cache.lookup("生成一张红烧肉的图片", session_id="s2"),
+            await cache.lookup("分析这张图", session_id="s1", image_path="/tmp/a.png"),
+            await cache.lookup("分析这张图", session_id="s1", image_path="/tmp/b.png"),
+            await cache.lookup("导入菜谱", session_id="s1", file_path="/tmp/a.xlsx"),
+        )
+
+    file_stored, own, other, same_image, other_image, file_lookup = asyncio.run(scenario())
+    assert file_stored is False
+    assert own.hit
+    assert other.status == "miss"
+    assert same_image.hit and same_image.payload["message"] == "analysis"
+    assert other_image.status == "miss"
+    assert file_lookup.status == "bypass"
+
+
+def test_semantic_tier_serves_paraphrase_and_fills_lru(make_semantic_cache):
+    writer = _make_cache(make_semantic_cache())
+    reader = _make_cache(make_semantic_cache())
+
+    async def scenario():
+        await writer.store("红烧肉怎么做", _answer("graphrag-query"), session_id="s1")
+        await _drain(writer)
+        await writer.store("生成一张红烧肉的图片", _answer("image-query", "img"), session_id="s1")
+        await _drain(writer)
+        return (
+            await reader.lookup("红烧肉怎么做啊", session_id="s2"),
+            await reader.lookup("红烧肉怎么做啊", session_id="s2"),
+            await reader.lookup("生成一张红烧肉的图片", session_id="s2"),
+        )
+
+    semantic_hit, lru_hit, image_miss = asyncio.run(scenario())
+    assert semantic_hit.hit and semantic_hit.tier == "semantic"
+    assert semantic_hit.payload["message"] == "先焯水再红烧"
+    assert lru_hit.tier == "lru"
+    assert image_miss.status == "miss"
+
+
+def test_history_digest_depends_on_prior_turns():
+    turns = [{"type": "human", "content": "红烧肉怎么做"}, {"type": "ai", "content": "先焯水再红烧"}]
+
+    assert history_digest([]) is None
+    assert history_digest(turns) == history_digest([dict(turn) for turn in turns])
+    assert history_digest(turns) != history_digest(turns[:1])
+
+
+def test_follow_up_only_hits_after_the_same_history(make_semantic_cache):
+    cache = _make_cache(make_semantic_cache())
+    pork = history_digest([{"type": "human", "content": "红烧肉怎么做"}, {"type": "ai", "content": "先焯水再红烧"}])
+    gongbao = history_digest([{"type": "human", "content": "宫保鸡丁的历史"}, {"type": "ai", "content": "丁宝桢"}])
+
+    async def scenario():
+        await cache.store("那它要煮多久？", _answer("graphrag-query", "小火炖一小时"), session_id="s1", history_key=pork)
+        await _drain(cache)
+        return (
+            await cache.lookup("那它要煮多久", session_id="s2"),
+            await cache.lookup("那它要煮多久", session_id="s3", history_key=gongbao),
+            await cache.lookup("那它要煮多久", session_id="s4", history_key=pork),
+        )
+
+    fresh, other_topic, same_topic = asyncio.run(scenario())
+    # 追问既不进入全局精确键，也不写入只看最后一句话的语义层
+    assert fresh.status == "miss"
+    assert other_topic.status == "miss" and other_topic.history_key == gongbao
+    assert same_topic.hit and same_topic.payload["message"] == "小火炖一小时"
@@ -0,0 +1,96 @@
+"""
+KB 检索并发执行器测试：优先级合并、取消兜底源、截止时间
+"""
+import asyncio
+import time
+
+from gustobot.application.agents.kg_sub_graph.agentic_rag_agents.workflows.multi_agent.retrieval_executor import (
+    RetrievalExecutor,
+    RetrievalSource,
+)
+
+
+def _source(name, delay, results, *, always=False, log=None):
+    async def search():
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            if log is not None:
+                log.append(name)
+            raise
+        if isinstance(results, BaseException):
+            raise results
+        return results
+
+    return RetrievalSource(name, search, always=always)
+
+
+def _run(sources, deadline=5.0):
+    return asyncio.run(RetrievalExecutor(deadline).run(sources))
+
+
+def test_postgres_wins_and_cancels_late_fallbacks() -> None:
+    cancelled = []
+    started = time.perf_counter()
+    outcomes = _run([
+        _source("postgres", 0.05, [{"id": "pg"}]),
+        _source("milvus", 1.0, [{"id": "mv"}], log=cancelled),
+        _source("external", 1.0, [{"id": "ext"}], log=cancelled),
+    ])
+
+    assert time.perf_counter() - started < 0.5
+    assert outcomes["postgres"].status == "ok"
+    assert outcomes["postgres"].results == [{"id": "pg"}]
+    assert outcomes["milvus"].status == "cancelled"
+    assert outcomes["external"].status == "cancelled"
+    assert sorted(cancelled) == ["external", "milvus"]
+    assert outcomes["postgres"].as_step().startswith("local_search:postgres=ok(1) ")
+
+
+def test_fallback_result_waits_for_higher_priority_source() -> None:
+    outcomes = _run([
+        _source("postgres", 0.1, []),
+        _source("milvus", 0.01, [{"id": "mv"}]),
+    ])
+
+    assert outcomes["postgres"].status == "empty"
+    assert outcomes["milvus"].status == "ok"  # finished first but only used once postgres is empty
+
+
+def test_failed_source_falls_through_and_always_source_is_kept() -> None:
+    outcomes = _run([
+        _source("postgres", 0.01, RuntimeError("boom")),
+        _source("milvus", 0.02, [{"id": "mv"}]),
+        _source("external", 0.1, [{"id": "ext"}], always=True),
+    ])
+
+    assert outcomes["postgres"].status == "error"
+    assert outcomes["milvus"].status == "ok"
+    assert outcomes["external"].status == "ok"
+
+
+def test_source_that_ends_cancelled_is_reported() -> None:
+    outcomes = _run([
+        _source("postgres", 0.01, asyncio.CancelledError()),
+        _source("milvus", 0.02, [{"id": "mv"}]),
+    ])
+
+    assert outcomes["postgres"].status == "cancelled"
+    assert outcomes["milvus"].status == "ok"
+
+
+def test_deadline_cancels_slow_sources() -> None:
+    cancelled = []
+    started = time.perf_counter()
+    outcomes = _run(
+        [
+            _source("postgres", 1.0, [{"id": "pg"}], log=cancelled),
+            _source("milvus", 0.01, [{"id": "mv"}]),
+        ],
+        deadline=0.1,
+    )
+
+    assert time.perf_counter() - started < 0.5
+    assert outcomes["postgres"].status == "timeout"
+    assert outcomes["milvus"].results == [{"id": "mv"}]
+    assert cancelled == ["postgres"]
@@ -0,0 +1,181 @@
+"""
+向量索引语义缓存测试
+"""
+import asyncio
+
+import pytest
+
+from gustobot.application.services.redis_cache import RedisSemanticCache
+from gustobot.application.services.semantic_cache import (
+    NumpyVectorIndex,
+    create_vector_index,
+)
+
+VECTORS = {
+    "红烧肉怎么做": [1.0, 0.0, 0.0, 0.0],
+    "红烧肉怎么做？": [0.99, 0.05, 0.0, 0.0],
+    "宫保鸡丁的历史": [0.0, 1.0, 0.0, 0.0],
+    "麻婆豆腐": [0.0, 0.0, 1.0, 0.0],
+}
+
+
+def _messages(text: str):
+    return [{"role": "user", "content": text}]
+
+
+def test_numpy_index_search_and_remove():
+    index = NumpyVectorIndex(3, initial_capacity=1)
+    index.add("a", [1.0, 0.0, 0.0])
+    index.add("b", [0.0, 1.0, 0.0])
+    index.add("c", [0.0, 0.0, 1.0])
+
+    assert index.search([0.1, 0.9, 0.0])[0][0] == "b"
+    assert [key for key, _ in index.search([1.0, 0.5, 0.0], k=2)] == ["a", "b"]
+
+    index.remove("a")
+    assert "a" not in index
+    assert len(index) == 2
+    assert index.search([1.0, 0.0, 0.0], k=3)[0][0] in {"b", "c"}
+
+
+def test_create_vector_index_rejects_unknown_backend():
+    with pytest.raises(ValueError):
+        create_vector_index(4, "faiss")
+
+
+def test_lookup_hits_similar_question_in_one_round_trip(fake_redis, make_semantic_cache):
+    cache = make_semantic_cache()
+
+    async def scenario():
+        await cache.update(_messages("红烧肉怎么做"), "先焯水再红烧")
+        fake_redis.round_trips = 0
+        hit = await cache.lookup(_messages("红烧肉怎么做？"))
+        lookup_trips = fake_redis.round_trips
+        miss = await cache.lookup(_messages("宫保鸡丁的历史"))
+        return hit, lookup_trips, miss
+
+    hit, lookup_trips, miss = asyncio.run(scenario())
+
+    assert hit == "先焯水再红烧"
+    assert lookup_trips == 1
+    assert miss is None
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["writes"] == 1
+    assert stats["latency_ms"]["max"] >= 0
+
+
+def test_index_rebuilds_from_redis_and_scopes_are_isolated(make_semantic_cache):
+    writer = make_semantic_cache()
+    reader = make_semantic_cache()
+
+    async def scenario():
+        await writer.update(_messages("麻婆豆腐"), "麻辣鲜香", scope="session-1")
+        return (
+            await reader.lookup(_messages("麻婆豆腐"), scope="session-1"),
+            await reader.lookup(_messages("麻婆豆腐"), scope="session-2"),
+        )
+
+    scoped_hit, other_scope = asyncio.run(scenario())
+
+    assert scoped_hit == "麻辣鲜香"
+    assert other_scope is None
+
+
+def test_capacity_evicts_least_recently_used(fake_redis, make_semantic_cache):
+    cache = make_semantic_cache(max_cache_size=2)
+
+    async def scenario():
+        await cache.update(_messages("红烧肉怎么做"), "a")
+        await cache.update(_messages("宫保鸡丁的历史"), "b")
+        await cache.lookup(_messages("红烧肉怎么做"))
+        await cache.update(_messages("麻婆豆腐"), "c")
+        return [
+            await cache.lookup(_messages(text))
+            for text in ("红烧肉怎么做", "宫保鸡丁的历史", "麻婆豆腐")
+        ]
+
+    assert asyncio.run(scenario()) == ["a", None, "c"]
+    assert cache.metrics.evictions == 1
+    assert fake_redis._data.keys() == {
+        f"semantic:entry:{RedisSemanticCache._message_hash(text)}".encode("utf-8")
+        for text in ("红烧肉怎么做", "麻婆豆腐")
+    }
+
+
+def test_expired_entry_is_dropped_from_index(fake_redis, make_semantic_cache):
+    cache = make_semantic_cache()
+    entry_key = f"semantic:entry:{RedisSemanticCache._message_hash('麻婆豆腐')}"
+
+    async def scenario():
+        await cache.update(_messages("麻婆豆腐"), "c")
+        await fake_redis.delete(entry_key)
+        fake_redis.round_trips = 0
+        return await cache.lookup(_messages("麻婆豆腐"))
+
+    assert asyncio.run(scenario()) is None
+    # 过期条目不会被访问记录重新写回，也无需额外的删除请求
+    assert fake_redis.round_trips == 1
+    assert cache.stats()["namespaces"]["semantic"] == 0
+    assert not fake_redis._data
+
+
+def test_restore_keeps_access_metadata(fake_redis, make_semantic_cache):
+    cache = make_semantic_cache()
+    entry_key = f"semantic:entry:{RedisSemanticCache._message_hash('红烧肉怎么做')}"
+
+    async def scenario():
+        await cache.update(_messages("红烧肉怎么做"), "a")
+        created_at = await fake_redis.hget(entry_key, "created_at")
+        await cache.lookup(_messages("红烧肉怎么做"))
+        await cache.lookup(_messages("红烧肉怎么做"))
+        await cache.update(_messages("红烧肉怎么做"), "b")
+        return created_at, await fake_redis.hgetall(entry_key)
+
+    created_at, entry = asyncio.run(scenario())
+
+    assert entry[b"resp"] == b"b"
+    assert entry[b"access_count"] == b"3"
+    assert entry[b"created_at"] == created_at
+
+
+def test_stale_index_is_resynced_in_the_background(make_semantic_cache):
+    writer = make_semantic_cache()
+    reader = make_semantic_cache(sync_interval=60)
+
+    async def scenario():
+        await reader.lookup(_messages("麻婆豆腐"))
+        await writer.update(_messages("麻婆豆腐"), "麻辣鲜香")
+        reader._namespaces["semantic"].synced_at -= 120
+        # 过期的索引照常服务，重载在后台进行
+        stale = await reader.lookup(_messages("麻婆豆腐"))
+        resync = reader._resyncs["semantic"]
+        await reader.update(_messages("宫保鸡丁的历史"), "丁宝桢")
+        await resync
+        return (
+            stale,
+            await reader.lookup(_messages("麻婆豆腐")),
+            await reader.lookup(_messages("宫保鸡丁的历史")),
+        )
+
+    stale, synced, written_during_resync = asyncio.run(scenario())
+
+    assert stale is None
+    assert synced == "麻辣鲜香"
+    assert written_during_resync == "丁宝桢"
+    assert not reader._resyncs
+
+
+def test_hnsw_index_matches_exact_search():
+    pytest.importorskip("hnswlib")
+    index = create_vector_index(3, "hnsw")
+    index.add_many(["a", "b", "c"], [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0]])
+    index.add("d", [0.7, 0.7, 0.0])
+
+    key, score = index.search([0.0, 0.9, 0.1])[0]
+    assert key == "b"
+    assert score == pytest.approx(0.9939, abs=1e-3)
+
+    index.remove("b")
+    assert index.search([0.0, 0.9, 0.1])[0][0] == "d"
@@ -0,0 +1,127 @@
+"""
+子工作流工厂测试：按配置编译一次、Neo4j 不可用时不缓存、schema 变更失效
+"""
+from gustobot.application.agents.workflow_factory import AgentDependencies, WorkflowFactory
+
+
+class FakeGraph:
+    def __init__(self) -> None:
+        self.refreshes = 0
+
+    def refresh_schema(self) -> None:
+        self.refreshes += 1
+
+
+def _factory(graph_factory=None):
+    calls = {"llm": 0, "graph": 0, "retriever": 0, "research": 0, "kb": 0}
+    service = object()
+    shared_graph = FakeGraph()
+    schema = {"version": 1}
+
+    def refresh_schema():
+        shared_graph.refresh_schema()
+        schema["version"] += 1
+
+    def llm_factory(temperature, tag):
+        calls["llm"] += 1
+        return (temperature, tag)
+
+    def default_graph():
+        calls["graph"] += 1
+        return shared_graph
+
+    def retriever_factory():
+        calls["retriever"] += 1
+        return object()
+
+    def research_builder(**kwargs):
+        calls["research"] += 1
+        return {"kind": "research", **kwargs}
+
+    def kb_builder(**kwargs):
+        calls["kb"] += 1
+        return {"kind": "kb", **kwargs}
+
+    dependencies = AgentDependencies(
+        llm_factory=llm_factory,
+        graph_factory=graph_factory or default_graph,
+        schema_version=lambda: schema["version"],
+        schema_refresher=refresh_schema,
+        retriever_factory=retriever_factory,
+        knowledge_service_factory=lambda: service,
+        graph_retry_backoff=0,
+    )
+    factory = WorkflowFactory(dependencies, research_builder=research_builder, kb_builder=kb_builder)
+    return factory, calls, schema
+
+
+def test_research_workflow_is_compiled_once() -> None:
+    factory, calls, schema = _factory()
+
+    first = factory.research_workflow()
+    second = factory.research_workflow()
+
+    assert first is second
+    assert calls == {"llm": 1, "graph": 2, "retriever": 1, "research": 1, "kb": 0}
+    assert first["llm"] == (0.7, "research_plan")
+    assert factory.stats["hits"] == 1
+
+
+def test_kb_workflow_is_keyed_by_configuration() -> None:
+    factory, calls, schema = _factory()
+
+    a = factory.kb_workflow(top_k=5, similarity_threshold=0.5)
+    b = factory.kb_workflow(top_k=5, similarity_threshold=0.5)
+    c = factory.kb_workflow(top_k=8, similarity_threshold=0.5)
+
+    assert a is b
+    assert c is not a
+    assert calls["kb"] == 2
+    assert calls["llm"] == 1  # the chat model is shared across configurations
+
+
+def test_research_workflow_not_cached_without_neo4j() -> None:
+    attempts = {"n": 0}
+
+    def flaky_graph():
+        attempts["n"] += 1
+        if attempts["n"] == 1:
+            raise ConnectionError("neo4j down")
+        return FakeGraph()
+
+    factory, calls, schema = _factory(graph_factory=flaky_graph)
+
+    degraded = factory.research_workflow()
+    assert degraded["graph"] is None
+
+    recovered = factory.research_workflow()
+    assert isinstance(recovered["graph"], FakeGraph)
+    assert factory.research_workflow() is recovered
+    assert calls["research"] == 2
+
+
+def test_invalidate_neo4j_schema_refreshes_and_recompiles() -> None:
+    factory, calls, schema = _factory()
+    kb = factory.kb_workflow(top_k=5, similarity_threshold=0.5)
+    first = factory.research_workflow()
+    graph = first["graph"]
+
+    assert factory.invalidate_neo4j_schema() == 1
+
+    second = factory.research_workflow()
+    assert second is not first
+    assert second["graph"] is graph
+    assert graph.refreshes == 1
+    assert factory.kb_workflow(top_k=5, similarity_threshold=0.5) is kb
+
+
+def test_schema_version_change_recompiles_research_workflow() -> None:
+    factory, calls, schema = _factory()
+    first = factory.research_workflow()
+
+    schema["version"] += 1  # e.g. TTL refresh inside kg_neo4j_conn
+
+    second = factory.research_workflow()
+    assert second is not first
+    assert factory.research_workflow() is second
+    assert calls["research"] == 2